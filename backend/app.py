@@ -1,6 +1,7 @@
 import os
 import uvicorn
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
@@ -9,35 +10,61 @@ from dotenv import load_dotenv
 # 환경 변수 로드를 최상단으로 이동
 load_dotenv()
 
+from logging_config import setup_logging, RequestContextMiddleware
+
 # 라우터 임포트
 from routes.chat import router as chat_router
 from routes.admin import router as admin_router
+from routes.metrics import router as metrics_router
+# 라우트별 요청 시간 계측 미들웨어
+from services.metrics_service import MetricsMiddleware
 # MongoDB 연결/종료 함수 임포트
 from db.mongo import connect_to_mongo, close_mongo_connection
+# OpenAI 클라이언트 생성/종료 함수 임포트
+from services.openai_service import init_openai_client, close_openai_client
+# 날씨 HTTP 클라이언트 생성/종료 함수 임포트
+from services.weather_service import init_weather_client, close_weather_client
+# 트레이스 내보내기(TRACE_EXPORTER) 시작/종료 함수 임포트
+from services.tracing_service import init_tracing, close_tracing
+# 워커 간 공유 상태(SHARED_STATE_BACKEND) 생성/종료 함수 임포트
+from services.shared_state import init_shared_state, close_shared_state
+# 전체 대화 검색 색인(SEARCH_INDEX_PATH) 열기/닫기 함수 임포트
+from db.search_index import init_search_index, close_search_index
+# 보관 정책 스위퍼(아카이브/만료 삭제/삭제 후속 정리) 시작/종료 함수 임포트
+from services.retention_service import init_retention, close_retention
 
-# 로깅 설정
-log_file = "app.log"
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler()
-    ]
-)
+# 로깅 설정 (큐 핸들러 + 백그라운드 스레드에서 파일/콘솔 출력, LOG_FORMAT=json 이면 구조화 로그)
+setup_logging()
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
-
-# Startup 이벤트 핸들러: 앱 시작 시 MongoDB 연결
-@app.on_event("startup")
-async def startup_event():
+# 워커별 초기화: gunicorn 등으로 여러 워커를 띄우면 각 워커 프로세스에서 한 번씩 실행됩니다.
+# (Mongo/HTTP 클라이언트와 백그라운드 스레드는 fork 후에 만들어야 하므로 임포트 시점이 아닌 lifespan 에서 생성)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging() # --preload 로 fork 된 워커면 리스너 스레드를 새로 시작
     await connect_to_mongo()
+    await init_openai_client()
+    await init_weather_client()
+    await init_shared_state()
+    init_search_index()
+    init_tracing()
+    init_retention()
+    logger.info("워커 시작 (pid %d)", os.getpid())
+    try:
+        yield
+    finally:
+        # 앱 종료 시 스위퍼, HTTP 클라이언트, 공유 상태 백엔드 및 MongoDB 연결 종료
+        await close_retention()
+        await close_weather_client()
+        await close_openai_client()
+        await close_mongo_connection()
+        await close_shared_state()
+        close_search_index()
+        close_tracing()
 
-# Shutdown 이벤트 핸들러: 앱 종료 시 MongoDB 연결 종료
-@app.on_event("shutdown")
-async def shutdown_event():
-    await close_mongo_connection()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestContextMiddleware) # 가장 바깥에서 request_id 설정 (로그/메트릭 공통)
 
 # templates와 static 폴더 생성 확인 및 설정
 if not os.path.exists("templates"):
@@ -52,8 +79,10 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # 라우터 등록
 app.include_router(chat_router)
 app.include_router(admin_router)
+app.include_router(metrics_router)
 
 if __name__ == "__main__":
     logger.info("애플리케이션 시작 (단독 실행 모드)")
     # uvicorn.run("app:app", host="127.0.0.1", port=8000, reload=True)
-    uvicorn.run(app, host="127.0.0.1", port=8000) # Docker Compose에서 실행 시 이 부분은 사용되지 않음
\ No newline at end of file
+    uvicorn.run(app, host="127.0.0.1", port=8000) # Docker Compose에서 실행 시 이 부분은 사용되지 않음
+    # 운영(멀티 워커) 실행: gunicorn -c gunicorn.conf.py app:app
\ No newline at end of file
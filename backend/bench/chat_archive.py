@@ -0,0 +1,133 @@
+"""대화 아카이브(cold tier)의 저장 공간 절감, 아카이브 처리량, 복원/조회 지연, 삭제 지연 측정 스크립트입니다.
+
+실행 (backend 디렉토리에서, 테스트용 Mongo 를 가리키도록 설정한 상태):
+    MONGO_URI=mongodb://127.0.0.1:27017 CHAT_ARCHIVE_DIR=/tmp/bench_archive python -m bench.chat_archive --conversations 200 --messages 40
+    (mongod 가 없으면 python -m bench.mongo_stub --port 27099 --latency 0.001 & 후 MONGO_URI=mongodb://127.0.0.1:27099)
+현재 저장 형식(CHAT_STORAGE_LAYOUT)으로 대화와 턴마다 토큰 사용량을 저장한 뒤,
+1. 아카이브 전후 collStats 차이로 Mongo 에서 빠진 문서 수/데이터 크기와 아카이브 파일 크기를 비교하고
+2. 아카이브되지 않은 대화의 기록 페이지 조회 지연(아카이브 목록 확인 포함/제외)과 아카이브된 대화의 첫 조회(복원 포함) 지연,
+3. 대화 삭제 요청 지연(요청 안에서 끝나는 부분)과 토큰 사용량/집계 후속 정리가 끝나기까지의 시간을 측정합니다.
+bench-archive- 로 시작하는 대화만 만들고 지우지만, 운영 DB 와 운영 CHAT_ARCHIVE_DIR 에는 실행하지 마세요.
+"""
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from typing import List
+
+from bench.chat_load import percentile
+from bench.chat_storage import coll_stats, timed
+from db import mongo
+from db.history_cache import history_cache
+
+async def _no_archive(conversation_id: str) -> bool:
+    return False
+
+async def write_conversations(args, conversations: List[str], started_at: datetime):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    async def write(conversation_id: str):
+        async with semaphore:
+            for i in range(args.messages):
+                role = "user" if i % 2 == 0 else "assistant"
+                timestamp = started_at + timedelta(seconds=i)
+                await mongo.save_chat_message(conversation_id, role, f"{role} 메시지 {i} " + "내용 " * args.words, timestamp=timestamp, token_count=args.words)
+                if role == "assistant":
+                    await mongo.save_token_usage({
+                        "session_id": conversation_id, "model_name": "bench", "input_tokens": 100, "output_tokens": 20,
+                        "total_tokens": 120, "timestamp": timestamp,
+                    })
+    await asyncio.gather(*(write(c) for c in conversations))
+
+async def page_latencies(conversations: List[str], reads: int) -> List[float]:
+    latencies: List[float] = []
+    for conversation_id in random.sample(conversations, min(reads, len(conversations))):
+        await timed(latencies, mongo.get_chat_history_page(conversation_id, limit=50))
+    return latencies
+
+async def run(args):
+    await mongo.connect_to_mongo()
+    chat_name = mongo.COLLECTION_NAME_CHAT_BUCKETS if mongo.mongo_db.chat_layout == "bucket" else mongo.COLLECTION_NAME_CHAT
+    run_id = uuid.uuid4().hex[:8]
+    conversations = [f"bench-archive-{run_id}-{i}" for i in range(args.conversations)]
+    try:
+        await write_conversations(args, conversations, datetime.utcnow() - timedelta(days=30))
+        hot = [f"bench-archive-{run_id}-hot-{i}" for i in range(args.reads)]
+        await write_conversations(args, hot, datetime.utcnow())
+
+        # 아카이브 전 조회 지연 (아카이브 목록 확인 포함 / 제외)
+        hot_with_check = await page_latencies(hot, args.reads)
+        is_archived = mongo._is_archived
+        mongo._is_archived = _no_archive
+        hot_without_check = await page_latencies(hot, args.reads)
+        mongo._is_archived = is_archived
+
+        before = await coll_stats(chat_name)
+        started = time.perf_counter()
+        archived = {"conversations": 0, "messages": 0, "raw_bytes": 0, "archived_bytes": 0}
+        while True:
+            result = await mongo.archive_idle_conversations(datetime.utcnow() - timedelta(days=1), args.batch)
+            for key in archived:
+                archived[key] += result[key]
+            if result["conversations"] < args.batch:
+                break
+        archive_seconds = time.perf_counter() - started
+        after = await coll_stats(chat_name)
+
+        # 아카이브된 대화의 첫 조회 (복원 + 조회), 복원 후 다시 조회
+        cold_first: List[float] = []
+        cold_again: List[float] = []
+        for conversation_id in random.sample(conversations, min(args.reads, len(conversations))):
+            history_cache.invalidate(conversation_id)
+            await timed(cold_first, mongo.get_chat_history_page(conversation_id, limit=50))
+            await timed(cold_again, mongo.get_chat_history_page(conversation_id, limit=50))
+
+        # 삭제: 요청 지연과 후속 정리(token_usages 삭제 + 집계 차감 + 세션 삭제)가 끝나기까지의 시간
+        delete_request: List[float] = []
+        delete_total: List[float] = []
+        for conversation_id in conversations[:args.deletes]:
+            started = time.perf_counter()
+            await mongo.delete_chat_history_by_id(conversation_id)
+            delete_request.append(time.perf_counter() - started)
+            await asyncio.gather(*mongo._purge_tasks)
+            delete_total.append(time.perf_counter() - started)
+    finally:
+        for conversation_id in conversations + hot:
+            await mongo.delete_chat_history_by_id(conversation_id)
+        await asyncio.gather(*mongo._purge_tasks)
+        await mongo.compact_archive_segments(min_age=0)
+        await mongo.close_mongo_connection()
+
+    removed_docs = before.get("count", 0) - after.get("count", 0)
+    removed_bytes = before.get("size", 0) - after.get("size", 0)
+    print(f"형식 {mongo.mongo_db.chat_layout}, 대화 {args.conversations}개 x 메시지 {args.messages}개, MONGO_URI={mongo.MONGO_URI}")
+    print(f"아카이브: 대화 {archived['conversations']}개 / 메시지 {archived['messages']}개, "
+          f"{archived['conversations'] / archive_seconds:.0f} 대화/s ({archived['messages'] / archive_seconds:.0f} msg/s)")
+    print(f"  Mongo 에서 빠진 문서 {removed_docs}개, 데이터 {removed_bytes / 1024:.0f}KB (BSON)")
+    print(f"  아카이브 파일 {archived['archived_bytes'] / 1024:.0f}KB (JSONL {archived['raw_bytes'] / 1024:.0f}KB, "
+          f"BSON 대비 {archived['archived_bytes'] / max(1, removed_bytes):.1%})")
+    rows = [
+        ("일반 대화 페이지 (목록 확인 포함)", hot_with_check),
+        ("일반 대화 페이지 (목록 확인 제외)", hot_without_check),
+        ("아카이브 대화 첫 페이지 (복원 포함)", cold_first),
+        ("복원 후 같은 대화 페이지", cold_again),
+        ("삭제 요청", delete_request),
+        ("삭제 + 후속 정리 완료", delete_total),
+    ]
+    for name, latencies in rows:
+        print(f"  {name:<28} p50 {percentile(latencies, 0.5) * 1000:7.2f}ms  p99 {percentile(latencies, 0.99) * 1000:7.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="대화 아카이브 성능 측정")
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=40, help="대화당 메시지 수 (assistant 메시지마다 토큰 사용량 1개)")
+    parser.add_argument("--words", type=int, default=20, help="메시지당 반복 단어 수 (메시지 크기 조절)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--reads", type=int, default=50)
+    parser.add_argument("--deletes", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=100, help="아카이브 한 번에 처리할 대화 수")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""/chat 부하 테스트 스크립트입니다. (bench.stub_server 와 함께 사용)
+
+실행 (backend 디렉토리에서, 백엔드와 stub 서버가 떠 있는 상태):
+    python -m bench.chat_load --url http://127.0.0.1:8000 --requests 500 --concurrency 100 --users 20
+상태 코드별 개수, 지연 시간 백분위수, 429 의 Retry-After 분포, stub 서버의 최대 동시 호출 수를 출력합니다.
+"""
+import time
+import asyncio
+import argparse
+from collections import Counter
+from typing import List
+
+import httpx
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+async def run(args):
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    retry_after: Counter = Counter()
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(i)
+
+    async def worker(client: httpx.AsyncClient):
+        while not queue.empty():
+            i = queue.get_nowait()
+            user = f"user-{i % args.users}"
+            body = {"conversation_id": f"load-{user}-{i % args.conversations_per_user}", "message": f"부하 테스트 메시지 {i}"}
+            started = time.perf_counter()
+            try:
+                response = await client.post(args.path, json=body, headers={"X-User-Id": user})
+                statuses[response.status_code] += 1
+                if response.status_code == 429:
+                    retry_after[response.headers.get("Retry-After")] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        if args.stub_url:
+            await client.post(f"{args.stub_url}/stats/reset")
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+        print(f"요청 {args.requests}개, 동시성 {args.concurrency}, 소요 {elapsed:.2f}s ({args.requests / elapsed:.1f} req/s)")
+        print(f"상태 코드: {dict(statuses)}")
+        print("지연 시간(s): " + ", ".join(f"p{int(q * 100)}={percentile(latencies, q):.3f}" for q in (0.5, 0.9, 0.95, 0.99)) + f", max={max(latencies):.3f}")
+        if retry_after:
+            print(f"Retry-After 분포: {dict(retry_after)}")
+        if args.stub_url:
+            print(f"stub 서버: {(await client.get(f'{args.stub_url}/stats')).json()}")
+        runtime = (await client.get("/admin/runtime")).json()
+        print(f"수용 제어: {runtime.get('admission')}")
+
+def main():
+    parser = argparse.ArgumentParser(description="/chat 부하 테스트")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/chat")
+    parser.add_argument("--stub-url", default="http://127.0.0.1:9999", help="stub 서버 주소 (빈 값이면 통계 생략)")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--users", type=int, default=20, help="X-User-Id 로 나눌 사용자 수 (사용자별 한도는 앱을 CHAT_TRUSTED_PROXIES=127.0.0.1 CHAT_USER_ID_HEADER=X-User-Id 로 띄운 경우에만 적용)")
+    parser.add_argument("--conversations-per-user", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=60)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
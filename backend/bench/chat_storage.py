@@ -0,0 +1,113 @@
+"""채팅 기록 저장 형식(message / bucket)별 쓰기 처리량, 읽기 지연, 컬렉션/인덱스 크기 비교 스크립트입니다.
+
+실행 (backend 디렉토리에서, 테스트용 Mongo 를 가리키도록 설정한 상태):
+    MONGO_URI=mongodb://127.0.0.1:27017 python -m bench.chat_storage --conversations 200 --messages 60
+    (mongod 가 없으면 python -m bench.mongo_stub --port 27099 --latency 0.001 & 후 MONGO_URI=mongodb://127.0.0.1:27099)
+형식마다 같은 대화 세트를 save_chat_message 로 저장(대화 안에서는 순서대로, 대화 간에는 --concurrency 만큼 동시)하고,
+저장 전후 collStats 차이로 문서 수/데이터 크기/인덱스 크기를 구한 뒤,
+최근 기록(get_chat_history, 캐시 미사용)과 기록 페이지(get_chat_history_page) 조회 지연, 대화 삭제 지연을 측정합니다.
+bench-storage- 로 시작하는 대화만 만들고 지우지만, 운영 DB 에는 실행하지 마세요.
+"""
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from typing import Dict, List
+
+from bench.chat_load import percentile
+from db import mongo
+from db.chat_buckets import ensure_indexes
+from db.history_cache import history_cache
+
+COLLECTIONS = {"message": mongo.COLLECTION_NAME_CHAT, "bucket": mongo.COLLECTION_NAME_CHAT_BUCKETS}
+
+async def coll_stats(name: str) -> Dict[str, float]:
+    try:
+        stats = await mongo.mongo_db.db.command("collStats", name)
+    except Exception:
+        return {}
+    return {key: stats.get(key, 0) for key in ("count", "size", "totalIndexSize", "nindexes")}
+
+async def timed(latencies: List[float], coroutine):
+    started = time.perf_counter()
+    result = await coroutine
+    latencies.append(time.perf_counter() - started)
+    return result
+
+async def run_layout(args, layout: str) -> Dict[str, object]:
+    mongo.mongo_db.chat_layout = layout
+    if layout == "bucket":
+        await ensure_indexes(mongo.mongo_db.bucket_collection)
+    collection = COLLECTIONS[layout]
+    run_id = uuid.uuid4().hex[:8]
+    conversations = [f"bench-storage-{run_id}-{i}" for i in range(args.conversations)]
+    before = await coll_stats(collection)
+
+    # 쓰기: 대화별로 user/assistant 메시지를 번갈아 순서대로 저장
+    semaphore = asyncio.Semaphore(args.concurrency)
+    async def write(conversation_id: str):
+        async with semaphore:
+            for i in range(args.messages):
+                role = "user" if i % 2 == 0 else "assistant"
+                await mongo.save_chat_message(conversation_id, role, f"{role} 메시지 {i} " + "내용 " * args.words, token_count=args.words)
+    started = time.perf_counter()
+    await asyncio.gather(*(write(c) for c in conversations))
+    write_seconds = time.perf_counter() - started
+    after = await coll_stats(collection)
+
+    # 읽기: 캐시를 비운 상태의 최근 기록 조회, 가장 최근/중간 위치 페이지 조회
+    recent: List[float] = []
+    pages: List[float] = []
+    for _ in range(args.reads):
+        conversation_id = random.choice(conversations)
+        history_cache.invalidate(conversation_id)
+        await timed(recent, mongo.get_chat_history(conversation_id, limit=args.history_limit))
+        page = await timed(pages, mongo.get_chat_history_page(conversation_id, limit=args.page_limit))
+        if page["prev_cursor"]:
+            await timed(pages, mongo.get_chat_history_page(conversation_id, limit=args.page_limit, before=page["prev_cursor"]))
+
+    deletes: List[float] = []
+    for conversation_id in conversations:
+        await timed(deletes, mongo.delete_chat_history_by_id(conversation_id))
+
+    documents = after.get("count", 0) - before.get("count", 0)
+    return {
+        "write_rate": args.conversations * args.messages / write_seconds,
+        "documents": documents,
+        "index_keys": documents * after.get("nindexes", 0),
+        "data_bytes": after.get("size", 0) - before.get("size", 0),
+        "index_bytes": after.get("totalIndexSize", 0) - before.get("totalIndexSize", 0),
+        "recent_p50": percentile(recent, 0.5), "recent_p99": percentile(recent, 0.99),
+        "page_p50": percentile(pages, 0.5), "page_p99": percentile(pages, 0.99),
+        "delete_p50": percentile(deletes, 0.5),
+    }
+
+async def run(args):
+    await mongo.connect_to_mongo()
+    try:
+        results = {layout: await run_layout(args, layout) for layout in args.layouts.split(",")}
+    finally:
+        await mongo.close_mongo_connection()
+    print(f"대화 {args.conversations}개 x 메시지 {args.messages}개, 동시 대화 {args.concurrency}, 조회 {args.reads}회, MONGO_URI={mongo.MONGO_URI}")
+    print(f"{'형식':<9}{'msg/s':>8}{'문서':>8}{'인덱스 키':>10}{'데이터':>10}{'인덱스':>10}{'최근 p50':>10}{'p99':>8}{'페이지 p50':>11}{'p99':>8}{'삭제 p50':>10}")
+    for layout, r in results.items():
+        print(f"{layout:<9}{r['write_rate']:>8.0f}{r['documents']:>8}{r['index_keys']:>10}"
+              f"{r['data_bytes'] / 1024:>8.0f}KB{r['index_bytes'] / 1024:>8.0f}KB"
+              f"{r['recent_p50'] * 1000:>8.2f}ms{r['recent_p99'] * 1000:>6.2f}ms"
+              f"{r['page_p50'] * 1000:>9.2f}ms{r['page_p99'] * 1000:>6.2f}ms{r['delete_p50'] * 1000:>8.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="채팅 기록 저장 형식별 성능 비교")
+    parser.add_argument("--layouts", default="message,bucket")
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=60, help="대화당 메시지 수")
+    parser.add_argument("--words", type=int, default=20, help="메시지당 반복 단어 수 (메시지 크기 조절)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--reads", type=int, default=300)
+    parser.add_argument("--history-limit", type=int, default=20)
+    parser.add_argument("--page-limit", type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""동시 /chat 요청 N 개가 요청 1 개와 비슷한 시간에 끝나는지 확인하는 부하 테스트입니다. (bench.stub_server 와 함께 사용)
+
+실행 (backend 디렉토리에서, 백엔드와 stub 서버가 떠 있는 상태):
+    STUB_LATENCY=0.5 uvicorn bench.stub_server:app --port 9999
+    python -m bench.concurrent_chat --url http://127.0.0.1:8000 --concurrency 1,8,32
+동시성마다 서로 다른 사용자/대화로 /chat 을 동시에 보내 전체 소요 시간을 재고, 동시성 1 의 시간과 비교합니다.
+모델 호출이 이벤트 루프를 막으면 소요 시간이 동시성에 비례해 늘어나고, 막지 않으면 stub 지연 근처에 머뭅니다.
+요청이 진행되는 동안 /sessions 를 주기적으로 호출해 다른 요청의 지연도 함께 출력합니다.
+동시성은 CHAT_MAX_CONCURRENT_TURNS(기본 32) 이하로 지정해야 대기열 없이 비교됩니다.
+"""
+import time
+import uuid
+import asyncio
+import argparse
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+
+from bench.chat_load import percentile
+
+async def burst(client: httpx.AsyncClient, concurrency: int, run_id: str) -> Dict[str, object]:
+    statuses: Counter = Counter()
+    probes: List[float] = []
+    done = asyncio.Event()
+
+    async def chat(i: int):
+        user = f"concurrent-{run_id}-{concurrency}-{i}"
+        response = await client.post("/chat", json={"conversation_id": user, "message": f"동시 요청 {i}"}, headers={"X-User-Id": user})
+        statuses[response.status_code] += 1
+
+    async def probe():
+        # 채팅 요청이 처리되는 동안 가벼운 요청의 지연 (이벤트 루프가 막히면 모델 지연만큼 늘어남)
+        while not done.is_set():
+            started = time.perf_counter()
+            await client.get("/sessions", params={"limit": 1})
+            probes.append(time.perf_counter() - started)
+            await asyncio.sleep(0.05)
+
+    prober = asyncio.create_task(probe())
+    started = time.perf_counter()
+    await asyncio.gather(*(chat(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await prober
+    return {"elapsed": elapsed, "statuses": dict(statuses), "probe_p50": percentile(probes, 0.5), "probe_max": max(probes, default=0.0)}
+
+async def run(args):
+    run_id = uuid.uuid4().hex[:6]
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        await client.post("/chat", json={"conversation_id": f"concurrent-{run_id}-warmup", "message": "워밍업"})
+        rows = []
+        for concurrency in map(int, args.concurrency.split(",")):
+            if args.stub_url:
+                await client.post(f"{args.stub_url}/stats/reset")
+            result = await burst(client, concurrency, run_id)
+            result["stub_max_in_flight"] = (await client.get(f"{args.stub_url}/stats")).json()["max_in_flight"] if args.stub_url else None
+            rows.append((concurrency, result))
+
+    single = rows[0][1]["elapsed"]
+    print(f"{'동시성':>6}{'소요':>10}{'1개 대비':>9}{'stub 최대 동시':>14}{'/sessions p50':>15}{'max':>9}  상태 코드")
+    for concurrency, r in rows:
+        print(f"{concurrency:>6}{r['elapsed'] * 1000:>8.0f}ms{r['elapsed'] / single:>8.2f}x{str(r['stub_max_in_flight']):>14}"
+              f"{r['probe_p50'] * 1000:>13.1f}ms{r['probe_max'] * 1000:>7.1f}ms  {r['statuses']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="동시 /chat 요청 소요 시간 비교")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--stub-url", default="http://127.0.0.1:9999", help="stub 서버 주소 (빈 값이면 최대 동시 호출 수 생략)")
+    parser.add_argument("--concurrency", default="1,8,32", help="쉼표로 구분한 동시성 목록 (첫 값이 기준)")
+    parser.add_argument("--timeout", type=float, default=60)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
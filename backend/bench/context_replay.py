@@ -0,0 +1,126 @@
+"""대화 재생 코퍼스로 컨텍스트 구성 방식별 턴당 입력 토큰을 비교하는 리포트 스크립트입니다. (bench.stub_server 와 함께 사용)
+
+실행 (backend 디렉토리에서, OpenAI stub 과 Mongo 가 떠 있는 상태):
+    python -m bench.mongo_stub --port 27099 --latency 0.001 &
+    MONGO_URI=mongodb://127.0.0.1:27099 OPENAI_BASE_URL=http://127.0.0.1:9999/v1 python -m bench.context_replay --conversations 8
+transcript 파일(bench/transcripts.jsonl)의 턴을 이어 붙여 대화마다 --turns 턴짜리 긴 대화를 만들고,
+--paste-every 턴마다 긴 스택 트레이스를 붙여넣은 질문을 섞습니다. 프로필마다 환경 변수를 바꿔 앱을 새로 띄우고
+대화를 /chat 으로 순서대로 재생한 뒤, token_usages(TokenUsage) 에 기록된 input_tokens 로 턴당 입력 토큰을 계산합니다.
+  - window4: 변경 전 동작 (HISTORY_LIMIT=4, 토큰 예산 없음, 요약 없음)
+  - budget: 기본 토큰 예산(CONTEXT_TOKEN_BUDGET) 기반 컨텍스트 (요약 없음)
+  - budget+summary: 토큰 예산 + 창/예산 밖 기록 요약 (요약 호출 토큰은 별도 열로 표시)
+  - budget2000: 예산을 늘린 경우 (짧은 기록을 더 담는 만큼 턴당 토큰이 늘어남)
+입력 토큰 수는 stub 서버의 추정치(한글 약 2자당 1토큰)입니다. 응답 캐시는 모든 프로필에서 끕니다.
+"""
+import json
+import time
+import uuid
+import signal
+import asyncio
+import argparse
+from typing import Dict, List, Tuple
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from bench.chat_load import percentile
+from bench.mongo_pool import parse_profile, start_app, wait_ready
+from bench.replay_load import DEFAULT_TRANSCRIPTS, load_transcripts
+from db.mongo import MONGO_URI, DB_NAME, COLLECTION_NAME_TOKENS
+
+COMMON_ENV = {"RESPONSE_CACHE_ENABLED": "false", "CHAT_MAX_TURNS_PER_USER": "1000"} # 대화를 모두 한 클라이언트에서 동시에 재생
+DEFAULT_PROFILES = [
+    "window4:HISTORY_LIMIT=4,CONTEXT_TOKEN_BUDGET=1000000,CONTEXT_SUMMARY_ENABLED=false",
+    "budget:CONTEXT_SUMMARY_ENABLED=false",
+    "budget+summary:CONTEXT_SUMMARY_ENABLED=true",
+    "budget2000:CONTEXT_TOKEN_BUDGET=2000,CONTEXT_SUMMARY_ENABLED=false",
+]
+
+PASTE = "다음 에러가 났는데 원인이 뭐야?\n" + "\n".join(
+    f'  File "/app/services/worker_{i}.py", line {40 + i}, in handle_request\n    result = await process(payload, retries={i})'
+    for i in range(25)
+) + "\nTimeoutError: operation timed out after 30 seconds"
+
+def build_corpus(args) -> List[List[str]]:
+    turns = [turn for transcript in load_transcripts(args.transcripts) for turn in transcript]
+    corpus = []
+    for index in range(args.conversations):
+        conversation = []
+        for i in range(args.turns):
+            if args.paste_every and i % args.paste_every == args.paste_every - 1:
+                conversation.append(PASTE)
+            else:
+                conversation.append(turns[(index * 7 + i) % len(turns)])
+        corpus.append(conversation)
+    return corpus
+
+async def replay(args, corpus: List[List[str]], prefix: str) -> List[str]:
+    conversation_ids = [f"{prefix}-{i}" for i in range(len(corpus))]
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout) as client:
+        async def converse(conversation_id: str, turns: List[str]):
+            for turn in turns:
+                (await client.post("/chat", json={"conversation_id": conversation_id, "message": turn})).raise_for_status()
+        await asyncio.gather(*(converse(c, turns) for c, turns in zip(conversation_ids, corpus)))
+    return conversation_ids
+
+async def usage(conversation_ids: List[str]) -> Tuple[List[int], int]:
+    """(대화 턴별 input_tokens 목록, 요약 호출 input_tokens 합계). 대화 턴 문서에는 offered_tools 가 있고 요약 호출에는 없음"""
+    client = AsyncIOMotorClient(MONGO_URI)
+    try:
+        docs = await client[DB_NAME][COLLECTION_NAME_TOKENS].find(
+            {"session_id": {"$in": conversation_ids}}, {"input_tokens": 1, "offered_tools": 1}
+        ).to_list(length=None)
+    finally:
+        client.close()
+    turns = [doc["input_tokens"] for doc in docs if "offered_tools" in doc]
+    summaries = sum(doc["input_tokens"] for doc in docs if "offered_tools" not in doc)
+    return turns, summaries
+
+async def run(args):
+    corpus = build_corpus(args)
+    url = f"http://127.0.0.1:{args.port}"
+    rows = []
+    for name, env in map(parse_profile, args.profile or DEFAULT_PROFILES):
+        app = start_app(args, dict(COMMON_ENV, **env))
+        try:
+            await wait_ready(url)
+            started = time.perf_counter()
+            conversation_ids = await replay(args, corpus, f"bench-context-{name}-{uuid.uuid4().hex[:6]}")
+            elapsed = time.perf_counter() - started
+            await asyncio.sleep(args.settle) # 백그라운드 요약과 w=0 사용량 기록이 끝나기를 기다림
+        finally:
+            app.send_signal(signal.SIGTERM)
+            app.wait(timeout=60)
+        turns, summary_tokens = await usage(conversation_ids)
+        rows.append((name, turns, summary_tokens, elapsed))
+        print(f"{name}: 턴 {len(turns)}개 기록, {elapsed:.1f}s")
+
+    total_turns = sum(len(c) for c in corpus)
+    print(f"대화 {args.conversations}개 x {args.turns}턴 (붙여넣기 {args.paste_every}턴마다), 재생 턴 {total_turns}개, MONGO_URI={MONGO_URI}")
+    print(f"{'프로필':<16}{'기록 턴':>8}{'입력/턴':>9}{'p50':>7}{'p95':>7}{'최대':>7}{'요약 입력':>10}{'합계/턴':>9}{'기준 대비':>10}")
+    baseline = None
+    for name, turns, summary_tokens, _ in rows:
+        if not turns:
+            print(f"{name:<16}{0:>8}  (token_usages 기록 없음)")
+            continue
+        per_turn = sum(turns) / len(turns)
+        total_per_turn = (sum(turns) + summary_tokens) / len(turns)
+        baseline = baseline or total_per_turn
+        print(f"{name:<16}{len(turns):>8}{per_turn:>9.1f}{percentile(turns, 0.5):>7.0f}{percentile(turns, 0.95):>7.0f}{max(turns):>7}"
+              f"{summary_tokens:>10}{total_per_turn:>9.1f}{(total_per_turn / baseline - 1) * 100:>9.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="컨텍스트 구성 방식별 턴당 입력 토큰 리포트")
+    parser.add_argument("--profile", action="append", help="이름:ENV=값,ENV=값 (여러 번 지정 가능, 첫 프로필이 기준)")
+    parser.add_argument("--transcripts", default=DEFAULT_TRANSCRIPTS)
+    parser.add_argument("--conversations", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=40, help="대화당 턴 수")
+    parser.add_argument("--paste-every", type=int, default=10, help="이 턴마다 긴 스택 트레이스 질문 (0 이면 없음)")
+    parser.add_argument("--settle", type=float, default=2, help="재생 후 사용량 집계 전 대기 시간 (초)")
+    parser.add_argument("--app", default="app:app")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--timeout", type=float, default=60)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""최근 기록 캐시(db.history_cache) 유무에 따른 턴당 기록 조회 Mongo 명령 수와 조회 지연 비교 스크립트입니다. (bench.mongo_stub 과 함께 사용)
+
+실행 (backend 디렉토리에서):
+    python -m bench.mongo_stub --port 27099 --latency 0.002 &
+    MONGO_URI=mongodb://127.0.0.1:27099 python -m bench.history_cache --conversations 50 --turns 20
+활성 대화 --conversations 개가 번갈아 턴을 진행한다고 보고, 턴마다 chat_service 와 같은 순서로
+get_chat_history(HISTORY_LIMIT) -> 사용자 메시지 저장 -> 봇 응답 저장 을 수행합니다.
+  - nocache: 캐시 크기 0 (변경 전처럼 턴마다 Mongo 조회)
+  - cache: 캐시 크기 --cache-size (기본 HISTORY_CACHE_CONVERSATIONS)
+pymongo CommandListener 로 기록 컬렉션(chat_history / chat_buckets)에 보낸 조회 명령(find/aggregate/getMore)을 세어
+턴당 조회 수, 캐시 적중률, get_chat_history 지연을 출력합니다. --cache-size 를 대화 수보다 작게 주면 LRU 밀려남도 확인할 수 있습니다.
+bench-hcache- 로 시작하는 대화만 만들고 지우지만, 운영 DB 에는 실행하지 마세요.
+"""
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from typing import Dict, List
+
+from pymongo import monitoring
+
+from bench.chat_load import percentile
+from db import mongo
+from db.history_cache import history_cache, HISTORY_CACHE_CONVERSATIONS
+from services.openai_service import HISTORY_LIMIT
+
+READ_COMMANDS = {"find", "aggregate", "getMore"}
+HISTORY_COLLECTIONS = {mongo.COLLECTION_NAME_CHAT, mongo.COLLECTION_NAME_CHAT_BUCKETS}
+
+class HistoryReadCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.reads = 0
+
+    def started(self, event):
+        if event.command_name in READ_COMMANDS and event.command.get(event.command_name) in HISTORY_COLLECTIONS:
+            self.reads += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+async def run_mode(args, counter: HistoryReadCounter, mode: str, cache_size: int) -> Dict[str, float]:
+    history_cache.max_conversations = cache_size
+    run_id = uuid.uuid4().hex[:8]
+    conversations = [f"bench-hcache-{mode}-{run_id}-{i}" for i in range(args.conversations)]
+    # 이전 대화가 있는 상태에서 시작 (캐시는 비어 있음)
+    for conversation_id in conversations:
+        for i in range(args.initial_messages):
+            await mongo.save_chat_message(conversation_id, "user" if i % 2 == 0 else "assistant", f"이전 메시지 {i}")
+    for conversation_id in conversations:
+        history_cache.invalidate(conversation_id)
+    history_cache.hits = history_cache.misses = 0
+
+    reads: List[float] = []
+    counter.reads = 0
+    schedule = [c for _ in range(args.turns) for c in random.sample(conversations, len(conversations))]
+    for turn, conversation_id in enumerate(schedule):
+        started = time.perf_counter()
+        await mongo.get_chat_history(conversation_id, limit=HISTORY_LIMIT)
+        reads.append(time.perf_counter() - started)
+        await mongo.save_chat_message(conversation_id, "user", f"질문 {turn}")
+        await mongo.save_chat_message(conversation_id, "assistant", f"응답 {turn}")
+    turns = len(schedule)
+    result = {
+        "turns": turns,
+        "reads": counter.reads / turns,
+        "hit_rate": history_cache.hits / max(1, history_cache.hits + history_cache.misses),
+        "p50": percentile(reads, 0.5), "p95": percentile(reads, 0.95),
+    }
+    for conversation_id in conversations:
+        await mongo.delete_chat_history_by_id(conversation_id)
+    return result
+
+async def run(args):
+    counter = HistoryReadCounter()
+    monitoring.register(counter) # 이후 생성되는 클라이언트에 적용되므로 연결 전에 등록
+    await mongo.connect_to_mongo()
+    original_size = history_cache.max_conversations
+    try:
+        results = {
+            "nocache": await run_mode(args, counter, "nocache", 0),
+            "cache": await run_mode(args, counter, "cache", args.cache_size),
+        }
+    finally:
+        history_cache.max_conversations = original_size
+        await mongo.close_mongo_connection()
+    print(f"활성 대화 {args.conversations}개 x 턴 {args.turns}개, 캐시 크기 {args.cache_size}, HISTORY_LIMIT={HISTORY_LIMIT}, "
+          f"저장 형식 {mongo.CHAT_STORAGE_LAYOUT}, MONGO_URI={mongo.MONGO_URI}")
+    print(f"{'방식':<10}{'턴':>6}{'기록 조회/턴':>13}{'적중률':>9}{'조회 p50':>11}{'p95':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<10}{r['turns']:>6}{r['reads']:>13.2f}{r['hit_rate'] * 100:>8.1f}%{r['p50'] * 1000:>9.2f}ms{r['p95'] * 1000:>8.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="최근 기록 캐시 유무에 따른 턴당 기록 조회 비교")
+    parser.add_argument("--conversations", type=int, default=50, help="번갈아 턴을 진행하는 활성 대화 수")
+    parser.add_argument("--turns", type=int, default=20, help="대화당 턴 수")
+    parser.add_argument("--initial-messages", type=int, default=30, help="측정 전에 대화마다 저장해 둘 메시지 수")
+    parser.add_argument("--cache-size", type=int, default=HISTORY_CACHE_CONVERSATIONS)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""로깅 방식별 채팅 턴당 로그 비용 비교 스크립트입니다.
+
+실행 (backend 디렉토리에서):
+    python -m bench.logging_overhead --turns 5000
+한 턴(도구 1회 호출)에서 남기는 로그 호출을 흉내 내어, 호출한 스레드(이벤트 루프)가 로그에 쓰는 시간을 비교합니다.
+  - before: logging.basicConfig(FileHandler + StreamHandler), f-string 메시지, 도구 호출 객체/프롬프트 전체를 INFO 로 기록
+  - after: logging_config.setup_logging() (큐 핸들러 + 백그라운드 리스너), %-스타일 지연 포맷, 상세 내용은 DEBUG, 시작 로그 샘플링
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from typing import List
+
+import logging_config
+from logging_config import SAMPLED
+
+TOOL_CALLS = [{
+    "id": "call_0123456789abcdef",
+    "type": "function",
+    "function": {"name": "get_current_weather", "arguments": '{"location": "서울", "unit": "celsius"}'},
+}]
+TOOL_RESULT = '{"location": "서울", "temperature": 21.3, "feels_like": 20.8, "humidity": 55, "description": "맑음", "wind_speed": 2.1}'
+SECOND_CALL_PROMPT = "도구 실행 결과를 바탕으로 사용자 질문에 자연스럽게 답변하세요. " * 8
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+def turn_before(logger: logging.Logger, i: int):
+    conversation_id = f"bench-{i % 100}"
+    logger.info(f"채팅 라우트 호출됨: ConvID={conversation_id}")
+    logger.info(f"채팅 서비스 시작: ConvID={conversation_id}")
+    logger.info(f"OpenAI API 호출 시작 (모델: gpt-4o-mini, ConvID: {conversation_id})")
+    logger.info(f"도구 호출 감지 (라운드 1): {TOOL_CALLS}")
+    logger.info(f"함수 'get_current_weather' 호출 (인자: {TOOL_CALLS[0]['function']['arguments']})")
+    logger.info(f"함수 'get_current_weather' 결과: {TOOL_RESULT}")
+    logger.info(f"도구 1개 실행 완료 ({ {'get_current_weather': 0.123} })")
+    logger.info(f"두 번째 API 호출 전 시스템 메시지 추가: {SECOND_CALL_PROMPT}")
+    logger.info(f"API 응답 반환 (도구 라운드: 1). 누적 Tokens: Prompt={1200 + i % 7}, Completion={180 + i % 5}")
+    logger.debug(f"턴 저장 완료: ConvID={conversation_id}")
+
+def turn_after(logger: logging.Logger, i: int):
+    conversation_id = f"bench-{i % 100}"
+    logger.info("채팅 라우트 호출됨: ConvID=%s", conversation_id, extra=SAMPLED)
+    logger.info("채팅 서비스 시작: ConvID=%s", conversation_id, extra=SAMPLED)
+    logger.info("OpenAI API 호출 시작 (모델: %s, ConvID: %s)", "gpt-4o-mini", conversation_id, extra=SAMPLED)
+    logger.info("도구 호출 감지 (라운드 %d): %s", 1, [tool_call["function"]["name"] for tool_call in TOOL_CALLS])
+    logger.debug("도구 호출 상세: %s", TOOL_CALLS)
+    logger.info("함수 '%s' 호출 (인자: %s)", "get_current_weather", TOOL_CALLS[0]["function"]["arguments"])
+    logger.debug("함수 '%s' 결과: %s", "get_current_weather", TOOL_RESULT)
+    logger.info("도구 %d개 실행 완료 (%s)", 1, {"get_current_weather": 0.123})
+    logger.debug("두 번째 API 호출 전 시스템 메시지 추가")
+    logger.info("API 응답 반환 (도구 라운드: %d). 누적 Tokens: Prompt=%d, Completion=%d", 1, 1200 + i % 7, 180 + i % 5)
+    logger.debug("턴 저장 완료: ConvID=%s", conversation_id)
+
+def measure(turn, turns: int, interval: float) -> List[float]:
+    logger = logging.getLogger("bench.turn")
+    samples = []
+    for i in range(turns):
+        started = time.perf_counter()
+        turn(logger, i)
+        samples.append(time.perf_counter() - started)
+        if interval:
+            time.sleep(interval) # 턴 사이 간격 (실제 턴은 모델 응답을 기다리는 동안 로그를 남기지 않음)
+    return samples
+
+def report(name: str, samples: List[float], log_path: str):
+    size = sum(os.path.getsize(os.path.join(os.path.dirname(log_path), f))
+               for f in os.listdir(os.path.dirname(log_path)) if f.startswith(os.path.basename(log_path)))
+    print(f"{name:<7} 턴당 평균 {sum(samples) / len(samples) * 1e6:8.1f}us  "
+          f"p50 {percentile(samples, 0.5) * 1e6:8.1f}us  p99 {percentile(samples, 0.99) * 1e6:8.1f}us  "
+          f"최대 {max(samples) * 1e3:7.2f}ms  로그 {size / 1024:8.1f}KiB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--interval", type=float, default=0.001, help="턴 사이 간격 (초, 0 이면 쉬지 않고 연속 실행)")
+    parser.add_argument("--format", choices=["text", "json"], default="text", help="after 파이프라인의 출력 형식")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="log-bench-")
+    console = open(os.devnull, "w") # 콘솔 출력 비용은 양쪽 동일하게 /dev/null 로
+    root = logging.getLogger()
+
+    # before: 기존 app.py 설정
+    before_log = os.path.join(workdir, "before.log")
+    logging.basicConfig(
+        level=logging.INFO,
+        format=logging_config.TEXT_FORMAT,
+        handlers=[logging.FileHandler(before_log), logging.StreamHandler(console)],
+        force=True,
+    )
+    before = measure(turn_before, args.turns, args.interval)
+    for handler in root.handlers[:]:
+        handler.close()
+        root.removeHandler(handler)
+
+    # after: 큐 기반 파이프라인
+    after_log = os.path.join(workdir, "after.log")
+    logging_config.LOG_FILE = after_log
+    logging_config.LOG_FORMAT = args.format
+    stdout, sys.stdout = sys.stdout, console
+    logging_config.setup_logging()
+    sys.stdout = stdout
+    after = measure(turn_after, args.turns, args.interval)
+    flush_started = time.perf_counter()
+    logging_config.stop_logging()
+    flush_seconds = time.perf_counter() - flush_started
+
+    print(f"턴 {args.turns}회 (간격 {args.interval * 1e3:.1f}ms), 로그 디렉토리 {workdir}")
+    report("before", before, before_log)
+    report("after", after, after_log)
+    print(f"after 리스너 종료(남은 레코드 기록)까지 {flush_seconds * 1e3:.1f}ms, "
+          f"큐 포화로 버린 레코드 {logging_config.logging_pipeline.queue_handler.dropped}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Mongo 커넥션 풀 / write concern 설정별 /chat 처리량 비교 스크립트입니다. (bench.stub_server, bench.mongo_stub 과 함께 사용)
+
+실행 (backend 디렉토리에서, OpenAI stub 과 Mongo 가 떠 있는 상태):
+    python -m bench.mongo_stub --port 27099 --latency 0.02 &
+    MONGO_URI=mongodb://127.0.0.1:27099 python -m bench.mongo_pool --concurrency 64 --duration 20
+프로필마다 환경 변수를 바꿔 uvicorn 으로 앱을 새로 띄우고, 닫힌 루프로 /chat 을 호출한 뒤
+처리량/지연 시간과 /admin/runtime 의 커넥션 풀 통계(최대 사용 커넥션, 대기열, 체크아웃 대기 시간)를 출력합니다.
+프로필 형식: 이름:ENV=값,ENV=값 (--profile 을 여러 번 지정하면 기본 프로필 대신 사용)
+"""
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+import httpx
+
+from bench.worker_scaling import BACKEND_DIR, measure
+
+DEFAULT_PROFILES = [
+    # 설정 추가 이전과 같은 상태: Motor 스레드 풀이 CPU 코어 수 x 5 (1코어 기준 5개)로 동시 작업 수를 제한
+    "threads5:MONGO_MAX_POOL_SIZE=100,MOTOR_MAX_WORKERS=5",
+    "pool4:MONGO_MAX_POOL_SIZE=4",
+    "pool100:MONGO_MAX_POOL_SIZE=100",
+    "pool100+usage_w0:MONGO_MAX_POOL_SIZE=100,MONGO_USAGE_WRITE_CONCERN=0",
+]
+
+def parse_profile(text: str) -> Tuple[str, Dict[str, str]]:
+    name, _, assignments = text.partition(":")
+    env = {}
+    for assignment in filter(None, assignments.split(",")):
+        key, _, value = assignment.partition("=")
+        env[key.strip()] = value.strip()
+    return name, env
+
+def start_app(args, env: Dict[str, str]) -> subprocess.Popen:
+    command = [sys.executable, "-m", "uvicorn", args.app, "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=dict(os.environ, **env), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+async def wait_ready(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/metrics")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise SystemExit(f"앱이 {timeout:.0f}s 안에 시작되지 않았습니다.")
+
+async def run(args):
+    url = f"http://127.0.0.1:{args.port}"
+    rows: List[Tuple[str, dict, dict]] = []
+    for name, env in map(parse_profile, args.profile or DEFAULT_PROFILES):
+        app = start_app(args, env)
+        try:
+            await wait_ready(url)
+            result = await measure(args)
+            async with httpx.AsyncClient(base_url=url) as client:
+                pool = (await client.get("/admin/runtime")).json().get("mongo_pool", {})
+        finally:
+            app.send_signal(signal.SIGTERM)
+            app.wait(timeout=60)
+        rows.append((name, result, pool))
+        print(f"{name}: {result['throughput']:.1f} req/s, 상태 {result['statuses']}, 풀 {pool}")
+
+    print(f"동시성 {args.concurrency}, 측정 {args.duration:g}s (워밍업 {args.warmup:g}s), MONGO_URI={os.getenv('MONGO_URI', '(기본값)')}")
+    print(f"{'프로필':<20}{'req/s':>8}{'p50':>9}{'p99':>9}{'풀 최대 사용':>10}{'최대 대기열':>10}{'체크아웃 p99':>13}")
+    for name, result, pool in rows:
+        print(f"{name:<20}{result['throughput']:>8.1f}{result['p50'] * 1000:>7.0f}ms{result['p99'] * 1000:>7.0f}ms"
+              f"{pool.get('max_checked_out', 0):>10}{pool.get('max_wait_queue', 0):>10}{pool.get('checkout_wait_p99', 0) * 1000:>11.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Mongo 커넥션 풀 설정별 /chat 처리량 비교")
+    parser.add_argument("--profile", action="append", help="이름:ENV=값,ENV=값 (여러 번 지정 가능)")
+    parser.add_argument("--app", default="app:app")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20, help="측정 시간 (초)")
+    parser.add_argument("--warmup", type=float, default=3, help="측정 전 워밍업 시간 (초)")
+    parser.add_argument("--turns-per-conversation", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
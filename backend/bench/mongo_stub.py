@@ -0,0 +1,260 @@
+"""MongoDB 와이어 프로토콜을 흉내 내는 부하 테스트용 stub 서버입니다. (mongomock 으로 명령을 처리)
+
+실행 (backend 디렉토리에서):
+    python -m bench.mongo_stub --port 27099 --latency 0.02
+    MONGO_URI=mongodb://127.0.0.1:27099 uvicorn app:app
+실제 mongod 없이 pymongo/motor 의 커넥션 풀, 타임아웃, write concern(w=0 이면 응답 없이 전송) 동작을 재현하기 위한 용도입니다.
+명령마다 --latency(초, --jitter 비율만큼 변동) 만큼 지연한 뒤 응답하며, 연결마다 요청을 하나씩 처리하므로
+동시에 처리되는 명령 수는 클라이언트가 연 커넥션 수로 제한됩니다. (실제 서버와 같음)
+지원 명령: hello/isMaster, ping, insert, update, delete, find, getMore, aggregate($merge/$out 제외), count, createIndexes, listIndexes,
+dropIndexes, collMod(TTL 만료 시간), findAndModify, collStats(크기 추정)
+pip install mongomock 이 필요합니다.
+"""
+import time
+import random
+import struct
+import asyncio
+import argparse
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import bson
+import mongomock
+from bson.codec_options import CodecOptions
+
+logger = logging.getLogger(__name__)
+
+OP_REPLY = 1
+OP_QUERY = 2004
+OP_MSG = 2013
+MORE_TO_COME = 1 << 1
+CODEC = CodecOptions(tz_aware=False)
+
+class MongoStub:
+    def __init__(self, latency: float, jitter: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.client = mongomock.MongoClient()
+        self.stats = {"connections": 0, "max_connections": 0, "open_connections": 0, "commands": 0, "unacknowledged": 0}
+        self._request_id = 0
+
+    # --- 명령 처리 ---
+    def _collection(self, db: str, name: str):
+        return self.client[db][name]
+
+    def _hello(self) -> Dict[str, Any]:
+        return {
+            "ismaster": True, "isWritablePrimary": True, "helloOk": True,
+            "maxBsonObjectSize": 16 * 1024 * 1024, "maxMessageSizeBytes": 48000000, "maxWriteBatchSize": 100000,
+            "localTime": datetime.utcnow(), "minWireVersion": 0, "maxWireVersion": 17,
+            "connectionId": self.stats["connections"], "readOnly": False, "ok": 1.0,
+        }
+
+    def _cursor(self, db: str, name: str, docs: List[dict]) -> Dict[str, Any]:
+        return {"cursor": {"id": bson.int64.Int64(0), "ns": f"{db}.{name}", "firstBatch": docs}, "ok": 1.0}
+
+    def execute(self, command: Dict[str, Any]) -> Dict[str, Any]:
+        self.stats["commands"] += 1
+        name = next(iter(command))
+        db = command.get("$db", "admin")
+        target = command[name]
+        lowered = name.lower()
+        if lowered in ("hello", "ismaster"):
+            return self._hello()
+        if lowered in ("ping", "endsessions", "killcursors", "buildinfo", "getlasterror"):
+            return {"ok": 1.0}
+        coll = self._collection(db, target) if isinstance(target, str) else None
+        if name == "insert":
+            docs = command.get("documents", [])
+            if docs:
+                coll.insert_many(docs)
+            return {"n": len(docs), "ok": 1.0}
+        if name == "update":
+            n = modified = 0
+            upserted = []
+            for index, spec in enumerate(command.get("updates", [])):
+                update, upsert = spec["u"], spec.get("upsert", False)
+                try:
+                    if isinstance(update, dict) and not any(key.startswith("$") for key in update):
+                        result = coll.replace_one(spec["q"], update, upsert=upsert)
+                    elif spec.get("multi"):
+                        result = coll.update_many(spec["q"], update, upsert=upsert)
+                    else:
+                        result = coll.update_one(spec["q"], update, upsert=upsert)
+                except mongomock.DuplicateKeyError as e: # 실제 서버처럼 writeErrors 로 보고 (pymongo 가 DuplicateKeyError 로 변환)
+                    return {"n": n, "nModified": modified, "writeErrors": [{"index": index, "code": 11000, "errmsg": str(e)}], "ok": 1.0}
+                n += result.matched_count
+                modified += result.modified_count
+                if result.upserted_id is not None:
+                    n += 1
+                    upserted.append({"index": index, "_id": result.upserted_id})
+            response = {"n": n, "nModified": modified, "ok": 1.0}
+            if upserted:
+                response["upserted"] = upserted
+            return response
+        if name == "delete":
+            n = 0
+            for spec in command.get("deletes", []):
+                result = coll.delete_one(spec["q"]) if spec.get("limit") == 1 else coll.delete_many(spec["q"])
+                n += result.deleted_count
+            return {"n": n, "ok": 1.0}
+        if name == "find":
+            cursor = coll.find(command.get("filter", {}), command.get("projection"))
+            if command.get("sort"):
+                cursor = cursor.sort(list(command["sort"].items()))
+            if command.get("skip"):
+                cursor = cursor.skip(command["skip"])
+            if command.get("limit"):
+                cursor = cursor.limit(abs(command["limit"]))
+            return self._cursor(db, target, list(cursor))
+        if name == "getMore":
+            return {"cursor": {"id": bson.int64.Int64(0), "ns": f"{db}.{command.get('collection')}", "nextBatch": []}, "ok": 1.0}
+        if name == "aggregate":
+            return self._cursor(db, target, list(coll.aggregate(command.get("pipeline", []))))
+        if name == "count":
+            return {"n": coll.count_documents(command.get("query") or {}), "ok": 1.0}
+        if name == "createIndexes":
+            before = len(coll.index_information())
+            for index in command.get("indexes", []):
+                options = {key: index[key] for key in ("expireAfterSeconds", "sparse", "unique") if key in index}
+                coll.create_index(list(index["key"].items()), name=index.get("name"), **options)
+            return {"numIndexesBefore": before, "numIndexesAfter": len(coll.index_information()), "ok": 1.0}
+        if name == "listIndexes":
+            indexes = [
+                {"v": 2, "key": dict(info["key"]), "name": index_name, **{k: v for k, v in info.items() if k not in ("key", "v")}}
+                for index_name, info in coll.index_information().items()
+            ]
+            return self._cursor(db, target, indexes)
+        if name == "dropIndexes":
+            coll.drop_index(command["index"])
+            return {"ok": 1.0}
+        if name == "collMod":
+            # TTL 인덱스 만료 시간 변경만 지원 (같은 이름으로 다시 생성)
+            spec = command.get("index", {})
+            info = coll.index_information()[spec["name"]]
+            coll.drop_index(spec["name"])
+            coll.create_index(info["key"], name=spec["name"], expireAfterSeconds=spec["expireAfterSeconds"])
+            return {"ok": 1.0}
+        if name == "findAndModify":
+            if command.get("remove"):
+                value = coll.find_one_and_delete(command.get("query", {}), projection=command.get("fields"))
+            else:
+                value = coll.find_one_and_update(
+                    command.get("query", {}), command["update"], projection=command.get("fields"),
+                    upsert=command.get("upsert", False), return_document=command.get("new", False),
+                )
+            return {"value": value, "ok": 1.0}
+        if name == "collStats":
+            # 실제 저장 크기(압축/인덱스 B-tree)는 알 수 없으므로 문서 BSON 크기와 인덱스 항목 수만 보고
+            docs = list(coll.find({}))
+            return {
+                "ns": f"{db}.{target}", "count": len(docs), "size": sum(len(bson.encode(doc)) for doc in docs),
+                "nindexes": len(coll.index_information()), "ok": 1.0,
+            }
+        return {"ok": 0.0, "errmsg": f"no such command: '{name}'", "code": 59, "codeName": "CommandNotFound"}
+
+    # --- 와이어 프로토콜 ---
+    def _next_id(self) -> int:
+        self._request_id += 1
+        return self._request_id
+
+    def _reply_msg(self, response_to: int, document: Dict[str, Any]) -> bytes:
+        body = struct.pack("<I", 0) + b"\x00" + bson.encode(document)
+        return struct.pack("<iiii", 16 + len(body), self._next_id(), response_to, OP_MSG) + body
+
+    def _reply_legacy(self, response_to: int, document: Dict[str, Any]) -> bytes:
+        body = struct.pack("<iqii", 0, 0, 0, 1) + bson.encode(document)
+        return struct.pack("<iiii", 16 + len(body), self._next_id(), response_to, OP_REPLY) + body
+
+    @staticmethod
+    def _parse_msg(payload: bytes) -> Tuple[int, Dict[str, Any]]:
+        flags = struct.unpack_from("<I", payload)[0]
+        position, end = 4, len(payload) - (4 if flags & 1 else 0) # checksumPresent
+        command: Dict[str, Any] = {}
+        while position < end:
+            kind = payload[position]
+            position += 1
+            if kind == 0:
+                size = struct.unpack_from("<i", payload, position)[0]
+                command.update(bson.decode(payload[position:position + size], CODEC))
+                position += size
+            else: # kind 1: 문서 시퀀스 (insert 의 documents, update 의 updates 등)
+                size = struct.unpack_from("<i", payload, position)[0]
+                section_end = position + size
+                name_end = payload.index(b"\x00", position + 4)
+                identifier = payload[position + 4:name_end].decode()
+                command[identifier] = list(bson.decode_all(payload[name_end + 1:section_end], CODEC))
+                position = section_end
+        return flags, command
+
+    @staticmethod
+    def _parse_query(payload: bytes) -> Dict[str, Any]:
+        name_end = payload.index(b"\x00", 4)
+        position = name_end + 1 + 8 # numberToSkip, numberToReturn
+        size = struct.unpack_from("<i", payload, position)[0]
+        return bson.decode(payload[position:position + size], CODEC)
+
+    async def _delay(self):
+        if self.latency:
+            spread = self.latency * self.jitter
+            await asyncio.sleep(max(0.0, random.uniform(self.latency - spread, self.latency + spread)))
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats["connections"] += 1
+        self.stats["open_connections"] += 1
+        self.stats["max_connections"] = max(self.stats["max_connections"], self.stats["open_connections"])
+        try:
+            while True:
+                header = await reader.readexactly(16)
+                length, request_id, _, op_code = struct.unpack("<iiii", header)
+                payload = await reader.readexactly(length - 16)
+                if op_code == OP_QUERY:
+                    response = self.execute(self._parse_query(payload))
+                    writer.write(self._reply_legacy(request_id, response))
+                elif op_code == OP_MSG:
+                    flags, command = self._parse_msg(payload)
+                    try:
+                        response = self.execute(command)
+                    except Exception as e:
+                        logger.warning("명령 처리 실패: %s", e)
+                        response = {"ok": 0.0, "errmsg": str(e), "code": 1}
+                    if next(iter(command), "").lower() not in ("hello", "ismaster"): # 서버 모니터링 명령은 지연 없이 응답
+                        await self._delay()
+                    if flags & MORE_TO_COME: # w=0: 클라이언트가 응답을 기다리지 않음
+                        self.stats["unacknowledged"] += 1
+                        continue
+                    writer.write(self._reply_msg(request_id, response))
+                else:
+                    logger.warning("지원하지 않는 opCode: %d", op_code)
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            self.stats["open_connections"] -= 1
+            writer.close()
+
+async def serve(args):
+    stub = MongoStub(args.latency, args.jitter)
+    server = await asyncio.start_server(stub.handle, args.host, args.port)
+    print(f"Mongo stub listening on {args.host}:{args.port} (latency {args.latency * 1000:.0f}ms ±{args.jitter * 100:.0f}%)")
+    started = time.monotonic()
+    async with server:
+        while True:
+            await asyncio.sleep(args.report_interval)
+            if args.report_interval:
+                print(f"[{time.monotonic() - started:.0f}s] {stub.stats}", flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="MongoDB 와이어 프로토콜 stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=27099)
+    parser.add_argument("--latency", type=float, default=0.0, help="명령당 지연 (초)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="지연 변동 비율 (0~1)")
+    parser.add_argument("--report-interval", type=float, default=10, help="통계 출력 간격 (초)")
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(serve(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""날짜/날씨 질문의 모델 호출 수, 입력 토큰, 지연 시간을 측정합니다. (prompt_facts_service 효과 비교, bench.stub_server 와 함께 사용)
+
+실행 (backend 디렉토리에서, 백엔드와 stub 서버가 떠 있는 상태):
+    python -m bench.prompt_facts --url http://127.0.0.1:8000 --rounds 20
+백엔드를 PROMPT_FACTS_ENABLED=false / true (날씨까지 보려면 PROMPT_FACTS_WEATHER_LOCATION 도 설정)로
+각각 띄워 실행하고 결과를 비교합니다. 질문은 종류별로 순서대로 보내며(동시 요청 없음), 요청마다 새 대화를 씁니다.
+응답 캐시가 같은 질문에 답하지 않도록 질문 끝에 번호를 붙입니다.
+"""
+import time
+import uuid
+import asyncio
+import argparse
+from typing import Dict, List
+
+import httpx
+
+from bench.chat_load import percentile
+
+QUESTIONS: Dict[str, List[str]] = {
+    "date": ["오늘 날짜 알려줘", "오늘 무슨 요일이야?", "이번 달 말일까지 며칠 남았어?", "지금 몇 시야?"],
+    "weather": ["오늘 날씨 어때?", "지금 날씨 우산 챙겨야 해?", "날씨 보고 옷차림 추천해줘"],
+    "other": ["파이썬 리스트 컴프리헨션 예시 보여줘", "점심 메뉴 추천해줘", "git stash 사용법 알려줘"],
+}
+
+async def _stub_stats(client: httpx.AsyncClient, stub_url: str) -> Dict[str, int]:
+    return (await client.get(f"{stub_url}/stats")).json()
+
+async def run(args):
+    results = {}
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        for kind, questions in QUESTIONS.items():
+            latencies: List[float] = []
+            before = await _stub_stats(client, args.stub_url)
+            for i in range(args.rounds):
+                for question in questions:
+                    started = time.perf_counter()
+                    response = await client.post(f"{args.url}/chat", json={
+                        "conversation_id": f"facts-{uuid.uuid4().hex[:8]}", "message": f"{question} ({i})",
+                    })
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - started)
+            after = await _stub_stats(client, args.stub_url)
+            turns = len(latencies)
+            results[kind] = {
+                "turns": turns,
+                "calls": (after["calls"] - before["calls"]) / turns,
+                "prompt_tokens": (after["prompt_tokens"] - before["prompt_tokens"]) / turns,
+                "weather_calls": after["weather_calls"] - before["weather_calls"],
+                "p50": percentile(latencies, 0.5),
+                "p95": percentile(latencies, 0.95),
+            }
+    print(f"{'종류':<8}{'턴':>5}{'모델 호출/턴':>14}{'입력 토큰/턴':>14}{'날씨 API':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for kind, result in results.items():
+        print(f"{kind:<8}{result['turns']:>5}{result['calls']:>14.2f}{result['prompt_tokens']:>14.1f}"
+              f"{result['weather_calls']:>10}{result['p50'] * 1000:>10.1f}{result['p95'] * 1000:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="프롬프트 정보 주입 효과 측정")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--stub-url", default="http://127.0.0.1:9999")
+    parser.add_argument("--rounds", type=int, default=20, help="질문 종류별 반복 횟수")
+    parser.add_argument("--timeout", type=float, default=60)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
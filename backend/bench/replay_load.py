@@ -0,0 +1,220 @@
+"""대화 기록(transcript)을 /chat, /history, /sessions 에 목표 RPS 로 재생하는 부하 테스트 스크립트입니다. (bench.stub_server 와 함께 사용)
+
+실행 (backend 디렉토리에서, 백엔드와 stub 서버가 떠 있는 상태):
+    python -m bench.replay_load --rps 20 --duration 60 --mix chat=0.7,history=0.2,sessions=0.1
+transcript 파일은 한 줄에 대화 하나이며 {"turns": ["사용자 메시지", ...]} 또는 GET /history 응답 형식
+({"messages": [{"role": "user", "content": ...}, ...]}) 을 사용할 수 있습니다. 기본값은 bench/transcripts.jsonl 입니다.
+요청은 고정 간격(open-loop)으로 보내므로 서버가 느려져도 전송 속도가 줄지 않습니다. 같은 대화의 턴은 순서대로 보냅니다.
+엔드포인트별 상태 코드/지연 시간 백분위수, 처리량과 /metrics 차이로 계산한 턴당 Mongo 연산 수/모델 호출 수를 출력합니다.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from collections import Counter, defaultdict, deque
+from typing import Deque, Dict, List, Tuple
+
+import httpx
+
+from bench.chat_load import percentile
+
+DEFAULT_TRANSCRIPTS = os.path.join(os.path.dirname(__file__), "transcripts.jsonl")
+METRIC_COUNT_LINE = re.compile(r'^(chatbot_[a-z_]+)_count\{([^}]*)\} ([0-9.e+-]+)$')
+# 조회 엔드포인트에서 발생하는 Mongo 연산 (턴당 수치에서 제외하고 해당 엔드포인트 요청당으로 표시)
+ENDPOINT_OPERATIONS = {"get_chat_history_page": "history", "get_all_sessions": "sessions"}
+
+def load_transcripts(path: str) -> List[List[str]]:
+    transcripts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            turns = entry.get("turns") or [m["content"] for m in entry.get("messages", []) if m.get("role") == "user"]
+            if turns:
+                transcripts.append(turns)
+    if not transcripts:
+        raise SystemExit(f"재생할 대화가 없습니다: {path}")
+    return transcripts
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("chat", "history", "sessions"):
+            raise SystemExit(f"알 수 없는 요청 종류: {name}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+async def scrape_counts(client: httpx.AsyncClient) -> Dict[Tuple[str, str], float]:
+    """/metrics 의 히스토그램 _count 값을 (메트릭 이름, 라벨) 별로 읽습니다."""
+    response = await client.get("/metrics")
+    response.raise_for_status()
+    counts = {}
+    for line in response.text.splitlines():
+        match = METRIC_COUNT_LINE.match(line)
+        if match:
+            counts[match.group(1), match.group(2)] = float(match.group(3))
+    return counts
+
+def _label(labels: str, name: str) -> str:
+    match = re.search(rf'{name}="([^"]*)"', labels)
+    return match.group(1) if match else ""
+
+class Replayer:
+    def __init__(self, args, transcripts: List[List[str]]):
+        self.args = args
+        self.transcripts = transcripts
+        self.run_id = uuid.uuid4().hex[:8]
+        self.idle: Deque[Tuple[str, int, int]] = deque() # 다음 턴을 보낼 수 있는 대화 (conversation_id, transcript 번호, 다음 턴)
+        self.started: List[str] = [] # 한 턴 이상 성공한 대화 (history 조회 대상)
+        self.next_transcript = 0
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.turns_ok = 0
+
+    def _next_conversation(self) -> Tuple[str, int, int]:
+        if self.idle:
+            return self.idle.popleft()
+        index = self.next_transcript
+        self.next_transcript += 1
+        return f"replay-{self.run_id}-{index}", index % len(self.transcripts), 0
+
+    async def _timed(self, name: str, send) -> object:
+        started = time.perf_counter()
+        try:
+            status = await send()
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        self.latencies[name].append(time.perf_counter() - started)
+        self.statuses[name][status] += 1
+        return status
+
+    async def chat(self, client: httpx.AsyncClient):
+        conversation_id, transcript, turn = self._next_conversation()
+        body = {"conversation_id": conversation_id, "message": self.transcripts[transcript][turn]}
+        headers = {"X-User-Id": f"replay-user-{transcript % self.args.users}"}
+
+        async def send():
+            if not self.args.stream:
+                return (await client.post("/chat", json=body, headers=headers)).status_code
+            started = time.perf_counter()
+            first_byte = None
+            async with client.stream("POST", "/chat/stream", json=body, headers=headers) as response:
+                payload = b""
+                async for chunk in response.aiter_bytes():
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                        self.latencies["chat_ttfb"].append(first_byte)
+                    payload += chunk
+            return "200-error" if response.status_code == 200 and b'"type": "error"' in payload else response.status_code
+
+        status = await self._timed("chat", send)
+        if status == 200:
+            self.turns_ok += 1
+            if turn == 0:
+                self.started.append(conversation_id)
+        if turn + 1 < len(self.transcripts[transcript]):
+            self.idle.append((conversation_id, transcript, turn + 1))
+
+    async def history(self, client: httpx.AsyncClient):
+        conversation_id = random.choice(self.started)
+        await self._timed("history", lambda: self._status(client.get(f"/history/{conversation_id}", params={"limit": 20})))
+
+    async def sessions(self, client: httpx.AsyncClient):
+        await self._timed("sessions", lambda: self._status(client.get("/sessions", params={"limit": 50})))
+
+    @staticmethod
+    async def _status(request) -> int:
+        return (await request).status_code
+
+async def run(args):
+    transcripts = load_transcripts(args.transcripts)
+    mix = parse_mix(args.mix)
+    kinds, weights = list(mix), list(mix.values())
+    replayer = Replayer(args, transcripts)
+    total = int(args.rps * args.duration)
+    interval = 1 / args.rps
+    in_flight = set()
+    skipped = 0
+    send_lag: List[float] = []
+
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        if args.stub_url:
+            await client.post(f"{args.stub_url}/stats/reset")
+        before = await scrape_counts(client)
+        started = time.perf_counter()
+        for i in range(total):
+            delay = started + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                send_lag.append(-delay)
+            if len(in_flight) >= args.max_in_flight:
+                skipped += 1 # 클라이언트 측 한도 초과: 보내지 않고 건너뜀 (서버가 따라오지 못하는 상태)
+                continue
+            kind = random.choices(kinds, weights)[0]
+            if kind == "history" and not replayer.started:
+                kind = "chat"
+            task = asyncio.create_task(getattr(replayer, kind)(client))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        sent_elapsed = time.perf_counter() - started
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        elapsed = time.perf_counter() - started
+        after = await scrape_counts(client)
+
+        completed = sum(len(values) for name, values in replayer.latencies.items() if name != "chat_ttfb")
+        print(f"목표 {args.rps:g} req/s x {args.duration:g}s = {total}건 (건너뜀 {skipped}), "
+              f"전송 {(total - skipped) / sent_elapsed:.1f} req/s, 완료 처리량 {completed / elapsed:.1f} req/s, 소요 {elapsed:.1f}s")
+        if send_lag:
+            print(f"전송 지연 (스케줄보다 늦게 보낸 요청 {len(send_lag)}건): p99={percentile(send_lag, 0.99) * 1000:.1f}ms")
+        print(f"{'요청':<10}{'건수':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  상태 코드")
+        for name in ("chat", "chat_ttfb", "history", "sessions"):
+            values = replayer.latencies.get(name)
+            if not values:
+                continue
+            row = "".join(f"{percentile(values, q) * 1000:>7.0f}ms" for q in (0.5, 0.95, 0.99)) + f"{max(values) * 1000:>7.0f}ms"
+            print(f"{name:<10}{len(values):>6}{row}  {dict(replayer.statuses.get(name, {}))}")
+
+        # /metrics 차이 -> 성공한 턴당 Mongo 연산 수 (db.mongo 함수 호출 수, 캐시 히트 포함) / 모델 호출 수
+        delta = {key: after.get(key, 0) - before.get(key, 0) for key in after}
+        turns = max(1, replayer.turns_ok)
+        mongo = {_label(labels, "operation"): count for (name, labels), count in delta.items()
+                 if name == "chatbot_mongo_operation_duration_seconds" and count}
+        turn_ops = {op: count for op, count in mongo.items() if op not in ENDPOINT_OPERATIONS}
+        print(f"성공한 턴 {replayer.turns_ok}건, 턴당 Mongo 연산 {sum(turn_ops.values()) / turns:.2f}회: "
+              + ", ".join(f"{op}={count / turns:.2f}" for op, count in sorted(turn_ops.items())))
+        for op, endpoint in ENDPOINT_OPERATIONS.items():
+            requests = len(replayer.latencies.get(endpoint, []))
+            if requests and op in mongo:
+                print(f"{endpoint} 요청당 Mongo 연산: {op}={mongo[op] / requests:.2f}")
+        openai_calls = {f"{_label(labels, 'kind')}/{_label(labels, 'outcome')}": count for (name, labels), count in delta.items()
+                        if name == "chatbot_openai_request_duration_seconds" and count}
+        print(f"턴당 모델 호출: {sum(openai_calls.values()) / turns:.2f}회 "
+              + ", ".join(f"{key}={count / turns:.2f}" for key, count in sorted(openai_calls.items())))
+        if args.stub_url:
+            print(f"stub 서버: {(await client.get(f'{args.stub_url}/stats')).json()}")
+
+def main():
+    parser = argparse.ArgumentParser(description="transcript 재생 부하 테스트")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--stub-url", default="http://127.0.0.1:9999", help="stub 서버 주소 (빈 값이면 통계 생략)")
+    parser.add_argument("--transcripts", default=DEFAULT_TRANSCRIPTS)
+    parser.add_argument("--rps", type=float, default=10, help="목표 요청 속도 (req/s)")
+    parser.add_argument("--duration", type=float, default=30, help="요청을 보내는 시간 (초)")
+    parser.add_argument("--mix", default="chat=0.7,history=0.2,sessions=0.1", help="요청 종류별 비율")
+    parser.add_argument("--stream", action="store_true", help="/chat 대신 /chat/stream 사용 (첫 바이트까지 시간도 측정)")
+    parser.add_argument("--users", type=int, default=20, help="X-User-Id 로 나눌 사용자 수 (사용자별 한도는 앱을 CHAT_TRUSTED_PROXIES=127.0.0.1 CHAT_USER_ID_HEADER=X-User-Id 로 띄운 경우에만 적용)")
+    parser.add_argument("--max-in-flight", type=int, default=500, help="클라이언트 동시 요청 한도 (초과 시 건너뜀)")
+    parser.add_argument("--timeout", type=float, default=60)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""검색 색인 크기에 따른 /search 조회 지연 측정 스크립트입니다.
+
+실행 (backend 디렉토리에서):
+    python -m bench.search_index --sizes 100000,300000,1000000 --queries 200
+임의로 만든 한국어/영문 대화 메시지를 SearchIndex 에 단계적으로 채우면서, 크기마다 search_conversations
+(일치 구간 읽기 + 대화별 묶기/순위/하이라이트, 세션 제목 조회 제외)를 검색어 유형별로 반복 호출해 p50/p99 를 출력합니다.
+색인 파일은 --path 에 만들며 실행할 때마다 새로 만듭니다.
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from bench.chat_load import percentile
+from db.search_index import SearchIndex, search_index
+from services import search_service
+
+WORDS = [
+    "오늘", "내일", "서울", "부산", "날씨가", "날씨는", "기온", "비가", "맑음", "흐림", "우산을", "챙겨", "점심", "저녁",
+    "메뉴", "추천해줘", "회의", "일정을", "알려줘", "프로젝트", "마감", "보고서", "작성", "요약해줘", "번역", "영어로",
+    "파이썬", "코드", "오류가", "났어", "데이터베이스", "인덱스", "성능", "개선", "여행", "제주도", "항공권", "호텔",
+    "weather", "python", "error", "meeting", "summary", "report", "index", "query", "travel", "hotel",
+]
+RARE_WORDS = ["양자컴퓨터", "오로라관측", "kubernetes"] # 약 1/5000 메시지에만 등장
+
+QUERIES = {
+    "common": "날씨", # 매우 자주 등장 (구간을 금방 채움)
+    "two_words": "서울 날씨", # 두 단어 모두 포함
+    "rare": "양자컴퓨터", # 드물게 등장
+    "none": "존재하지않는말", # 일치 없음
+    "sparse_and": "제주도 kubernetes", # 각각은 흔하거나 드물지만 둘 다 포함하는 메시지는 드묾
+}
+
+def make_messages(start: int, count: int, conversations: int) -> List[Dict[str, object]]:
+    base = datetime(2025, 1, 1)
+    messages = []
+    for i in range(start, start + count):
+        text = " ".join(random.choices(WORDS, k=random.randint(6, 20)))
+        if random.random() < 1 / 5000:
+            text += " " + random.choice(RARE_WORDS)
+        messages.append({
+            "id": f"{i:024x}",
+            "conversation_id": f"bench-search-{random.randrange(conversations)}",
+            "role": "user" if i % 2 == 0 else "assistant",
+            "timestamp": base + timedelta(seconds=i),
+            "content": text,
+        })
+    return messages
+
+async def fill(index: SearchIndex, start: int, end: int, conversations: int, batch: int = 5000):
+    for offset in range(start, end, batch):
+        await index.add(make_messages(offset, min(batch, end - offset), conversations))
+
+async def measure(queries: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, query in QUERIES.items():
+        latencies = []
+        for _ in range(queries):
+            started = time.perf_counter()
+            await search_service.search_conversations(query, limit=20)
+            latencies.append(time.perf_counter() - started)
+        results[name] = {"p50": percentile(latencies, 0.5), "p99": percentile(latencies, 0.99)}
+    return results
+
+async def run(args):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.path + suffix):
+            os.remove(args.path + suffix)
+    random.seed(args.seed)
+    search_index.index = SearchIndex(args.path)
+    rows = []
+    filled = 0
+    try:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            started = time.perf_counter()
+            await fill(search_index.index, filled, size, args.conversations)
+            rate = (size - filled) / (time.perf_counter() - started)
+            filled = size
+            result = await measure(args.queries)
+            rows.append((size, rate, os.path.getsize(args.path), result))
+            print(f"{size:,} 메시지 (색인 {rate:,.0f} msg/s): " + ", ".join(f"{n} p50 {r['p50'] * 1000:.2f}ms" for n, r in result.items()), flush=True)
+    finally:
+        search_index.index.close()
+        search_index.index = None
+
+    print(f"검색 구간 {search_service.SEARCH_WINDOW}, 페이지당 대화 20, 검색어별 {args.queries}회, 대화 {args.conversations}개")
+    print(f"{'메시지 수':>12}{'파일 크기':>10}" + "".join(f"{name + ' p50/p99':>24}" for name in QUERIES))
+    for size, rate, file_size, result in rows:
+        print(f"{size:>12,}{file_size / 1024 / 1024:>8.0f}MB" + "".join(
+            f"{result[name]['p50'] * 1000:>13.2f}/{result[name]['p99'] * 1000:>6.2f}ms" for name in QUERIES))
+
+def main():
+    parser = argparse.ArgumentParser(description="검색 색인 크기별 조회 지연 측정")
+    parser.add_argument("--path", default="/tmp/bench_search_index.db")
+    parser.add_argument("--sizes", default="100000,300000,1000000", help="측정할 누적 메시지 수 (쉼표 구분)")
+    parser.add_argument("--conversations", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=100, help="검색어별 반복 횟수")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""세션 목록 조회 지연 비교 스크립트입니다. (chat_history 전체 집계 vs chat_sessions keyset 페이지)
+
+실행 (backend 디렉토리에서, 테스트용 Mongo 를 가리키도록 설정한 상태):
+    MONGO_URI=mongodb://127.0.0.1:27017 python -m bench.session_list --sessions 100000 --messages 4
+    (mongod 가 없으면 python -m bench.mongo_stub --port 27099 --latency 0.001 & 후 MONGO_URI=mongodb://127.0.0.1:27099,
+     mongomock 은 인덱스를 쓰지 않으므로 두 방식 모두 컬렉션을 훑는 비용이 포함됩니다)
+세션 --sessions 개와 세션당 메시지 --messages 개를 save_chat_message 가 만드는 것과 같은 형태로 한꺼번에 넣은 뒤,
+  - aggregate: 변경 전 get_all_sessions 와 같은 chat_history 전체 $sort/$group (모든 세션 ID 를 한 번에 반환)
+  - first_page: get_all_sessions(limit=50) (프론트엔드 첫 화면)
+  - deep_page: --deep-page 번째 페이지 (커서로 바로 조회)
+  - all_pages: limit=200 으로 next_cursor 를 끝까지 따라가 전체 목록 구성 (프론트엔드 getSessions)
+의 지연을 출력하고 (--modes 로 일부만 선택), 지원되는 서버에서는 first_page / aggregate 의 explain(executionStats) 검사 키/문서 수도 출력합니다.
+message 저장 형식(chat_history)에서만 비교합니다. bench-sessions- 로 시작하는 대화만 만들고 지우지만, 운영 DB 에는 실행하지 마세요.
+"""
+import time
+import uuid
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+
+from bench.chat_load import percentile
+from bench.chat_storage import timed
+from db import mongo
+
+# 변경 전 get_all_sessions 의 파이프라인
+AGGREGATE_PIPELINE = [
+    { "$sort": { "timestamp": -1 } },
+    { "$group": { "_id": "$conversation_id", "last_message_time": { "$first": "$timestamp" } } },
+    { "$sort": { "last_message_time": -1 } },
+    { "$project": { "_id": 0, "conversation_id": "$_id" } },
+]
+
+SLOW_MODES = {"aggregate", "all_pages"} # --slow-reads 만큼만 반복
+
+async def seed(args, prefix: str):
+    started_at = datetime.utcnow() - timedelta(seconds=args.sessions * args.messages)
+    messages, sessions = [], []
+    for i in range(args.sessions):
+        conversation_id = f"{prefix}-{i:07d}"
+        for j in range(args.messages):
+            role = "user" if j % 2 == 0 else "assistant"
+            messages.append({
+                "_id": ObjectId(), "conversation_id": conversation_id, "role": role,
+                "content": f"{role} 메시지 {j}", "timestamp": started_at + timedelta(seconds=i * args.messages + j), "token_count": 5,
+            })
+        last = messages[-1]
+        sessions.append({
+            "_id": conversation_id, "created_at": messages[-args.messages]["timestamp"], "last_message_time": last["timestamp"],
+            "message_count": args.messages, "title": "user 메시지 0", "preview": last["content"],
+        })
+        if len(messages) >= args.batch:
+            await mongo.mongo_db.chat_collection.insert_many(messages, ordered=False)
+            await mongo.mongo_db.session_collection.insert_many(sessions, ordered=False)
+            messages, sessions = [], []
+    if messages:
+        await mongo.mongo_db.chat_collection.insert_many(messages, ordered=False)
+        await mongo.mongo_db.session_collection.insert_many(sessions, ordered=False)
+
+async def explain(command: dict) -> Optional[Dict[str, int]]:
+    try:
+        result = await mongo.mongo_db.db.command("explain", command, verbosity="executionStats")
+    except Exception:
+        return None
+    stats = result.get("executionStats") or {}
+    if not stats:
+        # aggregate 의 explain 은 stages[0].$cursor 아래에 executionStats 가 있음
+        stages = result.get("stages") or [{}]
+        stats = stages[0].get("$cursor", {}).get("executionStats", {})
+    if not stats:
+        return None
+    return {"keys": stats.get("totalKeysExamined", 0), "docs": stats.get("totalDocsExamined", 0)}
+
+async def all_pages() -> int:
+    count, cursor = 0, None
+    while True:
+        page = await mongo.get_all_sessions(limit=200, cursor=cursor)
+        count += len(page["sessions"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            return count
+
+async def run(args):
+    await mongo.connect_to_mongo()
+    prefix = f"bench-sessions-{uuid.uuid4().hex[:8]}"
+    try:
+        started = time.perf_counter()
+        await seed(args, prefix)
+        print(f"세션 {args.sessions}개 x 메시지 {args.messages}개 적재: {time.perf_counter() - started:.1f}s, MONGO_URI={mongo.MONGO_URI}")
+
+        deep_cursor = None
+        for _ in range(args.deep_page - 1):
+            deep_cursor = (await mongo.get_all_sessions(limit=50, cursor=deep_cursor))["next_cursor"]
+
+        queries = {
+            "aggregate": lambda: mongo.mongo_db.chat_collection.aggregate(AGGREGATE_PIPELINE).to_list(length=None),
+            "first_page": lambda: mongo.get_all_sessions(limit=50),
+            "deep_page": lambda: mongo.get_all_sessions(limit=50, cursor=deep_cursor),
+            "all_pages": all_pages,
+        }
+        modes = args.modes.split(",")
+        latencies: Dict[str, List[float]] = {mode: [] for mode in modes}
+        counts: Dict[str, int] = {}
+        for mode in modes:
+            for _ in range(args.slow_reads if mode in SLOW_MODES else args.reads):
+                result = await timed(latencies[mode], queries[mode]())
+                counts[mode] = result if isinstance(result, int) else len(result if isinstance(result, list) else result["sessions"])
+
+        explains = {
+            "first_page": {
+                "find": mongo.COLLECTION_NAME_SESSIONS, "filter": {"deleted_at": {"$exists": False}},
+                "sort": {"last_message_time": -1, "_id": -1}, "limit": 51,
+            },
+            "aggregate": {"aggregate": mongo.COLLECTION_NAME_CHAT, "pipeline": AGGREGATE_PIPELINE, "cursor": {}},
+        }
+        plans = {mode: await explain(command) for mode, command in explains.items() if mode in modes}
+        # 대량 삭제가 오래 걸려도 결과가 남도록 정리 전에 출력
+        print(f"{'조회':<12}{'세션 수':>9}{'p50':>11}{'p95':>11}{'검사 키':>10}{'검사 문서':>11}")
+        for name, values in latencies.items():
+            plan = plans.get(name)
+            keys, docs = (f"{plan['keys']}", f"{plan['docs']}") if plan else ("-", "-")
+            print(f"{name:<12}{counts[name]:>9}{percentile(values, 0.5) * 1000:>9.1f}ms{percentile(values, 0.95) * 1000:>9.1f}ms{keys:>10}{docs:>11}", flush=True)
+    finally:
+        await mongo.mongo_db.chat_collection.delete_many({"conversation_id": {"$regex": f"^{prefix}"}})
+        await mongo.mongo_db.session_collection.delete_many({"_id": {"$regex": f"^{prefix}"}})
+        await mongo.close_mongo_connection()
+
+def main():
+    parser = argparse.ArgumentParser(description="세션 목록 조회 방식별 지연 비교")
+    parser.add_argument("--modes", default="aggregate,first_page,deep_page,all_pages")
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--messages", type=int, default=4, help="세션당 메시지 수")
+    parser.add_argument("--batch", type=int, default=5000, help="insert_many 한 번에 넣는 메시지 수")
+    parser.add_argument("--deep-page", type=int, default=100, help="deep_page 로 조회할 페이지 번호 (limit=50 기준)")
+    parser.add_argument("--reads", type=int, default=50)
+    parser.add_argument("--slow-reads", type=int, default=3, help="aggregate / all_pages 반복 횟수")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""로컬 부하 테스트용 OpenAI / OpenWeatherMap 대체 서버입니다.
+
+실행 (backend 디렉토리에서):
+    STUB_LATENCY=0.5 STUB_MAX_CONCURRENCY=20 uvicorn bench.stub_server:app --port 9999
+지연/토큰 수/도구 호출 비율/장애 주입은 실행 중에 POST /faults 로 바꿀 수 있습니다.
+    예) {"error_rate": 0.5, "status": 503, "retry_after": 1}, {"latency": 1.0, "jitter": 0.3, "tool_call_rate": 0.2}
+백엔드는 OPENAI_BASE_URL=http://127.0.0.1:9999/v1, OPENWEATHER_BASE_URL=http://127.0.0.1:9999/data/2.5/weather 로 실행합니다.
+"""
+import os
+import re
+import json
+import random
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+STUB_LATENCY = float(os.getenv("STUB_LATENCY", "0.5")) # 모델 응답 지연 (초)
+STUB_MAX_CONCURRENCY = int(os.getenv("STUB_MAX_CONCURRENCY", "0")) # 초과 시 429 반환 (0 = 제한 없음, 업스트림 rate limit 재현용)
+
+app = FastAPI()
+
+stats = {
+    "calls": 0, "rate_limited": 0, "injected_errors": 0, "in_flight": 0, "max_in_flight": 0,
+    "tool_calls_emitted": 0, "calls_with_tools": 0, "prompt_tokens": 0, "completion_tokens": 0,
+    "weather_calls": 0, "weather_errors": 0,
+}
+
+# 동작 설정 (POST /faults 로 변경)
+#  - error_rate 확률로 status 응답 (retry_after 가 있으면 Retry-After 헤더 포함)
+#  - latency ± jitter 비율만큼 균등 분포로 응답 지연, 스트리밍은 청크마다 chunk_delay 추가
+#  - prompt_tokens 가 0 이면 요청 메시지 길이로 추정 (한글 기준 약 2자당 1토큰), completion_tokens 는 고정값
+#  - tool_call_rate 확률로 키워드가 없어도 날씨 도구 호출 ("날씨" / 날짜 키워드는 보낸 도구에 있으면 항상 도구 호출)
+#    system 메시지에 서버가 넣은 현재 날씨가 있으면 날씨 도구는 호출하지 않음 (prompt_facts_service)
+#  - 날씨 API 는 weather_latency 지연, weather_error_rate 확률로 500
+faults = {
+    "error_rate": float(os.getenv("STUB_ERROR_RATE", "0")),
+    "status": int(os.getenv("STUB_ERROR_STATUS", "503")),
+    "retry_after": None,
+    "latency": STUB_LATENCY,
+    "jitter": float(os.getenv("STUB_LATENCY_JITTER", "0")),
+    "chunk_delay": float(os.getenv("STUB_CHUNK_DELAY", "0")),
+    "prompt_tokens": int(os.getenv("STUB_PROMPT_TOKENS", "0")),
+    "completion_tokens": int(os.getenv("STUB_COMPLETION_TOKENS", "20")),
+    "tool_call_rate": float(os.getenv("STUB_TOOL_CALL_RATE", "0")),
+    "weather_latency": float(os.getenv("STUB_WEATHER_LATENCY", str(STUB_LATENCY / 5))),
+    "weather_error_rate": float(os.getenv("STUB_WEATHER_ERROR_RATE", "0")),
+}
+
+def _latency() -> float:
+    jitter = faults["latency"] * faults["jitter"]
+    return max(0.0, random.uniform(faults["latency"] - jitter, faults["latency"] + jitter))
+
+def _usage(body: dict) -> dict:
+    # 도구 스키마도 실제 API 처럼 입력 토큰으로 계산 (의도 라우터 절감량 확인용)
+    prompt_tokens = faults["prompt_tokens"] or max(1, (
+        sum(len(str(m.get("content") or "")) for m in body["messages"]) + len(json.dumps(body.get("tools") or [], ensure_ascii=False)) // 2
+    ) // 2)
+    completion_tokens = faults["completion_tokens"]
+    stats["prompt_tokens"] += prompt_tokens
+    stats["completion_tokens"] += completion_tokens
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+DATE_KEYWORDS = re.compile(r"날짜|며칠|요일|몇 시")
+
+def _tool_calls(body: dict, last_user: str):
+    """도구가 주어졌고 아직 도구 결과가 없으면, 메시지 키워드(또는 tool_call_rate)에 따라 보낸 도구 중에서 도구 호출을 돌려줍니다."""
+    if not body.get("tools") or any(m.get("role") == "tool" for m in body["messages"]):
+        return None
+    offered = {tool["function"]["name"] for tool in body["tools"]}
+    weather_in_prompt = any(m.get("role") == "system" and "현재 날씨:" in str(m.get("content")) for m in body["messages"])
+    tool_calls = []
+    if ("get_current_weather" in offered and not weather_in_prompt
+            and ("날씨" in last_user or random.random() < faults["tool_call_rate"])):
+        tool_calls.append({"id": "call_weather", "type": "function", "function": {
+            "name": "get_current_weather", "arguments": json.dumps({"latitude": 37.56, "longitude": 126.97})}})
+    if "get_current_date" in offered and DATE_KEYWORDS.search(last_user):
+        tool_calls.append({"id": "call_date", "type": "function", "function": {"name": "get_current_date", "arguments": "{}"}})
+    stats["tool_calls_emitted"] += len(tool_calls)
+    return tool_calls or None
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+@app.post("/stats/reset")
+async def reset_stats():
+    stats.update({key: 0 for key in stats if key != "in_flight"}, max_in_flight=stats["in_flight"])
+    return stats
+
+@app.post("/faults")
+async def set_faults(request: Request):
+    faults.update(await request.json())
+    return faults
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["calls"] += 1
+    stats["calls_with_tools"] += bool(body.get("tools"))
+    if STUB_MAX_CONCURRENCY and stats["in_flight"] >= STUB_MAX_CONCURRENCY:
+        stats["rate_limited"] += 1
+        return JSONResponse(status_code=429, content={"error": {"message": "Rate limit reached", "type": "requests"}})
+    if random.random() < faults["error_rate"]:
+        stats["injected_errors"] += 1
+        headers = {"Retry-After": str(faults["retry_after"])} if faults["retry_after"] is not None else None
+        return JSONResponse(status_code=faults["status"], content={"error": {"message": "Injected fault", "type": "server_error"}}, headers=headers)
+
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        await asyncio.sleep(_latency())
+    finally:
+        stats["in_flight"] -= 1
+
+    last_user = [m for m in body["messages"] if m.get("role") == "user"][-1]["content"]
+    tool_calls = _tool_calls(body, last_user)
+    content = None if tool_calls else f"stub: {last_user[:50]}"
+    base = {"id": "chatcmpl-stub", "created": 0, "model": body["model"]}
+
+    if body.get("stream"):
+        async def chunks():
+            if tool_calls:
+                for index, tool_call in enumerate(tool_calls):
+                    delta = {"role": "assistant", "tool_calls": [dict(tool_call, index=index)]}
+                    yield f"data: {json.dumps(dict(base, object='chat.completion.chunk', choices=[{'index': 0, 'delta': delta, 'finish_reason': None}]))}\n\n"
+            else:
+                for word in content.split(" "):
+                    if faults["chunk_delay"]:
+                        await asyncio.sleep(faults["chunk_delay"])
+                    yield f"data: {json.dumps(dict(base, object='chat.completion.chunk', choices=[{'index': 0, 'delta': {'content': word + ' '}, 'finish_reason': None}]))}\n\n"
+            finish_reason = "tool_calls" if tool_calls else "stop"
+            yield f"data: {json.dumps(dict(base, object='chat.completion.chunk', choices=[{'index': 0, 'delta': {}, 'finish_reason': finish_reason}]))}\n\n"
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps(dict(base, object='chat.completion.chunk', choices=[], usage=_usage(body)))}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    message = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    return dict(
+        base,
+        object="chat.completion",
+        choices=[{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_calls else "stop"}],
+        usage=_usage(body),
+    )
+
+@app.get("/data/2.5/weather")
+async def current_weather(lat: float, lon: float):
+    stats["weather_calls"] += 1
+    await asyncio.sleep(faults["weather_latency"])
+    if random.random() < faults["weather_error_rate"]:
+        stats["weather_errors"] += 1
+        return JSONResponse(status_code=500, content={"cod": 500, "message": "Injected fault"})
+    return {
+        "name": "Seoul",
+        "weather": [{"description": "맑음"}],
+        "main": {"temp": 20.0, "feels_like": 19.0, "humidity": 40},
+        "wind": {"speed": 1.5},
+    }
@@ -0,0 +1,102 @@
+"""턴당 Mongo 명령 수와 턴 지연(모델 호출 제외 DB 대기 시간) 비교 스크립트입니다. (chat_service 턴 저장 순서 효과 측정, bench.mongo_stub 과 함께 사용)
+
+실행 (backend 디렉토리에서):
+    python -m bench.mongo_stub --port 27099 --latency 0.02 &
+    MONGO_URI=mongodb://127.0.0.1:27099 python -m bench.turn_persistence --conversations 20 --turns 10
+모델 호출은 --model-latency 만큼 sleep 으로 대신하고, 두 방식으로 같은 수의 턴을 저장합니다.
+  - sequential: 사용자 메시지 저장 -> 기록 조회 -> 모델 -> 토큰 사용량 저장 -> 봇 응답 저장 (모두 순서대로 대기)
+  - overlapped: chat_service._begin_turn / _finish_turn (사용자 메시지 저장을 모델 호출과 겹치고, 토큰 사용량과 봇 응답은 동시에 저장)
+pymongo CommandListener 로 턴 동안 보낸 명령 수를 세고, 턴 지연에서 모델 시간을 뺀 값을 DB 대기 시간으로 출력합니다.
+bench-persist- 로 시작하는 대화만 만들고 지우지만, 운영 DB 에는 실행하지 마세요.
+"""
+import time
+import uuid
+import asyncio
+import argparse
+from collections import Counter
+from typing import Dict, List
+
+from pymongo import monitoring
+
+from bench.chat_load import percentile
+from db import mongo
+from services import chat_service
+from services.openai_service import load_history
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.commands: Counter = Counter()
+
+    def started(self, event):
+        self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+async def sequential_turn(conversation_id: str, message: str, model_latency: float):
+    await mongo.save_chat_message(conversation_id, "user", message)
+    await load_history(conversation_id)
+    await asyncio.sleep(model_latency)
+    await chat_service._save_token_usage(conversation_id, 100, 20)
+    await mongo.save_chat_message(conversation_id, "assistant", f"응답: {message}")
+
+async def overlapped_turn(conversation_id: str, message: str, model_latency: float):
+    _, user_write = await chat_service._begin_turn(conversation_id, message)
+    await asyncio.sleep(model_latency)
+    await chat_service._finish_turn(conversation_id, user_write, f"응답: {message}", 100, 20)
+
+MODES = {"sequential": sequential_turn, "overlapped": overlapped_turn}
+
+async def run_mode(args, counter: CommandCounter, mode: str) -> Dict[str, float]:
+    turn = MODES[mode]
+    run_id = uuid.uuid4().hex[:8]
+    conversations = [f"bench-persist-{mode}-{run_id}-{i}" for i in range(args.conversations)]
+    latencies: List[float] = []
+
+    async def converse(conversation_id: str):
+        for i in range(args.turns):
+            started = time.perf_counter()
+            await turn(conversation_id, f"질문 {i}", args.model_latency)
+            latencies.append(time.perf_counter() - started)
+
+    counter.commands.clear()
+    await asyncio.gather(*(converse(c) for c in conversations))
+    commands = sum(counter.commands.values())
+    for conversation_id in conversations:
+        await mongo.delete_chat_history_by_id(conversation_id)
+    turns = len(latencies)
+    db_wait = [latency - args.model_latency for latency in latencies]
+    return {
+        "turns": turns,
+        "commands": commands / turns,
+        "p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95),
+        "db_p50": percentile(db_wait, 0.5), "db_p95": percentile(db_wait, 0.95),
+    }
+
+async def run(args):
+    counter = CommandCounter()
+    monitoring.register(counter) # 이후 생성되는 클라이언트에 적용되므로 연결 전에 등록
+    await mongo.connect_to_mongo()
+    try:
+        results = {mode: await run_mode(args, counter, mode) for mode in args.modes.split(",")}
+    finally:
+        await mongo.close_mongo_connection()
+    print(f"대화 {args.conversations}개 x 턴 {args.turns}개 (동시 대화 {args.conversations}), 모델 {args.model_latency * 1000:.0f}ms, MONGO_URI={mongo.MONGO_URI}")
+    print(f"{'방식':<12}{'턴':>6}{'명령/턴':>9}{'턴 p50':>10}{'p95':>9}{'DB 대기 p50':>13}{'p95':>9}")
+    for mode, r in results.items():
+        print(f"{mode:<12}{r['turns']:>6}{r['commands']:>9.1f}{r['p50'] * 1000:>8.1f}ms{r['p95'] * 1000:>7.1f}ms"
+              f"{r['db_p50'] * 1000:>11.1f}ms{r['db_p95'] * 1000:>7.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="턴 저장 순서별 Mongo 명령 수 / 지연 비교")
+    parser.add_argument("--modes", default="sequential,overlapped")
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=10, help="대화당 턴 수")
+    parser.add_argument("--model-latency", type=float, default=0.2, help="모델 호출 대신 기다리는 시간 (초)")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
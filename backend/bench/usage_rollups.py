@@ -0,0 +1,167 @@
+"""관리자 사용량 통계 조회 지연 비교 스크립트입니다. (token_usages 전체 $group vs 일별/월별 집계 컬렉션)
+
+실행 (backend 디렉토리에서, 테스트용 Mongo 를 가리키도록 설정한 상태):
+    MONGO_URI=mongodb://127.0.0.1:27017 python -m bench.usage_rollups --docs 1000000 --days 365
+    (mongod 가 없으면 python -m bench.mongo_stub --port 27099 --latency 0.001 & 후 MONGO_URI=mongodb://127.0.0.1:27099,
+     mongomock 은 집계가 느리므로 --docs 를 줄여 실행)
+--days 일에 고르게 퍼진 TokenUsage 형태의 문서 --docs 개를 한꺼번에 넣고, save_token_usage 가 문서마다 하는 $inc 를
+일자/월별로 모아 집계 컬렉션에 한 번에 반영한 뒤 (결과는 문서별 $inc 와 같음)
+  - old_daily / old_monthly: 변경 전 get_daily_usage_stats / get_monthly_usage_stats 의 token_usages 전체 $group
+  - daily / monthly: 현재 get_daily_usage_stats / get_monthly_usage_stats (집계 컬렉션 조회)
+  - daily_30d: 최근 30일 범위 조회 (관리자 화면 기본 범위)
+의 지연과 반환 행 수를 출력합니다. 쓰기 쪽 비용으로 insert_one 과 save_token_usage(집계 $inc 포함)의 지연도 --writes 번씩 비교합니다.
+bench-usage- 로 표시한 문서만 만들고, 끝나면 지우고 집계 컬렉션에서도 같은 양을 빼지만 운영 DB 에는 실행하지 마세요.
+"""
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from bench.chat_load import percentile
+from bench.chat_storage import timed
+from db import mongo
+
+def _old_pipeline(date_format: str, key_name: str) -> list:
+    """변경 전 get_daily_usage_stats / get_monthly_usage_stats 의 파이프라인"""
+    return [
+        {
+            "$group": {
+                "_id": { "$dateToString": { "format": date_format, "date": "$timestamp" } },
+                "total_input_tokens": { "$sum": "$input_tokens" },
+                "total_output_tokens": { "$sum": "$output_tokens" },
+                "total_tokens": { "$sum": "$total_tokens" }
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                key_name: "$_id",
+                "input_tokens": "$total_input_tokens",
+                "output_tokens": "$total_output_tokens",
+                "total_tokens": "$total_tokens",
+                "cost": {
+                    "$add": [
+                        { "$multiply": ["$total_input_tokens", mongo.PRICE_PER_TOKEN_INPUT] },
+                        { "$multiply": ["$total_output_tokens", mongo.PRICE_PER_TOKEN_OUTPUT] }
+                    ]
+                }
+            }
+        },
+        { "$sort": { key_name: 1 } }
+    ]
+
+def _usage_doc(prefix: str, index: int, timestamp: datetime) -> dict:
+    input_tokens = random.randint(200, 1500)
+    output_tokens = random.randint(20, 400)
+    doc = {
+        "session_id": f"{prefix}-{index % 5000}", "model_name": "gpt-4o-mini",
+        "input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens,
+        "timestamp": timestamp,
+    }
+    if index % 10 == 0: # 응답 캐시 히트 (비용 0, 절감량 기록)
+        doc.update(input_tokens=0, output_tokens=0, total_tokens=0, cache_hit="exact",
+                   saved_input_tokens=input_tokens, saved_output_tokens=output_tokens)
+    else:
+        doc["offered_tools"] = ["get_current_weather"] if index % 3 else []
+    return doc
+
+def _add_increments(totals: Dict[str, Dict[str, Dict[str, int]]], doc: dict):
+    for name, key in (("daily", doc["timestamp"].strftime("%Y-%m-%d")), ("monthly", doc["timestamp"].strftime("%Y-%m"))):
+        for field, value in mongo._usage_increments(doc).items():
+            totals[name][key][field] += value
+
+async def _apply_rollups(totals: Dict[str, Dict[str, int]], collection, sign: int):
+    for key, increments in totals.items():
+        await collection.update_one({"_id": key}, {"$inc": {k: sign * v for k, v in increments.items()}}, upsert=True)
+    if sign < 0: # 벤치 문서만 있던 기간은 집계 문서를 지움
+        await collection.delete_many({"_id": {"$in": list(totals)}, "requests": {"$lte": 0}})
+
+async def seed(args, prefix: str) -> Dict[str, Dict[str, Dict[str, int]]]:
+    """문서를 넣고 일별/월별로 모은 $inc 를 집계 컬렉션에 반영합니다. 정리할 때 빼기 위해 반영한 합계를 반환합니다."""
+    end = datetime.utcnow()
+    span = timedelta(days=args.days).total_seconds()
+    totals = {"daily": defaultdict(lambda: defaultdict(int)), "monthly": defaultdict(lambda: defaultdict(int))}
+    batch = []
+    for i in range(args.docs):
+        doc = _usage_doc(prefix, i, end - timedelta(seconds=span * (args.docs - i) / args.docs))
+        batch.append(doc)
+        _add_increments(totals, doc)
+        if len(batch) >= args.batch:
+            await mongo.mongo_db.token_collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await mongo.mongo_db.token_collection.insert_many(batch, ordered=False)
+    await _apply_rollups(totals["daily"], mongo.mongo_db.usage_daily_collection, 1)
+    await _apply_rollups(totals["monthly"], mongo.mongo_db.usage_monthly_collection, 1)
+    return totals
+
+async def writes(args, prefix: str, totals) -> Dict[str, List[float]]:
+    latencies: Dict[str, List[float]] = {"insert_one": [], "save_token_usage": []}
+    for i in range(args.writes):
+        await timed(latencies["insert_one"], mongo.mongo_db.token_collection.insert_one(_usage_doc(f"{prefix}-w", i, datetime.utcnow())))
+    for i in range(args.writes):
+        doc = _usage_doc(f"{prefix}-w", i, datetime.utcnow())
+        doc.pop("session_id") # 세션 문서가 없으므로 세션별 합계 $inc 는 생략
+        doc["user_id"] = prefix # 정리용 표시
+        _add_increments(totals, doc) # 정리할 때 집계 컬렉션에서 함께 뺌
+        await timed(latencies["save_token_usage"], mongo.save_token_usage(doc))
+    return latencies
+
+async def run(args):
+    await mongo.connect_to_mongo()
+    prefix = f"bench-usage-{uuid.uuid4().hex[:8]}"
+    totals = None
+    try:
+        started = time.perf_counter()
+        totals = await seed(args, prefix)
+        print(f"token_usages {args.docs}개 ({args.days}일) 적재: {time.perf_counter() - started:.1f}s, MONGO_URI={mongo.MONGO_URI}")
+
+        since = (datetime.utcnow() - timedelta(days=30)).strftime("%Y-%m-%d")
+        tokens = mongo.mongo_db.token_collection
+        queries = {
+            "old_daily": lambda: tokens.aggregate(_old_pipeline("%Y-%m-%d", "date")).to_list(length=None),
+            "old_monthly": lambda: tokens.aggregate(_old_pipeline("%Y-%m", "month")).to_list(length=None),
+            "daily": lambda: mongo.get_daily_usage_stats(),
+            "monthly": lambda: mongo.get_monthly_usage_stats(),
+            "daily_30d": lambda: mongo.get_daily_usage_stats(start=since),
+        }
+        latencies: Dict[str, List[float]] = {name: [] for name in queries}
+        rows: Dict[str, int] = {}
+        for name, query in queries.items():
+            for _ in range(args.slow_reads if name.startswith("old_") else args.reads):
+                rows[name] = len(await timed(latencies[name], query()))
+        write_latencies = await writes(args, prefix, totals)
+        # 대량 삭제가 오래 걸려도 결과가 남도록 정리 전에 출력
+        print(f"{'조회':<18}{'행 수':>7}{'p50':>12}{'p95':>12}{'변경 전 대비':>12}")
+        baselines = {"daily": "old_daily", "daily_30d": "old_daily", "monthly": "old_monthly"}
+        for name, values in latencies.items():
+            p50 = percentile(values, 0.5)
+            ratio = f"{percentile(latencies[baselines[name]], 0.5) / p50:.0f}x" if name in baselines and p50 else "-"
+            print(f"{name:<18}{rows[name]:>7}{p50 * 1000:>10.1f}ms{percentile(values, 0.95) * 1000:>10.1f}ms{ratio:>12}")
+        for name, values in write_latencies.items():
+            print(f"{name:<18}{len(values):>7}{percentile(values, 0.5) * 1000:>10.1f}ms{percentile(values, 0.95) * 1000:>10.1f}ms{'-':>12}")
+    finally:
+        # 적재/쓰기 비교로 넣은 문서를 지우고 집계 컬렉션에 더한 양을 되돌림
+        await mongo.mongo_db.token_collection.delete_many({"session_id": {"$regex": f"^{prefix}"}})
+        await mongo.mongo_db.token_collection.delete_many({"user_id": prefix})
+        if totals:
+            await _apply_rollups(totals["daily"], mongo.mongo_db.usage_daily_collection, -1)
+            await _apply_rollups(totals["monthly"], mongo.mongo_db.usage_monthly_collection, -1)
+        await mongo.close_mongo_connection()
+
+def main():
+    parser = argparse.ArgumentParser(description="사용량 통계 조회 방식별 지연 비교")
+    parser.add_argument("--docs", type=int, default=1000000, help="적재할 token_usages 문서 수")
+    parser.add_argument("--days", type=int, default=365, help="문서를 퍼뜨릴 기간 (일)")
+    parser.add_argument("--batch", type=int, default=10000, help="insert_many 한 번에 넣는 문서 수")
+    parser.add_argument("--reads", type=int, default=50)
+    parser.add_argument("--slow-reads", type=int, default=3, help="변경 전 $group 반복 횟수")
+    parser.add_argument("--writes", type=int, default=200, help="insert_one / save_token_usage 비교 횟수 (0 이면 생략)")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
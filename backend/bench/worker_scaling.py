@@ -0,0 +1,119 @@
+"""gunicorn 워커 수에 따른 /chat 처리량 비교 스크립트입니다. (bench.stub_server 와 함께 사용)
+
+실행 (backend 디렉토리에서, stub 서버와 Mongo 가 떠 있는 상태):
+    python -m bench.worker_scaling --workers 1,2,4 --duration 20 --concurrency 64
+워커 수마다 gunicorn -c gunicorn.conf.py 를 새로 띄워 고정 시간 동안 닫힌 루프(closed-loop)로 /chat 을 호출하고,
+처리량(req/s)과 지연 시간 백분위수, 1 워커 대비 배율을 출력합니다.
+stub 지연을 0 으로 두면 모델 대기 없이 워커의 CPU 처리량(라우팅/컨텍스트 구성/직렬화/Mongo 호출)만 비교할 수 있습니다.
+"""
+import os
+import sys
+import time
+import uuid
+import signal
+import asyncio
+import argparse
+import subprocess
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+
+from bench.chat_load import percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def start_server(args, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), SHARED_STATE_BACKEND=args.shared_state)
+    command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{args.port}", *args.gunicorn_args.split(), args.app]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+async def wait_ready(client: httpx.AsyncClient, workers: int, timeout: float = 60):
+    """모든 워커가 요청을 받을 수 있을 때까지 /metrics 응답의 워커 pid 를 모읍니다."""
+    deadline = time.monotonic() + timeout
+    pids = set()
+    while time.monotonic() < deadline:
+        try:
+            async with httpx.AsyncClient(base_url=client.base_url) as fresh: # 새 연결 -> 다른 워커로 분산
+                response = await fresh.get("/metrics")
+            for line in response.text.splitlines():
+                if line.startswith("chatbot_runtime_worker_pid "):
+                    pids.add(line.split()[1])
+            if len(pids) >= workers:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit(f"워커 {workers}개가 {timeout:.0f}s 안에 준비되지 않았습니다. (응답한 워커 {len(pids)}개)")
+
+async def measure(args) -> Dict[str, object]:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    run_id = uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout, limits=limits) as client:
+        stop_at = time.perf_counter() + args.warmup + args.duration
+        measure_from = time.perf_counter() + args.warmup
+
+        async def worker(index: int):
+            turn = 0
+            while time.perf_counter() < stop_at:
+                # 클라이언트마다 대화를 나눠 같은 대화의 턴 직렬화/중복 병합에 걸리지 않도록 함
+                body = {"conversation_id": f"scale-{run_id}-{index}-{turn // args.turns_per_conversation}", "message": f"확장성 테스트 {turn}"}
+                turn += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/chat", json=body, headers={"X-User-Id": f"scale-{index}"})
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                if started >= measure_from:
+                    latencies.append(time.perf_counter() - started)
+                    statuses[status] += 1
+
+        await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+    ok = statuses.get(200, 0)
+    return {
+        "throughput": ok / args.duration,
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "statuses": dict(statuses),
+    }
+
+async def run(args):
+    results = {}
+    for workers in [int(w) for w in args.workers.split(",")]:
+        server = start_server(args, workers)
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}") as client:
+                await wait_ready(client, workers)
+            results[workers] = await measure(args)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+        result = results[workers]
+        print(f"워커 {workers}: {result['throughput']:.1f} req/s, p50 {result['p50'] * 1000:.0f}ms, p99 {result['p99'] * 1000:.0f}ms, 상태 {result['statuses']}")
+
+    base = next(iter(results.values()))["throughput"] or 1
+    print(f"CPU 코어 {os.cpu_count()}개, 동시성 {args.concurrency}, 측정 {args.duration:g}s (워밍업 {args.warmup:g}s), 공유 상태 {args.shared_state}")
+    print(f"{'워커':<6}{'req/s':>10}{'배율':>8}{'p50':>9}{'p99':>9}")
+    for workers, result in results.items():
+        print(f"{workers:<6}{result['throughput']:>10.1f}{result['throughput'] / base:>7.2f}x"
+              f"{result['p50'] * 1000:>7.0f}ms{result['p99'] * 1000:>7.0f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="워커 수별 /chat 처리량 비교")
+    parser.add_argument("--workers", default="1,2,4", help="비교할 워커 수 (쉼표 구분)")
+    parser.add_argument("--app", default="app:app", help="gunicorn 에 넘길 ASGI 앱")
+    parser.add_argument("--gunicorn-args", default="", help="gunicorn 에 추가로 넘길 인자 (예: '--pythonpath ../local')")
+    parser.add_argument("--shared-state", default="memory", choices=["memory", "redis", "sqlite"])
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20, help="측정 시간 (초)")
+    parser.add_argument("--warmup", type=float, default=3, help="측정 전 워밍업 시간 (초)")
+    parser.add_argument("--turns-per-conversation", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import os
+import gzip
+import json
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+CHAT_ARCHIVE_IDLE_DAYS = float(os.getenv("CHAT_ARCHIVE_IDLE_DAYS", "0")) # 마지막 메시지 후 이 기간(일)이 지난 대화를 아카이브 파일로 이동 (0 이면 사용 안 함)
+CHAT_ARCHIVE_DIR = os.getenv("CHAT_ARCHIVE_DIR", "data/archive") # 아카이브 파일 디렉토리 (여러 호스트가 복원하려면 공유 볼륨)
+CHAT_ARCHIVE_COMPRESSION = os.getenv("CHAT_ARCHIVE_COMPRESSION", "zstd,gzip") # 선호 순서. 설치되지 않은 압축기(zstandard)는 제외
+
+# 압축 형식별 파일 확장자 (파일 이름으로 형식을 구분하므로 설정을 바꿔도 기존 파일을 읽을 수 있음)
+SUFFIXES = {"zstd": ".jsonl.zst", "gzip": ".jsonl.gz"}
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 6
+
+# === 아카이브 파일 형식 ===
+# 세그먼트 파일(chat-<생성 시각>-<pid>-<임의값>.jsonl.gz)은 추가만 하는 파일입니다.
+# 대화 하나를 JSONL(한 줄에 메시지 하나, conversation_id 포함)로 만들어 독립된 압축 프레임(gzip 멤버 / zstd 프레임)으로
+# 이어 붙이고, 대화별 (파일, 시작 위치, 길이)를 Mongo 의 아카이브 목록(chat_archives)에 기록합니다.
+# 복원할 때는 그 구간만 읽어 압축을 풀므로 파일 크기와 상관없이 대화 크기만큼만 읽습니다.
+# 이어 붙인 프레임은 그대로 이어진 하나의 스트림이기도 하므로, 목록을 잃어도 zcat/zstdcat 으로 전체 파일을 읽을 수 있습니다.
+# 복원/삭제된 대화의 구간은 목록에서 빠진 죽은 구간이 되며, 정리(compact) 시 살아 있는 구간만 새 세그먼트로 복사합니다.
+
+def _available_codec() -> str:
+    for name in (c.strip() for c in CHAT_ARCHIVE_COMPRESSION.split(",") if c.strip()):
+        if name == "gzip":
+            return name
+        if name == "zstd":
+            try:
+                import zstandard # noqa: F401
+            except ImportError:
+                logger.info("아카이브 압축기 'zstd' 를 사용할 수 없어 제외합니다. (pip install zstandard)")
+                continue
+            return name
+        logger.warning(f"알 수 없는 아카이브 압축기 '{name}' 는 무시합니다.")
+    return "gzip"
+
+def codec_of(file_name: str) -> str:
+    for codec, suffix in SUFFIXES.items():
+        if file_name.endswith(suffix):
+            return codec
+    raise ValueError(f"알 수 없는 아카이브 파일 형식: {file_name}")
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data) # 프레임에 원본 크기 포함
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def encode_messages(conversation_id: str, messages: List[dict]) -> bytes:
+    """메시지 문서 목록(시간순)을 JSONL 바이트로 만듭니다. (_id, timestamp 는 문자열로 저장)"""
+    lines = []
+    for message in messages:
+        record = {key: value for key, value in message.items() if key not in ("_id", "timestamp", "conversation_id")}
+        record.update({"_id": str(message["_id"]), "conversation_id": conversation_id, "timestamp": message["timestamp"].isoformat()})
+        lines.append(json.dumps(record, ensure_ascii=False))
+    return ("\n".join(lines) + "\n").encode()
+
+def decode_messages(data: bytes) -> List[dict]:
+    """encode_messages 로 만든 JSONL 을 chat_history 형식 메시지 문서 목록으로 되돌립니다."""
+    messages = []
+    for line in data.decode().splitlines():
+        if line:
+            record = json.loads(line)
+            record["_id"] = ObjectId(record["_id"])
+            record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+            messages.append(record)
+    return messages
+
+class ArchiveWriter:
+    """새 세그먼트 파일 하나에 대화를 이어 붙입니다. (스위퍼 실행 한 번에 하나, 다른 프로세스와 파일을 공유하지 않음)
+
+    sync() 가 끝나기 전에는 기록한 위치를 목록에 올리거나 원본을 지우면 안 됩니다.
+    """
+
+    def __init__(self, directory: str = CHAT_ARCHIVE_DIR, codec: Optional[str] = None):
+        os.makedirs(directory, exist_ok=True)
+        self.codec = codec or _available_codec()
+        self.file = f"chat-{datetime.utcnow():%Y%m%dT%H%M%S}-{os.getpid()}-{uuid.uuid4().hex[:6]}{SUFFIXES[self.codec]}"
+        self.path = os.path.join(directory, self.file)
+        self._handle = None
+        self._size = 0
+
+    def _write(self, frame: bytes) -> Dict[str, Any]:
+        if self._handle is None:
+            self._handle = open(self.path, "ab")
+        location = {"file": self.file, "offset": self._size, "length": len(frame)}
+        self._handle.write(frame)
+        self._size += len(frame)
+        return location
+
+    def _sync(self):
+        if self._handle is not None:
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
+
+    def _close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    async def append(self, conversation_id: str, messages: List[dict]) -> Dict[str, Any]:
+        """대화를 압축 프레임 하나로 추가하고 {"file", "offset", "length", "raw_bytes"} 를 반환합니다."""
+        data = encode_messages(conversation_id, messages)
+        frame = await asyncio.to_thread(_compress, self.codec, data)
+        return {**await asyncio.to_thread(self._write, frame), "raw_bytes": len(data)}
+
+    async def append_frame(self, frame: bytes) -> Dict[str, Any]:
+        """다른 세그먼트에서 읽은 압축 프레임을 그대로 추가합니다. (정리용, 같은 압축 형식만)"""
+        return await asyncio.to_thread(self._write, frame)
+
+    async def sync(self):
+        await asyncio.to_thread(self._sync)
+
+    async def close(self):
+        await asyncio.to_thread(self._close)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+def _read_frame(directory: str, file: str, offset: int, length: int) -> bytes:
+    with open(os.path.join(directory, file), "rb") as handle:
+        handle.seek(offset)
+        frame = handle.read(length)
+    if len(frame) != length:
+        raise IOError(f"아카이브 파일이 잘렸습니다: {file} ({offset}+{length})")
+    return frame
+
+async def read_frame(entry: dict, directory: str = CHAT_ARCHIVE_DIR) -> bytes:
+    return await asyncio.to_thread(_read_frame, directory, entry["file"], entry["offset"], entry["length"])
+
+async def read_conversation(entry: dict, directory: str = CHAT_ARCHIVE_DIR) -> List[dict]:
+    """아카이브 목록 항목({"file", "offset", "length"})이 가리키는 대화의 메시지 목록(시간순)을 읽습니다."""
+    frame = await read_frame(entry, directory)
+    data = await asyncio.to_thread(_decompress, codec_of(entry["file"]), frame)
+    return decode_messages(data)
+
+def list_segments(directory: str = CHAT_ARCHIVE_DIR) -> Dict[str, Dict[str, float]]:
+    """디렉토리의 세그먼트 파일 {파일 이름: {"size", "modified"(epoch 초)}} 를 반환합니다."""
+    if not os.path.isdir(directory):
+        return {}
+    segments = {}
+    for name in os.listdir(directory):
+        if name.startswith("chat-") and any(name.endswith(suffix) for suffix in SUFFIXES.values()):
+            stat = os.stat(os.path.join(directory, name))
+            segments[name] = {"size": stat.st_size, "modified": stat.st_mtime}
+    return segments
+
+def remove_segment(file: str, directory: str = CHAT_ARCHIVE_DIR):
+    try:
+        os.remove(os.path.join(directory, file))
+    except FileNotFoundError:
+        pass
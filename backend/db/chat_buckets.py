@@ -0,0 +1,125 @@
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+CHAT_BUCKET_SIZE = int(os.getenv("CHAT_BUCKET_SIZE", "50")) # 버킷 문서 하나에 담는 최대 메시지 수
+
+# 버킷 문서 형식 (chat_buckets 컬렉션):
+# {
+#   "conversation_id": str,
+#   "count": 메시지 수, "first_timestamp": 가장 이른 메시지 시각, "last_timestamp": 가장 늦은 메시지 시각,
+#   "messages": [{"_id": ObjectId, "role", "content", "timestamp", "token_count"(선택)}, ...]  (추가 순서)
+# }
+# 메시지 _id 는 chat_history 형식과 같은 ObjectId 이므로 두 형식 사이에서 페이지네이션 커서가 그대로 유효합니다.
+BUCKET_INDEXES = [
+    [("conversation_id", 1), ("last_timestamp", -1)], # 최근 기록 / before 페이지 (최신 버킷부터)
+    [("conversation_id", 1), ("first_timestamp", 1)], # after 페이지 / 전체 스트리밍 (오래된 버킷부터)
+]
+
+Cursor = Tuple[datetime, ObjectId] # (timestamp, _id) keyset 위치
+
+def bucket_message(message_doc: dict) -> dict:
+    """chat_history 형식의 메시지 문서를 버킷에 넣을 메시지로 변환합니다. (_id 가 없으면 새로 발급)"""
+    message = {key: value for key, value in message_doc.items() if key != "conversation_id"}
+    message.setdefault("_id", ObjectId())
+    return message
+
+def make_bucket(conversation_id: str, messages: List[dict]) -> dict:
+    """메시지 목록(시간순)으로 버킷 문서를 만듭니다. (마이그레이션용)"""
+    return {
+        "conversation_id": conversation_id,
+        "count": len(messages),
+        "first_timestamp": min(message["timestamp"] for message in messages),
+        "last_timestamp": max(message["timestamp"] for message in messages),
+        "messages": messages,
+    }
+
+async def ensure_indexes(collection):
+    for keys in BUCKET_INDEXES:
+        await collection.create_index(keys)
+
+async def append_message(collection, conversation_id: str, message: dict):
+    """대화의 열린 버킷(메시지 수 < CHAT_BUCKET_SIZE)에 메시지를 추가합니다. 열린 버킷이 없으면 upsert 로 새로 만듭니다.
+
+    같은 대화의 턴은 admission 단계에서 직렬화되므로 보통 열린 버킷은 하나입니다.
+    동시에 쓰여 버킷이 둘 생기거나 시각이 겹치더라도 읽기 쪽에서 (timestamp, _id) 순서로 병합합니다.
+    """
+    await collection.update_one(
+        {"conversation_id": conversation_id, "count": {"$lt": CHAT_BUCKET_SIZE}},
+        {
+            "$push": {"messages": message},
+            "$inc": {"count": 1},
+            "$min": {"first_timestamp": message["timestamp"]},
+            "$max": {"last_timestamp": message["timestamp"]},
+        },
+        upsert=True,
+    )
+
+def _order_key(message: dict):
+    return message["timestamp"], message["_id"]
+
+def _in_range(message: dict, before: Optional[Cursor], after: Optional[Cursor]) -> bool:
+    key = _order_key(message)
+    return (before is None or key < before) and (after is None or key > after)
+
+async def iter_messages(
+    collection,
+    conversation_id: str,
+    before: Optional[Cursor] = None,
+    after: Optional[Cursor] = None,
+    descending: bool = False,
+    batch_size: int = 2
+) -> AsyncIterator[dict]:
+    """버킷에 담긴 메시지를 (timestamp, _id) 순서(descending 이면 최신순)로 하나씩 반환합니다.
+
+    버킷을 범위 경계(내림차순이면 last_timestamp, 오름차순이면 first_timestamp) 순으로 읽으면서,
+    다음 버킷의 경계보다 앞서는 메시지만 내보내고 나머지는 보류합니다. 이후 버킷의 메시지는 모두 경계 뒤에 오므로
+    버킷 시각 범위가 겹쳐도 순서가 유지되고, 필요한 만큼만 읽고 멈출 수 있습니다.
+    """
+    query: Dict[str, Any] = {"conversation_id": conversation_id}
+    if before:
+        query["first_timestamp"] = {"$lte": before[0]}
+    if after:
+        query["last_timestamp"] = {"$gte": after[0]}
+    boundary_field = "last_timestamp" if descending else "first_timestamp"
+    direction = -1 if descending else 1
+    cursor = collection.find(query, {"messages": 1, boundary_field: 1}).sort(
+        [(boundary_field, direction), ("_id", direction)]
+    ).batch_size(batch_size)
+
+    pending: List[dict] = []
+    async for bucket in cursor:
+        boundary = bucket[boundary_field]
+        ready = [m for m in pending if (m["timestamp"] > boundary if descending else m["timestamp"] < boundary)]
+        if ready:
+            pending = [m for m in pending if (m["timestamp"] <= boundary if descending else m["timestamp"] >= boundary)]
+            ready.sort(key=_order_key, reverse=descending)
+            for message in ready:
+                yield message
+        pending.extend(m for m in bucket.get("messages", []) if _in_range(m, before, after))
+    pending.sort(key=_order_key, reverse=descending)
+    for message in pending:
+        yield message
+
+async def delete_conversation(collection, conversation_id: str, until: Optional[datetime] = None) -> int:
+    """대화의 버킷을 모두 삭제하고 삭제된 메시지 수를 반환합니다.
+
+    until 을 주면 마지막 메시지가 그 시각 이전인 버킷만 삭제합니다. (아카이브 후 그 사이 새 메시지가 담긴 버킷은 남김)
+    """
+    query: Dict[str, Any] = {"conversation_id": conversation_id}
+    if until is not None:
+        query["last_timestamp"] = {"$lte": until}
+    buckets = await collection.find(query, {"count": 1}).to_list(length=None)
+    if not buckets:
+        return 0
+    await collection.delete_many({"_id": {"$in": [bucket["_id"] for bucket in buckets]}})
+    return sum(bucket.get("count", 0) for bucket in buckets)
+
+# rebuild_sessions 등 메시지 단위 집계 파이프라인 앞에 붙여 버킷을 chat_history 형식 문서로 펼칩니다.
+UNWIND_STAGES = [
+    {"$unwind": "$messages"},
+    {"$set": {"messages.conversation_id": "$conversation_id"}},
+    {"$replaceRoot": {"newRoot": "$messages"}},
+]
@@ -0,0 +1,101 @@
+import os
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+HISTORY_CACHE_CONVERSATIONS = int(os.getenv("HISTORY_CACHE_CONVERSATIONS", "1000")) # 캐시할 최대 대화 수 (LRU)
+HISTORY_CACHE_MESSAGES = int(os.getenv("HISTORY_CACHE_MESSAGES", "20")) # 대화별로 유지할 최근 메시지 수
+
+class _Entry:
+    __slots__ = ("messages", "complete", "version")
+
+    def __init__(self, messages: List[Dict[str, Any]], complete: bool, version: Optional[int] = None):
+        self.messages = deque(messages, maxlen=HISTORY_CACHE_MESSAGES)
+        # True 이면 버퍼가 대화의 전체 메시지를 담고 있음 (버퍼보다 큰 limit 요청도 처리 가능)
+        self.complete = complete
+        # 공유 상태 백엔드의 대화 버전 (멀티 워커 모드에서만 사용, 다른 워커가 쓰면 버전이 달라져 미스 처리)
+        self.version = version
+
+class HistoryCache:
+    """대화별 최근 메시지를 링 버퍼로 유지하는 LRU 캐시입니다.
+
+    save_chat_message 에서 write-through 로 갱신되고 delete_chat_history_by_id 에서 무효화됩니다.
+    캐시에 없는 대화는 Mongo 에서 읽은 뒤 채웁니다.
+    멀티 워커 모드에서는 호출하는 쪽이 공유 대화 버전을 넘기며, 버전이 다른 항목은 다른 워커의 쓰기를 놓친 것으로 보고 사용하지 않습니다.
+    """
+
+    def __init__(self, max_conversations: int):
+        self.max_conversations = max_conversations
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Mongo 에서 읽는 중인 대화 -> 그 사이 발생한 쓰기 수 (읽기 도중 쓰기가 있으면 채우지 않음)
+        self._loading: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conversation_id: str, limit: int, version: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """캐시로 처리할 수 있으면 최근 limit 개 메시지를, 아니면 None 을 반환합니다."""
+        entry = self._entries.get(conversation_id)
+        if entry is None or entry.version != version or (limit > len(entry.messages) and not entry.complete):
+            self.misses += 1
+            return None
+        self._entries.move_to_end(conversation_id)
+        self.hits += 1
+        messages = list(entry.messages)[-limit:] if limit > 0 else []
+        return [dict(message) for message in messages]
+
+    def begin_load(self, conversation_id: str):
+        self._loading[conversation_id] = 0
+
+    def finish_load(self, conversation_id: str, messages: List[Dict[str, Any]], fetch_limit: int, version: Optional[int] = None):
+        """Mongo 조회 결과로 캐시를 채웁니다. fetch_limit 보다 적게 조회됐다면 전체 대화로 간주합니다."""
+        if self._loading.pop(conversation_id, 0):
+            # 조회 중 새 메시지가 저장/삭제됐다면 결과가 오래됐을 수 있으므로 캐시하지 않음
+            return
+        complete = len(messages) < fetch_limit and len(messages) <= HISTORY_CACHE_MESSAGES
+        self._entries[conversation_id] = _Entry(messages, complete=complete, version=version)
+        self._entries.move_to_end(conversation_id)
+        while len(self._entries) > self.max_conversations:
+            self._entries.popitem(last=False)
+
+    def cancel_load(self, conversation_id: str):
+        self._loading.pop(conversation_id, None)
+
+    def append(self, conversation_id: str, message: Dict[str, Any], version: Optional[int] = None):
+        """저장된 메시지를 캐시된 대화의 링 버퍼에 추가합니다. (write-through)
+
+        version 은 이 쓰기로 올라간 공유 대화 버전입니다. 직전 버전이 캐시 항목과 다르면
+        (다른 워커의 쓰기가 사이에 있었으면) 항목을 버립니다.
+        """
+        if conversation_id in self._loading:
+            self._loading[conversation_id] += 1
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            return
+        if version is not None:
+            if entry.version != version - 1:
+                del self._entries[conversation_id]
+                return
+            entry.version = version
+        if len(entry.messages) == entry.messages.maxlen:
+            entry.complete = False # 가장 오래된 메시지가 밀려나므로 더 이상 전체 대화가 아님
+        entry.messages.append(message)
+
+    def invalidate(self, conversation_id: str):
+        self._entries.pop(conversation_id, None)
+        if conversation_id in self._loading:
+            self._loading[conversation_id] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "conversations": len(self._entries),
+            "max_conversations": self.max_conversations,
+            "messages_per_conversation": HISTORY_CACHE_MESSAGES,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+history_cache = HistoryCache(HISTORY_CACHE_CONVERSATIONS)
@@ -1,213 +1,890 @@
 import os
+import json
+import time
+import base64
+import random
+import asyncio
 import logging
+from bson import ObjectId
+from contextlib import aclosing
+
+# Motor 는 pymongo 호출을 스레드 풀(기본 CPU 코어 수 x 5 개)에서 실행하므로 스레드 수보다 큰 커넥션 풀은 쓰이지 않습니다.
+# motor 임포트 전에 스레드 수를 풀 크기에 맞춥니다. (MOTOR_MAX_WORKERS 를 직접 지정하면 그 값 사용)
+os.environ.setdefault("MOTOR_MAX_WORKERS", os.getenv("MONGO_MAX_POOL_SIZE", "100"))
 from motor.motor_asyncio import AsyncIOMotorClient
-from datetime import datetime
-from typing import Optional, List
+from pymongo import ReadPreference, ReplaceOne, UpdateOne, WriteConcern
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from datetime import datetime, timedelta
+from typing import Optional, List, AsyncIterator, Set
+
+from db import chat_archive, chat_buckets, search_index
+from db.history_cache import history_cache, HISTORY_CACHE_MESSAGES
+from db.pool_monitor import PoolMonitor
+from services.metrics_service import timed_operation
+from services.tracing_service import traced
+from services.shared_state import shared_state, shared_key, is_shared
 
 logger = logging.getLogger(__name__)
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017") # Docker 환경 고려
+
+# === 커넥션 풀 / 타임아웃 / 압축 설정 (URI 에 같은 옵션이 있으면 아래 값이 우선) ===
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100")) # 서버당 최대 커넥션 수 (워커 프로세스마다 따로 생성)
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0")) # 미리 열어 둘 커넥션 수 (첫 요청의 커넥션 생성 지연 제거)
+MONGO_MAX_CONNECTING = int(os.getenv("MONGO_MAX_CONNECTING", "2")) # 동시에 새로 만들 수 있는 커넥션 수 (연결 폭주 방지)
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")) # 유휴 커넥션을 닫기까지의 시간 (ms, 0 이면 닫지 않음)
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")) # 풀이 가득 찼을 때 커넥션을 기다리는 최대 시간 (ms)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")) # 사용 가능한 서버를 찾는 최대 시간 (ms, 기본 30초 대신 빠르게 실패)
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")) # 커넥션 생성 타임아웃 (ms)
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000")) # 응답을 기다리는 최대 시간 (ms, 0 이면 무제한)
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib") # 선호 순서. 설치되지 않은 압축기(zstandard, python-snappy)는 제외
+MONGO_ZLIB_LEVEL = int(os.getenv("MONGO_ZLIB_LEVEL", "1")) # zlib 압축 수준 (-1~9, 낮을수록 CPU 사용이 적음)
+
+# === 작업별 write concern / read preference 프로필 ===
+# chat: 채팅 기록/세션 (사용자 대화 유실 방지, 자신이 쓴 기록을 바로 읽어야 하므로 primary)
+# usage: 토큰 사용량/집계 쓰기 (유실되어도 rebuild_usage_rollups 로 재계산 가능, 0 이면 응답을 기다리지 않음)
+# analytics: 관리자 통계 조회 (약간 오래된 값을 허용하고 레플리카셋이면 secondary 에서 읽어 primary 부하 분산)
+MONGO_CHAT_WRITE_CONCERN = os.getenv("MONGO_CHAT_WRITE_CONCERN", "majority") # w 값 (majority 또는 숫자)
+MONGO_CHAT_JOURNAL = os.getenv("MONGO_CHAT_JOURNAL", "false").lower() == "true" # 저널 기록까지 기다림 (j=true)
+MONGO_USAGE_WRITE_CONCERN = os.getenv("MONGO_USAGE_WRITE_CONCERN", "1")
+MONGO_ANALYTICS_READ_PREFERENCE = os.getenv("MONGO_ANALYTICS_READ_PREFERENCE", "secondaryPreferred") # primary, primaryPreferred, secondary, secondaryPreferred, nearest
 DB_NAME = "chatbot_db"
 COLLECTION_NAME_CHAT = "chat_history"
 COLLECTION_NAME_TOKENS = "token_usages" # 토큰 컬렉션 이름 정의
+COLLECTION_NAME_USAGE_DAILY = "usage_daily_rollups" # 일별 사용량 집계 컬렉션 (_id: YYYY-MM-DD)
+COLLECTION_NAME_USAGE_MONTHLY = "usage_monthly_rollups" # 월별 사용량 집계 컬렉션 (_id: YYYY-MM)
+COLLECTION_NAME_SESSIONS = "chat_sessions" # 세션 요약 컬렉션 (_id: conversation_id, 쓰기 시 갱신)
+COLLECTION_NAME_CHAT_BUCKETS = "chat_buckets" # 버킷 저장 형식의 채팅 기록 컬렉션 (대화별 메시지 CHAT_BUCKET_SIZE 개씩)
+COLLECTION_NAME_CHAT_ARCHIVES = "chat_archives" # 아카이브 파일로 옮긴 대화 목록 (_id: conversation_id, 파일/위치/길이)
+
+# 채팅 기록 저장 형식
+# message: chat_history 에 메시지마다 문서 하나 (기존 형식)
+# bucket: chat_buckets 에 대화별로 메시지를 묶은 버킷 문서 (최근 기록 조회가 버킷 1~2개 읽기, 인덱스 항목이 버킷당 하나)
+# 형식을 바꿀 때는 python -m scripts.migrate_chat_storage --to <형식> 으로 기존 기록을 옮긴 뒤 설정을 바꿉니다.
+CHAT_STORAGE_LAYOUT = os.getenv("CHAT_STORAGE_LAYOUT", "message")
+CHAT_STORAGE_LAYOUTS = ("message", "bucket")
+
+SESSION_TITLE_LENGTH = 40 # 세션 제목(첫 사용자 메시지) 최대 길이
+SESSION_PREVIEW_LENGTH = 80 # 세션 미리보기(마지막 메시지) 최대 길이
+HISTORY_VERSION_TTL = float(os.getenv("HISTORY_VERSION_TTL", "86400")) # 공유 대화 버전 키 유지 시간 (초, 쓰기마다 갱신)
+
+# === 보관 기간 ===
+TOKEN_USAGE_RETENTION_DAYS = float(os.getenv("TOKEN_USAGE_RETENTION_DAYS", "0")) # token_usages 원본 보관 기간 (일, TTL 인덱스로 만료, 0 이면 영구 보관. 일별/월별 집계는 남음)
+USAGE_PURGE_BATCH = 1000 # 세션 삭제 시 token_usages 를 한 번에 지우는 문서 수
 
 # === 비용 계산 상수 (GPT-4.1 nano 기준) ===
+# 사용량 문서에는 실제 사용한 모델 가격으로 계산한 cost 가 저장됩니다. (chat_service.calculate_cost)
+# 아래 가격은 cost 가 없는 이전 문서/집계에만 적용합니다.
 PRICE_PER_TOKEN_INPUT = 0.100 / 1_000_000
 PRICE_PER_TOKEN_OUTPUT = 0.400 / 1_000_000
 
+def _default_cost(input_tokens: int, output_tokens: int) -> float:
+    return input_tokens * PRICE_PER_TOKEN_INPUT + output_tokens * PRICE_PER_TOKEN_OUTPUT
+
+def _default_cost_expr(input_field: str, output_field: str) -> dict:
+    """_default_cost 의 집계 파이프라인 식"""
+    return { "$add": [
+        { "$multiply": [{ "$ifNull": [f"${input_field}", 0] }, PRICE_PER_TOKEN_INPUT] },
+        { "$multiply": [{ "$ifNull": [f"${output_field}", 0] }, PRICE_PER_TOKEN_OUTPUT] }
+    ] }
+
 class MongoDB:
     client: AsyncIOMotorClient = None
     db = None
     chat_collection = None # 명시적으로 구분
     token_collection = None # 명시적으로 구분
+    usage_daily_collection = None
+    usage_monthly_collection = None
+    session_collection = None
+    bucket_collection = None
+    archive_collection = None
+    chat_layout: str = CHAT_STORAGE_LAYOUT
+    # analytics 프로필(read preference)로 읽는 집계 컬렉션 핸들
+    usage_daily_analytics = None
+    usage_monthly_analytics = None
+    pool_monitor: PoolMonitor = None
 
 mongo_db = MongoDB()
 
+def _write_concern(w: str, journal: bool = False) -> WriteConcern:
+    w_value = int(w) if w.isdigit() else w
+    if w_value == 0:
+        return WriteConcern(w=0) # 응답을 기다리지 않는 쓰기에는 j 를 지정할 수 없음
+    return WriteConcern(w=w_value, j=journal or None)
+
+def _read_preference(name: str):
+    modes = {
+        "primary": ReadPreference.PRIMARY,
+        "primarypreferred": ReadPreference.PRIMARY_PREFERRED,
+        "secondary": ReadPreference.SECONDARY,
+        "secondarypreferred": ReadPreference.SECONDARY_PREFERRED,
+        "nearest": ReadPreference.NEAREST,
+    }
+    if name.lower() not in modes:
+        raise ValueError(f"알 수 없는 read preference: {name}")
+    return modes[name.lower()]
+
+def _available_compressors() -> List[str]:
+    """MONGO_COMPRESSORS 중 사용할 수 있는 압축기만 선호 순서대로 반환합니다. (zlib 은 표준 라이브러리)"""
+    modules = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+    available = []
+    for name in (c.strip() for c in MONGO_COMPRESSORS.split(",") if c.strip()):
+        try:
+            __import__(modules[name])
+        except KeyError:
+            logger.warning(f"알 수 없는 Mongo 압축기 '{name}' 는 무시합니다.")
+            continue
+        except ImportError:
+            logger.info(f"Mongo 압축기 '{name}' 를 사용할 수 없어 제외합니다. (pip install {modules[name]})")
+            continue
+        available.append(name)
+    return available
+
+def _client_options() -> dict:
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxConnecting": MONGO_MAX_CONNECTING,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS or None,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS or None,
+        "appname": "my_chat_bot",
+    }
+    compressors = _available_compressors()
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+        if "zlib" in compressors:
+            options["zlibCompressionLevel"] = MONGO_ZLIB_LEVEL
+    return options
+
 async def connect_to_mongo():
     """애플리케이션 시작 시 MongoDB에 연결하고 컬렉션 및 인덱스를 설정합니다.""" # 설명 업데이트
     logger.info("MongoDB 연결 시도 중...")
+    if CHAT_STORAGE_LAYOUT not in CHAT_STORAGE_LAYOUTS:
+        raise ValueError(f"알 수 없는 채팅 기록 저장 형식: {CHAT_STORAGE_LAYOUT} ({', '.join(CHAT_STORAGE_LAYOUTS)} 중 하나)")
     try:
-        mongo_db.client = AsyncIOMotorClient(MONGO_URI)
+        options = _client_options()
+        mongo_db.pool_monitor = PoolMonitor(MONGO_MAX_POOL_SIZE)
+        mongo_db.client = AsyncIOMotorClient(MONGO_URI, event_listeners=[mongo_db.pool_monitor], **options)
         mongo_db.db = mongo_db.client[DB_NAME]
-        mongo_db.chat_collection = mongo_db.db[COLLECTION_NAME_CHAT]
-        mongo_db.token_collection = mongo_db.db[COLLECTION_NAME_TOKENS] # 토큰 컬렉션 할당
+        chat_profile = {"write_concern": _write_concern(MONGO_CHAT_WRITE_CONCERN, MONGO_CHAT_JOURNAL), "read_preference": ReadPreference.PRIMARY}
+        usage_profile = {"write_concern": _write_concern(MONGO_USAGE_WRITE_CONCERN)}
+        analytics_profile = {"read_preference": _read_preference(MONGO_ANALYTICS_READ_PREFERENCE)}
+        mongo_db.chat_collection = mongo_db.db.get_collection(COLLECTION_NAME_CHAT, **chat_profile)
+        mongo_db.token_collection = mongo_db.db.get_collection(COLLECTION_NAME_TOKENS, **usage_profile) # 토큰 컬렉션 할당
+        mongo_db.usage_daily_collection = mongo_db.db.get_collection(COLLECTION_NAME_USAGE_DAILY, **usage_profile)
+        mongo_db.usage_monthly_collection = mongo_db.db.get_collection(COLLECTION_NAME_USAGE_MONTHLY, **usage_profile)
+        mongo_db.session_collection = mongo_db.db.get_collection(COLLECTION_NAME_SESSIONS, **chat_profile)
+        mongo_db.bucket_collection = mongo_db.db.get_collection(COLLECTION_NAME_CHAT_BUCKETS, **chat_profile)
+        mongo_db.archive_collection = mongo_db.db.get_collection(COLLECTION_NAME_CHAT_ARCHIVES, **chat_profile)
+        mongo_db.chat_layout = CHAT_STORAGE_LAYOUT
+        mongo_db.usage_daily_analytics = mongo_db.db.get_collection(COLLECTION_NAME_USAGE_DAILY, **analytics_profile)
+        mongo_db.usage_monthly_analytics = mongo_db.db.get_collection(COLLECTION_NAME_USAGE_MONTHLY, **analytics_profile)
 
         # 연결 테스트
         await mongo_db.client.admin.command('ping')
-        logger.info("MongoDB 연결 성공!")
+        logger.info(
+            f"MongoDB 연결 성공! (풀 {MONGO_MIN_POOL_SIZE}~{MONGO_MAX_POOL_SIZE}, 스레드 {os.environ['MOTOR_MAX_WORKERS']}, 압축: {options.get('compressors', '없음')}, "
+            f"write concern chat={MONGO_CHAT_WRITE_CONCERN}/usage={MONGO_USAGE_WRITE_CONCERN}, analytics 읽기={MONGO_ANALYTICS_READ_PREFERENCE}, 기록 형식={CHAT_STORAGE_LAYOUT})"
+        )
 
         # --- 인덱스 생성 --- #
-        # chat_history 컬렉션 인덱스 (세션 조회 및 기록 조회 최적화)
-        await mongo_db.chat_collection.create_index([("conversation_id", 1), ("timestamp", -1)])
+        # chat_history 컬렉션 인덱스 (기록 조회 및 (timestamp, _id) keyset 페이지네이션 최적화)
+        await mongo_db.chat_collection.create_index([("conversation_id", 1), ("timestamp", -1), ("_id", -1)])
         logger.info(f"'{COLLECTION_NAME_CHAT}' 컬렉션 인덱스 생성/확인 완료.")
+        if mongo_db.chat_layout == "bucket":
+            await chat_buckets.ensure_indexes(mongo_db.bucket_collection)
+            logger.info(f"'{COLLECTION_NAME_CHAT_BUCKETS}' 컬렉션 인덱스 생성/확인 완료.")
 
-        # token_usages 컬렉션 인덱스 (세션별 조회 및 시간순 조회 최적화)
+        # token_usages 컬렉션 인덱스 (세션별 조회 및 시간순 조회 최적화, 보관 기간이 있으면 시간 인덱스가 TTL 인덱스)
         await mongo_db.token_collection.create_index([("session_id", 1)])
-        await mongo_db.token_collection.create_index([("timestamp", -1)])
-        logger.info(f"'{COLLECTION_NAME_TOKENS}' 컬렉션 인덱스 생성/확인 완료.")
+        await _ensure_ttl_index(mongo_db.token_collection, "timestamp", int(TOKEN_USAGE_RETENTION_DAYS * 86400))
+        logger.info(f"'{COLLECTION_NAME_TOKENS}' 컬렉션 인덱스 생성/확인 완료. (보관 기간: {TOKEN_USAGE_RETENTION_DAYS or '무제한'}일)")
+
+        # chat_sessions 컬렉션 인덱스 (최근 세션 순 keyset 페이지네이션, 삭제 대기 세션 조회)
+        await mongo_db.session_collection.create_index([("last_message_time", -1), ("_id", -1)])
+        await mongo_db.session_collection.create_index([("deleted_at", 1)], sparse=True)
+        if chat_archive.CHAT_ARCHIVE_IDLE_DAYS:
+            # 아카이브 대상 조회: archived_at 이 없는(null) 세션만 last_message_time 범위로 읽음
+            await mongo_db.session_collection.create_index([("archived_at", 1), ("last_message_time", 1)])
+        logger.info(f"'{COLLECTION_NAME_SESSIONS}' 컬렉션 인덱스 생성/확인 완료.")
+
+        # chat_archives 컬렉션 인덱스 (세그먼트 파일별 살아 있는 구간 조회)
+        await mongo_db.archive_collection.create_index([("file", 1)])
 
     except Exception as e:
         logger.error(f"MongoDB 연결 또는 인덱스 생성 실패: {e}", exc_info=True)
         raise
 
+async def _ensure_ttl_index(collection, field: str, seconds: int):
+    """field 단일 필드 인덱스를 seconds 초 후 만료되는 TTL 인덱스로 맞춥니다. seconds 가 0 이면 TTL 없는 인덱스로 되돌립니다.
+
+    같은 필드에는 인덱스를 하나만 둡니다. (TTL 인덱스도 범위 조회/정렬에 그대로 쓰임)
+    보관 기간을 바꾸면 collMod 로 만료 시간만 바꾸므로 인덱스를 다시 만들지 않습니다.
+    여러 워커가 동시에 시작해도 되도록, 이미 지워진 인덱스를 지우려다 난 오류는 무시합니다.
+    """
+    indexes = await collection.index_information()
+    ttl_name, plain_name = f"{field}_ttl", f"{field}_-1"
+    if seconds:
+        current = indexes.get(ttl_name)
+        if current is None:
+            await collection.create_index([(field, 1)], name=ttl_name, expireAfterSeconds=seconds)
+        elif current.get("expireAfterSeconds") != seconds:
+            await collection.database.command("collMod", collection.name, index={"name": ttl_name, "expireAfterSeconds": seconds})
+        stale = plain_name
+    else:
+        await collection.create_index([(field, -1)])
+        stale = ttl_name
+    if stale in indexes:
+        try:
+            await collection.drop_index(stale)
+            logger.info(f"'{collection.name}' 컬렉션의 인덱스 {stale} 삭제 (보관 기간 설정 변경)")
+        except OperationFailure as e:
+            logger.debug(f"인덱스 {stale} 삭제 건너뜀: {e}")
+
+def get_pool_stats() -> dict:
+    """현재 워커의 Mongo 커넥션 풀 사용률/대기열 통계를 반환합니다."""
+    return mongo_db.pool_monitor.stats() if mongo_db.pool_monitor else {}
+
 async def close_mongo_connection():
-    """애플리케이션 종료 시 MongoDB 연결을 닫습니다."""
+    """애플리케이션 종료 시 MongoDB 연결을 닫습니다. (진행 중인 세션 삭제 후속 정리를 잠시 기다림)"""
+    if _purge_tasks:
+        await asyncio.wait(set(_purge_tasks), timeout=10)
     if mongo_db.client:
         mongo_db.client.close()
         logger.info("MongoDB 연결 종료됨.")
 
+def _to_mongo_precision(timestamp: datetime) -> datetime:
+    """BSON datetime 은 밀리초 단위이므로, 캐시에 담는 값과 DB 값이 같도록 미리 잘라냅니다."""
+    return timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000)
+
+@traced("mongo.save_chat_message")
+@timed_operation("save_chat_message")
 async def save_chat_message(
     conversation_id: str,
     role: str,
-    content: str
+    content: str,
+    timestamp: Optional[datetime] = None,
+    token_count: Optional[int] = None
 ):
-    """채팅 메시지를 MongoDB에 저장합니다."""
+    """채팅 메시지를 MongoDB에 저장합니다.
+
+    timestamp 를 지정하면 저장 시각 대신 그 값을 사용합니다. (다른 작업과 겹쳐 저장할 때 순서 보장용)
+    token_count 를 지정하면 함께 저장해 컨텍스트 구성 시 다시 계산하지 않도록 합니다.
+    """
     if mongo_db.chat_collection is None: # chat_collection 확인
         logger.error("MongoDB chat 컬렉션이 초기화되지 않았습니다. 메시지 저장 실패.")
         return
     try:
         message_doc = {
+            "_id": ObjectId(), # 저장 형식과 상관없이 메시지 ID 를 미리 발급 (검색 색인과 공유)
             "conversation_id": conversation_id,
             "role": role,
             "content": content,
-            "timestamp": datetime.utcnow()
+            "timestamp": _to_mongo_precision(timestamp or datetime.utcnow())
         }
+        if token_count is not None:
+            message_doc["token_count"] = token_count
 
-        await mongo_db.chat_collection.insert_one(message_doc) # chat_collection 사용
+        await asyncio.gather(
+            _store_message(message_doc),
+            _update_session_on_message(message_doc),
+            search_index.index_message(message_doc),
+        )
+        version = await _bump_history_version(conversation_id)
+        history_cache.append(conversation_id, _context_message(message_doc), version) # 최근 기록 캐시 갱신 (write-through)
         logger.debug(f"메시지 저장됨: ConvID={conversation_id}, Role={role}")
     except Exception as e:
+        history_cache.invalidate(conversation_id) # 저장/버전 갱신 중 실패하면 캐시와 DB 가 어긋날 수 있으므로 버림
         logger.error(f"메시지 저장 실패: {e}", exc_info=True)
+        raise # 호출한 턴이 실패를 알 수 있도록 다시 발생 (사용자 메시지 없이 봇 응답만 남지 않게 함)
+
+async def _store_message(message_doc: dict):
+    if mongo_db.chat_layout == "bucket":
+        await chat_buckets.append_message(
+            mongo_db.bucket_collection, message_doc["conversation_id"], chat_buckets.bucket_message(message_doc)
+        )
+    else:
+        await mongo_db.chat_collection.insert_one(message_doc) # chat_collection 사용
+
+@traced("mongo.update_session_on_message")
+@timed_operation("update_session_on_message")
+async def _update_session_on_message(message_doc: dict):
+    """메시지 저장 시 세션 요약(마지막 메시지 시각, 메시지 수, 제목/미리보기)을 upsert 로 갱신합니다.
+
+    삭제 표시(deleted_at)가 남은 세션에 메시지가 오면(삭제 후 백그라운드 정리 전에 같은 ID 로 대화가 이어짐)
+    삭제된 대화의 요약/합계를 버리고 새 세션으로 다시 만듭니다. deleted_at 이 사라지므로 목록에 다시 보이고,
+    진행 중인 purge_deleted_session 은 세션 문서를 지우지 않습니다.
+    """
+    conversation_id = message_doc["conversation_id"]
+    update = {
+        "$max": {"last_message_time": message_doc["timestamp"]},
+        "$inc": {"message_count": 1},
+        "$set": {"preview": message_doc["content"][:SESSION_PREVIEW_LENGTH]},
+        "$setOnInsert": {"created_at": message_doc["timestamp"]},
+        "$unset": {"archived_at": ""}, # 새 메시지가 생기면 다시 아카이브 대상
+    }
+    if message_doc["role"] == "user":
+        update["$setOnInsert"]["title"] = message_doc["content"][:SESSION_TITLE_LENGTH]
+    live = {"_id": conversation_id, "deleted_at": {"$exists": False}}
+    try:
+        await mongo_db.session_collection.update_one(live, update, upsert=True)
+    except DuplicateKeyError: # 삭제 표시된 세션 문서가 있어 upsert 가 새 문서를 만들지 못함
+        revived = {"created_at": message_doc["timestamp"], "message_count": 0}
+        if "title" in update["$setOnInsert"]:
+            revived["title"] = update["$setOnInsert"]["title"]
+        await mongo_db.session_collection.replace_one({"_id": conversation_id, "deleted_at": {"$exists": True}}, revived)
+        await mongo_db.session_collection.update_one(live, update, upsert=True)
+        logger.info(f"ConvID={conversation_id} 삭제 정리 전에 새 메시지가 와서 세션을 다시 만들었습니다.")
+
+@traced("mongo.save_token_usage")
+@timed_operation("save_token_usage")
+async def save_token_usage(usage_doc: dict):
+    """토큰 사용량 문서를 'token_usages' 컬렉션에 저장하고 일별/월별 집계를 갱신합니다."""
+    if mongo_db.token_collection is None:
+        logger.error("MongoDB token 컬렉션이 초기화되지 않았습니다. 토큰 사용량 저장 실패.")
+        return
+    await mongo_db.token_collection.insert_one(usage_doc)
+    await _apply_usage_rollups(usage_doc)
+
+def _usage_increments(usage_doc: dict) -> dict:
+    input_tokens = usage_doc.get("input_tokens", 0)
+    output_tokens = usage_doc.get("output_tokens", 0)
+    saved_input_tokens = usage_doc.get("saved_input_tokens", 0)
+    saved_output_tokens = usage_doc.get("saved_output_tokens", 0)
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": usage_doc.get("total_tokens", 0),
+        # 모델별 가격으로 계산된 비용 (cost 가 없는 이전 문서는 기본 모델 가격)
+        "cost": usage_doc.get("cost", _default_cost(input_tokens, output_tokens)),
+        "requests": 1,
+        # 응답 캐시 히트 (비용 0, 모델 호출 시 들었을 토큰 수를 절감량으로 기록)
+        "cache_hits": 1 if usage_doc.get("cache_hit") else 0,
+        "saved_input_tokens": saved_input_tokens,
+        "saved_output_tokens": saved_output_tokens,
+        "saved_cost": usage_doc.get("saved_cost", _default_cost(saved_input_tokens, saved_output_tokens)),
+        "router_saved_tokens": usage_doc.get("router_saved_tokens", 0),
+        "router_saved_cost": usage_doc.get("router_saved_cost", 0),
+    }
+
+@traced("mongo.apply_usage_rollups")
+@timed_operation("apply_usage_rollups")
+async def _apply_usage_rollups(usage_doc: dict):
+    """토큰 사용량을 일별/월별 집계 문서와 세션 요약에 $inc 로 반영합니다."""
+    timestamp = usage_doc.get("timestamp") or datetime.utcnow()
+    increments = _usage_increments(usage_doc)
+    updates = [
+        mongo_db.usage_daily_collection.update_one(
+            {"_id": timestamp.strftime("%Y-%m-%d")}, {"$inc": increments}, upsert=True
+        ),
+        mongo_db.usage_monthly_collection.update_one(
+            {"_id": timestamp.strftime("%Y-%m")}, {"$inc": increments}, upsert=True
+        ),
+    ]
+    if usage_doc.get("session_id"):
+        # 세션별 토큰 합계 (세션 문서는 사용자 메시지 저장 시 이미 생성됨)
+        updates.append(mongo_db.session_collection.update_one(
+            {"_id": usage_doc["session_id"]},
+            {"$inc": {key: increments[key] for key in ("input_tokens", "output_tokens", "total_tokens", "cost")}},
+        ))
+    await asyncio.gather(*updates)
 
+# === 멀티 워커 기록 캐시 무효화 ===
+# 대화마다 공유 상태 백엔드에 버전 카운터를 두고 메시지 저장/삭제 시 1 씩 올립니다.
+# 각 워커의 history_cache 항목은 채울 때의 버전을 기억하고, 조회 시 버전이 다르면 미스로 처리합니다.
+# (memory 백엔드이면 버전을 쓰지 않고 기존처럼 동작)
+async def _history_version(conversation_id: str) -> Optional[int]:
+    if not is_shared():
+        return None
+    key = shared_key("history_version", conversation_id)
+    value = await shared_state.backend.get(key)
+    if value is None:
+        # 만료 후 다시 만들 때 이전 버전 번호와 겹치지 않도록 임의의 큰 값에서 시작
+        await shared_state.backend.set(key, str(random.getrandbits(48)), ttl=HISTORY_VERSION_TTL, nx=True)
+        value = await shared_state.backend.get(key)
+    return int(value)
+
+async def _bump_history_version(conversation_id: str) -> Optional[int]:
+    if not is_shared():
+        return None
+    await _history_version(conversation_id)
+    return await shared_state.backend.incr(shared_key("history_version", conversation_id), ttl=HISTORY_VERSION_TTL)
+
+def _context_message(doc: dict) -> dict:
+    """컨텍스트 구성에 필요한 필드만 남긴 메시지 dict 를 만듭니다."""
+    return {
+        "role": doc["role"],
+        "content": doc["content"],
+        "timestamp": doc.get("timestamp"),
+        "token_count": doc.get("token_count"),
+    }
+
+@traced("mongo.get_chat_history")
+@timed_operation("get_chat_history")
 async def get_chat_history(conversation_id: str, limit: int = 10) -> list:
-    """특정 대화 ID의 최근 채팅 기록을 가져옵니다."""
+    """특정 대화 ID의 최근 채팅 기록을 가져옵니다. 최근 기록 캐시에 있으면 DB 를 조회하지 않습니다.
+
+    각 메시지는 role, content, timestamp, token_count(저장된 경우) 를 포함합니다.
+    """
+    version = await _history_version(conversation_id)
+    cached = history_cache.get(conversation_id, limit, version)
+    if cached is not None:
+        logger.debug(f"{len(cached)}개의 채팅 기록 캐시 조회됨: ConvID={conversation_id}")
+        return cached
+
     if mongo_db.chat_collection is None: # chat_collection 확인
         logger.error("MongoDB chat 컬렉션이 초기화되지 않았습니다. 기록 조회 실패.")
         return []
+    # 캐시 링 버퍼를 채울 수 있도록 최소 HISTORY_CACHE_MESSAGES 개를 조회
+    fetch_limit = max(limit, HISTORY_CACHE_MESSAGES)
+    history_cache.begin_load(conversation_id)
     try:
-        cursor = mongo_db.chat_collection.find( # chat_collection 사용
-            {"conversation_id": conversation_id}
-        ).sort("timestamp", -1).limit(limit)
-        history = await cursor.to_list(length=limit)
+        # 아카이브 여부는 기록 조회와 동시에 확인 (아카이브된 대화면 복원 후 다시 조회)
+        history, archived = await asyncio.gather(_recent_messages(conversation_id, fetch_limit), _is_archived(conversation_id))
+        if archived and await rehydrate_conversation(conversation_id):
+            history = await _recent_messages(conversation_id, fetch_limit)
         history.reverse()
-        logger.debug(f"{len(history)}개의 채팅 기록 조회됨: ConvID={conversation_id}")
-        return [{"role": msg["role"], "content": msg["content"]} for msg in history]
+        messages = [_context_message(msg) for msg in history]
+        history_cache.finish_load(conversation_id, messages, fetch_limit, version)
+        logger.debug(f"{len(messages)}개의 채팅 기록 조회됨: ConvID={conversation_id}")
+        return messages[-limit:] if limit > 0 else []
     except Exception as e:
+        history_cache.cancel_load(conversation_id)
         logger.error(f"채팅 기록 조회 실패: {e}", exc_info=True)
         return []
 
-async def get_all_sessions() -> list:
-    """MongoDB에서 고유한 conversation_id 목록을 가져옵니다."""
-    if mongo_db.chat_collection is None: # chat_collection 확인
-        logger.error("MongoDB chat 컬렉션이 초기화되지 않았습니다. 세션 목록 조회 실패.")
+async def _recent_messages(conversation_id: str, fetch_limit: int) -> List[dict]:
+    """대화의 최근 메시지 문서를 최신순으로 최대 fetch_limit 개 조회합니다."""
+    if mongo_db.chat_layout == "bucket":
+        # 최신 버킷부터 읽어 fetch_limit 개를 채우면 중단 (보통 버킷 1~2개)
+        return await _take(chat_buckets.iter_messages(mongo_db.bucket_collection, conversation_id, descending=True), fetch_limit)
+    cursor = mongo_db.chat_collection.find( # chat_collection 사용
+        {"conversation_id": conversation_id}
+    ).sort([("timestamp", -1), ("_id", -1)]).limit(fetch_limit)
+    return await cursor.to_list(length=fetch_limit)
+
+@traced("mongo.get_session_summary")
+@timed_operation("get_session_summary")
+async def get_session_summary(conversation_id: str) -> Optional[dict]:
+    """세션 문서의 대화 요약 상태를 반환합니다. 세션이 없으면 None.
+
+    반환값: {"summary": 요약 또는 None, "summary_until": 요약에 포함된 마지막 메시지 시각(워터마크),
+            "summary_count": 워터마크까지의 메시지 수, "message_count": 전체 메시지 수}
+    """
+    if mongo_db.session_collection is None:
+        return None
+    doc = await mongo_db.session_collection.find_one(
+        {"_id": conversation_id}, {"summary": 1, "summary_until": 1, "summary_count": 1, "message_count": 1}
+    )
+    if not doc:
+        return None
+    return {
+        "summary": doc.get("summary"),
+        "summary_until": doc.get("summary_until"),
+        "summary_count": doc.get("summary_count", 0),
+        "message_count": doc.get("message_count", 0),
+    }
+
+@traced("mongo.save_session_summary")
+@timed_operation("save_session_summary")
+async def save_session_summary(conversation_id: str, summary: Optional[str], summary_until: Optional[datetime], summary_count: int):
+    """대화 요약과 워터마크(summary_until, summary_count)를 세션 문서에 저장합니다. 더 최신 요약이 이미 있으면 덮어쓰지 않습니다.
+
+    summary 가 None 이면 요약은 그대로 두고 summary_count 만 바로잡습니다. (요약할 메시지가 없었던 경우)
+    """
+    if mongo_db.session_collection is None:
+        logger.error("MongoDB session 컬렉션이 초기화되지 않았습니다. 요약 저장 실패.")
+        return
+    if summary is None:
+        await mongo_db.session_collection.update_one({"_id": conversation_id}, {"$set": {"summary_count": summary_count}})
+        return
+    await mongo_db.session_collection.update_one(
+        {"_id": conversation_id, "$or": [
+            {"summary_until": {"$exists": False}},
+            {"summary_until": {"$lt": summary_until}},
+        ]},
+        {"$set": {"summary": summary, "summary_until": summary_until, "summary_count": summary_count}},
+    )
+
+# 시각만으로 keyset 경계를 만들 때 쓰는 보조 키 (같은 시각의 메시지를 모두 포함/제외)
+_MIN_KEY, _MAX_KEY = str(ObjectId("0" * 24)), str(ObjectId("f" * 24))
+
+@traced("mongo.get_messages_between")
+@timed_operation("get_messages_between")
+async def get_messages_between(conversation_id: str, after: Optional[datetime], before: datetime, limit: int) -> List[dict]:
+    """after 보다 늦고 before 보다 이른 메시지를 시간순으로 최대 limit 개 조회합니다. (최근 기록 창 밖으로 밀려난 메시지 요약용)"""
+    if mongo_db.chat_collection is None:
+        logger.error("MongoDB chat 컬렉션이 초기화되지 않았습니다. 기록 조회 실패.")
         return []
+    docs = await _page_docs(
+        conversation_id, limit,
+        before=encode_cursor(before, _MIN_KEY),
+        after=encode_cursor(after, _MAX_KEY) if after else None,
+        newer_first=False,
+    )
+    return [_context_message(doc) for doc in docs]
+
+async def _take(iterator: AsyncIterator[dict], count: int) -> List[dict]:
+    """비동기 이터레이터에서 최대 count 개를 꺼내고 이터레이터(와 Motor 커서)를 닫습니다."""
+    items = []
+    if count <= 0:
+        return items
+    async with aclosing(iterator):
+        async for item in iterator:
+            items.append(item)
+            if len(items) >= count:
+                break
+    return items
+
+def _keyset_bound(cursor: Optional[str]) -> Optional[tuple]:
+    """before/after 커서를 (timestamp, ObjectId) 쌍으로 변환합니다. (버킷 형식용)"""
+    if not cursor:
+        return None
+    cursor_time, cursor_id = decode_cursor(cursor)
+    if not ObjectId.is_valid(cursor_id):
+        raise ValueError("Invalid cursor")
+    return cursor_time, ObjectId(cursor_id)
+
+def _history_range_query(conversation_id: str, before: Optional[str], after: Optional[str]) -> dict:
+    """before/after 커서를 (timestamp, _id) keyset 조건으로 변환합니다."""
+    conditions = [{"conversation_id": conversation_id}]
+    for cursor, op in ((before, "$lt"), (after, "$gt")):
+        if cursor:
+            cursor_time, cursor_id = decode_cursor(cursor)
+            if not ObjectId.is_valid(cursor_id):
+                raise ValueError("Invalid cursor")
+            conditions.append({"$or": [
+                {"timestamp": {op: cursor_time}},
+                {"timestamp": cursor_time, "_id": {op: ObjectId(cursor_id)}},
+            ]})
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+def _history_message(doc: dict) -> dict:
+    return {"id": str(doc["_id"]), "role": doc["role"], "content": doc["content"], "timestamp": doc["timestamp"]}
+
+@timed_operation("get_chat_history_page")
+async def get_chat_history_page(
+    conversation_id: str,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None
+) -> dict:
+    """대화 기록을 (timestamp, _id) keyset 으로 한 페이지 조회합니다. 메시지는 시간순으로 반환됩니다.
+
+    커서가 없거나 before 가 주어지면 가장 최근(또는 before 이전) 메시지부터, after 가 주어지면 그 이후 메시지를 조회합니다.
+    반환값: {"messages": [...], "prev_cursor": 더 오래된 페이지 커서, "next_cursor": 더 최근 페이지 커서}
+    """
+    if mongo_db.chat_collection is None:
+        logger.error("MongoDB chat 컬렉션이 초기화되지 않았습니다. 기록 조회 실패.")
+        raise ConnectionError("Database chat collection not available")
+    newer_first = after is None # after 페이지는 오래된 순으로 읽어야 커서 바로 다음 메시지부터 가져옴
+    docs, archived = await asyncio.gather(
+        _page_docs(conversation_id, limit + 1, before, after, newer_first), _is_archived(conversation_id)
+    )
+    if archived and await rehydrate_conversation(conversation_id):
+        docs = await _page_docs(conversation_id, limit + 1, before, after, newer_first)
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if newer_first:
+        docs.reverse()
+
+    prev_cursor = next_cursor = None
+    if docs:
+        if has_more or not newer_first:
+            prev_cursor = encode_cursor(docs[0]["timestamp"], str(docs[0]["_id"]))
+        if (has_more and not newer_first) or (before and newer_first):
+            next_cursor = encode_cursor(docs[-1]["timestamp"], str(docs[-1]["_id"]))
+    logger.debug(f"{len(docs)}개의 채팅 기록 페이지 조회됨: ConvID={conversation_id}")
+    return {"messages": [_history_message(doc) for doc in docs], "prev_cursor": prev_cursor, "next_cursor": next_cursor}
+
+async def _page_docs(conversation_id: str, count: int, before: Optional[str], after: Optional[str], newer_first: bool) -> List[dict]:
+    if mongo_db.chat_layout == "bucket":
+        return await _take(chat_buckets.iter_messages(
+            mongo_db.bucket_collection, conversation_id,
+            before=_keyset_bound(before), after=_keyset_bound(after), descending=newer_first,
+        ), count)
+    query = _history_range_query(conversation_id, before, after)
+    direction = -1 if newer_first else 1
+    return await mongo_db.chat_collection.find(query).sort(
+        [("timestamp", direction), ("_id", direction)]
+    ).limit(count).to_list(length=count)
+
+async def iter_chat_history(
+    conversation_id: str,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    batch_size: int = 200
+) -> AsyncIterator[dict]:
+    """대화 기록을 시간순으로 하나씩 반환합니다. 전체를 메모리에 올리지 않고 Motor 커서를 배치 단위로 순회합니다."""
+    if mongo_db.chat_collection is None:
+        logger.error("MongoDB chat 컬렉션이 초기화되지 않았습니다. 기록 조회 실패.")
+        raise ConnectionError("Database chat collection not available")
+    if await _is_archived(conversation_id):
+        await rehydrate_conversation(conversation_id)
+    if mongo_db.chat_layout == "bucket":
+        messages = chat_buckets.iter_messages(
+            mongo_db.bucket_collection, conversation_id,
+            before=_keyset_bound(before), after=_keyset_bound(after),
+            batch_size=max(1, batch_size // chat_buckets.CHAT_BUCKET_SIZE),
+        )
+        async with aclosing(messages):
+            async for message in messages:
+                yield _history_message(message)
+        return
+    query = _history_range_query(conversation_id, before, after)
+    cursor = mongo_db.chat_collection.find(query).sort([("timestamp", 1), ("_id", 1)]).batch_size(batch_size)
+    async for doc in cursor:
+        yield _history_message(doc)
+
+def encode_cursor(timestamp: datetime, key: str) -> str:
+    """(시각, 보조 키) 쌍을 keyset 페이지네이션용 불투명 커서 문자열로 인코딩합니다."""
+    raw = json.dumps({"t": timestamp.isoformat(), "k": key})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    """encode_cursor 로 만든 커서를 (datetime, 보조 키)로 되돌립니다. 잘못된 커서는 ValueError."""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return datetime.fromisoformat(raw["t"]), raw["k"]
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+@timed_operation("get_all_sessions")
+async def get_all_sessions(limit: int = 50, cursor: Optional[str] = None) -> dict:
+    """세션 요약 목록을 최근 메시지 순으로 한 페이지 가져옵니다.
+
+    반환값: {"sessions": [세션 요약 dict], "next_cursor": 다음 페이지 커서 또는 None}
+    """
+    if mongo_db.session_collection is None:
+        logger.error("MongoDB session 컬렉션이 초기화되지 않았습니다. 세션 목록 조회 실패.")
+        return {"sessions": [], "next_cursor": None}
+    query = {"deleted_at": {"$exists": False}} # 삭제 후속 정리 중인 세션 제외
+    if cursor:
+        # (last_message_time, _id) 내림차순 keyset: 커서 위치보다 뒤의 세션만 조회
+        last_time, last_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"last_message_time": {"$lt": last_time}},
+            {"last_message_time": last_time, "_id": {"$lt": last_id}},
+        ]
     try:
-        pipeline = [
-            { "$sort": { "timestamp": -1 } }, # 시간 역순 정렬
+        docs = await mongo_db.session_collection.find(query).sort(
+            [("last_message_time", -1), ("_id", -1)]
+        ).limit(limit + 1).to_list(length=limit + 1)
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = encode_cursor(docs[-1]["last_message_time"], docs[-1]["_id"])
+        sessions = [
             {
-                "$group": {
-                    "_id": "$conversation_id",
-                    "last_message_time": { "$first": "$timestamp" }
-                }
-            },
-            { "$sort": { "last_message_time": -1 } }, # 가장 최근 세션이 위로 오도록 정렬
-            { "$project": { "_id": 0, "conversation_id": "$_id" } } # conversation_id 필드만 선택
+                "conversation_id": doc["_id"],
+                "title": doc.get("title"),
+                "preview": doc.get("preview"),
+                "message_count": doc.get("message_count", 0),
+                "last_message_time": doc["last_message_time"],
+                "total_tokens": doc.get("total_tokens", 0),
+                "cost": doc.get("cost", _default_cost(doc.get("input_tokens", 0), doc.get("output_tokens", 0))),
+            }
+            for doc in docs
         ]
-        sessions = await mongo_db.chat_collection.aggregate(pipeline).to_list(length=None) # chat_collection 사용
-        session_ids = [s["conversation_id"] for s in sessions]
-        logger.info(f"{len(session_ids)}개의 세션 목록 조회됨")
-        return session_ids
+        logger.info(f"{len(sessions)}개의 세션 목록 조회됨")
+        return {"sessions": sessions, "next_cursor": next_cursor}
     except Exception as e:
         logger.error(f"세션 목록 조회 실패: {e}", exc_info=True)
-        return []
+        return {"sessions": [], "next_cursor": None}
+
+async def get_session_titles(conversation_ids: List[str]) -> dict:
+    """대화 ID 목록의 세션 제목을 {conversation_id: title} 로 반환합니다. (검색 결과 표시용)"""
+    if mongo_db.session_collection is None:
+        return {}
+    docs = await mongo_db.session_collection.find({"_id": {"$in": conversation_ids}}, {"title": 1}).to_list(length=None)
+    return {doc["_id"]: doc.get("title") for doc in docs}
+
+async def rebuild_sessions():
+    """chat_history(또는 chat_buckets) / token_usages 원본으로 세션 요약 컬렉션을 다시 계산합니다. (백필/복구용)"""
+    if mongo_db.chat_collection is None or mongo_db.token_collection is None:
+        logger.error("MongoDB 컬렉션이 초기화되지 않았습니다. 세션 요약 재생성 실패")
+        raise ConnectionError("Database collections not available")
+    if mongo_db.chat_layout == "bucket":
+        chat_source, unwind = mongo_db.bucket_collection, chat_buckets.UNWIND_STAGES
+    else:
+        chat_source, unwind = mongo_db.chat_collection, []
+    await chat_source.aggregate([
+        *unwind,
+        { "$sort": { "timestamp": 1 } },
+        {
+            "$group": {
+                "_id": "$conversation_id",
+                "created_at": { "$first": "$timestamp" },
+                "last_message_time": { "$last": "$timestamp" },
+                "message_count": { "$sum": 1 },
+                "title": { "$first": { "$cond": [{ "$eq": ["$role", "user"] }, "$content", None] } },
+                "preview": { "$last": "$content" }
+            }
+        },
+        {
+            "$set": {
+                "title": { "$substrCP": [{ "$ifNull": ["$title", ""] }, 0, SESSION_TITLE_LENGTH] },
+                "preview": { "$substrCP": ["$preview", 0, SESSION_PREVIEW_LENGTH] }
+            }
+        },
+        { "$merge": { "into": COLLECTION_NAME_SESSIONS, "whenMatched": "merge", "whenNotMatched": "insert" } }
+    ]).to_list(length=None)
+    # 백필은 usage 프로필(w=0 가능) 대신 기본 write concern 으로 $merge 결과를 확인
+    await mongo_db.db[COLLECTION_NAME_TOKENS].aggregate([
+        { "$match": { "session_id": { "$ne": None } } },
+        {
+            "$group": {
+                "_id": "$session_id",
+                "input_tokens": { "$sum": "$input_tokens" },
+                "output_tokens": { "$sum": "$output_tokens" },
+                "total_tokens": { "$sum": "$total_tokens" },
+                "cost": { "$sum": { "$ifNull": ["$cost", _default_cost_expr("input_tokens", "output_tokens")] } }
+            }
+        },
+        # 메시지가 남아 있는 세션에만 토큰 합계 반영
+        { "$merge": { "into": COLLECTION_NAME_SESSIONS, "whenMatched": "merge", "whenNotMatched": "discard" } }
+    ]).to_list(length=None)
+    session_count = await mongo_db.session_collection.count_documents({})
+    logger.info(f"세션 요약 재생성 완료: {session_count}개")
+    return session_count
+
+def _rollup_pipeline(date_format: str, target_collection: str, since: Optional[datetime] = None) -> list:
+    """token_usages 원본에서 집계 문서를 다시 계산해 target_collection 을 교체하는 파이프라인입니다.
 
-async def get_daily_usage_stats() -> List[dict]:
-    """일별 토큰 사용량 및 비용을 집계합니다.""" # 설명 수정
+    since 를 주면 그 시각 이후 원본만 다시 집계해 해당 기간의 집계 문서만 바꿉니다. (이전 기간 집계는 유지)
+    """
+    match = [{ "$match": { "timestamp": { "$gte": since } } }] if since else []
+    output = (
+        { "$merge": { "into": target_collection, "whenMatched": "replace", "whenNotMatched": "insert" } }
+        if since else { "$out": target_collection }
+    )
+    return [
+        *match,
+        {
+            "$group": {
+                "_id": {
+                    "$dateToString": { "format": date_format, "date": "$timestamp" }
+                },
+                "input_tokens": { "$sum": "$input_tokens" },
+                "output_tokens": { "$sum": "$output_tokens" },
+                "total_tokens": { "$sum": "$total_tokens" },
+                "cost": { "$sum": { "$ifNull": ["$cost", _default_cost_expr("input_tokens", "output_tokens")] } },
+                "requests": { "$sum": 1 },
+                "cache_hits": { "$sum": { "$cond": [{ "$ifNull": ["$cache_hit", False] }, 1, 0] } },
+                "saved_input_tokens": { "$sum": { "$ifNull": ["$saved_input_tokens", 0] } },
+                "saved_output_tokens": { "$sum": { "$ifNull": ["$saved_output_tokens", 0] } },
+                "saved_cost": { "$sum": { "$ifNull": ["$saved_cost", _default_cost_expr("saved_input_tokens", "saved_output_tokens")] } },
+                "router_saved_tokens": { "$sum": { "$ifNull": ["$router_saved_tokens", 0] } },
+                "router_saved_cost": { "$sum": { "$ifNull": ["$router_saved_cost", 0] } }
+            }
+        },
+        output
+    ]
+
+def _retained_usage_since() -> tuple:
+    """TTL 로 원본 일부가 만료된 기간을 피해, 원본이 온전히 남아 있는 첫 날/첫 달의 시작 시각을 반환합니다."""
+    cutoff = datetime.utcnow() - timedelta(days=TOKEN_USAGE_RETENTION_DAYS)
+    day = datetime(cutoff.year, cutoff.month, cutoff.day) + timedelta(days=1)
+    month = datetime(cutoff.year + cutoff.month // 12, cutoff.month % 12 + 1, 1)
+    return day, month
+
+async def rebuild_usage_rollups():
+    """token_usages 전체를 다시 집계하여 일별/월별 집계 컬렉션을 재생성합니다. (백필/복구용)
+
+    TOKEN_USAGE_RETENTION_DAYS 가 있으면 원본이 온전히 남아 있는 기간만 다시 집계하고, 그 이전 집계는 그대로 둡니다.
+    """
     if mongo_db.token_collection is None:
-        logger.error("MongoDB token 컬렉션이 초기화되지 않았습니다. 일별 통계 조회 실패")
+        logger.error("MongoDB token 컬렉션이 초기화되지 않았습니다. 집계 재생성 실패")
+        raise ConnectionError("Database token collection not available")
+    tokens = mongo_db.db[COLLECTION_NAME_TOKENS] # 기본 write concern 으로 $out 실행 (usage 프로필은 w=0 일 수 있음)
+    day_since, month_since = _retained_usage_since() if TOKEN_USAGE_RETENTION_DAYS else (None, None)
+    await tokens.aggregate(_rollup_pipeline("%Y-%m-%d", COLLECTION_NAME_USAGE_DAILY, day_since)).to_list(length=None)
+    await tokens.aggregate(_rollup_pipeline("%Y-%m", COLLECTION_NAME_USAGE_MONTHLY, month_since)).to_list(length=None)
+    daily_count = await mongo_db.usage_daily_collection.count_documents({})
+    monthly_count = await mongo_db.usage_monthly_collection.count_documents({})
+    logger.info(f"사용량 집계 재생성 완료: 일별 {daily_count}개, 월별 {monthly_count}개")
+    return daily_count, monthly_count
+
+async def _get_usage_rollups(collection, key_name: str, start: Optional[str], end: Optional[str]) -> List[dict]:
+    """집계 컬렉션에서 기간(_id 범위, 양 끝 포함)에 해당하는 통계를 조회하고 비용을 계산합니다."""
+    query = {}
+    if start or end:
+        query["_id"] = {}
+        if start:
+            query["_id"]["$gte"] = start
+        if end:
+            query["_id"]["$lte"] = end
+    docs = await collection.find(query).sort("_id", 1).to_list(length=None)
+    return [
+        {
+            key_name: doc["_id"],
+            "input_tokens": doc.get("input_tokens", 0),
+            "output_tokens": doc.get("output_tokens", 0),
+            "total_tokens": doc.get("total_tokens", 0),
+            # cost 없는 집계 문서는 모델별 비용 기록 이전의 것 (rebuild_usage_rollups 로 다시 만들면 채워짐)
+            "cost": doc.get("cost", _default_cost(doc.get("input_tokens", 0), doc.get("output_tokens", 0))),
+            "cache_hits": doc.get("cache_hits", 0),
+            "saved_tokens": doc.get("saved_input_tokens", 0) + doc.get("saved_output_tokens", 0),
+            "saved_cost": doc.get("saved_cost", _default_cost(doc.get("saved_input_tokens", 0), doc.get("saved_output_tokens", 0))),
+            "router_saved_tokens": doc.get("router_saved_tokens", 0),
+            "router_saved_cost": doc.get("router_saved_cost", 0),
+        }
+        for doc in docs
+    ]
+
+@timed_operation("get_daily_usage_stats")
+async def get_daily_usage_stats(start: Optional[str] = None, end: Optional[str] = None) -> List[dict]:
+    """일별 토큰 사용량 및 비용을 집계 컬렉션에서 조회합니다. (start/end: YYYY-MM-DD)"""
+    if mongo_db.usage_daily_collection is None:
+        logger.error("MongoDB 일별 집계 컬렉션이 초기화되지 않았습니다. 일별 통계 조회 실패")
         return []
     try:
-        pipeline = [
-            {
-                "$group": {
-                    "_id": {
-                        "$dateToString": { "format": "%Y-%m-%d", "date": "$timestamp" }
-                    },
-                    "total_input_tokens": { "$sum": "$input_tokens" },
-                    "total_output_tokens": { "$sum": "$output_tokens" },
-                    "total_tokens": { "$sum": "$total_tokens" }
-                    # 비용 계산은 $project 단계에서 합계된 토큰으로 수행
-                }
-            },
-            {
-                "$project": {
-                    "_id": 0,
-                    "date": "$_id",
-                    "input_tokens": "$total_input_tokens",
-                    "output_tokens": "$total_output_tokens",
-                    "total_tokens": "$total_tokens",
-                    # 비용 계산 추가
-                    "cost": {
-                        "$add": [
-                            { "$multiply": ["$total_input_tokens", PRICE_PER_TOKEN_INPUT] },
-                            { "$multiply": ["$total_output_tokens", PRICE_PER_TOKEN_OUTPUT] }
-                        ]
-                    }
-                }
-            },
-            { "$sort": { "date": 1 } }
-        ]
-        stats = await mongo_db.token_collection.aggregate(pipeline).to_list(length=None)
-        logger.info(f"{len(stats)}개의 일별 사용량/비용 통계 조회됨") # 로그 메시지 수정
+        stats = await _get_usage_rollups(mongo_db.usage_daily_analytics, "date", start, end)
+        logger.info(f"{len(stats)}개의 일별 사용량/비용 통계 조회됨")
         return stats
     except Exception as e:
-        logger.error(f"일별 사용량/비용 통계 조회 실패: {e}", exc_info=True) # 로그 메시지 수정
+        logger.error(f"일별 사용량/비용 통계 조회 실패: {e}", exc_info=True)
         return []
 
-async def get_monthly_usage_stats() -> List[dict]:
-    """월별 토큰 사용량 및 비용을 집계합니다.""" # 설명 수정
-    if mongo_db.token_collection is None:
-        logger.error("MongoDB token 컬렉션이 초기화되지 않았습니다. 월별 통계 조회 실패")
+@timed_operation("get_monthly_usage_stats")
+async def get_monthly_usage_stats(start: Optional[str] = None, end: Optional[str] = None) -> List[dict]:
+    """월별 토큰 사용량 및 비용을 집계 컬렉션에서 조회합니다. (start/end: YYYY-MM)"""
+    if mongo_db.usage_monthly_collection is None:
+        logger.error("MongoDB 월별 집계 컬렉션이 초기화되지 않았습니다. 월별 통계 조회 실패")
         return []
     try:
-        pipeline = [
-            {
-                "$group": {
-                    "_id": {
-                        "$dateToString": { "format": "%Y-%m", "date": "$timestamp" }
-                    },
-                    "total_input_tokens": { "$sum": "$input_tokens" },
-                    "total_output_tokens": { "$sum": "$output_tokens" },
-                    "total_tokens": { "$sum": "$total_tokens" }
-                    # 비용 계산은 $project 단계에서
-                }
-            },
-            {
-                "$project": {
-                    "_id": 0,
-                    "month": "$_id",
-                    "input_tokens": "$total_input_tokens",
-                    "output_tokens": "$total_output_tokens",
-                    "total_tokens": "$total_tokens",
-                    # 비용 계산 추가
-                    "cost": {
-                        "$add": [
-                            { "$multiply": ["$total_input_tokens", PRICE_PER_TOKEN_INPUT] },
-                            { "$multiply": ["$total_output_tokens", PRICE_PER_TOKEN_OUTPUT] }
-                        ]
-                    }
-                }
-            },
-            { "$sort": { "month": 1 } }
-        ]
-        stats = await mongo_db.token_collection.aggregate(pipeline).to_list(length=None)
-        logger.info(f"{len(stats)}개의 월별 사용량/비용 통계 조회됨") # 로그 메시지 수정
+        stats = await _get_usage_rollups(mongo_db.usage_monthly_analytics, "month", start, end)
+        logger.info(f"{len(stats)}개의 월별 사용량/비용 통계 조회됨")
         return stats
     except Exception as e:
-        logger.error(f"월별 사용량/비용 통계 조회 실패: {e}", exc_info=True) # 로그 메시지 수정
+        logger.error(f"월별 사용량/비용 통계 조회 실패: {e}", exc_info=True)
         return []
 
+async def iter_tool_usages(since: datetime, limit: int = 0) -> AsyncIterator[dict]:
+    """도구를 보낸 턴의 토큰 사용량(보낸/예측한/사용한 도구 포함)을 대화별, 시간순으로 반환합니다. (라우터 평가용)"""
+    tokens = mongo_db.db[COLLECTION_NAME_TOKENS]
+    cursor = tokens.find(
+        {"used_tools": {"$exists": True}, "timestamp": {"$gte": since}},
+        {"session_id": 1, "timestamp": 1, "route": 1, "offered_tools": 1, "predicted_tools": 1, "used_tools": 1, "fact_tools": 1},
+    ).sort([("session_id", 1), ("timestamp", 1)]).limit(limit)
+    async for doc in cursor:
+        yield doc
+
+# === 세션 삭제 (연쇄 삭제) ===
+# 1. 세션 문서에 deleted_at 을 표시해 목록에서 숨깁니다. (후속 정리가 중단되면 스위퍼가 이 표시로 찾아 이어서 처리)
+# 2. 채팅 기록(chat_history / chat_buckets), 아카이브 목록 항목, 검색 색인은 요청 안에서 지웁니다. (대화 단위 일괄 삭제)
+# 3. token_usages 삭제와 일별/월별 집계 차감, 세션 문서 삭제는 백그라운드에서 USAGE_PURGE_BATCH 개씩 진행합니다.
+_purge_tasks: Set[asyncio.Task] = set()
+
+@timed_operation("delete_chat_history_by_id")
 async def delete_chat_history_by_id(conversation_id: str) -> int:
-    """Deletes all chat messages for a specific conversation ID."""
+    """대화의 채팅 기록(아카이브 포함)을 삭제하고, 토큰 사용량/집계/세션 정리를 백그라운드로 시작합니다.
+
+    반환값: 삭제된 메시지 수
+    """
     if mongo_db.chat_collection is None: # chat_collection 확인
         logger.error("MongoDB chat 컬렉션이 초기화되지 않았습니다. 기록 삭제 실패.")
         raise ConnectionError("Database chat collection not available")
@@ -216,10 +893,358 @@ async def delete_chat_history_by_id(conversation_id: str) -> int:
         return 0 # 삭제할 ID가 없으므로 0 반환
 
     try:
-        delete_result = await mongo_db.chat_collection.delete_many({"conversation_id": conversation_id}) # chat_collection 사용
-        deleted_count = delete_result.deleted_count
+        history_cache.invalidate(conversation_id)
+        deleted_at = _to_mongo_precision(datetime.utcnow())
+        await mongo_db.session_collection.update_one({"_id": conversation_id}, {"$set": {"deleted_at": deleted_at}})
+        deleted_count = await _delete_conversation_data(conversation_id)
+        await _bump_history_version(conversation_id) # 다른 워커의 캐시 항목 무효화
+        _schedule_purge(conversation_id, deleted_at)
         logger.info(f"ConvID={conversation_id}의 채팅 기록 {deleted_count}개가 삭제되었습니다.")
         return deleted_count
     except Exception as e:
+        history_cache.invalidate(conversation_id)
         logger.error(f"ConvID={conversation_id} 기록 삭제 중 오류 발생: {e}", exc_info=True)
-        raise
\ No newline at end of file
+        raise
+
+async def _delete_conversation_data(conversation_id: str) -> int:
+    """채팅 기록, 아카이브 목록 항목, 검색 색인을 지우고 삭제된 메시지 수를 반환합니다. (반복 실행해도 결과가 같음)"""
+    hot_count, archived, _ = await asyncio.gather(
+        _delete_messages(conversation_id),
+        mongo_db.archive_collection.find_one_and_delete({"_id": conversation_id}), # 파일의 구간은 다음 정리(compact) 때 제거
+        search_index.delete_conversation(conversation_id),
+    )
+    return hot_count + (archived["message_count"] if archived else 0)
+
+async def _delete_messages(conversation_id: str, until: Optional[datetime] = None) -> int:
+    """대화의 메시지를 삭제합니다. until 을 주면 그 시각까지의 메시지만 삭제합니다. (아카이브용)"""
+    if mongo_db.chat_layout == "bucket":
+        return await chat_buckets.delete_conversation(mongo_db.bucket_collection, conversation_id, until)
+    query = {"conversation_id": conversation_id}
+    if until is not None:
+        query["timestamp"] = {"$lte": until}
+    delete_result = await mongo_db.chat_collection.delete_many(query) # chat_collection 사용
+    return delete_result.deleted_count
+
+def _schedule_purge(conversation_id: str, deleted_at: datetime):
+    task = asyncio.create_task(purge_deleted_session(conversation_id, deleted_at))
+    _purge_tasks.add(task)
+    task.add_done_callback(_purge_tasks.discard)
+
+async def purge_deleted_session(conversation_id: str, deleted_at: datetime) -> int:
+    """삭제 표시된 세션의 token_usages 를 배치 단위로 지우고 일별/월별 집계에서 빼낸 뒤 세션 문서를 지웁니다.
+
+    삭제 시각 이후의 사용량(삭제 후 같은 ID 로 이어진 대화)은 남깁니다.
+    배치마다 먼저 지우고 집계를 빼므로, 도중에 중단되면 집계가 실제보다 크게 남을 수 있으며 rebuild_usage_rollups 로 바로잡습니다.
+    실패해도 예외를 올리지 않으며, 세션의 삭제 표시가 남아 있으므로 스위퍼가 다시 시도합니다.
+    반환값: 삭제한 token_usages 문서 수
+    """
+    tokens = mongo_db.db[COLLECTION_NAME_TOKENS] # 삭제 수를 확인해야 하므로 기본 write concern (usage 프로필은 w=0 일 수 있음)
+    query = {"session_id": conversation_id, "timestamp": {"$lte": deleted_at}}
+    fields = {"timestamp": 1, "input_tokens": 1, "output_tokens": 1, "total_tokens": 1, "cost": 1,
+              "cache_hit": 1, "saved_input_tokens": 1, "saved_output_tokens": 1, "saved_cost": 1,
+              "router_saved_tokens": 1, "router_saved_cost": 1}
+    purged = 0
+    try:
+        while True:
+            docs = await tokens.find(query, fields).limit(USAGE_PURGE_BATCH).to_list(length=USAGE_PURGE_BATCH)
+            if not docs:
+                break
+            result = await tokens.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+            if result.deleted_count == len(docs):
+                await _subtract_usage_rollups(docs)
+            else:
+                logger.warning(
+                    f"ConvID={conversation_id} 토큰 사용량 일부가 이미 삭제되어 집계 차감을 건너뜁니다. "
+                    "(rebuild_usage_rollups 로 재계산 필요)"
+                )
+            purged += result.deleted_count
+            if len(docs) < USAGE_PURGE_BATCH:
+                break
+        # 삭제 후 같은 ID 로 새 대화가 시작됐다면 지우지 않음
+        #  - 새 메시지가 세션을 다시 만들었으면 deleted_at 이 없음 (_update_session_on_message)
+        #  - 다시 삭제됐으면 deleted_at 이 다름
+        #  - 삭제 표시 이후 시각의 메시지가 기록됐으면 last_message_time 이 deleted_at 보다 큼
+        await mongo_db.session_collection.delete_one({
+            "_id": conversation_id,
+            "deleted_at": deleted_at,
+            "$or": [{"last_message_time": {"$exists": False}}, {"last_message_time": {"$lte": deleted_at}}],
+        })
+        logger.info(f"ConvID={conversation_id} 삭제 후속 정리 완료: 토큰 사용량 {purged}개")
+    except Exception as e:
+        logger.error(f"ConvID={conversation_id} 삭제 후속 정리 실패 (스위퍼가 다시 시도): {e}", exc_info=True)
+    return purged
+
+async def _subtract_usage_rollups(usage_docs: List[dict]):
+    """삭제한 토큰 사용량을 일별/월별 집계 문서에서 $inc 로 뺍니다."""
+    daily, monthly = {}, {}
+    for doc in usage_docs:
+        increments = _usage_increments(doc)
+        for totals, key in ((daily, doc["timestamp"].strftime("%Y-%m-%d")), (monthly, doc["timestamp"].strftime("%Y-%m"))):
+            total = totals.setdefault(key, dict.fromkeys(increments, 0))
+            for name, value in increments.items():
+                total[name] -= value
+    await asyncio.gather(
+        mongo_db.usage_daily_collection.bulk_write([UpdateOne({"_id": key}, {"$inc": inc}) for key, inc in daily.items()], ordered=False),
+        mongo_db.usage_monthly_collection.bulk_write([UpdateOne({"_id": key}, {"$inc": inc}) for key, inc in monthly.items()], ordered=False),
+    )
+
+async def purge_pending_sessions(marked_before: datetime, limit: int) -> int:
+    """deleted_at 이 marked_before 이전인데 남아 있는 세션(후속 정리가 중단된 삭제)을 최대 limit 개 다시 정리합니다."""
+    sessions = await mongo_db.session_collection.find(
+        {"deleted_at": {"$lt": marked_before}}, {"deleted_at": 1}
+    ).limit(limit).to_list(length=limit)
+    for session in sessions:
+        # 요청 안에서 끝나지 못한 단계도 다시 실행 (반복해도 결과가 같음)
+        await _delete_conversation_data(session["_id"])
+        await purge_deleted_session(session["_id"], session["deleted_at"])
+    return len(sessions)
+
+async def delete_expired_conversations(idle_before: datetime, limit: int) -> int:
+    """마지막 메시지가 idle_before 이전인 대화를 최대 limit 개 연쇄 삭제합니다. (보관 기간 만료)"""
+    sessions = await mongo_db.session_collection.find(
+        {"last_message_time": {"$lt": idle_before}, "deleted_at": {"$exists": False}}, {"_id": 1}
+    ).sort([("last_message_time", 1)]).limit(limit).to_list(length=limit)
+    for session in sessions:
+        await delete_chat_history_by_id(session["_id"])
+    return len(sessions)
+
+# === 아카이브 (cold tier) ===
+# 오래 쓰이지 않은 대화는 메시지를 압축 아카이브 파일(db/chat_archive.py)로 옮기고 chat_archives 에 위치를 기록합니다.
+# 세션 문서와 검색 색인은 남기므로 세션 목록/검색에는 그대로 나오며, 기록을 읽을 때(get_chat_history,
+# get_chat_history_page, iter_chat_history) 아카이브 목록에 있으면 먼저 복원한 뒤 읽습니다.
+# 세션의 archived_at 은 아카이브 후 새 메시지가 없었다는 표시이며 새 메시지가 저장되면 지워집니다.
+
+async def _is_archived(conversation_id: str) -> bool:
+    if mongo_db.archive_collection is None:
+        return False
+    return await mongo_db.archive_collection.find_one({"_id": conversation_id}, {"_id": 1}) is not None
+
+async def _conversation_messages(conversation_id: str) -> List[dict]:
+    """대화의 메시지 문서 전체를 시간순으로 조회합니다. (token_count 등 저장된 필드 포함)"""
+    if mongo_db.chat_layout == "bucket":
+        messages = chat_buckets.iter_messages(mongo_db.bucket_collection, conversation_id)
+        async with aclosing(messages):
+            return [message async for message in messages]
+    return await mongo_db.chat_collection.find(
+        {"conversation_id": conversation_id}, {"conversation_id": 0}
+    ).sort([("timestamp", 1), ("_id", 1)]).to_list(length=None)
+
+async def _read_archived(entry: dict) -> tuple:
+    """아카이브 목록 항목의 메시지를 읽어 (항목, 메시지 목록)을 반환합니다."""
+    try:
+        return entry, await chat_archive.read_conversation(entry)
+    except FileNotFoundError:
+        # 정리(compact)로 세그먼트가 바뀌었으면 목록의 새 위치에서 다시 읽음
+        entry = await mongo_db.archive_collection.find_one({"_id": entry["_id"]})
+        if entry is None:
+            return None, []
+        return entry, await chat_archive.read_conversation(entry)
+
+async def get_archived_messages(conversation_id: str) -> Optional[List[dict]]:
+    """아카이브된 대화의 메시지 목록(시간순)을 복원하지 않고 읽습니다. 아카이브되지 않은 대화면 None."""
+    entry = await mongo_db.archive_collection.find_one({"_id": conversation_id})
+    if entry is None:
+        return None
+    _, messages = await _read_archived(entry)
+    return messages
+
+@traced("mongo.rehydrate_conversation")
+@timed_operation("rehydrate_conversation")
+async def rehydrate_conversation(conversation_id: str) -> int:
+    """아카이브된 대화의 메시지를 현재 저장 형식(CHAT_STORAGE_LAYOUT)으로 되돌리고 아카이브 목록에서 뺍니다.
+
+    메시지(버킷 형식이면 첫 메시지) _id 를 그대로 쓰고 없는 문서만 넣으므로($setOnInsert),
+    여러 요청이 동시에 복원하거나 중간에 실패한 복원을 다시 실행해도 중복되지 않습니다.
+    반환값: 복원한 메시지 수 (아카이브되지 않은 대화면 0)
+    """
+    entry = await mongo_db.archive_collection.find_one({"_id": conversation_id})
+    if entry is None:
+        return 0
+    entry, messages = await _read_archived(entry)
+    if entry is None:
+        return 0 # 다른 요청이 먼저 복원함
+    if mongo_db.chat_layout == "bucket":
+        collection, requests = mongo_db.bucket_collection, []
+        for start in range(0, len(messages), chat_buckets.CHAT_BUCKET_SIZE):
+            chunk = [chat_buckets.bucket_message(message) for message in messages[start:start + chat_buckets.CHAT_BUCKET_SIZE]]
+            requests.append(UpdateOne(
+                {"_id": chunk[0]["_id"]}, {"$setOnInsert": chat_buckets.make_bucket(conversation_id, chunk)}, upsert=True
+            ))
+    else:
+        collection = mongo_db.chat_collection
+        requests = [
+            UpdateOne({"_id": message["_id"]}, {"$setOnInsert": {k: v for k, v in message.items() if k != "_id"}}, upsert=True)
+            for message in messages
+        ]
+    if requests:
+        await collection.bulk_write(requests, ordered=False)
+    await mongo_db.archive_collection.delete_one({"_id": conversation_id, "file": entry["file"], "offset": entry["offset"]})
+    await mongo_db.session_collection.update_one({"_id": conversation_id}, {"$unset": {"archived_at": ""}})
+    logger.info(f"ConvID={conversation_id} 아카이브 복원: 메시지 {len(messages)}개 ({entry['file']})")
+    return len(messages)
+
+async def archive_idle_conversations(idle_before: datetime, limit: int, directory: str = chat_archive.CHAT_ARCHIVE_DIR) -> dict:
+    """마지막 메시지가 idle_before 이전인 대화를 최대 limit 개 새 아카이브 세그먼트로 옮깁니다.
+
+    순서: 메시지를 읽어 세그먼트에 쓰고 fsync -> 아카이브 목록에 추가 -> 세션이 그대로일 때만(새 메시지/삭제 없음)
+    archived_at 표시 -> 그 시각까지의 메시지 삭제. 표시에 실패하면 목록 항목을 되돌리고 원본을 그대로 둡니다.
+    어느 단계에서 중단되어도 원본이 지워지기 전에는 파일과 목록이 먼저 남아 있으므로 기록이 유실되지 않습니다.
+    반환값: {"conversations", "messages", "raw_bytes", "archived_bytes", "skipped"}
+    """
+    stats = {"conversations": 0, "messages": 0, "raw_bytes": 0, "archived_bytes": 0, "skipped": 0}
+    sessions = await mongo_db.session_collection.find(
+        {"archived_at": None, "last_message_time": {"$lt": idle_before}, "deleted_at": {"$exists": False}},
+        {"last_message_time": 1},
+    ).sort([("archived_at", 1), ("last_message_time", 1)]).limit(limit).to_list(length=limit)
+    if not sessions:
+        return stats
+
+    writer = chat_archive.ArchiveWriter(directory)
+    staged = []
+    try:
+        for session in sessions:
+            messages = await _conversation_messages(session["_id"])
+            location = await writer.append(session["_id"], messages) if messages else None
+            staged.append((session, len(messages), location))
+        await writer.sync()
+    finally:
+        await writer.close()
+
+    archived_at = _to_mongo_precision(datetime.utcnow())
+    for session, message_count, location in staged:
+        conversation_id, last_message_time = session["_id"], session["last_message_time"]
+        if location is not None:
+            try:
+                await mongo_db.archive_collection.insert_one({
+                    "_id": conversation_id, "file": location["file"], "offset": location["offset"], "length": location["length"],
+                    "message_count": message_count, "last_message_time": last_message_time, "archived_at": archived_at,
+                })
+            except DuplicateKeyError:
+                # 이전 아카이브가 복원되지 않은 채 새 메시지가 저장됨: 이전 아카이브를 합쳐 두고 다음 실행에서 다시 아카이브
+                await rehydrate_conversation(conversation_id)
+                stats["skipped"] += 1
+                continue
+        marked = await mongo_db.session_collection.update_one(
+            {"_id": conversation_id, "last_message_time": last_message_time, "archived_at": None, "deleted_at": {"$exists": False}},
+            {"$set": {"archived_at": archived_at}},
+        )
+        if not marked.modified_count:
+            if location is not None:
+                await mongo_db.archive_collection.delete_one({"_id": conversation_id, "file": location["file"]})
+            stats["skipped"] += 1 # 그 사이 새 메시지가 저장되었거나 삭제됨
+            continue
+        if location is not None:
+            await _delete_messages(conversation_id, until=last_message_time)
+            stats["raw_bytes"] += location["raw_bytes"]
+            stats["archived_bytes"] += location["length"]
+        stats["conversations"] += 1
+        stats["messages"] += message_count
+    logger.info(
+        f"대화 아카이브 완료 ({writer.file}): 대화 {stats['conversations']}개, 메시지 {stats['messages']}개, "
+        f"{stats['raw_bytes']} -> {stats['archived_bytes']} bytes, 건너뜀 {stats['skipped']}개"
+    )
+    return stats
+
+async def compact_archive_segments(directory: str = chat_archive.CHAT_ARCHIVE_DIR, min_age: float = 600) -> dict:
+    """복원/삭제로 죽은 구간이 생긴 세그먼트의 살아 있는 구간만 새 세그먼트로 복사하고 원래 파일을 지웁니다.
+
+    삭제된 대화의 원문이 파일에 남지 않도록 죽은 구간이 있으면 비율과 상관없이 정리합니다. (압축 프레임을 그대로 복사)
+    최근 min_age 초 안에 바뀐 세그먼트는 다른 워커의 스위퍼가 아직 쓰는 중일 수 있으므로 건너뜁니다.
+    반환값: {"segments": 다시 쓴 세그먼트 수, "removed": 통째로 지운 세그먼트 수, "reclaimed_bytes"}
+    """
+    stats = {"segments": 0, "removed": 0, "reclaimed_bytes": 0}
+    modified_before = time.time() - min_age
+    for file, info in (await asyncio.to_thread(chat_archive.list_segments, directory)).items():
+        if info["modified"] > modified_before:
+            continue
+        entries = await mongo_db.archive_collection.find({"file": file}, {"offset": 1, "length": 1}).sort("offset", 1).to_list(length=None)
+        live_bytes = sum(entry["length"] for entry in entries)
+        if live_bytes >= info["size"]:
+            continue
+        if entries:
+            writer = chat_archive.ArchiveWriter(directory, codec=chat_archive.codec_of(file))
+            moved = []
+            try:
+                for entry in entries:
+                    frame = await chat_archive.read_frame({**entry, "file": file}, directory)
+                    moved.append((entry, await writer.append_frame(frame)))
+                await writer.sync()
+            finally:
+                await writer.close()
+            await mongo_db.archive_collection.bulk_write([
+                UpdateOne({"_id": entry["_id"], "file": file, "offset": entry["offset"]}, {"$set": {"file": location["file"], "offset": location["offset"]}})
+                for entry, location in moved
+            ], ordered=False)
+        else:
+            stats["removed"] += 1
+        await asyncio.to_thread(chat_archive.remove_segment, file, directory)
+        stats["segments"] += 1
+        stats["reclaimed_bytes"] += info["size"] - live_bytes
+    if stats["segments"]:
+        logger.info(f"아카이브 세그먼트 정리: {stats['segments']}개 (삭제 {stats['removed']}개), {stats['reclaimed_bytes']} bytes 회수")
+    return stats
+
+async def get_archive_stats(directory: str = chat_archive.CHAT_ARCHIVE_DIR) -> dict:
+    """아카이브된 대화 수와 세그먼트 파일 수/크기를 반환합니다."""
+    segments = await asyncio.to_thread(chat_archive.list_segments, directory)
+    return {
+        "conversations": await mongo_db.archive_collection.count_documents({}) if mongo_db.archive_collection is not None else 0,
+        "segments": len(segments),
+        "bytes": sum(info["size"] for info in segments.values()),
+    }
+
+async def migrate_chat_storage(target: str, conversation_ids: Optional[List[str]] = None) -> dict:
+    """채팅 기록을 다른 저장 형식으로 복사합니다. (원본은 남겨 두며, 대화 단위로 다시 실행해도 결과가 같음)
+
+    target="bucket": chat_history 의 메시지를 대화별로 시간순 CHAT_BUCKET_SIZE 개씩 묶어 chat_buckets 에 씁니다.
+    (대상 대화의 기존 버킷은 먼저 지움)
+    target="message": chat_buckets 의 메시지를 원래 _id 그대로 chat_history 에 upsert 합니다.
+    메시지 _id 가 유지되므로 기존 페이지네이션 커서도 그대로 쓸 수 있습니다.
+    이전 중 새로 저장되는 메시지는 옮겨지지 않으므로 쓰기를 멈춘 상태에서 실행한 뒤 CHAT_STORAGE_LAYOUT 을 바꾸세요.
+    반환값: {"conversations": 대화 수, "messages": 메시지 수, "buckets": 버킷 수}
+    """
+    if target not in CHAT_STORAGE_LAYOUTS:
+        raise ValueError(f"알 수 없는 채팅 기록 저장 형식: {target}")
+    if mongo_db.chat_collection is None or mongo_db.bucket_collection is None:
+        logger.error("MongoDB 컬렉션이 초기화되지 않았습니다. 채팅 기록 이전 실패")
+        raise ConnectionError("Database collections not available")
+    query = {"conversation_id": {"$in": conversation_ids}} if conversation_ids else {}
+    stats = {"conversations": 0, "messages": 0, "buckets": 0}
+    if target == "bucket":
+        await chat_buckets.ensure_indexes(mongo_db.bucket_collection)
+        # (conversation_id, timestamp, _id) 인덱스를 역방향으로 읽어 대화별 시간순으로 순회
+        cursor = mongo_db.chat_collection.find(query).sort([("conversation_id", -1), ("timestamp", 1), ("_id", 1)])
+        current, chunk = None, []
+
+        async def flush():
+            if chunk:
+                await mongo_db.bucket_collection.insert_one(chat_buckets.make_bucket(current, list(chunk)))
+                stats["buckets"] += 1
+                chunk.clear()
+
+        async for doc in cursor:
+            if doc["conversation_id"] != current:
+                await flush()
+                current = doc["conversation_id"]
+                await mongo_db.bucket_collection.delete_many({"conversation_id": current})
+                stats["conversations"] += 1
+            chunk.append(chat_buckets.bucket_message(doc))
+            stats["messages"] += 1
+            if len(chunk) >= chat_buckets.CHAT_BUCKET_SIZE:
+                await flush()
+        await flush()
+    else:
+        seen = set()
+        async for bucket in mongo_db.bucket_collection.find(query):
+            requests = [
+                ReplaceOne({"_id": message["_id"]}, {**message, "conversation_id": bucket["conversation_id"]}, upsert=True)
+                for message in bucket.get("messages", [])
+            ]
+            if requests:
+                await mongo_db.chat_collection.bulk_write(requests, ordered=False)
+            seen.add(bucket["conversation_id"])
+            stats["messages"] += len(requests)
+            stats["buckets"] += 1
+        stats["conversations"] = len(seen)
+    logger.info(f"채팅 기록 이전 완료 ({target}): 대화 {stats['conversations']}개, 메시지 {stats['messages']}개, 버킷 {stats['buckets']}개")
+    return stats
@@ -0,0 +1,114 @@
+import threading
+from collections import deque
+from typing import Any, Dict
+
+from pymongo import monitoring
+
+from services.metrics_service import (
+    MONGO_POOL_CONNECTIONS, MONGO_POOL_CHECKED_OUT, MONGO_POOL_WAITING,
+    MONGO_POOL_CHECKOUT_SECONDS, MONGO_POOL_CHECKOUT_FAILED,
+)
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Mongo 커넥션 풀 이벤트로 열린 커넥션 수, 사용 중인 커넥션 수, 체크아웃 대기열을 집계합니다.
+
+    pymongo 의 작업 스레드에서 호출되므로 카운터 갱신은 락으로 보호합니다.
+    레플리카셋이면 서버마다 풀이 따로 있으며, 여기서는 모든 서버의 합계를 유지합니다.
+    """
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.max_checked_out_seen = 0
+        self.max_waiting_seen = 0
+        self.checkouts = 0
+        self.failed: Dict[str, int] = {}
+        self.cleared = 0
+        self._wait_times = deque(maxlen=1000) # 최근 체크아웃 대기 시간 (초)
+        self._failed_counters = {
+            reason: MONGO_POOL_CHECKOUT_FAILED.labels(reason)
+            for reason in ("timeout", "poolClosed", "connectionError")
+        }
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+        MONGO_POOL_CONNECTIONS.inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+        MONGO_POOL_CONNECTIONS.dec()
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting_seen = max(self.max_waiting_seen, self.waiting)
+        MONGO_POOL_WAITING.inc()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.failed[event.reason] = self.failed.get(event.reason, 0) + 1
+        MONGO_POOL_WAITING.dec()
+        counter = self._failed_counters.get(event.reason)
+        if counter is not None:
+            counter.inc()
+
+    def connection_checked_out(self, event):
+        duration = getattr(event, "duration", None) # pymongo 4.7 이상
+        with self._lock:
+            self.waiting -= 1
+            self.checked_out += 1
+            self.checkouts += 1
+            self.max_checked_out_seen = max(self.max_checked_out_seen, self.checked_out)
+            if duration is not None:
+                self._wait_times.append(duration)
+        MONGO_POOL_WAITING.dec()
+        MONGO_POOL_CHECKED_OUT.inc()
+        if duration is not None:
+            MONGO_POOL_CHECKOUT_SECONDS.observe(duration)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+        MONGO_POOL_CHECKED_OUT.dec()
+
+    def stats(self) -> Dict[str, Any]:
+        """풀 사용률(사용 중 / 최대 풀 크기), 대기열 길이, 체크아웃 대기 시간(평균/p99/최대) 통계를 반환합니다."""
+        with self._lock:
+            waits = sorted(self._wait_times)
+            return {
+                "max_pool_size": self.max_pool_size,
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "utilization": self.checked_out / self.max_pool_size if self.max_pool_size else 0.0,
+                "max_checked_out": self.max_checked_out_seen,
+                "wait_queue": self.waiting,
+                "max_wait_queue": self.max_waiting_seen,
+                "checkouts": self.checkouts,
+                "checkout_failed": dict(self.failed),
+                "pool_cleared": self.cleared,
+                "checkout_wait_avg": sum(waits) / len(waits) if waits else 0.0,
+                "checkout_wait_p99": waits[min(len(waits) - 1, int(len(waits) * 0.99))] if waits else 0.0,
+                "checkout_wait_max": waits[-1] if waits else 0.0,
+            }
@@ -0,0 +1,234 @@
+import os
+import re
+import asyncio
+import sqlite3
+import logging
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "true").lower() == "true" # 메시지 저장 시 검색 색인 갱신
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "data/search_index.db") # 검색 색인 SQLite 파일 (같은 호스트의 워커끼리 공유)
+SEARCH_SCAN_BATCH = 500 # 색인 목록을 한 번에 읽는 행 수
+
+_WORD = re.compile(r"[^\W_]+") # 문자/숫자 연속 구간 (FTS5 unicode61 토크나이저가 구분자로 보는 '_' 제외)
+
+def normalize(text: str) -> str:
+    """색인/검색 공통 정규화 (NFKC: 전각/반각 및 한글 자모 조합 통일, 소문자화)"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+def words(text: str) -> List[str]:
+    return _WORD.findall(normalize(text))
+
+def bigrams(word: str) -> List[str]:
+    """단어를 글자 bigram 으로 나눕니다. 한 글자 단어는 그대로 사용합니다.
+
+    한국어는 조사/어미가 붙어 공백 단위 토큰이 잘 맞지 않으므로 ("날씨가", "날씨는") 글자 bigram 으로 색인하면
+    "날씨" 검색이 두 문장 모두와 일치합니다. 영문/숫자도 같은 방식이라 부분 문자열 검색이 됩니다.
+    """
+    if len(word) == 1:
+        return [word]
+    return [word[i:i + 2] for i in range(len(word) - 1)]
+
+def index_tokens(text: str) -> str:
+    """FTS5 에 넣을 토큰 문자열 (단어별 bigram 을 위치 순서대로 공백으로 연결)"""
+    return " ".join(gram for word in words(text) for gram in bigrams(word))
+
+class SearchIndex:
+    """채팅 메시지의 bigram 역색인입니다. (SQLite FTS5, contentless)
+
+    messages 테이블에 원문과 메타데이터를, grams(FTS5) 테이블에 bigram 토큰 색인을,
+    gram_df 테이블에 bigram 별 문서 수를 둡니다.
+    rowid 는 색인에 추가된 순서(대략 시간순)입니다. 검색은 검색어의 bigram 중 문서 수가 가장 적은 하나의
+    색인 목록만 rowid 역순으로 읽고 원문에 검색어가 모두 있는지 확인하므로, 읽는 양이 scan_limit 로 제한되어
+    전체 색인 크기와 상관없이 조회 시간이 일정합니다.
+    (FTS5 의 구 검색/bm25 는 검색어마다 전체 색인 목록을 훑어 색인이 커질수록 느려지므로 사용하지 않음)
+    파일을 공유하는 같은 호스트의 워커끼리는 WAL 로 동시에 읽고, 쓰기는 트랜잭션으로 직렬화됩니다.
+    """
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock() # 프로세스 내 스레드 간 연결 공유 보호
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY,
+                    message_id TEXT NOT NULL UNIQUE,
+                    conversation_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    content TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS messages_conversation ON messages (conversation_id);
+                CREATE VIRTUAL TABLE IF NOT EXISTS grams USING fts5 (tokens, content='', tokenize='unicode61 remove_diacritics 0');
+                CREATE TABLE IF NOT EXISTS gram_df (gram TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID;
+                """
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, operation, *args) -> Any:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = operation(*args)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def _add(self, messages: Iterable[Dict[str, Any]]) -> int:
+        added = 0
+        for message in messages:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO messages (message_id, conversation_id, role, timestamp, content) VALUES (?, ?, ?, ?, ?)",
+                (message["id"], message["conversation_id"], message["role"], message["timestamp"].isoformat(), message["content"]),
+            )
+            if not cursor.rowcount: # 이미 색인된 메시지(재색인)는 건너뜀
+                continue
+            tokens = index_tokens(message["content"])
+            self._conn.execute("INSERT INTO grams (rowid, tokens) VALUES (?, ?)", (cursor.lastrowid, tokens))
+            self._conn.executemany(
+                "INSERT INTO gram_df (gram, df) VALUES (?, 1) ON CONFLICT (gram) DO UPDATE SET df = df + 1",
+                [(gram,) for gram in set(tokens.split())],
+            )
+            added += 1
+        return added
+
+    def _delete_conversation(self, conversation_id: str) -> int:
+        rows = self._conn.execute("SELECT id, content FROM messages WHERE conversation_id = ?", (conversation_id,)).fetchall()
+        for row_id, content in rows:
+            tokens = index_tokens(content)
+            # contentless 테이블은 색인했던 토큰을 그대로 넘겨야 삭제됨
+            self._conn.execute("INSERT INTO grams (grams, rowid, tokens) VALUES ('delete', ?, ?)", (row_id, tokens))
+            self._conn.executemany("UPDATE gram_df SET df = df - 1 WHERE gram = ?", [(gram,) for gram in set(tokens.split())])
+        self._conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+        return len(rows)
+
+    def _document_frequency(self, gram: str) -> int:
+        row = self._conn.execute("SELECT df FROM gram_df WHERE gram = ?", (gram,)).fetchone()
+        return row[0] if row else 0
+
+    def _search(self, query_words: List[str], upper: Optional[int], limit: int, scan_limit: int) -> Dict[str, Any]:
+        # 단어별 문서 수 추정: 단어가 들어 있는 메시지는 그 단어의 모든 bigram 을 포함하므로 bigram 문서 수의 최솟값 이하
+        total = self._conn.execute("SELECT coalesce(max(id), 0) FROM messages").fetchone()[0]
+        df = {word: min(self._document_frequency(gram) for gram in bigrams(word)) if len(word) > 1 else total for word in query_words}
+        result = {"hits": [], "scanned_to": None, "total": total, "df": df}
+        if any(count == 0 for count in df.values()):
+            return result # 어떤 메시지에도 없는 단어가 있음
+        if all(len(word) == 1 for word in query_words):
+            driver = f"{query_words[0]}*" # 한 글자 검색어만 있으면 그 글자로 시작하는 토큰을 접두어 검색
+        else:
+            driver = min(
+                (gram for word in query_words if len(word) > 1 for gram in bigrams(word)),
+                key=self._document_frequency,
+            )
+            driver = f'"{driver}"'
+
+        position = upper if upper is not None else total + 1
+        scanned = 0
+        while scanned < scan_limit and len(result["hits"]) < limit:
+            batch = self._conn.execute(
+                """
+                SELECT m.id, m.message_id, m.conversation_id, m.role, m.timestamp, m.content
+                FROM (SELECT rowid FROM grams WHERE grams MATCH ? AND rowid < ? ORDER BY rowid DESC LIMIT ?) AS g
+                JOIN messages AS m ON m.id = g.rowid
+                ORDER BY m.id DESC
+                """,
+                (driver, position, min(SEARCH_SCAN_BATCH, scan_limit - scanned)),
+            ).fetchall()
+            if not batch:
+                return result # 색인 끝까지 읽음 (scanned_to=None)
+            for row_id, message_id, conversation_id, role, timestamp, content in batch:
+                scanned += 1
+                position = row_id
+                text = normalize(content)
+                if all(word in text for word in query_words):
+                    result["hits"].append({
+                        "row": row_id, "id": message_id, "conversation_id": conversation_id,
+                        "role": role, "timestamp": timestamp, "content": content, "text": text,
+                    })
+                    if len(result["hits"]) >= limit:
+                        break
+        result["scanned_to"] = position # 다음 구간은 이 rowid 보다 오래된 메시지부터
+        return result
+
+    def _stats(self) -> Dict[str, Any]:
+        row = self._conn.execute("SELECT count(*), coalesce(max(id), 0) FROM messages").fetchone()
+        return {"path": self.path, "messages": row[0], "max_row": row[1]}
+
+    async def add(self, messages: List[Dict[str, Any]]) -> int:
+        """메시지({"id", "conversation_id", "role", "timestamp", "content"})를 색인하고 새로 색인한 수를 반환합니다."""
+        return await asyncio.to_thread(self._transaction, self._add, messages)
+
+    async def delete_conversation(self, conversation_id: str) -> int:
+        return await asyncio.to_thread(self._transaction, self._delete_conversation, conversation_id)
+
+    async def search(self, query_words: List[str], upper: Optional[int], limit: int, scan_limit: int) -> Dict[str, Any]:
+        """검색어 단어를 모두 포함하는 메시지를 rowid < upper 범위에서 최신순으로 최대 limit 개 찾습니다.
+
+        색인 항목은 최대 scan_limit 개까지만 읽습니다.
+        반환값: {"hits": [...], "scanned_to": 다음 구간 상한 rowid (끝까지 읽었으면 None), "total": 전체 메시지 수, "df": 단어별 문서 수 추정}
+        """
+        def run():
+            with self._lock:
+                return self._search(query_words, upper, limit, scan_limit)
+        return await asyncio.to_thread(run)
+
+    async def stats(self) -> Dict[str, Any]:
+        def run():
+            with self._lock:
+                return self._stats()
+        return await asyncio.to_thread(run)
+
+class SearchIndexHolder:
+    index: Optional[SearchIndex] = None
+
+search_index = SearchIndexHolder()
+
+def init_search_index():
+    """워커 시작 시 검색 색인 파일을 엽니다. (SEARCH_INDEX_ENABLED=false 이면 검색/색인 비활성)"""
+    if not SEARCH_INDEX_ENABLED or search_index.index is not None:
+        return
+    search_index.index = SearchIndex(SEARCH_INDEX_PATH)
+    logger.info(f"검색 색인 열림: {SEARCH_INDEX_PATH}")
+
+def close_search_index():
+    if search_index.index is not None:
+        search_index.index.close()
+        search_index.index = None
+        logger.info("검색 색인 닫힘.")
+
+async def index_message(message_doc: dict):
+    """저장된 채팅 메시지를 검색 색인에 추가합니다. 실패해도 메시지 저장에는 영향을 주지 않습니다."""
+    if search_index.index is None:
+        return
+    try:
+        await search_index.index.add([{
+            "id": str(message_doc["_id"]),
+            "conversation_id": message_doc["conversation_id"],
+            "role": message_doc["role"],
+            "timestamp": message_doc["timestamp"],
+            "content": message_doc["content"],
+        }])
+    except Exception as e:
+        logger.error(f"검색 색인 갱신 실패: ConvID={message_doc['conversation_id']}, {e}", exc_info=True)
+
+async def delete_conversation(conversation_id: str):
+    if search_index.index is None:
+        return
+    try:
+        await search_index.index.delete_conversation(conversation_id)
+    except Exception as e:
+        logger.error(f"검색 색인 삭제 실패: ConvID={conversation_id}, {e}", exc_info=True)
@@ -0,0 +1,35 @@
+"""운영(멀티 워커) 실행 설정입니다.
+
+실행 (backend 디렉토리에서):
+    gunicorn -c gunicorn.conf.py app:app
+워커마다 lifespan 에서 Mongo/OpenAI/날씨 클라이언트와 로그 리스너를 따로 만듭니다.
+사용자별 한도, 중복 요청 병합, 기록/날씨 캐시를 워커 간에 맞추려면 SHARED_STATE_BACKEND=redis 를 함께 설정하세요.
+"""
+import os
+import shutil
+import multiprocessing
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count()))) # 워커 프로세스 수 (기본값: CPU 코어 수)
+worker_class = "uvicorn_worker.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120")) # 워커 무응답 판정 시간 (초, 스트리밍 턴보다 길게)
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30")) # 종료 시 진행 중인 요청을 마무리할 시간 (초)
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0")) # 워커 재시작 주기 (요청 수, 0 이면 재시작하지 않음)
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+accesslog = None # 요청 로그는 앱의 로깅 파이프라인에서 남김
+
+# 워커 간 공유 상태 백엔드가 워커 수를 알 수 있도록 (memory 백엔드로 여러 워커를 띄우면 경고)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+# 워커별 Prometheus 메트릭을 합산하기 위한 디렉토리 (워커가 prometheus_client 를 임포트하기 전에 설정)
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/chatbot_prometheus")
+
+def on_starting(server):
+    # 이전 실행의 메트릭 파일이 남아 있으면 카운터가 이어서 합산되므로 시작할 때 비움
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+def child_exit(server, worker):
+    from services.metrics_service import mark_worker_dead
+    mark_worker_dead(worker.pid)
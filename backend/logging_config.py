@@ -0,0 +1,184 @@
+import os
+import sys
+import atexit
+import json
+import uuid
+import queue
+import logging
+import logging.handlers
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# === 로깅 설정 ===
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text") # text | json
+LOG_FILE = os.getenv("LOG_FILE", "app.log") # 빈 값이면 파일 로그 비활성화
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))) # 로그 파일 최대 크기 (초과 시 회전)
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5")) # 보관할 회전 파일 수
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000")) # 가득 차면 새 레코드를 버림 (이벤트 루프를 막지 않음)
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "10")) # 샘플링 대상 메시지는 N 개 중 1 개만 기록
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# 요청/대화 단위 컨텍스트 (로그 레코드에 자동으로 붙음)
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+conversation_id_var: ContextVar[Optional[str]] = ContextVar("conversation_id", default=None)
+
+# 대량 로그에 extra=SAMPLED 를 주면 LOG_SAMPLE_EVERY 개 중 1 개만 기록 (WARNING 이상은 항상 기록)
+SAMPLED = {"sampled": True}
+
+class ContextFilter(logging.Filter):
+    """로그를 남긴 시점의 request_id / conversation_id 를 레코드에 복사합니다. (큐로 넘기기 전에 실행)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.conversation_id = conversation_id_var.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """extra=SAMPLED 로 표시된 INFO 이하 레코드를 메시지 템플릿별로 every 개 중 1 개만 통과시킵니다."""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._counts: Dict[tuple, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False) or record.levelno >= logging.WARNING or self.every == 1:
+            return True
+        key = (record.name, record.msg)
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        return count % self.every == 0
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """레코드를 백그라운드 스레드로 넘기는 핸들러입니다.
+
+    기본 QueueHandler 는 호출한 스레드(이벤트 루프)에서 메시지를 포맷하지만, 여기서는 예외 정보만 문자열로 만들고
+    msg % args 포맷은 리스너 스레드에서 수행합니다. 큐가 가득 차면 기다리지 않고 버린 뒤 개수만 셉니다.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None # traceback 프레임을 다른 스레드로 넘기지 않음
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel) # 큐가 가득 차 있어도 리스너가 비울 때까지 기다린 뒤 종료 신호 전달
+
+class JsonFormatter(logging.Formatter):
+    """한 줄에 JSON 객체 하나씩 출력합니다. request_id / conversation_id 가 있으면 함께 기록합니다."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        conversation_id = getattr(record, "conversation_id", None)
+        if conversation_id:
+            entry["conversation_id"] = conversation_id
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _LoggingPipeline:
+    queue_handler: Optional[NonBlockingQueueHandler] = None
+    listener: Optional[logging.handlers.QueueListener] = None
+    pid: Optional[int] = None # 파이프라인을 만든 프로세스 (fork 된 워커에서는 리스너 스레드가 없으므로 다시 만듦)
+
+logging_pipeline = _LoggingPipeline()
+
+def setup_logging():
+    """루트 로거에 큐 핸들러를 달고, 파일(크기 기반 회전)/콘솔 출력은 백그라운드 리스너 스레드에서 처리합니다.
+
+    같은 프로세스에서 다시 호출하면 아무것도 하지 않습니다. (gunicorn --preload 로 fork 된 워커에서는 새로 구성)
+    """
+    if logging_pipeline.listener is not None and logging_pipeline.pid == os.getpid():
+        return
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if LOG_FILE:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_EVERY))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    listener = DrainingQueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    logging_pipeline.queue_handler = queue_handler
+    logging_pipeline.listener = listener
+    logging_pipeline.pid = os.getpid()
+    atexit.register(stop_logging) # 프로세스 종료 시 남은 레코드 기록
+
+def stop_logging():
+    """큐에 남은 레코드를 모두 기록한 뒤 리스너 스레드를 종료합니다."""
+    if logging_pipeline.listener is None or logging_pipeline.pid != os.getpid():
+        return # fork 이전 부모 프로세스의 파이프라인은 그 프로세스가 정리
+    logging.getLogger().removeHandler(logging_pipeline.queue_handler)
+    logging_pipeline.listener.stop()
+    for handler in logging_pipeline.listener.handlers:
+        handler.close()
+    if logging_pipeline.queue_handler.dropped:
+        sys.stderr.write(f"로그 큐 포화로 버려진 레코드: {logging_pipeline.queue_handler.dropped}\n")
+    logging_pipeline.listener = None
+
+class RequestContextMiddleware:
+    """요청마다 request_id 를 정하고(X-Request-ID 헤더가 있으면 사용) 응답 헤더로 돌려주는 ASGI 미들웨어입니다."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        conversation_token = conversation_id_var.set(None) # 채팅 서비스에서 설정
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
+            conversation_id_var.reset(conversation_token)
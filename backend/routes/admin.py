@@ -1,5 +1,6 @@
 import logging
-from fastapi import APIRouter, Request, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Request, HTTPException, Query
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
@@ -24,23 +25,43 @@ async def admin_page(request: Request):
     return templates.TemplateResponse("admin.html", {"request": request})
 
 @router.get("/usage/daily", response_model=DailyUsageResponse)
-async def get_daily_usage_route():
+async def get_daily_usage_route(
+    start: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$", description="시작 날짜 (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$", description="종료 날짜 (YYYY-MM-DD)"),
+):
     """일별 사용량 통계를 반환하는 API 엔드포인트"""
-    logger.info("일별 사용량 API 요청 받음")
+    logger.info(f"일별 사용량 API 요청 받음 (기간: {start} ~ {end})")
     try:
-        stats = await admin_service.get_daily_stats()
+        stats = await admin_service.get_daily_stats(start, end)
         return DailyUsageResponse(daily_stats=stats)
     except Exception as e:
         logger.error(f"일별 사용량 API 처리 중 오류: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="일별 사용량 조회 중 서버 오류 발생")
 
 @router.get("/usage/monthly", response_model=MonthlyUsageResponse)
-async def get_monthly_usage_route():
+async def get_monthly_usage_route(
+    start: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="시작 월 (YYYY-MM)"),
+    end: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="종료 월 (YYYY-MM)"),
+):
     """월별 사용량 통계를 반환하는 API 엔드포인트"""
-    logger.info("월별 사용량 API 요청 받음")
+    logger.info(f"월별 사용량 API 요청 받음 (기간: {start} ~ {end})")
     try:
-        stats = await admin_service.get_monthly_stats()
+        stats = await admin_service.get_monthly_stats(start, end)
         return MonthlyUsageResponse(monthly_stats=stats)
     except Exception as e:
         logger.error(f"월별 사용량 API 처리 중 오류: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="월별 사용량 조회 중 서버 오류 발생")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="월별 사용량 조회 중 서버 오류 발생")
+
+@router.get("/runtime")
+async def get_runtime_stats_route():
+    """현재 워커의 런타임 통계(도구별 지연 시간, 캐시 통계 등)를 반환하는 API 엔드포인트"""
+    logger.info("런타임 통계 API 요청 받음")
+    return admin_service.get_runtime_stats()
+
+@router.get("/traces/slowest")
+async def get_slowest_traces_route(
+    limit: int = Query(10, ge=1, le=100, description="반환할 트레이스 수 (최대 TRACE_SLOWEST_N)"),
+):
+    """현재 워커에서 가장 느렸던 채팅 요청의 트레이스(라우트 -> 서비스 -> OpenAI -> 도구 -> Mongo span)를 반환하는 API 엔드포인트"""
+    logger.info(f"느린 트레이스 API 요청 받음 (limit={limit})")
+    return {"traces": admin_service.get_slowest_traces(limit)}
@@ -1,55 +1,144 @@
+import json
 import logging
-from fastapi import APIRouter, HTTPException, Request, status
-from fastapi.responses import HTMLResponse, JSONResponse # JSONResponse 추가
+from fastapi import APIRouter, HTTPException, Request, status, Query
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse # JSONResponse 추가
 from fastapi.templating import Jinja2Templates
-from typing import List # List 추가
+from typing import Optional
 
 # 스키마 임포트
-from schemas.chat import UserMessage
-from schemas.session import SessionListResponse # 세션 스키마 임포트
+from schemas.chat import UserMessage, ChatMessage, HistoryResponse
+from schemas.session import SessionListResponse, SessionSummary # 세션 스키마 임포트
+from schemas.search import SearchResponse
 
 # 서비스 임포트
-from services import chat_service, session_service # 개별 서비스 임포트
+from services import chat_service, session_service, search_service # 개별 서비스 임포트
+from services.admission_service import AdmissionRejected, trusted_user_id
+from services.resilience_service import UpstreamUnavailable
+from services.tracing_service import trace_request, start_trace, end_trace
+from logging_config import SAMPLED
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 templates = Jinja2Templates(directory="templates")
 
+def _request_user_id(request: Request) -> Optional[str]:
+    """사용자별 동시 처리 제한에 사용할 신뢰할 수 있는 사용자 식별자 (없으면 None, CHAT_TRUSTED_PROXIES 참고)"""
+    return trusted_user_id(request.client.host if request.client else None, request.headers)
+
+def _request_timeout(request: Request) -> Optional[float]:
+    """클라이언트가 X-Request-Timeout 헤더(초)로 지정한 턴 마감 시간 (잘못된 값은 무시)"""
+    try:
+        timeout = float(request.headers.get("X-Request-Timeout", ""))
+    except ValueError:
+        return None
+    return timeout if timeout > 0 else None
+
+def _service_unavailable(e: ConnectionError) -> HTTPException:
+    logger.error(f"OpenAI 서비스 연결 오류 발생 (라우트): {e}", exc_info=not isinstance(e, UpstreamUnavailable))
+    retry_after = getattr(e, "retry_after", None)
+    return HTTPException(
+        status_code=503, # 503 Service Unavailable
+        detail=f"챗봇 서비스 연결 오류: {e}",
+        headers={"Retry-After": str(retry_after)} if retry_after else None
+    )
+
+def _too_many_requests(e: AdmissionRejected) -> HTTPException:
+    logger.warning(f"채팅 요청 수용 거절 ({e.reason}), Retry-After={e.retry_after}s")
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="요청이 많아 잠시 후 다시 시도해주세요.",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
 @router.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     logger.info("루트 페이지 요청 받음 (라우터)")
     return templates.TemplateResponse("index.html", {"request": request})
 
-# 세션 목록 엔드포인트 (서비스 호출 및 응답 모델 사용)
+# 세션 목록 엔드포인트 (서비스 호출 및 응답 모델 사용, 커서 기반 페이지네이션)
 @router.get("/sessions", response_model=SessionListResponse)
-async def get_sessions_route():
-    logger.info("세션 목록 라우트 호출됨")
+async def get_sessions_route(
+    limit: int = Query(50, ge=1, le=200, description="페이지 크기"),
+    cursor: Optional[str] = Query(None, description="이전 응답의 next_cursor"),
+):
+    logger.info(f"세션 목록 라우트 호출됨 (limit={limit})")
     try:
-        session_ids = await session_service.get_sessions()
-        return SessionListResponse(sessions=session_ids)
+        page = await session_service.get_sessions(limit=limit, cursor=cursor)
+        items = [SessionSummary(**session) for session in page["sessions"]]
+        return SessionListResponse(
+            sessions=[item.conversation_id for item in items],
+            items=items,
+            next_cursor=page["next_cursor"]
+        )
+    except ValueError as ve:
+        logger.warning(f"세션 목록 요청 오류 (잘못된 커서): {ve}")
+        raise HTTPException(status_code=400, detail="잘못된 cursor 입니다.")
     except Exception as e:
         # 서비스 레벨에서 처리되지 않은 예외
         logger.error(f"세션 목록 라우트 처리 중 오류 발생: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="세션 목록 조회 중 서버 오류가 발생했습니다.")
 
-# 대화 기록 조회 엔드포인트 (서비스 호출 및 응답 타입 명시)
-# 참고: Pydantic 모델을 정의하여 response_model로 사용하는 것이 더 엄격하지만, 여기서는 List[dict]를 사용
-@router.get("/history/{conversation_id}", response_model=List[dict])
-async def get_history_route(conversation_id: str):
-    logger.info(f"대화 기록 라우트 호출됨: ConvID={conversation_id}")
+# 대화 기록 조회 엔드포인트 (커서 기반 페이지네이션, format=ndjson 이면 전체 기록 스트리밍)
+@router.get("/history/{conversation_id}", response_model=HistoryResponse)
+async def get_history_route(
+    conversation_id: str,
+    limit: int = Query(50, ge=1, le=500, description="페이지 크기"),
+    before: Optional[str] = Query(None, description="이 커서보다 오래된 메시지 조회 (prev_cursor)"),
+    after: Optional[str] = Query(None, description="이 커서보다 최근 메시지 조회 (next_cursor)"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson: 한 줄에 메시지 하나씩 스트리밍"),
+):
+    logger.info(f"대화 기록 라우트 호출됨: ConvID={conversation_id}, format={format}")
     if not conversation_id:
         # 기본적인 입력 검증은 라우터에서 수행
         raise HTTPException(status_code=400, detail="conversation_id가 필요합니다.")
 
     try:
-        history = await session_service.get_history(conversation_id)
-        return history
+        if format == "ndjson":
+            messages = session_service.stream_history(conversation_id, before=before, after=after)
+            first = await anext(messages, None) # 스트림 시작 전에 커서 오류를 400으로 처리하기 위해 첫 메시지를 미리 읽음
+
+            async def ndjson_stream():
+                if first is None:
+                    return
+                yield ChatMessage(**first).model_dump_json() + "\n"
+                async for message in messages:
+                    yield ChatMessage(**message).model_dump_json() + "\n"
+
+            return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+        page = await session_service.get_history(conversation_id, limit=limit, before=before, after=after)
+        return HistoryResponse(**page)
+    except ValueError as ve:
+        logger.warning(f"대화 기록 조회 요청 오류 (잘못된 커서): {ve}")
+        raise HTTPException(status_code=400, detail="잘못된 cursor 입니다.")
     except Exception as e:
         # 서비스 레벨에서 처리되지 않은 예외
         logger.error(f"대화 기록 라우트 처리 중 오류 발생: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="대화 기록 조회 중 서버 오류가 발생했습니다.")
 
+# 전체 대화 검색 엔드포인트 (bigram 역색인, 대화별로 묶어 관련도 순, 커서 기반 페이지네이션)
+@router.get("/search", response_model=SearchResponse)
+async def search_route(
+    q: str = Query(..., min_length=1, max_length=200, description="검색어 (공백으로 구분한 단어를 모두 포함하는 메시지 검색)"),
+    limit: int = Query(20, ge=1, le=100, description="페이지당 대화 수"),
+    cursor: Optional[str] = Query(None, description="이전 응답의 next_cursor"),
+):
+    logger.info(f"검색 라우트 호출됨 (limit={limit})")
+    try:
+        page = await search_service.search_conversations(q, limit=limit, cursor=cursor)
+        return SearchResponse(**page)
+    except ValueError as ve:
+        logger.warning(f"검색 요청 오류: {ve}")
+        detail = "잘못된 cursor 입니다." if str(ve) == "Invalid cursor" else "검색어에 문자나 숫자가 포함되어야 합니다."
+        raise HTTPException(status_code=400, detail=detail)
+    except ConnectionError as e:
+        logger.error(f"검색 색인 사용 불가: {e}")
+        raise HTTPException(status_code=503, detail="검색 기능을 사용할 수 없습니다.")
+    except Exception as e:
+        logger.error(f"검색 라우트 처리 중 오류 발생: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="검색 중 서버 오류가 발생했습니다.")
+
 # 대화 기록 삭제 엔드포인트
 @router.delete("/history/{conversation_id}", status_code=status.HTTP_200_OK)
 async def delete_history_route(conversation_id: str):
@@ -77,8 +166,8 @@ async def delete_history_route(conversation_id: str):
 
 # 채팅 엔드포인트 (서비스 호출)
 @router.post("/chat", response_class=JSONResponse)
-async def handle_chat_route(user_message: UserMessage):
-    logger.info(f"채팅 라우트 호출됨: ConvID={user_message.conversation_id}")
+async def handle_chat_route(user_message: UserMessage, request: Request):
+    logger.info("채팅 라우트 호출됨: ConvID=%s", user_message.conversation_id, extra=SAMPLED)
     # Pydantic 모델을 통해 conversation_id 와 message 는 이미 검증됨 (존재 여부, 타입)
     # 빈 문자열 등 추가 검증이 필요하면 여기서 수행 가능
     if not user_message.message:
@@ -87,17 +176,74 @@ async def handle_chat_route(user_message: UserMessage):
         raise HTTPException(status_code=400, detail="conversation_id가 비어있습니다.")
 
     try:
-        # chat_service 호출
-        bot_response = await chat_service.handle_new_message(
-            conversation_id=user_message.conversation_id,
-            user_message=user_message.message
-        )
+        # chat_service 호출 (요청 단위 트레이스: 관리자 화면의 느린 턴 목록 / TRACE_EXPORTER 로 내보냄)
+        with trace_request("handle_chat_route", conversation_id=user_message.conversation_id):
+            bot_response = await chat_service.handle_new_message(
+                conversation_id=user_message.conversation_id,
+                user_message=user_message.message,
+                idempotency_key=user_message.idempotency_key,
+                user_id=_request_user_id(request),
+                timeout=_request_timeout(request)
+            )
         return {"response": bot_response}
+    except AdmissionRejected as e:
+        raise _too_many_requests(e)
     except ConnectionError as e:
-        # 서비스에서 발생시킨 특정 예외 처리
-        logger.error(f"OpenAI 서비스 연결 오류 발생 (라우트): {e}", exc_info=True)
-        raise HTTPException(status_code=503, detail=f"챗봇 서비스 연결 오류: {e}") # 503 Service Unavailable
+        # 서비스에서 발생시킨 특정 예외 처리 (서킷 차단 시 Retry-After 포함)
+        raise _service_unavailable(e)
     except Exception as e:
         # 기타 예상치 못한 오류
         logger.error(f"채팅 라우트 처리 중 예상치 못한 오류 발생: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="챗봇 응답 처리 중 서버 오류가 발생했습니다.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="챗봇 응답 처리 중 서버 오류가 발생했습니다.")
+
+# 스트리밍 채팅 엔드포인트 (Server-Sent Events)
+@router.post("/chat/stream")
+async def handle_chat_stream_route(user_message: UserMessage, request: Request):
+    logger.info("스트리밍 채팅 라우트 호출됨: ConvID=%s", user_message.conversation_id, extra=SAMPLED)
+    if not user_message.message:
+        raise HTTPException(status_code=400, detail="메시지 내용이 비어있습니다.")
+    if not user_message.conversation_id:
+        raise HTTPException(status_code=400, detail="conversation_id가 비어있습니다.")
+
+    # 스트림이 끝날 때 트레이스를 종료 (라우트 함수가 반환된 뒤에도 계속됨)
+    trace = start_trace("handle_chat_stream_route", conversation_id=user_message.conversation_id)
+    events = chat_service.handle_new_message_stream(
+        conversation_id=user_message.conversation_id,
+        user_message=user_message.message,
+        idempotency_key=user_message.idempotency_key,
+        user_id=_request_user_id(request),
+        timeout=_request_timeout(request)
+    )
+    # 스트림 시작 전에 수용 거절(429)/연결 오류(503)를 HTTP 상태 코드로 처리하기 위해 첫 이벤트를 미리 읽음
+    try:
+        first = await anext(events)
+    except AdmissionRejected as e:
+        end_trace(trace, e)
+        raise _too_many_requests(e)
+    except ConnectionError as e:
+        end_trace(trace, e)
+        raise _service_unavailable(e)
+
+    async def event_stream():
+        try:
+            yield f"data: {json.dumps(first, ensure_ascii=False)}\n\n"
+            async for event in events:
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except ConnectionError as e:
+            # 응답 헤더가 이미 전송되었으므로 HTTP 상태 코드 대신 error 이벤트로 전달
+            end_trace(trace, e)
+            logger.error(f"OpenAI 서비스 연결 오류 발생 (스트리밍 라우트): {e}", exc_info=True)
+            yield f"data: {json.dumps({'type': 'error', 'detail': f'챗봇 서비스 연결 오류: {e}'}, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            end_trace(trace, e)
+            logger.error(f"스트리밍 채팅 처리 중 예상치 못한 오류 발생: {e}", exc_info=True)
+            yield f"data: {json.dumps({'type': 'error', 'detail': '챗봇 응답 처리 중 서버 오류가 발생했습니다.'}, ensure_ascii=False)}\n\n"
+        finally:
+            await events.aclose()
+            end_trace(trace)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} # 프록시 버퍼링 방지
+    )
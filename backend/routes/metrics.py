@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Response
+
+from services import admin_service
+from services.metrics_service import render_metrics, register_runtime_collector
+
+router = APIRouter(tags=["metrics"])
+
+# 캐시 / 수용 제어 / 서킷 브레이커 등 런타임 통계를 스크레이프 시점에 게이지로 노출
+register_runtime_collector(admin_service.get_runtime_stats)
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics_route():
+    """Prometheus 텍스트 포맷 메트릭을 반환합니다."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
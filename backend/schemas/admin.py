@@ -6,6 +6,11 @@ class UsageStatBase(BaseModel):
     output_tokens: int
     total_tokens: int
     cost: float
+    cache_hits: int = 0 # 응답 캐시로 처리된 요청 수
+    saved_tokens: int = 0 # 캐시 히트로 절감한 토큰 수
+    saved_cost: float = 0.0
+    router_saved_tokens: int = 0 # 의도 라우터가 도구 스키마를 빼서 절감한 입력 토큰 수 (추정치)
+    router_saved_cost: float = 0.0 # 의도 라우터 절감 비용 (빠진 도구 스키마 + 저렴한 모델 사용, 추정치)
 
 class DailyUsageStat(UsageStatBase):
     date: str # YYYY-MM-DD
@@ -1,5 +1,19 @@
 from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
 
 class UserMessage(BaseModel):
     conversation_id: str
-    message: str
\ No newline at end of file
+    message: str
+    idempotency_key: Optional[str] = None # 클라이언트 재시도 시 같은 값을 보내면 턴을 한 번만 처리
+
+class ChatMessage(BaseModel):
+    id: Optional[str] = None
+    role: str
+    content: str
+    timestamp: Optional[datetime] = None
+
+class HistoryResponse(BaseModel):
+    messages: List[ChatMessage] # 시간순 정렬
+    prev_cursor: Optional[str] = None # before 로 전달하면 더 오래된 메시지 조회
+    next_cursor: Optional[str] = None # after 로 전달하면 더 최근 메시지 조회
@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+
+class SearchHit(BaseModel):
+    id: str # 메시지 ID (/history 커서와 같은 ID)
+    role: str
+    timestamp: datetime
+    snippet: str # 일치 위치 주변 미리보기
+    highlights: List[List[int]] = [] # snippet 안의 일치 구간 [시작, 끝) 목록
+
+class SearchResult(BaseModel):
+    conversation_id: str
+    title: Optional[str] = None
+    score: float # 관련도 (클수록 관련도 높음)
+    hit_count: int # 이번 검색 구간에서 일치한 메시지 수
+    hits: List[SearchHit]
+
+class SearchResponse(BaseModel):
+    results: List[SearchResult] # 관련도 순
+    next_cursor: Optional[str] = None # 다음 페이지 커서 (마지막 페이지면 None)
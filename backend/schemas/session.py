@@ -1,5 +1,17 @@
 from pydantic import BaseModel
-from typing import List
+from datetime import datetime
+from typing import List, Optional
+
+class SessionSummary(BaseModel):
+    conversation_id: str
+    title: Optional[str] = None # 첫 사용자 메시지
+    preview: Optional[str] = None # 마지막 메시지 미리보기
+    message_count: int = 0
+    last_message_time: datetime
+    total_tokens: int = 0
+    cost: float = 0.0 # 턴마다 사용한 모델 가격으로 계산한 비용 합계
 
 class SessionListResponse(BaseModel):
-    sessions: List[str]
\ No newline at end of file
+    sessions: List[str] # 세션 ID 목록 (기존 클라이언트 호환)
+    items: List[SessionSummary] = []
+    next_cursor: Optional[str] = None # 다음 페이지 커서 (마지막 페이지면 None)
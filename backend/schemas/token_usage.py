@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field, GetJsonSchemaHandler
 from pydantic_core import core_schema
 from datetime import datetime
-from typing import Optional, Any
+from typing import Optional, Any, List
 from bson import ObjectId
 
 # ObjectId를 Pydantic에서 사용하기 위한 커스텀 타입 (Pydantic V2 스타일)
@@ -38,6 +38,18 @@ class TokenUsage(BaseModel):
     input_tokens: int = Field(...)
     output_tokens: int = Field(...)
     total_tokens: int = Field(...)
+    cost: Optional[float] = None # model_name 가격으로 계산한 비용 (USD)
+    cache_hit: Optional[str] = None # 응답 캐시 히트 단계 ("exact" / "normalized"), 모델 호출 시 None
+    saved_input_tokens: Optional[int] = None # 캐시 히트로 절감한 입력 토큰 수
+    saved_output_tokens: Optional[int] = None # 캐시 히트로 절감한 출력 토큰 수
+    saved_cost: Optional[float] = None # 캐시 히트로 절감한 비용 (기본 모델 가격)
+    route: Optional[str] = None # 의도 라우터 판단 ("none" / "tools" / "all" / "shadow"), 라우터를 쓰지 않으면 None
+    offered_tools: Optional[List[str]] = None # 모델에 보낸 도구 목록
+    predicted_tools: Optional[List[str]] = None # 라우터가 예측한 도구 목록 (보낸 도구와 다를 때만)
+    used_tools: Optional[List[str]] = None # 모델이 실제로 호출한 도구 목록 (도구를 보냈을 때만, 라우터 평가의 정답)
+    router_saved_tokens: Optional[int] = None # 라우터가 도구 스키마를 빼서 절감한 입력 토큰 수 (추정치)
+    router_saved_cost: Optional[float] = None # 라우터 절감 비용 (빠진 도구 스키마 + 기본 모델 대신 저렴한 모델을 쓴 차액, 추정치)
+    fact_tools: Optional[List[str]] = None # 도구 대신 프롬프트에 넣은 정보로 답한 도구 목록 (라우터 예측 기준 추정, 현재 날짜 등)
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
     class Config:
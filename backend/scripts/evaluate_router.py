@@ -0,0 +1,143 @@
+"""의도 라우터(services/router_service.py)의 판단을 정답이 있는 턴에 다시 적용해 정확도와 절감량을 측정합니다.
+
+사용법 (backend 디렉토리에서):
+    python -m scripts.evaluate_router                              # bench/router_eval.jsonl (직접 표시한 정답)
+    python -m scripts.evaluate_router --file 대화.jsonl
+    python -m scripts.evaluate_router --mongo --days 30 --export data/router_train.jsonl
+파일은 한 줄에 대화 하나이며 {"turns": ["사용자 메시지", ...], "tools": [["도구 이름", ...], ...]} 형식입니다. (턴별 정답 도구)
+--mongo 는 실제 트래픽에서 전체 도구를 보낸 턴(라우터 미사용 / 판단 보류 / shadow)의 token_usages 를 대화 기록과 맞춰
+"모델이 실제로 호출한 도구"를 정답으로 씁니다. 라우터가 도구를 뺀 턴은 모델이 무엇을 썼을지 알 수 없으므로 제외합니다.
+--export 로 그 정답을 ROUTER_TRAINING_PATH 형식으로 저장하면 분류기 추가 학습에 쓸 수 있습니다.
+(같은 데이터로 학습과 평가를 하면 정확도가 부풀려지므로 --days 로 기간을 나눠 평가하세요)
+"""
+import json
+import asyncio
+import logging
+import argparse
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from db.mongo import connect_to_mongo, close_mongo_connection, iter_tool_usages, iter_chat_history, get_archived_messages
+from services.tool_service import TOOL_REGISTRY
+from services.router_service import plan_route, schema_tokens, ROUTER_LIGHT_MODEL
+from services.prompt_facts_service import covered_tools
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_EVAL_FILE = os.path.join(os.path.dirname(__file__), "..", "bench", "router_eval.jsonl")
+FULL_TOOL_ROUTES = (None, "all", "shadow") # 전체 도구를 보낸 턴 (모델의 도구 사용이 정답이 됨)
+
+# 평가 예시: (사용자 메시지, 직전 사용자 메시지, 정답 도구 목록)
+Example = Tuple[str, Optional[str], List[str]]
+
+def load_file_examples(path: str) -> List[Example]:
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if len(entry["turns"]) != len(entry.get("tools", [])):
+                raise SystemExit(f"턴 수와 정답 수가 다릅니다: {entry['turns'][0]}")
+            previous = None
+            for message, tools in zip(entry["turns"], entry["tools"]):
+                examples.append((message, previous, tools))
+                previous = message
+    return examples
+
+async def _user_messages(conversation_id: str) -> List[dict]:
+    archived = await get_archived_messages(conversation_id)
+    if archived is not None:
+        return [message for message in archived if message["role"] == "user"] # 복원하지 않고 아카이브 파일에서 읽음
+    return [message async for message in iter_chat_history(conversation_id) if message["role"] == "user"]
+
+async def load_mongo_examples(days: float, limit: int) -> List[Example]:
+    """전체 도구를 보낸 턴의 사용량 문서마다 그 직전 사용자 메시지를 찾아 (메시지, 직전 메시지, 사용한 도구) 로 만듭니다."""
+    examples: List[Example] = []
+    session_id, users = None, []
+    async for usage in iter_tool_usages(datetime.utcnow() - timedelta(days=days), limit):
+        if usage.get("route") not in FULL_TOOL_ROUTES:
+            continue
+        if usage["session_id"] != session_id:
+            session_id = usage["session_id"]
+            users = await _user_messages(session_id)
+        # 사용자 메시지는 모델 호출 전에, 사용량은 응답 후에 기록되므로 사용량 시각 이전의 마지막 사용자 메시지가 그 턴
+        index = None
+        for i, message in enumerate(users):
+            if message["timestamp"] <= usage["timestamp"]:
+                index = i
+        if index is None:
+            continue
+        previous = users[index - 1]["content"] if index > 0 else None
+        # 프롬프트 정보로 대신한 도구(fact_tools)는 보내지 않았을 뿐 그 턴에 필요했던 도구
+        examples.append((users[index]["content"], previous, usage["used_tools"] + usage.get("fact_tools", [])))
+    return examples
+
+def evaluate(examples: List[Example], show: int) -> Dict[str, float]:
+    covered = covered_tools() # 프롬프트 정보로 대신해 어차피 보내지 않는 도구 (PROMPT_FACTS_ENABLED)
+    available = set(TOOL_REGISTRY) - set(covered)
+    full_schema_tokens = sum(schema_tokens(name) for name in available)
+    routes: Dict[str, int] = {}
+    exact = missed = over_offered = tool_turns = light = saved = 0
+    misses = []
+    for message, previous, label in examples:
+        needed = set(label) & available # 지금은 등록되지 않았거나 프롬프트 정보로 대신하는 도구의 정답은 무시
+        context = [{"role": "user", "content": previous}] if previous else None
+        decision = plan_route(message, context, exclude=covered)
+        offered, predicted = set(decision["tools"]), set(decision["predicted"])
+        routes[decision["route"]] = routes.get(decision["route"], 0) + 1
+        tool_turns += bool(needed)
+        exact += predicted == needed
+        light += decision["model"] is not None
+        saved += decision["saved_per_call"]
+        if needed - offered:
+            missed += 1
+            misses.append((message, sorted(needed - offered), decision["reason"]))
+        over_offered += bool(offered - needed)
+    total = len(examples)
+    print(f"평가 턴 {total}개 (도구가 필요한 턴 {tool_turns}개), 도구 {sorted(available)}"
+          + (f", 프롬프트 정보로 대신함 {covered}" if covered else ""))
+    print(f"  라우팅: " + ", ".join(f"{route} {count} ({count / total:.0%})" for route, count in sorted(routes.items())))
+    print(f"  예측 정확도 (도구 집합 일치): {exact / total:.1%}")
+    print(f"  누락 (필요한 도구를 보내지 않음): {missed}턴 ({missed / total:.1%}, 도구가 필요한 턴의 {missed / max(1, tool_turns):.1%})")
+    print(f"  과잉 (필요 없는 도구를 보냄): {over_offered}턴 ({over_offered / total:.1%})")
+    print(f"  첫 호출 도구 스키마 토큰: 전체 {full_schema_tokens * total} -> {full_schema_tokens * total - saved} "
+          f"(턴당 평균 {saved / total:.1f} 토큰 절감, {saved / max(1, full_schema_tokens * total):.0%})")
+    if ROUTER_LIGHT_MODEL:
+        print(f"  저렴한 모델({ROUTER_LIGHT_MODEL}) 사용 턴: {light} ({light / total:.0%})")
+    for message, tools, reason in misses[:show]:
+        print(f"  누락: {message!r} -> {tools} (근거 {reason})")
+    return {"turns": total, "accuracy": exact / total, "missed": missed, "over_offered": over_offered, "saved_tokens": saved}
+
+async def main(args):
+    if args.mongo:
+        await connect_to_mongo()
+        try:
+            examples = await load_mongo_examples(args.days, args.limit)
+        finally:
+            await close_mongo_connection()
+    else:
+        examples = load_file_examples(args.file)
+    if not examples:
+        raise SystemExit("평가할 턴이 없습니다.")
+    if args.export:
+        with open(args.export, "w", encoding="utf-8") as f:
+            for message, _, tools in examples:
+                f.write(json.dumps({"text": message, "tools": tools}, ensure_ascii=False) + "\n")
+        logger.info(f"학습 예시 {len(examples)}개 저장: {args.export}")
+    evaluate(examples, args.show)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="의도 라우터 오프라인 평가")
+    parser.add_argument("--file", default=DEFAULT_EVAL_FILE, help="정답이 표시된 대화 JSONL")
+    parser.add_argument("--mongo", action="store_true", help="token_usages 에 기록된 실제 트래픽으로 평가")
+    parser.add_argument("--days", type=float, default=30, help="--mongo 일 때 최근 며칠의 트래픽을 쓸지")
+    parser.add_argument("--limit", type=int, default=0, help="--mongo 일 때 최대 사용량 문서 수 (0 이면 전체)")
+    parser.add_argument("--export", help="정답을 ROUTER_TRAINING_PATH 형식(JSONL)으로 저장할 경로")
+    parser.add_argument("--show", type=int, default=10, help="출력할 누락 사례 수")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,33 @@
+"""채팅 기록을 메시지 단위 형식(chat_history)과 버킷 형식(chat_buckets) 사이에서 옮깁니다.
+
+사용법 (backend 디렉토리에서, 앱의 쓰기를 멈춘 상태로):
+    python -m scripts.migrate_chat_storage --to bucket
+    python -m scripts.migrate_chat_storage --to message --conversation <conversation_id> ...
+이전이 끝나면 CHAT_STORAGE_LAYOUT 을 대상 형식으로 바꿔 앱을 다시 시작합니다.
+원본 컬렉션은 지우지 않으므로 되돌릴 때는 설정만 바꾸면 되고, 확인 후 원본은 직접 삭제합니다.
+"""
+import asyncio
+import logging
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from db.mongo import connect_to_mongo, close_mongo_connection, migrate_chat_storage, CHAT_STORAGE_LAYOUTS
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+async def main(args):
+    await connect_to_mongo()
+    try:
+        stats = await migrate_chat_storage(args.to, conversation_ids=args.conversation)
+        logger.info(f"채팅 기록 이전 완료: {stats}. CHAT_STORAGE_LAYOUT={args.to} 로 설정한 뒤 앱을 다시 시작하세요.")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="채팅 기록 저장 형식 이전")
+    parser.add_argument("--to", required=True, choices=CHAT_STORAGE_LAYOUTS, help="대상 저장 형식")
+    parser.add_argument("--conversation", action="append", help="이전할 대화 ID (여러 번 지정 가능, 생략하면 전체)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,67 @@
+"""저장된 채팅 기록 전체를 검색 색인(SEARCH_INDEX_PATH)에 추가합니다.
+
+사용법 (backend 디렉토리에서):
+    python -m scripts.rebuild_search_index
+검색 기능을 켜기 전에 쌓인 기록을 색인하거나 색인 파일을 잃었을 때 사용합니다.
+이미 색인된 메시지는 건너뛰므로 앱이 실행 중일 때 다시 실행해도 됩니다. (CHAT_STORAGE_LAYOUT 과 상관없이 동작)
+아카이브된 대화는 복원하지 않고 아카이브 파일(CHAT_ARCHIVE_DIR)에서 읽어 색인합니다.
+"""
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from db.mongo import connect_to_mongo, close_mongo_connection, get_all_sessions, iter_chat_history, get_archived_messages
+from db.search_index import search_index, init_search_index, close_search_index, SEARCH_INDEX_PATH
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500 # 한 트랜잭션으로 색인할 메시지 수
+
+async def _conversation_messages(conversation_id: str):
+    archived = await get_archived_messages(conversation_id)
+    if archived is not None:
+        # 아카이브된 대화는 복원하지 않고 아카이브 파일에서 읽음
+        for message in archived:
+            yield {"id": str(message["_id"]), "role": message["role"], "content": message["content"], "timestamp": message["timestamp"]}
+        return
+    async for message in iter_chat_history(conversation_id):
+        yield message
+
+async def index_conversation(conversation_id: str) -> int:
+    added, batch = 0, []
+    async for message in _conversation_messages(conversation_id):
+        batch.append({**message, "conversation_id": conversation_id})
+        if len(batch) >= BATCH_SIZE:
+            added += await search_index.index.add(batch)
+            batch = []
+    if batch:
+        added += await search_index.index.add(batch)
+    return added
+
+async def main():
+    await connect_to_mongo()
+    init_search_index()
+    if search_index.index is None:
+        raise SystemExit("SEARCH_INDEX_ENABLED=false 이면 색인할 수 없습니다.")
+    try:
+        conversations = added = 0
+        cursor = None
+        while True:
+            page = await get_all_sessions(limit=200, cursor=cursor)
+            for session in page["sessions"]:
+                added += await index_conversation(session["conversation_id"])
+                conversations += 1
+            logger.info(f"대화 {conversations}개 처리, 새로 색인한 메시지 {added}개")
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        logger.info(f"검색 색인 재생성 완료 ({SEARCH_INDEX_PATH}): 대화 {conversations}개, 새 메시지 {added}개")
+    finally:
+        close_search_index()
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
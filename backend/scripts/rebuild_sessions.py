@@ -0,0 +1,26 @@
+"""chat_history / token_usages 원본 데이터로 세션 요약(chat_sessions) 컬렉션을 다시 만듭니다.
+
+사용법 (backend 디렉토리에서):
+    python -m scripts.rebuild_sessions
+"""
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from db.mongo import connect_to_mongo, close_mongo_connection, rebuild_sessions
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+async def main():
+    await connect_to_mongo()
+    try:
+        session_count = await rebuild_sessions()
+        logger.info(f"세션 요약 재생성 완료: {session_count}개")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
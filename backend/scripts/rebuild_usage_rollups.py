@@ -0,0 +1,26 @@
+"""token_usages 원본 데이터로 일별/월별 사용량 집계 컬렉션을 다시 만듭니다.
+
+사용법 (backend 디렉토리에서):
+    python -m scripts.rebuild_usage_rollups
+"""
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from db.mongo import connect_to_mongo, close_mongo_connection, rebuild_usage_rollups
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+async def main():
+    await connect_to_mongo()
+    try:
+        daily_count, monthly_count = await rebuild_usage_rollups()
+        logger.info(f"집계 재생성 완료: 일별 {daily_count}개, 월별 {monthly_count}개")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
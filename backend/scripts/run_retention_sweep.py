@@ -0,0 +1,46 @@
+"""보관 정책 스위퍼(services/retention_service.py)를 한 번(또는 대상이 없어질 때까지) 실행합니다.
+
+사용법 (backend 디렉토리에서):
+    CHAT_ARCHIVE_IDLE_DAYS=90 python -m scripts.run_retention_sweep --until-done
+보관 정책을 처음 켜서 쌓인 대상이 많을 때 앱의 주기 실행(작업별 RETENTION_SWEEP_BATCH 개씩)을 기다리지 않고 처리하거나,
+RETENTION_SWEEP_INTERVAL=0 으로 앱의 스위퍼를 끄고 cron 등으로 따로 실행할 때 사용합니다.
+앱과 같은 CHAT_ARCHIVE_DIR / SEARCH_INDEX_PATH 를 보도록 실행하세요. (삭제 시 검색 색인도 함께 정리)
+"""
+import asyncio
+import logging
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from db.mongo import connect_to_mongo, close_mongo_connection
+from db.search_index import init_search_index, close_search_index
+from services.retention_service import retention_sweeper, RETENTION_SWEEP_BATCH
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def _has_more(result: dict) -> bool:
+    """작업 중 하나라도 배치를 가득 채웠으면 남은 대상이 있을 수 있음"""
+    archived = result.get("archived", {})
+    processed = [result["purge_retried"], result.get("expired", 0), archived.get("conversations", 0)]
+    return any(count >= RETENTION_SWEEP_BATCH for count in processed)
+
+async def main(args):
+    await connect_to_mongo()
+    init_search_index()
+    try:
+        for runs in range(1, args.max_runs + 1):
+            result = await retention_sweeper.sweep()
+            if not args.until_done or not _has_more(result):
+                break
+        logger.info(f"보관 정책 스위퍼 {runs}회 실행 완료. 아카이브: {result['archive']}")
+    finally:
+        close_search_index()
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="보관 정책 스위퍼 실행")
+    parser.add_argument("--until-done", action="store_true", help="배치가 가득 차지 않을 때까지 반복 실행")
+    parser.add_argument("--max-runs", type=int, default=100, help="--until-done 일 때 최대 실행 횟수")
+    asyncio.run(main(parser.parse_args()))
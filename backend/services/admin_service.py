@@ -1,26 +1,65 @@
 import logging
-from typing import List
+from typing import List, Dict, Any, Optional
 
 # DB 함수 임포트
 from db.mongo import get_daily_usage_stats as db_get_daily_usage
 from db.mongo import get_monthly_usage_stats as db_get_monthly_usage
+from db.mongo import get_pool_stats as db_get_pool_stats
+
+# 런타임 통계 제공 모듈 임포트
+from services.tool_service import get_tool_stats
+from services.weather_service import get_weather_cache_stats
+from services.response_cache_service import response_cache
+from services.chat_service import get_dedup_stats
+from services.admission_service import turn_scheduler
+from services.resilience_service import get_resilience_stats
+from services.tracing_service import trace_recorder
+from services.shared_state import get_shared_state_stats
+from services.retention_service import retention_sweeper
+from services.router_service import router_stats
+from services.prompt_facts_service import prompt_facts_stats
+from db.history_cache import history_cache
 
 # 스키마 임포트 (타입 힌팅 및 데이터 구조 확인용)
 from schemas.admin import DailyUsageStat, MonthlyUsageStat
 
 logger = logging.getLogger(__name__)
 
-async def get_daily_stats() -> List[DailyUsageStat]:
-    """일별 사용량 통계를 조회합니다."""
+async def get_daily_stats(start: Optional[str] = None, end: Optional[str] = None) -> List[DailyUsageStat]:
+    """일별 사용량 통계를 조회합니다. (start/end: YYYY-MM-DD, 양 끝 포함)"""
     logger.info("일별 통계 서비스 호출됨")
-    daily_data = await db_get_daily_usage()
+    daily_data = await db_get_daily_usage(start, end)
     # DB 결과가 스키마와 호환되는지 확인 (여기서는 단순 반환)
     # 필요시 여기서 데이터 변환/검증 추가 가능
     return [DailyUsageStat(**stat) for stat in daily_data]
 
-async def get_monthly_stats() -> List[MonthlyUsageStat]:
-    """월별 사용량 통계를 조회합니다."""
+async def get_monthly_stats(start: Optional[str] = None, end: Optional[str] = None) -> List[MonthlyUsageStat]:
+    """월별 사용량 통계를 조회합니다. (start/end: YYYY-MM, 양 끝 포함)"""
     logger.info("월별 통계 서비스 호출됨")
-    monthly_data = await db_get_monthly_usage()
+    monthly_data = await db_get_monthly_usage(start, end)
     # DB 결과가 스키마와 호환되는지 확인 (여기서는 단순 반환)
-    return [MonthlyUsageStat(**stat) for stat in monthly_data]
\ No newline at end of file
+    return [MonthlyUsageStat(**stat) for stat in monthly_data]
+
+def get_runtime_stats() -> Dict[str, Any]:
+    """현재 워커 프로세스의 런타임 통계(도구 지연 시간, 캐시 히트율 등)를 반환합니다."""
+    logger.info("런타임 통계 서비스 호출됨")
+    return {
+        "tools": get_tool_stats(),
+        "weather_cache": get_weather_cache_stats(),
+        "history_cache": history_cache.stats(),
+        "mongo_pool": db_get_pool_stats(),
+        "response_cache": response_cache.stats(),
+        "chat_dedup": get_dedup_stats(),
+        "admission": turn_scheduler.stats(),
+        "openai_resilience": get_resilience_stats(),
+        "tracing": trace_recorder.stats(),
+        "worker": get_shared_state_stats(),
+        "retention": retention_sweeper.stats(),
+        "router": router_stats.stats(),
+        "prompt_facts": prompt_facts_stats.stats(),
+    }
+
+def get_slowest_traces(limit: int) -> List[Dict[str, Any]]:
+    """현재 워커에서 끝난 채팅 요청 중 가장 느린 트레이스(span 포함)를 느린 순으로 반환합니다."""
+    logger.info(f"느린 트레이스 조회 서비스 호출됨 (limit={limit})")
+    return trace_recorder.slowest(limit)
@@ -0,0 +1,231 @@
+import os
+import math
+import ipaddress
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Mapping, Optional
+
+from services.shared_state import shared_state, shared_key, is_shared, acquire_lock, release_lock
+
+logger = logging.getLogger(__name__)
+
+# === 채팅 턴 수용 제어 설정 ===
+CHAT_MAX_CONCURRENT_TURNS = int(os.getenv("CHAT_MAX_CONCURRENT_TURNS", "32")) # 동시에 처리할 최대 턴 수 (전체)
+CHAT_MAX_TURNS_PER_USER = int(os.getenv("CHAT_MAX_TURNS_PER_USER", "4")) # 사용자별 처리 중 + 대기 중 최대 턴 수
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", "64")) # 대기열 최대 길이 (초과 시 즉시 429)
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", "15")) # 대기열에서 기다릴 수 있는 최대 시간 (초)
+CHAT_SHARED_LEASE = float(os.getenv("CHAT_SHARED_LEASE", "180")) # 멀티 워커 모드의 대화 락/사용자 카운트 유지 시간 (초, 워커 비정상 종료 시 회수)
+CHAT_TRUSTED_PROXIES = os.getenv("CHAT_TRUSTED_PROXIES", "") # 신뢰하는 프록시 IP/CIDR (쉼표 구분, 비어 있으면 사용자별 한도 미적용)
+CHAT_USER_ID_HEADER = os.getenv("CHAT_USER_ID_HEADER", "") # 신뢰하는 프록시가 인증 후 넣어 주는 사용자 식별 헤더 (예: X-User-Id, 비어 있으면 클라이언트 IP 사용)
+
+def _parse_networks(value: str) -> List[Any]:
+    networks = []
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            logger.warning(f"CHAT_TRUSTED_PROXIES 항목 무시 (잘못된 IP/CIDR): {item}")
+    return networks
+
+_trusted_proxies = _parse_networks(CHAT_TRUSTED_PROXIES)
+
+def _is_trusted_proxy(host: Optional[str]) -> bool:
+    try:
+        address = ipaddress.ip_address(host or "")
+    except ValueError:
+        return False
+    return any(address in network for network in _trusted_proxies)
+
+def trusted_user_id(client_host: Optional[str], headers: Mapping[str, str]) -> Optional[str]:
+    """사용자별 한도에 쓸 신뢰할 수 있는 사용자 식별자를 반환합니다. 없으면 None (사용자별 한도 미적용)
+
+    클라이언트가 보낸 헤더는 누구나 바꿀 수 있으므로, CHAT_TRUSTED_PROXIES 에서 온 요청의 헤더만 믿습니다.
+    - 신뢰 프록시에서 온 요청: CHAT_USER_ID_HEADER 값, 없으면 X-Forwarded-For 에서 신뢰 프록시를 뺀 가장 오른쪽 IP
+    - 그 밖의 요청: 직접 연결한 클라이언트 IP (헤더는 무시)
+    CHAT_TRUSTED_PROXIES 가 비어 있으면 프록시 뒤의 사용자들이 같은 IP 로 묶이지 않도록 항상 None 입니다.
+    """
+    if not _trusted_proxies or not client_host:
+        return None
+    if not _is_trusted_proxy(client_host):
+        return client_host
+    if CHAT_USER_ID_HEADER and headers.get(CHAT_USER_ID_HEADER):
+        return f"user:{headers[CHAT_USER_ID_HEADER]}"
+    forwarded = [hop.strip() for hop in headers.get("X-Forwarded-For", "").split(",") if hop.strip()]
+    for hop in reversed(forwarded):
+        if not _is_trusted_proxy(hop):
+            return hop
+    return None
+
+class AdmissionRejected(Exception):
+    """대기열이 가득 찼거나 대기 시간을 넘겨 턴을 받지 못한 경우 발생합니다. (HTTP 429 + Retry-After)"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"chat admission rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+async def _acquire_within(acquire: Callable[[], Awaitable[Any]], release: Callable[[], None], timeout: float):
+    """timeout 안에 acquire 를 완료합니다. 시간 초과/취소 시점에 이미 획득했다면 반납해 누수를 막습니다."""
+    waiter = asyncio.ensure_future(acquire())
+    try:
+        await asyncio.wait_for(asyncio.shield(waiter), timeout)
+    except BaseException:
+        if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+            release()
+        else:
+            waiter.cancel()
+        raise
+
+class TurnScheduler:
+    """채팅 턴을 대화별로 순서대로 실행하고, 전체/사용자별 동시 처리 수를 제한합니다.
+
+    - 같은 conversation_id 의 턴은 대화별 락으로 하나씩 실행 (기록 조회 -> 모델 호출 -> 저장이 섞이지 않음)
+    - 전체 동시 처리 수는 세마포어로 제한하고, 자리를 기다리는 턴은 CHAT_MAX_QUEUE 까지만 대기
+    - 대기열이 가득 찼거나, 사용자 한도를 넘었거나 (신뢰할 수 있는 사용자 식별자가 있을 때만), CHAT_QUEUE_TIMEOUT 안에 자리가 나지 않으면 AdmissionRejected
+
+    공유 상태 백엔드(redis/sqlite)를 사용하면 대화별 락과 사용자별 한도는 워커 전체에 적용됩니다.
+    전체 동시 처리 수와 대기열은 워커마다 따로 제한합니다. (워커 수 x CHAT_MAX_CONCURRENT_TURNS 가 전체 한도)
+    """
+
+    def __init__(self, max_concurrent: int, max_per_user: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._conversation_locks: Dict[str, asyncio.Lock] = {}
+        self._lock_refs: Dict[str, int] = {} # 락을 잡고 있거나 기다리는 턴 수 (0 이 되면 락 제거)
+        self._user_turns: Dict[str, int] = {}
+        self.waiting = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "user_limit": 0, "timeout": 0}
+        self.max_waiting_seen = 0
+        self._wait_times = deque(maxlen=1000) # 최근 대기 시간 (초)
+        self._turn_times = deque(maxlen=200) # 최근 턴 처리 시간 (초, Retry-After 추정용)
+
+    def _retry_after(self) -> int:
+        """최근 턴 처리 시간과 대기열 길이로 다시 시도할 시점(초)을 추정합니다."""
+        average_turn = sum(self._turn_times) / len(self._turn_times) if self._turn_times else 1.0
+        return max(1, min(60, math.ceil(average_turn * (self.waiting + 1) / self.max_concurrent)))
+
+    def _reject(self, reason: str):
+        self.rejected[reason] += 1
+        retry_after = self._retry_after()
+        logger.warning(f"채팅 턴 거절 ({reason}): 대기 {self.waiting}, 처리 중 {self.in_flight}, Retry-After {retry_after}s")
+        raise AdmissionRejected(reason, retry_after)
+
+    def _conversation_lock(self, conversation_id: str) -> asyncio.Lock:
+        self._lock_refs[conversation_id] = self._lock_refs.get(conversation_id, 0) + 1
+        return self._conversation_locks.setdefault(conversation_id, asyncio.Lock())
+
+    def _release_conversation_lock(self, conversation_id: str):
+        self._lock_refs[conversation_id] -= 1
+        if self._lock_refs[conversation_id] == 0:
+            del self._lock_refs[conversation_id]
+            del self._conversation_locks[conversation_id]
+
+    async def _claim_shared_user_turn(self, user_key: str) -> str:
+        """워커 전체의 사용자별 턴 수를 1 늘립니다. 한도를 넘으면 되돌리고 거절합니다."""
+        key = shared_key("user_turns", user_key)
+        if await shared_state.backend.incr(key, 1, ttl=CHAT_SHARED_LEASE) > self.max_per_user:
+            await shared_state.backend.incr(key, -1, ttl=CHAT_SHARED_LEASE)
+            self._reject("user_limit")
+        return key
+
+    async def _acquire_shared_conversation_lock(self, conversation_id: str, timeout: float) -> str:
+        token = await acquire_lock(shared_key("turn_lock", conversation_id), CHAT_SHARED_LEASE, timeout)
+        if token is None:
+            raise asyncio.TimeoutError()
+        return token
+
+    @asynccontextmanager
+    async def admit(self, conversation_id: str, user_id: Optional[str] = None) -> AsyncIterator[None]:
+        """턴 실행 권한을 얻을 때까지 기다립니다. 블록을 벗어나면 대화 락과 전체 슬롯을 반납합니다.
+
+        user_id 가 None 이면 (신뢰할 수 있는 사용자 식별자가 없으면) 사용자별 한도는 적용하지 않고
+        대화별 락과 전체 슬롯/대기열 한도만 적용합니다.
+        """
+        if user_id is not None and self._user_turns.get(user_id, 0) >= self.max_per_user:
+            self._reject("user_limit")
+        if self.waiting >= self.max_queue:
+            self._reject("queue_full")
+
+        if user_id is not None:
+            self._user_turns[user_id] = self._user_turns.get(user_id, 0) + 1
+        lock = self._conversation_lock(conversation_id)
+        holds_lock = holds_slot = False
+        shared_user = shared_lock = None
+        queued_at = time.monotonic()
+        self.waiting += 1
+        self.max_waiting_seen = max(self.max_waiting_seen, self.waiting)
+        try:
+            try:
+                if is_shared() and user_id is not None:
+                    shared_user = await self._claim_shared_user_turn(user_id)
+                # 1. 같은 대화의 앞선 턴이 끝날 때까지 대기 -> 2. 전체 처리 슬롯 대기 (둘 다 합쳐 queue_timeout 이내)
+                await _acquire_within(lock.acquire, lock.release, self.queue_timeout)
+                holds_lock = True
+                if is_shared():
+                    # 다른 워커에서 실행 중인 같은 대화의 턴 (워커 내 턴끼리는 위의 로컬 락으로 이미 순서가 정해짐)
+                    shared_lock = await self._acquire_shared_conversation_lock(
+                        conversation_id, self.queue_timeout - (time.monotonic() - queued_at)
+                    )
+                await _acquire_within(self._slots.acquire, self._slots.release, self.queue_timeout - (time.monotonic() - queued_at))
+                holds_slot = True
+            except asyncio.TimeoutError:
+                self.waiting -= 1
+                self._reject("timeout")
+            except BaseException:
+                self.waiting -= 1
+                raise
+
+            self.waiting -= 1
+            self._wait_times.append(time.monotonic() - queued_at)
+            self.admitted += 1
+            self.in_flight += 1
+            started = time.monotonic()
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+                self._turn_times.append(time.monotonic() - started)
+        finally:
+            if holds_slot:
+                self._slots.release()
+            try:
+                if shared_lock is not None:
+                    await release_lock(shared_key("turn_lock", conversation_id), shared_lock)
+                if shared_user is not None:
+                    await shared_state.backend.incr(shared_user, -1, ttl=CHAT_SHARED_LEASE)
+            except Exception as e:
+                logger.warning("공유 대화 락/사용자 카운트 반납 실패 (CHAT_SHARED_LEASE 후 자동 회수): %s", e)
+            finally:
+                if holds_lock:
+                    lock.release()
+                self._release_conversation_lock(conversation_id)
+                if user_id is not None:
+                    self._user_turns[user_id] -= 1
+                    if self._user_turns[user_id] == 0:
+                        del self._user_turns[user_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """대기열 길이, 처리 중 턴 수, 거절 횟수, 대기 시간(평균/p95/최대) 통계를 반환합니다."""
+        waits = sorted(self._wait_times)
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting_seen,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "wait_avg": sum(waits) / len(waits) if waits else 0.0,
+            "wait_p95": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+            "wait_max": waits[-1] if waits else 0.0,
+        }
+
+turn_scheduler = TurnScheduler(CHAT_MAX_CONCURRENT_TURNS, CHAT_MAX_TURNS_PER_USER, CHAT_MAX_QUEUE, CHAT_QUEUE_TIMEOUT)
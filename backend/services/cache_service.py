@@ -0,0 +1,104 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class AsyncTTLCache:
+    """TTL 만료 + 크기 제한 LRU 축출 + single-flight(동일 키 동시 요청 병합)를 지원하는 프로세스 내 캐시입니다."""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict() # key -> (만료 시각, 값)
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0 # 진행 중인 로드에 합류한 요청 수
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """(존재 여부, 값)을 반환합니다. 만료된 항목은 제거합니다. 통계에는 반영하지 않습니다."""
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """값을 저장합니다. 최대 크기를 넘으면 가장 오래 사용되지 않은 항목부터 제거합니다."""
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+        cache_if: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """캐시에 값이 있으면 반환하고, 없으면 loader 를 한 번만 실행해 결과를 공유합니다.
+
+        같은 키로 동시에 들어온 요청은 먼저 시작된 로드의 결과를 함께 기다립니다.
+        ttl=0 이면 결과를 저장하지 않고 진행 중인 요청 병합만 수행합니다.
+        cache_if 가 False 를 반환하는 결과(오류 응답 등)는 저장하지 않습니다.
+        """
+        found, value = self.get(key)
+        if found:
+            self.hits += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception() # 대기자가 없어도 'exception was never retrieved' 경고가 나지 않도록 처리
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        if ttl != 0 and (cache_if is None or cache_if(value)):
+            self.set(key, value, ttl)
+        future.set_result(value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """히트/미스/병합/축출 횟수와 현재 크기를 반환합니다."""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
@@ -1,72 +1,584 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
 import logging
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, List, Optional, Set, Tuple
 
 # 의존성 주입을 위해 필요한 모듈 임포트
-from db.mongo import save_chat_message, mongo_db # mongo_db 임포트 확인
-from services.openai_service import get_chat_response, MODEL_NAME # MODEL_NAME 임포트 (가격 계산에 필요할 수 있음)
+from db.mongo import save_chat_message, save_token_usage, get_session_summary, save_session_summary, get_messages_between
+from services.openai_service import get_chat_response, stream_chat_response, load_history, summarize_conversation, SYSTEM_PROMPT, MODEL_NAME, HISTORY_LIMIT # MODEL_NAME 임포트 (가격 계산에 필요할 수 있음)
+from services.tool_service import TOOL_REGISTRY
+from services.context_service import build_context, count_tokens, CONTEXT_SUMMARY_ENABLED, CONTEXT_SUMMARY_MIN_MESSAGES, CONTEXT_SUMMARY_MAX_MESSAGES
+from services.response_cache_service import response_cache, RESPONSE_CACHE_ENABLED
+from services.router_service import route_message
+from services.prompt_facts_service import build_prompt_facts
+from services.cache_service import AsyncTTLCache
+from services.admission_service import turn_scheduler
+from services.resilience_service import start_turn_deadline, remaining_time, UpstreamUnavailable
+from services.shared_state import shared_state, shared_key, is_shared
+from services.metrics_service import STAGE, CHAT_TURNS_IN_FLIGHT, record_llm_usage
+from services.tracing_service import span, start_span, set_span_attributes
+from logging_config import SAMPLED, conversation_id_var
 from schemas.token_usage import TokenUsage # 절대 경로로 수정
 
 logger = logging.getLogger(__name__)
 
-# === 비용 계산 상수 (GPT-4.1 nano 기준, 2025-04-20 사용자 제공 정보) ===
-# 입력: $0.100 / 1M tokens => $0.0001 / 1K tokens
-PRICE_PER_1K_TOKENS_PROMPT = 0.0001
-# 출력: $0.400 / 1M tokens => $0.0004 / 1K tokens
-PRICE_PER_1K_TOKENS_COMPLETION = 0.0004
+# === 중복 요청 병합 설정 ===
+CHAT_DEDUP_WINDOW = float(os.getenv("CHAT_DEDUP_WINDOW", "30")) # idempotency_key 가 같은 재전송 요청에 완료된 턴의 응답을 돌려주는 시간 (초, 0 이면 진행 중인 요청만 병합)
+CHAT_DEDUP_MAXSIZE = int(os.getenv("CHAT_DEDUP_MAXSIZE", "1024"))
+CHAT_DEDUP_LEASE = float(os.getenv("CHAT_DEDUP_LEASE", "180")) # 멀티 워커 모드에서 진행 중 표시 유지 시간 (초, 워커 비정상 종료 시 회수)
+CHAT_DEDUP_POLL_INTERVAL = float(os.getenv("CHAT_DEDUP_POLL_INTERVAL", "0.2")) # 다른 워커의 턴 완료를 확인하는 간격 (초)
 
-def calculate_cost(prompt_tokens: int, completion_tokens: int) -> float:
-    """토큰 수를 기반으로 예상 비용을 계산합니다."""
+# === 비용 계산 상수 (모델별 1M 토큰당 입력/출력 가격, USD) ===
+# GPT-4.1 nano 는 2025-04-20 사용자 제공 정보, 나머지는 OpenAI 공개 가격 기준
+MODEL_PRICES_PER_1M: Dict[str, Tuple[float, float]] = {
+    "gpt-4.1-nano": (0.100, 0.400),
+    "gpt-4.1-mini": (0.400, 1.600),
+    "gpt-4.1": (2.000, 8.000),
+    "gpt-4o-mini": (0.150, 0.600),
+    "gpt-4o": (2.500, 10.000),
+}
+# 가격 추가/변경: {"모델 이름": [입력, 출력]} (ROUTER_LIGHT_MODEL 에 표에 없는 모델을 쓸 때 지정)
+MODEL_PRICES_PER_1M.update({name: tuple(prices) for name, prices in json.loads(os.getenv("MODEL_PRICES", "{}")).items()})
+_unpriced_models: Set[str] = set()
+
+def _model_prices(model_name: str) -> Tuple[float, float]:
+    prices = MODEL_PRICES_PER_1M.get(model_name)
+    if prices is None:
+        if model_name not in _unpriced_models:
+            _unpriced_models.add(model_name)
+            logger.warning(f"모델 가격 정보 없음: {model_name} (MODEL_PRICES 로 지정), 기본 모델({MODEL_NAME}) 가격으로 계산합니다.")
+        prices = MODEL_PRICES_PER_1M[MODEL_NAME]
+    return prices
+
+def calculate_cost(prompt_tokens: int, completion_tokens: int, model_name: str = MODEL_NAME) -> float:
+    """토큰 수와 실제 사용한 모델의 가격으로 예상 비용을 계산합니다."""
     if prompt_tokens == 0 and completion_tokens == 0:
         return 0.0
 
-    prompt_cost = (prompt_tokens / 1000) * PRICE_PER_1K_TOKENS_PROMPT
-    completion_cost = (completion_tokens / 1000) * PRICE_PER_1K_TOKENS_COMPLETION
+    input_price, output_price = _model_prices(model_name)
+    prompt_cost = prompt_tokens * input_price / 1_000_000
+    completion_cost = completion_tokens * output_price / 1_000_000
     total_cost = prompt_cost + completion_cost
-    logger.debug(f"비용 계산: Prompt={prompt_tokens} (${prompt_cost:.6f}), Completion={completion_tokens} (${completion_cost:.6f}), Total=${total_cost:.6f}")
+    logger.debug("비용 계산 (%s): Prompt=%d ($%.6f), Completion=%d ($%.6f), Total=$%.6f", model_name, prompt_tokens, prompt_cost, completion_tokens, completion_cost, total_cost)
     return total_cost
 
-async def handle_new_message(conversation_id: str, user_message: str) -> str:
-    """새로운 사용자 메시지를 처리하고, 토큰 사용량과 비용을 기록합니다."""
-    logger.info(f"채팅 서비스 시작: ConvID={conversation_id}")
+def _router_saved_cost(route: Optional[Dict[str, Any]], model_name: str, prompt_tokens: int, completion_tokens: int, cost: float) -> Optional[float]:
+    """라우터 절감 비용: 빠진 도구 스키마 토큰(사용한 모델 입력 가격) + 기본 모델 대신 저렴한 모델을 쓴 차액"""
+    if not route:
+        return None
+    saved = calculate_cost(route["saved_tokens"] or 0, 0, model_name)
+    if model_name != MODEL_NAME:
+        saved += calculate_cost(prompt_tokens, completion_tokens, MODEL_NAME) - cost
+    return saved or None
 
-    # 1. 사용자 메시지 저장 (토큰/비용 정보 없음)
-    await save_chat_message(conversation_id, "user", user_message)
-    logger.debug(f"사용자 메시지 저장 완료: ConvID={conversation_id}")
+def _tool_fields(
+    route: Optional[Dict[str, Any]],
+    used_tools: Optional[List[str]],
+    facts: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """라우터 판단, 프롬프트 정보, 도구 사용 결과를 TokenUsage 필드로 바꿉니다. (used_tools 가 None 이면 모델 호출이 없었던 턴)"""
+    if used_tools is None:
+        return {}
+    covered = facts["covered_tools"] if facts else ()
+    offered = [name for name in (route["tools"] if route else TOOL_REGISTRY) if name not in covered]
+    fields = {
+        "offered_tools": offered,
+        "used_tools": sorted(set(used_tools)) if offered else None,
+        "fact_tools": _fact_tools(facts) or None,
+    }
+    if route:
+        fields.update(
+            route=route["route"],
+            predicted_tools=route["predicted"] if route["predicted"] != offered else None,
+            router_saved_tokens=route["saved_tokens"] or None,
+        )
+    return fields
 
-    # 2. OpenAI 서비스 호출 (봇 응답 + 토큰 정보 받기)
-    bot_response, prompt_tokens, completion_tokens = await get_chat_response(conversation_id, user_message)
-    logger.debug(f"봇 응답 및 토큰 수신 완료: ConvID={conversation_id}")
+def _fact_tools(facts: Optional[Dict[str, Any]]) -> List[str]:
+    """프롬프트 정보로 답한(것으로 예측한) 도구 목록 (도구를 호출한 것과 같이 응답 캐시에 저장하지 않음)"""
+    return facts["answered_tools"] if facts else []
 
-    # 3. 비용 계산 (별도 저장 위해 계산은 유지)
-    cost = calculate_cost(prompt_tokens, completion_tokens)
+async def _save_token_usage(
+    conversation_id: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    cache_hit: Optional[Dict[str, Any]] = None,
+    route: Optional[Dict[str, Any]] = None,
+    used_tools: Optional[List[str]] = None,
+    facts: Optional[Dict[str, Any]] = None
+):
+    """토큰 사용량을 'token_usages' 컬렉션에 저장합니다. 실패해도 챗봇 흐름은 막지 않습니다.
 
-    # 3.5 토큰 사용량 MongoDB의 'token_usages' 컬렉션에 저장 (이전 단계에서 추가됨)
+    cache_hit(응답 캐시 항목)이 주어지면 사용량 0 으로 기록하고, 원래 응답에 들었던 토큰 수를 절감량으로 남깁니다.
+    route(라우터 판단)와 used_tools 가 주어지면 보낸/예측한/사용한 도구와 라우터 절감량을 함께 남깁니다.
+    facts(프롬프트 정보)가 주어지면 도구 대신 그 정보로 답한 도구도 남깁니다.
+    """
+    model_name = route["model"] if route and route["model"] else MODEL_NAME
+    tool_fields = _tool_fields(route, used_tools, facts)
+    cost = calculate_cost(prompt_tokens, completion_tokens, model_name) # 라우터가 고른 모델 가격
     token_usage_data = TokenUsage(
         session_id=conversation_id,
-        model_name=MODEL_NAME, # openai_service 에서 가져온 모델 이름 사용
+        model_name=model_name, # 라우터가 저렴한 모델을 고른 턴은 그 모델
         input_tokens=prompt_tokens,
         output_tokens=completion_tokens,
-        total_tokens=prompt_tokens + completion_tokens
+        total_tokens=prompt_tokens + completion_tokens,
+        cost=cost,
+        cache_hit=cache_hit["tier"] if cache_hit else None,
+        saved_input_tokens=cache_hit["prompt_tokens"] if cache_hit else None,
+        saved_output_tokens=cache_hit["completion_tokens"] if cache_hit else None,
+        saved_cost=calculate_cost(cache_hit["prompt_tokens"], cache_hit["completion_tokens"]) if cache_hit else None,
+        router_saved_cost=_router_saved_cost(route, model_name, prompt_tokens, completion_tokens, cost) if used_tools is not None else None,
+        **tool_fields,
         # user_id 필드는 필요시 추가 구현
-        # cost 필드는 TokenUsage 스키마에 없으므로 저장 안 함 (필요 시 스키마 수정)
+    )
+    record_llm_usage(
+        model_name, prompt_tokens, completion_tokens, cost,
+        cache_hit=cache_hit["tier"] if cache_hit else None,
+        saved_tokens=cache_hit["prompt_tokens"] + cache_hit["completion_tokens"] if cache_hit else 0,
+        router_saved_tokens=tool_fields.get("router_saved_tokens") or 0,
     )
     try:
-        # mongo_db 객체를 통해 동적으로 컬렉션 접근
-        await mongo_db.db['token_usages'].insert_one(token_usage_data.dict(by_alias=True, exclude_none=True))
-        logger.debug(f"토큰 사용량 저장 완료: ConvID={conversation_id}, Model={MODEL_NAME}, In={prompt_tokens}, Out={completion_tokens}")
+        await save_token_usage(token_usage_data.dict(by_alias=True, exclude_none=True))
+        logger.debug("토큰 사용량 저장 완료: ConvID=%s, Model=%s, In=%d, Out=%d", conversation_id, model_name, prompt_tokens, completion_tokens)
     except Exception as e:
         logger.error(f"토큰 사용량 저장 실패: ConvID={conversation_id}, Error: {e}", exc_info=True)
         # 토큰 저장 실패가 챗봇 흐름을 막지 않도록 처리 (로깅만 함)
 
-    # 4. 봇 응답 저장 ('chat_history' 컬렉션) - 토큰/비용 정보 제외
-    await save_chat_message(
-        conversation_id=conversation_id,
-        role="assistant",
-        content=bot_response
-        # prompt_tokens=prompt_tokens, # 제거
-        # completion_tokens=completion_tokens, # 제거
-        # cost=cost # 제거
+# === 턴 저장 순서 / 내구성 ===
+# 1. 대화 기록을 먼저 읽고(대부분 캐시) 컨텍스트를 구성한 뒤, 사용자 메시지 저장은 모델 호출과 동시에 진행합니다.
+#    사용자 메시지는 모델 호출 전에 시각을 확정하므로 timestamp 순서는 항상 user -> assistant 입니다.
+# 2. 모델 응답 후에는 사용자 메시지 저장 완료를 기다린 뒤, 토큰 사용량과 봇 응답을
+#    서로 다른 컬렉션에 동시에 저장합니다. (임계 경로 상 DB 쓰기 왕복 1회)
+# 3. 모델 호출 중 프로세스가 종료되어도 사용자 메시지는 이미 저장(또는 저장 진행 중)이므로
+#    턴의 입력은 유실되지 않으며, 기존과 동일하게 봇 응답이 없는 사용자 메시지로 남습니다.
+# 4. 사용자 메시지 저장이 실패하면 봇 응답은 저장하지 않고 턴을 실패시킵니다. (모델 비용은 발생했으므로 토큰 사용량만 기록)
+#    기록에 질문 없이 답만 남지 않고, 클라이언트는 같은 idempotency_key 로 다시 보낼 수 있습니다.
+
+# 진행 중인 백그라운드 요약 작업: conversation_id -> task (중복 요약 방지 및 GC 로 취소되지 않도록 참조 유지)
+_summary_tasks: Dict[str, asyncio.Task] = {}
+
+# === 대화 요약 (CONTEXT_SUMMARY_ENABLED) ===
+# 세션 문서의 summary_until(요약에 포함된 마지막 메시지 시각)과 summary_count(그 시각까지의 메시지 수)가 워터마크입니다.
+# 컨텍스트에서 빠지는 메시지는 두 종류이며 둘 다 요약에 합칩니다.
+#  - 불러온 최근 HISTORY_LIMIT 개 중 토큰 예산 밖으로 밀려난 메시지 (build_context 의 unsummarized)
+#  - 최근 HISTORY_LIMIT 개 창보다 오래된 메시지: message_count 와 summary_count 로 개수를 계산하고, 요약할 때 DB 에서 읽음
+
+def _outside_window(history: List[Dict[str, Any]], summary: Optional[Dict[str, Any]]) -> int:
+    """불러온 기록 창보다 오래되었지만 아직 요약되지 않은 메시지 수"""
+    if not summary or len(history) < HISTORY_LIMIT:
+        return 0 # 창이 가득 차지 않았으면 대화 전체를 불러온 것
+    summarized_in_window = _count_until(history, summary["summary_until"])
+    return max(0, summary["message_count"] - len(history) - (summary["summary_count"] - summarized_in_window))
+
+def _count_until(history: List[Dict[str, Any]], until: Optional[datetime]) -> int:
+    return 0 if until is None else sum(1 for m in history if m["timestamp"] <= until)
+
+async def _refresh_summary(
+    conversation_id: str,
+    summary: Dict[str, Any],
+    history: List[Dict[str, Any]],
+    unsummarized: List[Dict[str, Any]],
+    outside: int
+):
+    """컨텍스트에서 빠진 기록(창 밖 + 예산 밖)을 기존 요약에 합쳐 세션 문서에 저장합니다."""
+    try:
+        dropped, caught_up = unsummarized, True
+        if outside:
+            gap = await get_messages_between(conversation_id, summary["summary_until"], history[0]["timestamp"], CONTEXT_SUMMARY_MAX_MESSAGES)
+            caught_up = len(gap) < CONTEXT_SUMMARY_MAX_MESSAGES
+            dropped = gap + unsummarized if caught_up else gap # 따라잡는 중이면 워터마크가 건너뛰지 않도록 창 밖 메시지만
+        window_start = summary["message_count"] - len(history) # 창보다 오래된 메시지 수
+        if not dropped:
+            # 요약할 메시지가 없음: 창 밖 메시지가 모두 이미 요약된 상태이므로 summary_count 만 바로잡음
+            await save_session_summary(conversation_id, None, None, window_start + _count_until(history, summary["summary_until"]))
+            return
+        until = dropped[-1]["timestamp"]
+        if caught_up:
+            summary_count = window_start + _count_until(history, until)
+        else:
+            summary_count = summary["summary_count"] + len(dropped)
+        text, prompt_tokens, completion_tokens = await summarize_conversation(summary["summary"], dropped)
+        await save_session_summary(conversation_id, text, until, summary_count)
+        await _save_token_usage(conversation_id, prompt_tokens, completion_tokens)
+        logger.info(f"대화 요약 갱신 완료: ConvID={conversation_id}, 요약된 메시지 {len(dropped)}개 (창 밖 {len(dropped) - len(unsummarized) if caught_up else len(dropped)}개)")
+    except Exception as e:
+        logger.error(f"대화 요약 갱신 실패: ConvID={conversation_id}, Error: {e}", exc_info=True)
+
+async def _begin_turn(conversation_id: str, user_message: str):
+    """대화 기록으로 컨텍스트를 구성하고, 사용자 메시지 저장을 백그라운드로 시작합니다. (컨텍스트, 저장 task) 반환"""
+    started = time.perf_counter()
+    history = await load_history(conversation_id)
+    summary = await get_session_summary(conversation_id) if CONTEXT_SUMMARY_ENABLED else None
+    loaded = time.perf_counter()
+    STAGE["load_history"].observe(loaded - started)
+    context, unsummarized = build_context(history, user_message, SYSTEM_PROMPT, summary)
+    STAGE["build_context"].observe(time.perf_counter() - loaded)
+    outside = _outside_window(history, summary)
+    if (CONTEXT_SUMMARY_ENABLED and summary and len(unsummarized) + outside >= CONTEXT_SUMMARY_MIN_MESSAGES
+            and conversation_id not in _summary_tasks):
+        task = asyncio.create_task(_refresh_summary(conversation_id, summary, history, unsummarized, outside))
+        _summary_tasks[conversation_id] = task
+        task.add_done_callback(lambda _: _summary_tasks.pop(conversation_id, None))
+
+    user_timestamp = datetime.utcnow()
+    user_write = asyncio.create_task(save_chat_message(
+        conversation_id, "user", user_message, timestamp=user_timestamp, token_count=count_tokens(user_message)
+    ))
+    return context, user_write
+
+async def _finish_turn(
+    conversation_id: str,
+    user_write: asyncio.Task,
+    bot_response: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    cache_hit: Optional[Dict[str, Any]] = None,
+    route: Optional[Dict[str, Any]] = None,
+    used_tools: Optional[List[str]] = None,
+    facts: Optional[Dict[str, Any]] = None
+):
+    """사용자 메시지 저장을 마무리하고, 토큰 사용량과 봇 응답을 동시에 저장합니다.
+
+    사용자 메시지 저장이 실패했으면 토큰 사용량만 기록하고 그 예외를 그대로 발생시킵니다.
+    """
+    started = time.perf_counter()
+    try:
+        await user_write
+    except Exception:
+        logger.error("사용자 메시지 저장 실패로 봇 응답을 저장하지 않습니다: ConvID=%s", conversation_id)
+        await _save_token_usage(conversation_id, prompt_tokens, completion_tokens, cache_hit, route, used_tools, facts)
+        raise
+    await asyncio.gather(
+        _save_token_usage(conversation_id, prompt_tokens, completion_tokens, cache_hit, route, used_tools, facts),
+        save_chat_message(
+            conversation_id=conversation_id,
+            role="assistant",
+            content=bot_response,
+            token_count=count_tokens(bot_response)
+        ),
     )
-    logger.debug(f"봇 응답 저장 완료 (메시지만): ConvID={conversation_id}")
+    STAGE["persist"].observe(time.perf_counter() - started)
+
+async def _settle(write: asyncio.Task):
+    """모델 호출이 실패/취소된 턴에서 사용자 메시지 저장이 끝나기를 기다립니다.
+
+    저장 실패는 save_chat_message 에서 이미 로깅되므로, 원래 예외를 가리지 않도록 여기서는 발생시키지 않습니다.
+    """
+    await asyncio.wait([write])
+    if not write.cancelled():
+        write.exception() # 'exception was never retrieved' 경고 방지
+
+def _cache_scope(facts: Optional[Dict[str, Any]]) -> str:
+    """응답 캐시의 프롬프트 범위: 시스템 프롬프트 + 프롬프트에 넣은 정보(KST 날짜 등)
+
+    날짜 질문을 라우터가 놓쳐 정보에 기댄 응답이 저장되더라도 다음 날에는 재사용되지 않습니다.
+    """
+    return f"{SYSTEM_PROMPT}\x00{facts['cache_key']}" if facts else SYSTEM_PROMPT
+
+def _lookup_cached_response(
+    context: List[Dict[str, Any]],
+    user_message: str,
+    facts: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Any]]:
+    """응답 캐시가 켜져 있으면 캐시된 응답을 찾습니다."""
+    if not RESPONSE_CACHE_ENABLED or not user_message:
+        return None
+    return response_cache.lookup(_cache_scope(facts), context, user_message)
+
+def _store_cached_response(
+    context: List[Dict[str, Any]],
+    user_message: str,
+    bot_response: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    used_tools: List[str],
+    facts: Optional[Dict[str, Any]] = None
+):
+    if RESPONSE_CACHE_ENABLED and user_message:
+        response_cache.store(
+            _cache_scope(facts), context, user_message, bot_response, prompt_tokens, completion_tokens,
+            used_tools + _fact_tools(facts), # 프롬프트 정보로 답한 도구도 시점 의존 도구로 취급
+        )
+
+# === 중복 요청 병합 (single-flight) ===
+# 재시도/중복 제출된 동일 턴((conversation_id, message, idempotency_key))은 모델 호출과 DB 쓰기를 한 번만 수행합니다.
+#  - 진행 중인 턴이 있으면 그 결과(future)를 함께 기다림
+#  - idempotency_key 가 있고 CHAT_DEDUP_WINDOW 안에 완료된 같은 턴이 있으면 저장된 응답을 그대로 반환
+# idempotency_key 가 없으면 동시에 진행 중인 요청만 병합합니다. 끝난 턴 뒤에 같은 메시지("응" 등)를 다시 보낸 것은
+# 재전송인지 새 턴인지 구분할 수 없으므로 새 턴으로 처리합니다.
+# 턴은 별도 task 로 실행되므로 처음 요청한 클라이언트의 연결이 끊겨도 중단되지 않습니다.
+TurnKey = Tuple[str, str, Optional[str]]
+
+_inflight_turns: Dict[TurnKey, asyncio.Future] = {}
+_recent_turns = AsyncTTLCache("chat_turn", maxsize=CHAT_DEDUP_MAXSIZE, ttl=CHAT_DEDUP_WINDOW)
+dedup_stats = {"coalesced": 0, "replayed": 0}
+
+def _turn_key(conversation_id: str, user_message: str, idempotency_key: Optional[str]) -> TurnKey:
+    return (conversation_id, user_message, idempotency_key)
+
+def _remember_turn(key: TurnKey, future: asyncio.Future):
+    """턴이 끝나면 진행 중 목록에서 제거하고, 성공한 응답은 재전송 대비 잠시 보관합니다."""
+    _inflight_turns.pop(key, None)
+    if future.cancelled():
+        return
+    if future.exception() is None and _replayable(key):
+        _recent_turns.set(key, future.result())
+
+def _replayable(key: TurnKey) -> bool:
+    """완료된 턴의 응답을 재전송 요청에 돌려줄 수 있는지 (클라이언트가 idempotency_key 를 보낸 턴만)"""
+    return key[2] is not None and CHAT_DEDUP_WINDOW > 0
+
+def _join_turn(key: TurnKey) -> Optional[Awaitable[str]]:
+    """같은 턴이 진행 중이거나 방금 끝났으면 그 응답을 기다리는 awaitable 을, 아니면 None 을 반환합니다."""
+    found, bot_response = _recent_turns.get(key) if _replayable(key) else (False, None)
+    if found:
+        dedup_stats["replayed"] += 1
+        logger.info(f"중복 요청: 최근 완료된 턴의 응답 재사용 (ConvID={key[0]})")
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(bot_response)
+        return future
+    inflight = _inflight_turns.get(key)
+    if inflight is not None:
+        dedup_stats["coalesced"] += 1
+        logger.info(f"중복 요청: 진행 중인 턴에 합류 (ConvID={key[0]})")
+        return asyncio.shield(inflight)
+    return None
+
+def _start_turn(key: TurnKey, future: asyncio.Future):
+    _inflight_turns[key] = future
+    future.add_done_callback(lambda done: _remember_turn(key, done))
+    if is_shared():
+        future.add_done_callback(lambda done: _publish_tasks.add(asyncio.ensure_future(_publish_shared_turn(key, done))))
+
+# --- 워커 간 병합 (SHARED_STATE_BACKEND=redis/sqlite) ---
+# 같은 턴이 다른 워커로 들어온 경우를 위해 공유 상태에 "running" 표시를 SET NX 로 선점하고,
+# 완료되면 응답(JSON)으로 바꿔 CHAT_DEDUP_WINDOW 동안 보관합니다. 실패하면 표시를 지워 다음 요청이 다시 처리합니다.
+_RUNNING = "running"
+_publish_tasks: Set[asyncio.Future] = set()
+
+def _shared_turn_key(key: TurnKey) -> str:
+    digest = hashlib.sha256(json.dumps(key, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return shared_key("turn", digest)
+
+async def _publish_shared_turn(key: TurnKey, future: asyncio.Future):
+    name = _shared_turn_key(key)
+    try:
+        if not future.cancelled() and future.exception() is None and _replayable(key):
+            await shared_state.backend.set(name, json.dumps({"response": future.result()}), ttl=CHAT_DEDUP_WINDOW)
+        else:
+            await shared_state.backend.delete(name)
+    except Exception as e:
+        logger.warning("공유 턴 상태 갱신 실패 (ConvID=%s): %s", key[0], e)
+    finally:
+        _publish_tasks.discard(asyncio.current_task())
+
+async def _join_shared_turn(key: TurnKey) -> Optional[str]:
+    """다른 워커가 같은 턴을 처리 중이거나 방금 끝냈으면 그 응답을, 이 워커가 처리해야 하면 None 을 반환합니다.
+
+    다른 워커의 턴이 끝날 때까지 턴 마감 시간 안에서 기다리며, 그 턴이 실패하면 이 워커가 이어받습니다.
+    """
+    name = _shared_turn_key(key)
+    counted = False
+    while True:
+        inflight = _inflight_turns.get(key)
+        if inflight is not None: # 기다리는 사이 이 워커에서 같은 턴이 시작됨
+            dedup_stats["coalesced"] += 1
+            return await asyncio.shield(inflight)
+        if await shared_state.backend.set(name, _RUNNING, ttl=CHAT_DEDUP_LEASE, nx=True):
+            return None
+        value = await shared_state.backend.get(name)
+        if value is not None and value != _RUNNING:
+            dedup_stats["replayed" if not counted else "coalesced"] += 1
+            logger.info("중복 요청: 다른 워커의 턴 응답 재사용 (ConvID=%s)", key[0])
+            return json.loads(value)["response"]
+        if value == _RUNNING and not counted:
+            counted = True
+            logger.info("중복 요청: 다른 워커에서 진행 중인 턴 대기 (ConvID=%s)", key[0])
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise UpstreamUnavailable("turn deadline exceeded while waiting for duplicate turn", retry_after=1)
+        await asyncio.sleep(CHAT_DEDUP_POLL_INTERVAL)
+
+def get_dedup_stats() -> Dict[str, Any]:
+    return {
+        "inflight": len(_inflight_turns),
+        "recent": _recent_turns.stats()["size"],
+        "window_seconds": CHAT_DEDUP_WINDOW,
+        **dedup_stats,
+    }
+
+async def handle_new_message(
+    conversation_id: str,
+    user_message: str,
+    idempotency_key: Optional[str] = None,
+    user_id: Optional[str] = None,
+    timeout: Optional[float] = None
+) -> str:
+    """새로운 사용자 메시지를 처리합니다. 동일한 턴의 중복 요청은 한 번만 처리하고 같은 응답을 돌려줍니다.
+
+    턴은 turn_scheduler 를 거쳐 대화별로 순서대로 실행되며, 수용 한도를 넘으면 AdmissionRejected 가 발생합니다.
+    timeout(초)은 대기열 대기와 업스트림 재시도를 포함한 턴 전체의 마감 시간입니다. (최대 CHAT_TURN_TIMEOUT)
+    """
+    start_turn_deadline(timeout) # 이후 생성되는 턴 task 로 전파됨
+    conversation_id_var.set(conversation_id) # 로그 레코드에 ConvID 자동 첨부
+    with span("handle_new_message") as turn_span:
+        key = _turn_key(conversation_id, user_message, idempotency_key)
+        joined = _join_turn(key)
+        if joined is not None:
+            if turn_span:
+                turn_span.set(deduplicated=True)
+            return await joined
+        if is_shared():
+            bot_response = await _join_shared_turn(key)
+            if bot_response is not None:
+                if turn_span:
+                    turn_span.set(deduplicated=True)
+                return bot_response
+        task = asyncio.create_task(_admitted_turn(conversation_id, user_message, user_id)) # 현재 span 이 부모로 전파됨
+        _start_turn(key, task)
+        return await asyncio.shield(task)
+
+async def _admitted_turn(conversation_id: str, user_message: str, user_id: Optional[str]) -> str:
+    queued_at = time.perf_counter()
+    async with turn_scheduler.admit(conversation_id, user_id):
+        set_span_attributes(queue_wait_ms=round((time.perf_counter() - queued_at) * 1000, 2))
+        return await _process_turn(conversation_id, user_message)
+
+async def _process_turn(conversation_id: str, user_message: str) -> str:
+    """새로운 사용자 메시지를 처리하고, 토큰 사용량과 비용을 기록합니다."""
+    logger.info("채팅 서비스 시작: ConvID=%s", conversation_id, extra=SAMPLED)
+
+    # 1. 토큰 예산 기반 컨텍스트 구성 + 사용자 메시지 저장 시작 (모델 호출과 동시에 진행)
+    context, user_write = await _begin_turn(conversation_id, user_message)
+
+    # 1-1. 프롬프트에 넣을 정보(현재 날짜 등) 구성 후 응답 캐시 확인 (히트 시 모델 호출 없이 비용 0 으로 기록)
+    facts = build_prompt_facts(user_message, context)
+    cache_hit = _lookup_cached_response(context, user_message, facts)
+    if cache_hit:
+        logger.info("응답 캐시 히트 (%s): ConvID=%s", cache_hit["tier"], conversation_id)
+        set_span_attributes(cache_hit=cache_hit["tier"])
+        await _finish_turn(conversation_id, user_write, cache_hit["response"], 0, 0, cache_hit)
+        return cache_hit["response"]
+
+    # 2. 보낼 도구/모델 결정 후 OpenAI 서비스 호출 (봇 응답 + 토큰 정보 받기)
+    route = route_message(user_message, context, exclude=facts["covered_tools"] if facts else ())
+    used_tools: List[str] = []
+    started = time.perf_counter()
+    CHAT_TURNS_IN_FLIGHT.inc()
+    try:
+        bot_response, prompt_tokens, completion_tokens = await get_chat_response(conversation_id, user_message, context, used_tools, route, facts)
+    except BaseException:
+        await _settle(user_write) # 실패해도 사용자 메시지 저장은 완료
+        raise
+    finally:
+        CHAT_TURNS_IN_FLIGHT.dec()
+        STAGE["openai"].observe(time.perf_counter() - started)
+    logger.debug("봇 응답 및 토큰 수신 완료: ConvID=%s", conversation_id)
+    set_span_attributes(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, tools=",".join(used_tools))
+
+    # 3. 토큰 사용량('token_usages') / 봇 응답('chat_history') 저장 (사용자 메시지 저장 실패 시 여기서 턴 실패)
+    await _finish_turn(conversation_id, user_write, bot_response, prompt_tokens, completion_tokens, route=route, used_tools=used_tools, facts=facts)
+    logger.debug("턴 저장 완료: ConvID=%s", conversation_id)
+    _store_cached_response(context, user_message, bot_response, prompt_tokens, completion_tokens, used_tools, facts)
+
+    # 4. 봇 응답 반환
+    return bot_response
+
+async def handle_new_message_stream(
+    conversation_id: str,
+    user_message: str,
+    idempotency_key: Optional[str] = None,
+    user_id: Optional[str] = None,
+    timeout: Optional[float] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """handle_new_message 의 스트리밍 버전입니다.
+
+    openai_service.stream_chat_response 의 이벤트를 그대로 전달하고,
+    스트림이 정상 종료되면 토큰 사용량과 봇 응답을 한 번만 저장합니다.
+    같은 턴이 진행 중이거나 방금 끝났으면 모델을 다시 호출하지 않고 완성된 응답을 delta 하나로 전달합니다.
+    """
+    start_turn_deadline(timeout)
+    conversation_id_var.set(conversation_id)
+    key = _turn_key(conversation_id, user_message, idempotency_key)
+    joined = _join_turn(key)
+    if joined is not None:
+        bot_response = await joined
+    else:
+        bot_response = await _join_shared_turn(key) if is_shared() else None
+    if bot_response is not None:
+        yield {"type": "delta", "content": bot_response}
+        yield {"type": "done", "response": bot_response, "prompt_tokens": 0, "completion_tokens": 0}
+        return
+
+    future = asyncio.get_running_loop().create_future()
+    _start_turn(key, future)
+    turn_span = start_span("handle_new_message_stream") # yield 를 감싸므로 현재 span 으로 설정하지 않음
+    queued_at = time.perf_counter()
+    try:
+        async with turn_scheduler.admit(conversation_id, user_id):
+            if turn_span:
+                turn_span.set(queue_wait_ms=round((time.perf_counter() - queued_at) * 1000, 2))
+            async for event in _process_turn_stream(conversation_id, user_message):
+                if event["type"] == "done":
+                    if not future.done():
+                        future.set_result(event["response"])
+                    if turn_span:
+                        turn_span.set(prompt_tokens=event["prompt_tokens"], completion_tokens=event["completion_tokens"])
+                yield event
+    except Exception as e:
+        if turn_span:
+            turn_span.finish(e)
+        if not future.done():
+            future.set_exception(e)
+            future.exception() # 합류한 요청이 없어도 'exception was never retrieved' 경고가 나지 않도록 처리
+        raise
+    finally:
+        if turn_span:
+            turn_span.finish()
+        if not future.done():
+            # 클라이언트 연결 종료 등으로 done 이전에 스트림이 닫힌 경우, 합류한 요청은 503 으로 끝나고 재시도함
+            future.set_exception(ConnectionError("원 요청의 스트림이 중단되었습니다."))
+            future.exception()
+
+async def _process_turn_stream(conversation_id: str, user_message: str) -> AsyncIterator[Dict[str, Any]]:
+    logger.info("스트리밍 채팅 서비스 시작: ConvID=%s", conversation_id, extra=SAMPLED)
+
+    # 1. 컨텍스트 구성 + 사용자 메시지 저장 시작
+    context, user_write = await _begin_turn(conversation_id, user_message)
+
+    # 1-1. 프롬프트에 넣을 정보 구성 후 응답 캐시 확인 (히트 시 전체 응답을 delta 하나로 전달)
+    facts = build_prompt_facts(user_message, context)
+    cache_hit = _lookup_cached_response(context, user_message, facts)
+    if cache_hit:
+        logger.info("응답 캐시 히트 (%s, 스트리밍): ConvID=%s", cache_hit["tier"], conversation_id)
+        await _finish_turn(conversation_id, user_write, cache_hit["response"], 0, 0, cache_hit)
+        yield {"type": "delta", "content": cache_hit["response"]}
+        yield {"type": "done", "response": cache_hit["response"], "prompt_tokens": 0, "completion_tokens": 0}
+        return
+
+    # 2. 보낼 도구/모델 결정 후 OpenAI 스트리밍 호출 (이벤트 전달)
+    route = route_message(user_message, context, exclude=facts["covered_tools"] if facts else ())
+    used_tools: List[str] = []
+    started = time.perf_counter()
+    CHAT_TURNS_IN_FLIGHT.inc()
+    try:
+        async for event in stream_chat_response(conversation_id, user_message, context, used_tools, route, facts):
+            if event["type"] != "done":
+                yield event
+                continue
+            STAGE["openai_stream"].observe(time.perf_counter() - started)
 
-    # 5. 봇 응답 반환
-    return bot_response
\ No newline at end of file
+            # 3. 스트림 완료: 토큰 사용량 / 봇 응답 저장 (비용은 _save_token_usage 에서 사용한 모델 가격으로 계산)
+            prompt_tokens = event["prompt_tokens"]
+            completion_tokens = event["completion_tokens"]
+            await _finish_turn(conversation_id, user_write, event["response"], prompt_tokens, completion_tokens, route=route, used_tools=used_tools, facts=facts)
+            logger.debug("스트리밍 턴 저장 완료: ConvID=%s", conversation_id)
+            _store_cached_response(context, user_message, event["response"], prompt_tokens, completion_tokens, used_tools, facts)
+            yield event
+    finally:
+        CHAT_TURNS_IN_FLIGHT.dec()
+        await _settle(user_write) # 이미 끝났으면 바로 반환
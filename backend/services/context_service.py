@@ -0,0 +1,83 @@
+import os
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# === 컨텍스트 구성 설정 ===
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000")) # 시스템 프롬프트 + 기록 + 사용자 메시지 토큰 예산 (bench.context_replay 로 비교)
+CONTEXT_SUMMARY_ENABLED = os.getenv("CONTEXT_SUMMARY_ENABLED", "false").lower() == "true" # 예산 밖 기록을 요약으로 대체
+CONTEXT_SUMMARY_MIN_MESSAGES = int(os.getenv("CONTEXT_SUMMARY_MIN_MESSAGES", "6")) # 요약되지 않은 메시지가 이만큼 쌓이면 요약 갱신
+CONTEXT_SUMMARY_MAX_MESSAGES = int(os.getenv("CONTEXT_SUMMARY_MAX_MESSAGES", "100")) # 한 번의 요약에 넣는 최대 메시지 수 (긴 대화에서 처음 켤 때는 여러 턴에 나눠 따라잡음)
+MESSAGE_TOKEN_OVERHEAD = 4 # 메시지당 role/구분자 토큰 (OpenAI chat 포맷 기준 근사치)
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "o200k_base") # gpt-4.1 계열 인코딩
+
+SUMMARY_SYSTEM_TEMPLATE = "이전 대화 요약 (오래된 메시지는 생략됨):\n{summary}"
+
+def _load_encoder():
+    """tiktoken 인코더를 로드합니다. 설치되지 않았거나 로드에 실패하면 None (근사치 계산 사용)."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning(f"tiktoken 인코더를 사용할 수 없어 근사치로 토큰 수를 계산합니다: {e}")
+        return None
+
+_encoder = _load_encoder()
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """텍스트의 토큰 수를 계산합니다. tiktoken 이 없으면 UTF-8 바이트 수 기반 근사치를 사용합니다."""
+    if not text:
+        return 0
+    if _encoder is not None:
+        return len(_encoder.encode(text))
+    return len(text.encode("utf-8")) // 3 + 1 # 한글 1글자(3바이트) ≈ 1토큰, 영문 ≈ 3~4글자/토큰
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """저장 시 계산해 둔 token_count 가 있으면 사용하고, 없으면 계산합니다."""
+    token_count = message.get("token_count")
+    if token_count is None:
+        token_count = count_tokens(message.get("content") or "")
+    return token_count + MESSAGE_TOKEN_OVERHEAD
+
+def build_context(
+    history: List[Dict[str, Any]],
+    message: str,
+    system_prompt: str,
+    summary: Optional[Dict[str, Any]] = None,
+    budget: int = CONTEXT_TOKEN_BUDGET
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """토큰 예산 안에서 최근 기록을 최대한 담은 컨텍스트를 구성합니다.
+
+    history 는 시간순(오래된 것부터) 메시지 목록입니다. summary(get_session_summary 결과)에 요약이 있으면
+    예산 밖으로 밀려난 오래된 기록 대신 요약을 시스템 메시지로 넣습니다.
+    반환값: (모델에 보낼 기록 메시지 목록, 예산 밖으로 밀려났지만 아직 요약되지 않은 메시지 목록)
+    """
+    remaining = budget - count_tokens(system_prompt) - count_tokens(message) - 2 * MESSAGE_TOKEN_OVERHEAD
+    summary_message = None
+    if summary and summary.get("summary"):
+        summary_message = {"role": "system", "content": SUMMARY_SYSTEM_TEMPLATE.format(summary=summary["summary"])}
+        remaining -= message_tokens(summary_message)
+
+    # 최신 메시지부터 예산이 허락하는 만큼 담기
+    kept = 0
+    for past_message in reversed(history):
+        cost = message_tokens(past_message)
+        if cost > remaining:
+            break
+        remaining -= cost
+        kept += 1
+    dropped = history[:len(history) - kept]
+    context = [{"role": m["role"], "content": m["content"]} for m in history[len(history) - kept:]]
+
+    if summary_message:
+        context.insert(0, summary_message)
+    summary_until = summary.get("summary_until") if summary else None
+    unsummarized = [
+        m for m in dropped
+        if summary_until is None or (m.get("timestamp") is not None and m["timestamp"] > summary_until)
+    ]
+    logger.debug(f"컨텍스트 구성: 기록 {kept}/{len(history)}개 포함, 남은 예산 {remaining} 토큰")
+    return context, unsummarized
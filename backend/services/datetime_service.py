@@ -1,6 +1,6 @@
 import datetime
 import logging
-from typing import Dict
+from typing import Dict, Optional
 # zoneinfo 추가 (Python 3.9+)
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
@@ -14,15 +14,23 @@ except ZoneInfoNotFoundError:
     logger.error("'Asia/Seoul' 시간대를 찾을 수 없습니다. 시스템에 시간대 데이터가 설치되어 있는지 확인하세요.")
     # 또는 pytz 라이브러리를 대신 사용할 수 있습니다.
 
+WEEKDAYS_KO = ("월", "화", "수", "목", "금", "토", "일")
+
+def now_kst() -> Optional[datetime.datetime]:
+    """현재 한국 시간(KST)을 반환합니다. 시간대 정보를 로드하지 못했으면 None."""
+    if KST is None:
+        return None
+    return datetime.datetime.now(KST)
+
 async def get_current_date() -> Dict[str, str]:
     """현재 한국 시간(KST) 기준 날짜를 'YYYY-MM-DD' 형식으로 반환합니다."""
     if KST is None:
         return {"error": "한국 시간대 정보를 로드할 수 없습니다."}
     try:
         # KST 기준으로 현재 시간 가져오기
-        now_kst = datetime.datetime.now(KST)
+        now = now_kst()
         # 날짜 부분만 추출
-        today_kst = now_kst.date()
+        today_kst = now.date()
         date_str = today_kst.strftime("%Y-%m-%d")
         logger.info(f"현재 한국 날짜 조회 성공: {date_str}")
         return {"current_date": date_str}
@@ -0,0 +1,209 @@
+import os
+import time
+import logging
+import functools
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, CollectorRegistry, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# 멀티 워커(gunicorn) 실행 시 워커별 메트릭을 합산하기 위한 디렉토리. prometheus_client 가 임포트 시점에 읽으므로
+# 프로세스 시작 전에 환경 변수로 지정해야 합니다. (gunicorn.conf.py 가 기본값을 설정하고 시작 시 비움)
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# 핫 패스 계측 원칙: 라벨 조합은 모듈 로드/등록 시점에 미리 바인딩(.labels())해 두고,
+# 요청 중에는 time.perf_counter() 두 번과 observe()/inc() 만 수행합니다.
+
+# 수 ms (캐시, Mongo) ~ 수십 초 (모델 호출) 를 모두 담는 버킷
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "chatbot_http_request_duration_seconds", "라우트별 HTTP 요청 처리 시간 (스트리밍은 응답 종료까지)",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("chatbot_http_requests_in_flight", "처리 중인 HTTP 요청 수", multiprocess_mode="livesum")
+CHAT_STAGE_SECONDS = Histogram(
+    "chatbot_chat_stage_duration_seconds", "채팅 턴 단계별 처리 시간",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+CHAT_TURNS_IN_FLIGHT = Gauge("chatbot_chat_turns_in_flight", "모델 응답을 생성 중인 채팅 턴 수", multiprocess_mode="livesum")
+OPENAI_REQUEST_SECONDS = Histogram(
+    "chatbot_openai_request_duration_seconds", "OpenAI chat completion 호출 1회(재시도 시도 단위) 시간",
+    ["kind", "outcome"], buckets=LATENCY_BUCKETS,
+)
+OPENAI_REQUESTS_IN_FLIGHT = Gauge("chatbot_openai_requests_in_flight", "진행 중인 OpenAI 호출 수", multiprocess_mode="livesum")
+TOOL_CALL_SECONDS = Histogram(
+    "chatbot_tool_call_duration_seconds", "도구 실행 시간",
+    ["tool", "outcome"], buckets=LATENCY_BUCKETS,
+)
+MONGO_OPERATION_SECONDS = Histogram(
+    "chatbot_mongo_operation_duration_seconds", "db.mongo 함수별 처리 시간 (캐시 히트 포함)",
+    ["operation"], buckets=LATENCY_BUCKETS,
+)
+MONGO_POOL_CONNECTIONS = Gauge("chatbot_mongo_pool_connections", "열려 있는 Mongo 커넥션 수 (모든 서버 합계)", multiprocess_mode="livesum")
+MONGO_POOL_CHECKED_OUT = Gauge("chatbot_mongo_pool_checked_out", "작업에 사용 중인 Mongo 커넥션 수", multiprocess_mode="livesum")
+MONGO_POOL_WAITING = Gauge("chatbot_mongo_pool_wait_queue", "커넥션을 기다리는 작업 수", multiprocess_mode="livesum")
+MONGO_POOL_CHECKOUT_SECONDS = Histogram(
+    "chatbot_mongo_pool_checkout_wait_seconds", "커넥션 체크아웃 대기 시간 (새 커넥션 생성 포함)",
+    buckets=LATENCY_BUCKETS,
+)
+MONGO_POOL_CHECKOUT_FAILED = Counter("chatbot_mongo_pool_checkout_failed_total", "커넥션 체크아웃 실패 수", ["reason"])
+LLM_TOKENS = Counter("chatbot_llm_tokens_total", "모델별 토큰 사용량", ["model", "type"])
+LLM_COST = Counter("chatbot_llm_cost_usd_total", "모델별 예상 비용 (USD)", ["model"])
+LLM_USAGE_RECORDS = Counter("chatbot_llm_usage_records_total", "모델별 사용량 기록 수 (cache: none/exact/normalized)", ["model", "cache"])
+
+# === 미리 바인딩된 라벨 ===
+CHAT_STAGES = ("load_history", "build_context", "openai", "openai_stream", "tools", "persist")
+STAGE: Dict[str, Any] = {stage: CHAT_STAGE_SECONDS.labels(stage) for stage in CHAT_STAGES}
+OPENAI_REQUEST: Dict[Tuple[str, str], Any] = {
+    (kind, outcome): OPENAI_REQUEST_SECONDS.labels(kind, outcome)
+    for kind in ("completion", "stream")
+    for outcome in ("ok", "error")
+}
+
+def bind_tool(tool_name: str) -> Tuple[Any, Any]:
+    """도구 등록 시 호출합니다. (성공, 실패) 라벨이 바인딩된 히스토그램을 반환합니다."""
+    return TOOL_CALL_SECONDS.labels(tool_name, "ok"), TOOL_CALL_SECONDS.labels(tool_name, "error")
+
+class _ModelCounters:
+    __slots__ = ("input_tokens", "output_tokens", "saved_tokens", "router_saved_tokens", "cost", "records")
+
+    def __init__(self, model: str):
+        self.input_tokens = LLM_TOKENS.labels(model, "input")
+        self.output_tokens = LLM_TOKENS.labels(model, "output")
+        self.saved_tokens = LLM_TOKENS.labels(model, "saved")
+        self.router_saved_tokens = LLM_TOKENS.labels(model, "router_saved")
+        self.cost = LLM_COST.labels(model)
+        self.records = {cache: LLM_USAGE_RECORDS.labels(model, cache) for cache in ("none", "exact", "normalized")}
+
+_model_counters: Dict[str, _ModelCounters] = {}
+
+def record_llm_usage(model: str, input_tokens: int, output_tokens: int, cost: float, cache_hit: str = None, saved_tokens: int = 0, router_saved_tokens: int = 0):
+    """토큰 사용량/비용 카운터를 증가시킵니다. 모델별 라벨은 처음 사용할 때 한 번만 바인딩합니다."""
+    counters = _model_counters.get(model)
+    if counters is None:
+        counters = _model_counters[model] = _ModelCounters(model)
+    counters.input_tokens.inc(input_tokens)
+    counters.output_tokens.inc(output_tokens)
+    counters.cost.inc(cost)
+    counters.records[cache_hit or "none"].inc()
+    if saved_tokens:
+        counters.saved_tokens.inc(saved_tokens)
+    if router_saved_tokens:
+        counters.router_saved_tokens.inc(router_saved_tokens)
+
+def timed_operation(operation: str) -> Callable:
+    """async 함수의 처리 시간을 MONGO_OPERATION_SECONDS{operation} 에 기록하는 데코레이터입니다."""
+    histogram = MONGO_OPERATION_SECONDS.labels(operation)
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+class MetricsMiddleware:
+    """라우트 템플릿(/history/{conversation_id} 등) 단위로 요청 시간을 기록하는 ASGI 미들웨어입니다.
+
+    경로 원문 대신 매칭된 라우트 템플릿을 라벨로 사용해 라벨 수가 늘어나지 않도록 합니다.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._children: Dict[Tuple[str, str, str], Any] = {}
+
+    def _histogram(self, method: str, route: str, status: str):
+        key = (method, route, status)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = HTTP_REQUEST_SECONDS.labels(method, route, status)
+        return child
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or ("/static" if scope["path"].startswith("/static") else "unmatched")
+            self._histogram(scope["method"], route_path, f"{status_code // 100}xx").observe(time.perf_counter() - started)
+
+class RuntimeStatsCollector:
+    """스크레이프 시점에 런타임 통계(dict)를 읽어 게이지로 노출합니다. (캐시/수용 제어/서킷 브레이커 등)
+
+    {"admission": {"queue_depth": 3}} -> chatbot_runtime_admission_queue_depth 3
+    """
+
+    BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, stats_fn: Callable[[], Dict[str, Any]]):
+        self.stats_fn = stats_fn
+
+    def _flatten(self, prefix: str, value: Any) -> Iterable[Tuple[str, float]]:
+        if isinstance(value, dict):
+            for key, inner in value.items():
+                yield from self._flatten(f"{prefix}_{key}", inner)
+        elif isinstance(value, bool):
+            yield prefix, float(value)
+        elif isinstance(value, (int, float)):
+            yield prefix, float(value)
+        elif prefix.endswith("_state") and value in self.BREAKER_STATES:
+            yield prefix, float(self.BREAKER_STATES[value])
+
+    def collect(self):
+        try:
+            stats = self.stats_fn()
+        except Exception as e:
+            logger.error(f"런타임 통계 수집 실패: {e}", exc_info=True)
+            return
+        for component, values in stats.items():
+            if component == "tools":
+                continue # 도구 지연은 chatbot_tool_call_duration_seconds 히스토그램으로 노출
+            for name, value in self._flatten(f"chatbot_runtime_{component}", values):
+                yield GaugeMetricFamily(name.replace("-", "_"), f"runtime stat {name}", value=value)
+
+_runtime_collectors = []
+
+def register_runtime_collector(stats_fn: Callable[[], Dict[str, Any]]):
+    collector = RuntimeStatsCollector(stats_fn)
+    _runtime_collectors.append(collector)
+    REGISTRY.register(collector)
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Prometheus 텍스트 포맷으로 직렬화한 (본문, Content-Type) 을 반환합니다.
+
+    멀티 워커 모드에서는 모든 워커의 히스토그램/카운터/게이지를 합산하고,
+    런타임 통계(chatbot_runtime_*)는 스크레이프를 처리한 워커의 값만 노출합니다.
+    """
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    for collector in _runtime_collectors:
+        registry.register(collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def mark_worker_dead(pid: int):
+    """종료된 워커의 livesum 게이지 파일을 정리합니다. (gunicorn child_exit 훅에서 호출)"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
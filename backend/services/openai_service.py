@@ -1,15 +1,21 @@
 import os
+import time
+import asyncio
 import logging
-import json # JSON 파싱 추가
-from typing import Tuple, List, Dict, Any # List, Dict, Any 추가
-from openai import OpenAI, AssistantEventHandler # 필요한 클래스 추가
+from typing import Tuple, List, Dict, Any, AsyncIterator, Optional # List, Dict, Any 추가
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, Timeout # 비동기 클라이언트 사용
 
 # MongoDB 함수 임포트
 from db.mongo import get_chat_history
-# 날씨 서비스 함수 임포트
-from services.weather_service import get_current_weather
-# 날짜 서비스 함수 임포트
-from services.datetime_service import get_current_date
+# 도구 레지스트리 / 실행기 임포트
+from services.tool_service import get_tool_schemas, execute_tool_calls, new_tool_deadline, MAX_TOOL_ROUNDS, TOOL_REGISTRY
+# 재시도 / 서킷 브레이커
+from services.resilience_service import call_with_retry, openai_breaker, UpstreamUnavailable
+# 지연 시간 계측
+from services.metrics_service import OPENAI_REQUEST, OPENAI_REQUESTS_IN_FLIGHT, STAGE
+from services.tracing_service import span, start_span
+from logging_config import SAMPLED
 
 logger = logging.getLogger(__name__)
 
@@ -19,12 +25,51 @@ if not api_key:
     logger.error("OPENAI_API_KEY 환경 변수가 설정되지 않았습니다.")
     raise ValueError("OPENAI_API_KEY 환경 변수를 설정해야 합니다.")
 
-try:
-    client = OpenAI(api_key=api_key)
-    logger.info("OpenAI 클라이언트 초기화 성공")
-except Exception as e:
-    logger.error(f"OpenAI 클라이언트 초기화 중 오류 발생: {e}", exc_info=True)
-    raise
+# === OpenAI 클라이언트 / 커넥션 풀 설정 ===
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") # 미설정 시 공식 API 엔드포인트 사용 (로컬 스텁 서버 테스트용)
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60")) # 요청 전체 타임아웃 (초)
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5")) # 연결 타임아웃 (초)
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")) # 풀 최대 연결 수
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20")) # 유지할 keep-alive 연결 수
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "50")) # 워커당 동시 completion 호출 수 제한
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "0")) # SDK 자체 재시도 (기본 0: resilience_service 가 재시도 담당)
+
+class OpenAIClient:
+    client: AsyncOpenAI = None
+    http_client: httpx.AsyncClient = None
+    semaphore: asyncio.Semaphore = None
+
+openai_client = OpenAIClient()
+
+async def init_openai_client():
+    """애플리케이션 시작 시 공유 HTTP 커넥션 풀과 비동기 OpenAI 클라이언트를 생성합니다."""
+    try:
+        openai_client.http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+        openai_client.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=OPENAI_BASE_URL,
+            http_client=openai_client.http_client,
+            timeout=Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+            max_retries=OPENAI_MAX_RETRIES,
+        )
+        openai_client.semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+        logger.info(f"OpenAI 클라이언트 초기화 성공 (최대 동시 호출: {OPENAI_MAX_CONCURRENCY}, 최대 연결: {OPENAI_MAX_CONNECTIONS})")
+    except Exception as e:
+        logger.error(f"OpenAI 클라이언트 초기화 중 오류 발생: {e}", exc_info=True)
+        raise
+
+async def close_openai_client():
+    """애플리케이션 종료 시 OpenAI 클라이언트와 커넥션 풀을 닫습니다."""
+    if openai_client.client:
+        await openai_client.client.close()
+        openai_client.client = None
+        openai_client.http_client = None
+        logger.info("OpenAI 클라이언트 종료됨.")
 
 # gpt 4.1 nano
 MODEL_NAME = "gpt-4.1-nano"
@@ -36,164 +81,339 @@ SYSTEM_PROMPT = """
 너는 여러가지 도구를 사용할 수 있어. 시간을 얻거나 실시간 날씨를 조회하는 등의 도구야.
 답변에 마크다운을 사용할 수 있어.
 """
-# 대화 기록 길이 제한 (토큰 제한 고려)
-HISTORY_LIMIT = 4
-
-# === 도구 정의 (OpenWeatherMap 날씨 조회 - 위도/경도 사용) ===
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_current_weather",
-            "description": "Get the current weather for a given latitude and longitude",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "latitude": {
-                        "type": "number",
-                        "description": "The latitude of the location",
-                    },
-                    "longitude": {
-                        "type": "number",
-                        "description": "The longitude of the location",
-                    },
-                },
-                "required": ["latitude", "longitude"],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_current_date",
-            "description": "Get the current date",
-            "parameters": { # 파라미터 없음
-                "type": "object",
-                "properties": {},
-            },
-        },
-    }
-]
-
-async def get_chat_response(conversation_id: str, message: str) -> Tuple[str, int, int]:
+# 컨텍스트 후보로 조회할 최대 메시지 수 (실제로 보낼 기록은 context_service 의 토큰 예산으로 결정)
+HISTORY_LIMIT = int(os.getenv("HISTORY_LIMIT", "20"))
+
+SUMMARY_PROMPT = """
+아래는 사용자와 AI 비서의 이전 대화야. 이후 대화를 이어가는 데 필요한 사실, 사용자의 선호, 진행 중인 주제를
+한국어로 5문장 이내로 요약해. 기존 요약이 있으면 새 내용과 합쳐서 하나의 요약으로 만들어.
+"""
+
+# === 도구 정의 (tool_service 레지스트리에 등록된 스키마 사용) ===
+tools = get_tool_schemas()
+
+def _route_request(route: Optional[Dict[str, Any]], facts: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], str]:
+    """라우터 판단(router_service.route_message)에 따라 보낼 도구 스키마와 모델을 반환합니다. (None 이면 전체 도구, 기본 모델)
+
+    facts(prompt_facts_service.build_prompt_facts)가 대신하는 도구는 보내지 않습니다.
+    """
+    covered = facts["covered_tools"] if facts else ()
+    if route is None:
+        if not covered:
+            return tools, MODEL_NAME
+        return [TOOL_REGISTRY[name]["schema"] for name in TOOL_REGISTRY if name not in covered], MODEL_NAME
+    return [TOOL_REGISTRY[name]["schema"] for name in route["tools"] if name not in covered], route["model"] or MODEL_NAME
+
+async def create_chat_completion(**kwargs):
+    """동시 호출 수 제한과 재시도/서킷 브레이커를 적용하여 chat completion 을 비동기로 요청합니다."""
+    if openai_client.client is None:
+        logger.error("OpenAI 클라이언트가 초기화되지 않았습니다.")
+        raise ConnectionError("OpenAI client not initialized")
+    kwargs.setdefault("model", MODEL_NAME)
+
+    async def attempt(timeout: float):
+        # 백오프 대기 중에는 동시 호출 슬롯을 점유하지 않음
+        async with openai_client.semaphore:
+            started = time.perf_counter()
+            OPENAI_REQUESTS_IN_FLIGHT.inc()
+            outcome = "error"
+            try:
+                with span("openai.chat_completion", model=kwargs["model"], timeout=round(timeout, 2)) as call_span:
+                    response = await openai_client.client.chat.completions.create(timeout=timeout, **kwargs)
+                    if call_span and response.usage:
+                        call_span.set(prompt_tokens=response.usage.prompt_tokens, completion_tokens=response.usage.completion_tokens)
+                outcome = "ok"
+                return response
+            finally:
+                OPENAI_REQUESTS_IN_FLIGHT.dec()
+                OPENAI_REQUEST["completion", outcome].observe(time.perf_counter() - started)
+
+    return await call_with_retry(attempt, OPENAI_TIMEOUT)
+
+# 도구 실행 후 두 번째 호출 전에 추가하는 시스템 메시지
+SECOND_CALL_SYSTEM_PROMPT = """
+당신은 도구로부터 정보를 얻었습니다. 과거의 메시지보다 새로 도구로 얻은 정보와 관련지어 사용자의 메시지에 응답하세요.
+마크다운을 사용할 수 있습니다.
+"""
+
+async def load_history(conversation_id: str) -> List[Dict[str, Any]]:
+    """모델에 전달할 최근 대화 기록을 조회합니다."""
+    return await get_chat_history(conversation_id, limit=HISTORY_LIMIT)
+
+async def _build_messages(
+    conversation_id: str,
+    message: str,
+    history: Optional[List[Dict[str, Any]]] = None,
+    facts: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """시스템 프롬프트, 최근 대화 기록, 사용자 메시지로 요청 메시지 목록을 구성합니다.
+
+    history 가 주어지지 않으면 DB(캐시)에서 조회합니다.
+    facts 는 사용자 메시지 바로 앞에 system 메시지로 넣습니다. (턴마다 바뀌는 값이 시스템 프롬프트 + 대화 기록 접두부를
+    바꾸지 않도록 해 프롬프트 캐싱이 유지됨)
+    """
+    if history is None:
+        history = await load_history(conversation_id)
+    messages: List[Dict[str, Any]] = [
+        {"role": "system", "content": SYSTEM_PROMPT}
+    ]
+    messages.extend({"role": m["role"], "content": m["content"]} for m in history)
+    if facts:
+        messages.append({"role": "system", "content": facts["content"]})
+    messages.append({"role": "user", "content": message})
+    return messages
+
+async def get_chat_response(
+    conversation_id: str,
+    message: str,
+    history: Optional[List[Dict[str, Any]]] = None,
+    used_tools: Optional[List[str]] = None,
+    route: Optional[Dict[str, Any]] = None,
+    facts: Optional[Dict[str, Any]] = None
+) -> Tuple[str, int, int]:
     """사용자 메시지를 받아 OpenAI 챗봇 응답과 총 토큰 사용량을 반환합니다.
-      필요시 날씨 조회 도구(위도/경도 기반)를 사용합니다.
+      필요시 도구(날씨, 날짜 등)를 사용하며, 최대 MAX_TOOL_ROUNDS 라운드까지 연쇄 호출을 허용합니다.
+      used_tools 리스트가 주어지면 실행한 도구 이름을 추가합니다. (응답 캐시 저장 여부 판단용)
+      route(라우터 판단)가 주어지면 그 도구와 모델만 사용하고, 도구를 뺀 호출마다 route["saved_tokens"] 에 절감량을 더합니다.
+      facts(프롬프트 정보)가 주어지면 첫 호출 전에 넣고, 그 정보로 대신하는 도구는 보내지 않습니다.
     """
     if not message:
         logger.warning("빈 메시지로 응답 생성 시도")
         return "메시지를 입력해주세요.", 0, 0
 
     try:
-        history = await get_chat_history(conversation_id, limit=HISTORY_LIMIT)
-        messages: List[Dict[str, Any]] = [
-            {"role": "system", "content": SYSTEM_PROMPT}
-        ]
-        messages.extend(history)
-        messages.append({"role": "user", "content": message})
-
-        logger.info(f"OpenAI API 호출 시작 (모델: {MODEL_NAME}, ConvID: {conversation_id})")
-
-        # === 첫 번째 API 호출 ===
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=messages,
-            tools=tools,
-            tool_choice="auto", # LLM이 도구 사용 여부 결정
-        )
+        messages = await _build_messages(conversation_id, message, history, facts)
+        offered_tools, model = _route_request(route, facts)
 
-        response_message = response.choices[0].message
-        tool_calls = response_message.tool_calls
+        logger.info("OpenAI API 호출 시작 (모델: %s, ConvID: %s)", model, conversation_id, extra=SAMPLED)
 
         # 누적 토큰 계산용 변수 초기화
-        total_prompt_tokens = response.usage.prompt_tokens
-        total_completion_tokens = response.usage.completion_tokens
-
-        # === 도구 사용 분기 ===
-        if tool_calls:
-            logger.info(f"도구 호출 감지: {tool_calls}")
-            available_functions = {
-                "get_current_weather": get_current_weather,
-                "get_current_date": get_current_date, # 날짜 함수 추가
-            }
+        total_prompt_tokens = 0
+        total_completion_tokens = 0
+        tool_deadline = new_tool_deadline()
+
+        for tool_round in range(MAX_TOOL_ROUNDS + 1):
+            # 마지막 라운드에서는 도구 없이 최종 응답을 강제 (보낼 도구가 없으면 첫 호출이 최종 응답)
+            if tool_round < MAX_TOOL_ROUNDS and offered_tools:
+                response = await create_chat_completion(
+                    model=model,
+                    messages=messages,
+                    tools=offered_tools,
+                    tool_choice="auto", # LLM이 도구 사용 여부 결정
+                )
+            else:
+                response = await create_chat_completion(model=model, messages=messages)
+            if route is not None and tool_round < MAX_TOOL_ROUNDS:
+                route["saved_tokens"] += route["saved_per_call"]
+
+            response_message = response.choices[0].message
+            tool_calls = response_message.tool_calls
+            total_prompt_tokens += response.usage.prompt_tokens
+            total_completion_tokens += response.usage.completion_tokens
+
+            if not tool_calls:
+                # 도구를 더 사용하지 않으면 현재 응답이 최종 응답
+                logger.info("API 응답 반환 (도구 라운드: %d). 누적 Tokens: Prompt=%d, Completion=%d", tool_round, total_prompt_tokens, total_completion_tokens)
+                return response_message.content, total_prompt_tokens, total_completion_tokens
+
+            # === 도구 사용 분기 ===
+            logger.info("도구 호출 감지 (라운드 %d): %s", tool_round + 1, [tool_call.function.name for tool_call in tool_calls])
+            logger.debug("도구 호출 상세: %s", tool_calls)
             # 어시스턴트의 응답(tool_calls 포함)을 메시지 목록에 추가
             messages.append(response_message.model_dump(exclude_unset=True))
+            if used_tools is not None:
+                used_tools.extend(tool_call.function.name for tool_call in tool_calls)
+            tools_started = time.perf_counter()
+            messages.extend(await execute_tool_calls(
+                [tool_call.model_dump() for tool_call in tool_calls],
+                deadline=tool_deadline,
+            ))
+            STAGE["tools"].observe(time.perf_counter() - tools_started)
 
-            for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_to_call = available_functions.get(function_name)
-                if not function_to_call:
-                    logger.error(f"알 수 없는 함수 호출 시도: {function_name}")
-                    # 오류 상황 처리 (예: 사용자에게 알림)
-                    tool_result = {"error": f"Function '{function_name}' not found."}
-                else:
-                    try:
-                        # 함수 인자 파싱 (비어 있을 수 있음)
-                        function_args = json.loads(tool_call.function.arguments)
-                        logger.info(f"함수 '{function_name}' 호출 (인자: {function_args})")
-
-                        # 함수 이름에 따라 호출 방식 분기
-                        if function_name == "get_current_weather":
-                            latitude = function_args.get("latitude")
-                            longitude = function_args.get("longitude")
-                            tool_result = await function_to_call(lat=latitude, lon=longitude)
-                        elif function_name == "get_current_date":
-                            tool_result = await function_to_call() # 인자 없이 호출
-                        else:
-                            # 혹시 모를 다른 함수 처리 (현재는 필요 없음)
-                            logger.warning(f"'{function_name}' 함수에 대한 호출 로직이 정의되지 않음")
-                            tool_result = {"error": "Function call logic not implemented."}
-
-                        logger.info(f"함수 '{function_name}' 결과: {tool_result}")
-                    except json.JSONDecodeError:
-                        logger.error(f"함수 인자 파싱 오류: {tool_call.function.arguments}")
-                        tool_result = {"error": "Invalid function arguments."}
-                    except Exception as e:
-                        logger.error(f"함수 '{function_name}' 실행 중 오류: {e}", exc_info=True)
-                        tool_result = {"error": "Error executing function."}
-
-                # 도구 실행 결과를 메시지 목록에 추가
-                messages.append(
-                    {
-                        "tool_call_id": tool_call.id,
-                        "role": "tool",
-                        "name": function_name,
-                        "content": json.dumps(tool_result), # 결과를 JSON 문자열로 전달
-                    }
-                )
+            if tool_round == 0:
+                # --- 두 번째 호출 전 메시지 수정 지점 --- #
+                # 도구 결과를 어떻게 사용할지 지시하는 시스템 메시지를 리스트 맨 뒤에 추가
+                # (LLM은 마지막 메시지들에 더 주목하는 경향이 있음)
+                messages.append({"role": "system", "content": SECOND_CALL_SYSTEM_PROMPT})
+                logger.debug("두 번째 API 호출 전 시스템 메시지 추가")
+                # --------------------------------------- #
+
+    except UpstreamUnavailable as e:
+        # 서킷 차단 / 턴 마감 초과: 호출하지 않고 즉시 실패 (Retry-After 전달을 위해 그대로 발생)
+        logger.warning(f"OpenAI 호출 생략: {e}")
+        raise
+    except Exception as e:
+        logger.error(f"OpenAI 서비스 처리 중 오류 발생: {e}", exc_info=True)
+        raise ConnectionError("챗봇 서비스와의 통신 중 오류가 발생했습니다.") from e
+
+async def summarize_conversation(previous_summary: Optional[str], messages: List[Dict[str, Any]]) -> Tuple[str, int, int]:
+    """기존 요약과 오래된 메시지들을 합쳐 새 대화 요약을 만듭니다. (요약, prompt 토큰, completion 토큰) 반환"""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    if previous_summary:
+        transcript = f"[기존 요약]\n{previous_summary}\n\n[이어진 대화]\n{transcript}"
+    response = await create_chat_completion(
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": transcript},
+        ],
+    )
+    return (
+        response.choices[0].message.content or "",
+        response.usage.prompt_tokens,
+        response.usage.completion_tokens,
+    )
 
-            # --- 두 번째 호출 전 메시지 수정 지점 --- #
-            # 예시: 도구 결과를 어떻게 사용할지 지시하는 시스템 메시지 추가
-            second_call_system_prompt = """
-            당신은 도구로부터 정보를 얻었습니다. 과거의 메시지보다 새로 도구로 얻은 정보와 관련지어 사용자의 메시지에 응답하세요.
-            마크다운을 사용할 수 있습니다.
-            """
-            # messages 리스트의 시스템 프롬프트(첫번째 요소)를 바꾸거나, 새 메시지를 추가할 수 있음
-            # 여기서는 리스트 맨 뒤에 새 시스템 메시지 추가 (LLM은 마지막 메시지들에 더 주목하는 경향이 있음)
-            # 또는 특정 위치(예: 마지막 tool 메시지 바로 뒤)에 삽입할 수도 있음.
-            messages.append({"role": "system", "content": second_call_system_prompt})
-            logger.info(f"두 번째 API 호출 전 시스템 메시지 추가: {second_call_system_prompt}")
-            # --------------------------------------- #
-
-            # === 두 번째 API 호출 (도구 결과 포함 + 수정된 메시지) ===
-            logger.info("도구 결과 포함하여 두 번째 API 호출 시작 (수정된 메시지 포함)")
-            second_response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=messages, # 수정된 messages 리스트 사용
+async def _stream_completion(**kwargs) -> AsyncIterator[Any]:
+    """스트리밍 completion 청크를 순서대로 반환합니다. 스트림을 연 시도의 동시 호출 슬롯은 스트림이 끝날 때까지 점유합니다.
+
+    재시도는 응답 헤더를 받기 전(스트림 시작 전)까지만 수행합니다. 이미 전달한 청크는 되돌릴 수 없으므로
+    스트림 도중 오류는 서킷 브레이커에 실패로만 기록하고 그대로 발생시킵니다.
+    """
+    if openai_client.client is None:
+        logger.error("OpenAI 클라이언트가 초기화되지 않았습니다.")
+        raise ConnectionError("OpenAI client not initialized")
+    kwargs.setdefault("model", MODEL_NAME)
+
+    async def attempt(timeout: float):
+        # 시도마다 동시 호출 슬롯을 잡고 실패하면 반납 (백오프 대기 중에는 점유하지 않음), 성공한 스트림은 끝날 때까지 유지
+        await openai_client.semaphore.acquire()
+        try:
+            return await openai_client.client.chat.completions.create(
+                stream=True,
+                stream_options={"include_usage": True}, # 마지막 청크에 토큰 사용량 포함
+                timeout=timeout,
+                **kwargs,
             )
-            final_response = second_response.choices[0].message.content
-            # 두 번째 호출의 토큰 사용량 누적
-            total_prompt_tokens += second_response.usage.prompt_tokens
-            total_completion_tokens += second_response.usage.completion_tokens
-            logger.info(f"두 번째 API 응답 성공. 누적 Tokens: Prompt={total_prompt_tokens}, Completion={total_completion_tokens}")
+        except BaseException:
+            openai_client.semaphore.release()
+            raise
 
-            return final_response, total_prompt_tokens, total_completion_tokens
+    started = time.perf_counter()
+    outcome = "error"
+    error = None
+    holds_slot = False
+    call_span = start_span("openai.chat_completion_stream", model=kwargs["model"]) # 스트림 종료까지
+    try:
+        stream = await call_with_retry(attempt, OPENAI_TIMEOUT)
+        holds_slot = True
+        OPENAI_REQUESTS_IN_FLIGHT.inc()
+        try:
+            async for chunk in stream:
+                if call_span and chunk.usage:
+                    call_span.set(prompt_tokens=chunk.usage.prompt_tokens, completion_tokens=chunk.usage.completion_tokens)
+                yield chunk
+        except Exception:
+            openai_breaker.record_failure() # 스트림 도중 오류 (재시도하지 않음)
+            raise
+        outcome = "ok"
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        if holds_slot:
+            OPENAI_REQUESTS_IN_FLIGHT.dec()
+            openai_client.semaphore.release()
+        if call_span:
+            call_span.finish(error)
+        OPENAI_REQUEST["stream", outcome].observe(time.perf_counter() - started) # 스트림 종료까지
 
-        else:
-            # 도구를 사용하지 않은 경우, 첫 번째 응답 반환
-            logger.info(f"도구 사용 없음. 첫 번째 API 응답 반환. Tokens: Prompt={total_prompt_tokens}, Completion={total_completion_tokens}")
-            final_response = response_message.content
-            return final_response, total_prompt_tokens, total_completion_tokens
+async def stream_chat_response(
+    conversation_id: str,
+    message: str,
+    history: Optional[List[Dict[str, Any]]] = None,
+    used_tools: Optional[List[str]] = None,
+    route: Optional[Dict[str, Any]] = None,
+    facts: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """get_chat_response 의 스트리밍 버전입니다. used_tools, route, facts 는 get_chat_response 와 동일합니다.
 
+    다음 이벤트(dict)를 순서대로 반환합니다.
+      - {"type": "delta", "content": str}: 모델 응답 조각
+      - {"type": "status", "status": "tool_call", "tools": [...]}: 도구 실행 시작 알림
+      - {"type": "done", "response": str, "prompt_tokens": int, "completion_tokens": int}: 완료 (마지막 이벤트)
+    """
+    if not message:
+        logger.warning("빈 메시지로 응답 생성 시도")
+        yield {"type": "done", "response": "메시지를 입력해주세요.", "prompt_tokens": 0, "completion_tokens": 0}
+        return
+
+    try:
+        messages = await _build_messages(conversation_id, message, history, facts)
+        offered_tools, model = _route_request(route, facts)
+        logger.info("OpenAI 스트리밍 API 호출 시작 (모델: %s, ConvID: %s)", model, conversation_id, extra=SAMPLED)
+
+        total_prompt_tokens = 0
+        total_completion_tokens = 0
+        tool_deadline = new_tool_deadline()
+
+        for tool_round in range(MAX_TOOL_ROUNDS + 1):
+            content_parts: List[str] = []
+            tool_calls: Dict[int, Dict[str, Any]] = {} # index -> tool_call (조각을 이어 붙여 완성)
+            # 마지막 라운드에서는 도구 없이 최종 응답을 강제 (보낼 도구가 없으면 첫 호출이 최종 응답)
+            request_kwargs = {"tools": offered_tools, "tool_choice": "auto"} if tool_round < MAX_TOOL_ROUNDS and offered_tools else {}
+            if route is not None and tool_round < MAX_TOOL_ROUNDS:
+                route["saved_tokens"] += route["saved_per_call"]
+
+            async for chunk in _stream_completion(model=model, messages=messages, **request_kwargs):
+                if chunk.usage:
+                    total_prompt_tokens += chunk.usage.prompt_tokens
+                    total_completion_tokens += chunk.usage.completion_tokens
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    content_parts.append(delta.content)
+                    yield {"type": "delta", "content": delta.content}
+                for tool_call_delta in delta.tool_calls or []:
+                    tool_call = tool_calls.setdefault(
+                        tool_call_delta.index,
+                        {"id": None, "type": "function", "function": {"name": "", "arguments": ""}},
+                    )
+                    if tool_call_delta.id:
+                        tool_call["id"] = tool_call_delta.id
+                    if tool_call_delta.function:
+                        if tool_call_delta.function.name:
+                            tool_call["function"]["name"] += tool_call_delta.function.name
+                        if tool_call_delta.function.arguments:
+                            tool_call["function"]["arguments"] += tool_call_delta.function.arguments
+
+            if not tool_calls:
+                break
+
+            # === 도구 사용 분기 ===
+            ordered_tool_calls = [tool_calls[index] for index in sorted(tool_calls)]
+            logger.info("도구 호출 감지 (스트리밍, 라운드 %d): %s", tool_round + 1, [tool_call["function"]["name"] for tool_call in ordered_tool_calls])
+            logger.debug("도구 호출 상세: %s", ordered_tool_calls)
+            yield {
+                "type": "status",
+                "status": "tool_call",
+                "tools": [tool_call["function"]["name"] for tool_call in ordered_tool_calls],
+            }
+            if used_tools is not None:
+                used_tools.extend(tool_call["function"]["name"] for tool_call in ordered_tool_calls)
+            messages.append({
+                "role": "assistant",
+                "content": "".join(content_parts) or None,
+                "tool_calls": ordered_tool_calls,
+            })
+            tools_started = time.perf_counter()
+            messages.extend(await execute_tool_calls(ordered_tool_calls, deadline=tool_deadline))
+            STAGE["tools"].observe(time.perf_counter() - tools_started)
+            if tool_round == 0:
+                messages.append({"role": "system", "content": SECOND_CALL_SYSTEM_PROMPT})
+
+        logger.info("스트리밍 응답 완료. 누적 Tokens: Prompt=%d, Completion=%d", total_prompt_tokens, total_completion_tokens)
+        yield {
+            "type": "done",
+            "response": "".join(content_parts),
+            "prompt_tokens": total_prompt_tokens,
+            "completion_tokens": total_completion_tokens,
+        }
+
+    except UpstreamUnavailable as e:
+        # 서킷 차단 / 턴 마감 초과: 호출하지 않고 즉시 실패 (Retry-After 전달을 위해 그대로 발생)
+        logger.warning(f"OpenAI 호출 생략: {e}")
+        raise
     except Exception as e:
-        logger.error(f"OpenAI 서비스 처리 중 오류 발생: {e}", exc_info=True)
-        raise ConnectionError("챗봇 서비스와의 통신 중 오류가 발생했습니다.") from e
\ No newline at end of file
+        logger.error(f"OpenAI 스트리밍 처리 중 오류 발생: {e}", exc_info=True)
+        raise ConnectionError("챗봇 서비스와의 통신 중 오류가 발생했습니다.") from e
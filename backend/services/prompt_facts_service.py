@@ -0,0 +1,114 @@
+import os
+import re
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.datetime_service import now_kst, WEEKDAYS_KO
+from services.weather_service import peek_current_weather, prefetch_current_weather
+from services.router_service import predict_tools, previous_user_message
+
+logger = logging.getLogger(__name__)
+
+# === 프롬프트 정보 주입 설정 ===
+# 모델이 도구를 호출해 왕복(모델 호출 1회 추가)하는 대신, 서버가 바로 알 수 있는 값을 첫 호출 프롬프트에 넣음
+PROMPT_FACTS_ENABLED = os.getenv("PROMPT_FACTS_ENABLED", "false").lower() == "true" # 현재 날짜/시각을 프롬프트에 넣고 get_current_date 도구를 보내지 않음 (기본 꺼짐)
+PROMPT_FACTS_WEATHER_LOCATION = os.getenv("PROMPT_FACTS_WEATHER_LOCATION", "") # 기본 위치 "위도,경도[,이름]" (예: 37.5665,126.9780,서울 / 비어 있으면 날씨는 넣지 않음)
+
+DATE_TOOL = "get_current_date"
+WEATHER_TOOL = "get_current_weather"
+# 라우터의 날짜 키워드에 없는 시각 질문 (프롬프트의 현재 시각으로 답하므로 응답 캐시에 저장하지 않음)
+TIME_PATTERN = re.compile(r"몇\s?시|몇\s?분|시각|지금\s?시간|what time", re.IGNORECASE)
+
+def _parse_location(value: str) -> Optional[Tuple[float, float, Optional[str]]]:
+    if not value.strip():
+        return None
+    parts = [part.strip() for part in value.split(",")]
+    try:
+        return float(parts[0]), float(parts[1]), (parts[2] if len(parts) > 2 and parts[2] else None)
+    except (IndexError, ValueError):
+        logger.error(f"PROMPT_FACTS_WEATHER_LOCATION 형식이 잘못되었습니다: {value!r} (위도,경도[,이름])")
+        return None
+
+WEATHER_LOCATION = _parse_location(PROMPT_FACTS_WEATHER_LOCATION)
+
+class PromptFactsStats:
+    def __init__(self):
+        self.turns = 0
+        self.weather: Counter = Counter() # hit (캐시된 날씨를 넣음) / prefetch (캐시에 없어 백그라운드 조회 시작)
+        self.answered: Counter = Counter() # 도구 이름 -> 프롬프트 정보로 답한(것으로 예측한) 턴 수
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": PROMPT_FACTS_ENABLED,
+            "weather_location": PROMPT_FACTS_WEATHER_LOCATION or None,
+            "covered_tools": covered_tools(),
+            "turns": self.turns,
+            "weather": dict(self.weather),
+            "answered_tools": dict(self.answered),
+        }
+
+prompt_facts_stats = PromptFactsStats()
+
+def covered_tools() -> List[str]:
+    """프롬프트 정보로 완전히 대신해 모델에 보내지 않는 도구 목록 (날씨는 다른 위치를 물을 수 있어 항상 보냄)"""
+    if PROMPT_FACTS_ENABLED and now_kst() is not None:
+        return [DATE_TOOL]
+    return []
+
+def _date_fact(now) -> str:
+    return f"- 현재 한국 시각(KST): {now:%Y-%m-%d} ({WEEKDAYS_KO[now.weekday()]}요일) {now:%H:%M}"
+
+def _weather_fact() -> Optional[str]:
+    lat, lon, name = WEATHER_LOCATION
+    weather = peek_current_weather(lat, lon)
+    if weather is None or "error" in weather:
+        prefetch_current_weather(lat, lon) # 이번 턴은 도구로 조회하고, 다음 턴부터 캐시된 값을 넣음
+        prompt_facts_stats.weather["prefetch"] += 1
+        return None
+    prompt_facts_stats.weather["hit"] += 1
+    return (f"- 기본 위치({name or weather['location']}) 현재 날씨: {weather['description']}, "
+            f"기온 {weather['temperature']}°C (체감 {weather['feels_like']}°C), "
+            f"습도 {weather['humidity']}%, 풍속 {weather['wind_speed']}m/s")
+
+def build_prompt_facts(message: str, context: Optional[List[Dict[str, Any]]] = None) -> Optional[Dict[str, Any]]:
+    """첫 모델 호출 전에 프롬프트에 넣을 정보를 만듭니다. 넣을 정보가 없으면 None
+
+    반환 dict:
+      - content: 사용자 메시지 바로 앞에 넣을 system 메시지 내용
+      - tools: 정보를 넣은 도구 이름 (이 도구가 필요한 질문은 도구 호출 왕복 없이 첫 호출에서 답할 수 있음)
+      - covered_tools: 요청에서 뺄 도구 이름
+      - answered_tools: tools 중 이 메시지가 필요로 하는 도구 (라우터 예측 + 시각 질문, 응답 캐시 제외와 사용량 기록에 사용)
+      - cache_key: 응답 캐시 키에 넣을 정보 (KST 날짜, 넣은 날씨). 예측이 빗나가 저장된 응답도 날짜/날씨가 바뀌면 재사용되지 않음
+    """
+    if not PROMPT_FACTS_ENABLED:
+        return None
+    lines, tools, rules, cache_parts = [], [], [], []
+    now = now_kst()
+    if now is not None:
+        lines.append(_date_fact(now))
+        tools.append(DATE_TOOL)
+        rules.append("날짜, 요일, 시각은 위 값을 기준으로 답하세요.")
+        cache_parts.append(f"{now:%Y-%m-%d}")
+    weather_fact = _weather_fact() if WEATHER_LOCATION else None
+    if weather_fact:
+        lines.append(weather_fact)
+        tools.append(WEATHER_TOOL)
+        cache_parts.append(weather_fact)
+        rules.append("위치를 말하지 않은 날씨 질문은 위 날씨로 답하고 날씨 도구를 호출하지 마세요. 다른 위치를 물을 때만 도구를 쓰세요.")
+    if not lines:
+        return None
+    prompt_facts_stats.turns += 1
+    covered = covered_tools()
+    predicted, _, _ = predict_tools(message, previous_user_message(context))
+    answered = [name for name in predicted if name in tools]
+    if DATE_TOOL in tools and DATE_TOOL not in answered and TIME_PATTERN.search(message):
+        answered.append(DATE_TOOL)
+    prompt_facts_stats.answered.update(answered)
+    return {
+        "content": "서버가 제공한 최신 정보:\n" + "\n".join(lines) + "\n" + " ".join(rules),
+        "tools": tools,
+        "covered_tools": [name for name in tools if name in covered],
+        "answered_tools": answered,
+        "cache_key": "\n".join(cache_parts),
+    }
@@ -0,0 +1,189 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# === 재시도 / 서킷 브레이커 설정 ===
+CHAT_TURN_TIMEOUT = float(os.getenv("CHAT_TURN_TIMEOUT", "60")) # 한 턴 전체에 쓸 수 있는 시간 (초, 클라이언트가 더 짧게 지정 가능)
+UPSTREAM_RETRY_ATTEMPTS = int(os.getenv("UPSTREAM_RETRY_ATTEMPTS", "3")) # 최초 호출 포함 최대 시도 횟수
+UPSTREAM_RETRY_BASE_DELAY = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.5")) # 지수 백오프 기본 지연 (초)
+UPSTREAM_RETRY_MAX_DELAY = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "8")) # 백오프 / Retry-After 최대 지연 (초)
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20")) # 오류율 계산에 사용할 최근 호출 수
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10")) # 이보다 적게 호출됐으면 차단하지 않음
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5")) # 이 오류율 이상이면 차단 (open)
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30")) # 차단 유지 시간, 이후 시험 호출 1회 허용 (half-open)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+class UpstreamUnavailable(ConnectionError):
+    """서킷이 열려 있거나 턴 마감 시간이 지나 업스트림을 호출하지 않은 경우 발생합니다."""
+
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# === 턴 마감 시간 (time.monotonic 기준, 요청 단위로 전파) ===
+_turn_deadline: ContextVar[Optional[float]] = ContextVar("turn_deadline", default=None)
+
+def start_turn_deadline(timeout: Optional[float] = None) -> float:
+    """현재 요청의 턴 마감 시간을 설정합니다. 이후 생성되는 task 에도 전파됩니다."""
+    timeout = CHAT_TURN_TIMEOUT if timeout is None else min(timeout, CHAT_TURN_TIMEOUT)
+    deadline = time.monotonic() + timeout
+    _turn_deadline.set(deadline)
+    return deadline
+
+def get_turn_deadline() -> Optional[float]:
+    return _turn_deadline.get()
+
+def remaining_time() -> Optional[float]:
+    """턴 마감까지 남은 시간(초). 마감 시간이 설정되지 않았으면 None."""
+    deadline = _turn_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+class CircuitBreaker:
+    """최근 BREAKER_WINDOW 회 호출의 오류율이 임계값을 넘으면 BREAKER_OPEN_SECONDS 동안 호출을 차단합니다."""
+
+    def __init__(self, name: str, window: int, min_calls: int, error_rate: float, open_seconds: float):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self._outcomes = deque(maxlen=window) # True = 실패
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """호출 가능 여부를 확인합니다. 차단 중이면 UpstreamUnavailable 을 발생시킵니다."""
+        if self.state == "closed":
+            return
+        elapsed = time.monotonic() - self._opened_at
+        if self.state == "open" and elapsed >= self.open_seconds:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True # 시험 호출 1회만 통과
+            return
+        self.rejected += 1
+        raise UpstreamUnavailable(f"{self.name} circuit open", retry_after=max(1, int(self.open_seconds - elapsed)))
+
+    def record_success(self):
+        if self.state == "half_open":
+            logger.info(f"서킷 브레이커 '{self.name}' 복구 (closed)")
+            self._outcomes.clear()
+        self.state = "closed"
+        self._probe_in_flight = False
+        self._outcomes.append(False)
+
+    def record_failure(self):
+        self._outcomes.append(True)
+        if self.state == "half_open":
+            self._open()
+            return
+        failures = sum(self._outcomes)
+        if self.state == "closed" and len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+            self._open()
+
+    def abandon_probe(self):
+        """시험 호출이 결과 없이 취소된 경우, 다음 호출이 시험 호출이 될 수 있도록 합니다."""
+        self._probe_in_flight = False
+
+    def _open(self):
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self.times_opened += 1
+        logger.warning(f"서킷 브레이커 '{self.name}' 차단 (open), {self.open_seconds:.0f}초 동안 호출 거부")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "window_calls": len(self._outcomes),
+            "window_error_rate": sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+openai_breaker = CircuitBreaker("openai", BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_ERROR_RATE, BREAKER_OPEN_SECONDS)
+
+retry_stats = {"calls": 0, "retries": 0, "gave_up": 0, "failures": 0}
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APIConnectionError, asyncio.TimeoutError)): # APITimeoutError 포함
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+def _retry_after_header(error: Exception) -> Optional[float]:
+    """429/503 응답의 retry-after-ms / retry-after 헤더 값(초)을 반환합니다."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        if response.headers.get("retry-after-ms"):
+            return float(response.headers["retry-after-ms"]) / 1000
+        if response.headers.get("retry-after"):
+            return float(response.headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+def _backoff_delay(attempt: int, error: Exception) -> float:
+    """Retry-After 가 있으면 따르고, 없으면 full jitter 지수 백오프를 사용합니다."""
+    retry_after = _retry_after_header(error)
+    if retry_after is not None:
+        return min(retry_after, UPSTREAM_RETRY_MAX_DELAY)
+    return random.uniform(0, min(UPSTREAM_RETRY_MAX_DELAY, UPSTREAM_RETRY_BASE_DELAY * 2 ** attempt))
+
+async def call_with_retry(call: Callable[[Optional[float]], Awaitable[T]], max_timeout: float, breaker: CircuitBreaker = openai_breaker) -> T:
+    """업스트림 호출을 재시도/서킷 브레이커와 함께 실행합니다.
+
+    call 은 이번 시도의 타임아웃(초)을 받아 요청을 보내는 함수입니다. 타임아웃과 백오프 대기는
+    턴 마감 시간(start_turn_deadline)을 넘지 않으며, 남은 시간으로 재시도할 수 없으면 마지막 오류를 그대로 발생시킵니다.
+    """
+    retry_stats["calls"] += 1
+    for attempt in range(UPSTREAM_RETRY_ATTEMPTS):
+        breaker.before_call()
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise UpstreamUnavailable("turn deadline exceeded")
+        timeout = max_timeout if remaining is None else min(max_timeout, remaining)
+        try:
+            result = await call(timeout)
+        except asyncio.CancelledError:
+            breaker.abandon_probe()
+            raise
+        except Exception as e:
+            if not _is_retryable(e):
+                if isinstance(e, openai.APIStatusError):
+                    breaker.record_success() # 4xx 는 요청 문제이므로 업스트림 장애로 보지 않음
+                else:
+                    breaker.abandon_probe()
+                raise
+            breaker.record_failure()
+            retry_stats["failures"] += 1
+            delay = _backoff_delay(attempt, e)
+            remaining = remaining_time()
+            if attempt + 1 >= UPSTREAM_RETRY_ATTEMPTS or (remaining is not None and delay >= remaining):
+                retry_stats["gave_up"] += 1
+                logger.error(f"업스트림 호출 실패, 재시도 중단 (시도 {attempt + 1}회): {e!r}")
+                raise
+            retry_stats["retries"] += 1
+            logger.warning(f"업스트림 호출 실패, {delay:.2f}초 후 재시도 ({attempt + 1}/{UPSTREAM_RETRY_ATTEMPTS}): {e!r}")
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+def get_resilience_stats() -> Dict[str, Any]:
+    return {"breaker": openai_breaker.stats(), **retry_stats}
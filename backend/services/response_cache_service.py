@@ -0,0 +1,152 @@
+import os
+import re
+import difflib
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+from services.cache_service import AsyncTTLCache
+
+logger = logging.getLogger(__name__)
+
+# === 응답 캐시 설정 (기본 비활성화) ===
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600")) # 캐시 유지 시간 (초)
+RESPONSE_CACHE_MAXSIZE = int(os.getenv("RESPONSE_CACHE_MAXSIZE", "2048")) # 정확 일치 캐시 최대 항목 수
+NORMALIZED_CACHE_ENABLED = os.getenv("NORMALIZED_CACHE_ENABLED", "true").lower() == "true"
+NORMALIZED_CACHE_MAXSIZE = int(os.getenv("NORMALIZED_CACHE_MAXSIZE", "4096")) # 정규화 일치 캐시 최대 키 수
+NORMALIZED_CACHE_BUCKET_SIZE = 4 # 한 키에 보관하는 질문 수 (같은 키라도 same_question 검증을 통과해야 히트)
+NORMALIZED_CACHE_MAX_CHARS = 500 # 이보다 긴 메시지는 정규화 일치 캐시 대상에서 제외
+
+# 결과가 시점에 따라 달라지는 도구. 이 도구를 사용한 턴은 캐시하지 않습니다.
+TIME_SENSITIVE_TOOLS = {"get_current_date", "get_current_weather"}
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.~,]+$")
+
+def normalize_text(text: str) -> str:
+    """대소문자, 공백, 끝 문장부호 차이를 없앤 비교용 문자열을 반환합니다."""
+    return _TRAILING_PUNCTUATION.sub("", _WHITESPACE.sub(" ", text.strip().lower()))
+
+# 두 질문이 이 조각들(조사, 높임/요청 어미, "좀")만 다를 때 같은 질문으로 봅니다.
+IGNORABLE_FRAGMENTS = frozenset({
+    "", "은", "는", "이", "가", "을", "를", "도", "요", "좀", "줘", "줄래", "주세요", "해줘", "해주세요", "해줄래",
+})
+_NOT_COMPARED = re.compile(r"[\s?!~'\"]+") # 비교에서 빼는 공백/문장부호 (숫자 사이 . , 는 유지)
+
+_IGNORABLE_CHARS = re.compile("[" + "".join(sorted(set("".join(IGNORABLE_FRAGMENTS)))) + "]")
+
+def _compared_text(text: str) -> str:
+    return _NOT_COMPARED.sub("", normalize_text(text))
+
+def normalized_key(text: str) -> str:
+    """정규화 일치 캐시의 키를 반환합니다.
+
+    비교용 문자열에서 IGNORABLE_FRAGMENTS 에 쓰이는 글자를 모두 뺀 것이라, same_question 이 같다고 보는 두 메시지는
+    항상 같은 키를 갖습니다. ("세금 계산" / "금 계산" 처럼) 키만 같은 다른 질문도 있으므로 히트는 same_question 으로 다시 확인합니다.
+    """
+    return _IGNORABLE_CHARS.sub("", _compared_text(text))
+
+def same_question(a: str, b: str) -> bool:
+    """두 메시지가 IGNORABLE_FRAGMENTS 만 다른지 검사합니다. (정규화 일치 캐시 히트 조건)
+
+    의미를 비교하지 않으므로 뜻이 같아도 표현이 다르면 다른 질문이고, 숫자, 영문, 그 밖의 단어가 다르면 항상 다른 질문입니다.
+    """
+    a, b = _compared_text(a), _compared_text(b)
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal" and (a[i1:i2] not in IGNORABLE_FRAGMENTS or b[j1:j2] not in IGNORABLE_FRAGMENTS):
+            return False
+    return True
+
+class ResponseCache:
+    """정확 일치(시스템 프롬프트 + 최근 기록 + 메시지 해시) / 정규화 일치 2단계 응답 캐시입니다.
+
+    정규화 일치는 띄어쓰기, 대소문자, 문장부호, 조사/요청 어미 차이만 무시하는 문자열 비교입니다. (의미 유사도 검색이 아님)
+    대화 기록과 무관하게 메시지만 비교하므로, 이전 맥락이 없는 턴(대화의 첫 질문 등)에만 사용합니다.
+    """
+
+    def __init__(self):
+        self.exact = AsyncTTLCache("response", maxsize=RESPONSE_CACHE_MAXSIZE, ttl=RESPONSE_CACHE_TTL)
+        # (시스템 프롬프트 해시, normalized_key) -> [(원문 메시지, 응답 항목)]
+        self.normalized = AsyncTTLCache("response_normalized", maxsize=NORMALIZED_CACHE_MAXSIZE, ttl=RESPONSE_CACHE_TTL)
+        self.exact_hits = 0
+        self.normalized_hits = 0
+        self.normalized_rejected = 0 # 키는 같지만 same_question 검증에서 떨어진 항목 수
+        self.misses = 0
+        self.stores = 0
+        self.skipped = 0 # 시점 의존 도구 사용으로 저장하지 않은 턴 수
+
+    @staticmethod
+    def _scope(system_prompt: str) -> int:
+        return int.from_bytes(hashlib.blake2b(system_prompt.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+    @staticmethod
+    def _exact_key(system_prompt: str, context: List[Dict[str, Any]], message: str) -> str:
+        hasher = hashlib.sha256(system_prompt.encode("utf-8"))
+        for past_message in context:
+            hasher.update(f"\x00{past_message['role']}\x01{normalize_text(past_message['content'] or '')}".encode("utf-8"))
+        hasher.update(f"\x00user\x01{normalize_text(message)}".encode("utf-8"))
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _normalized_eligible(context: List[Dict[str, Any]], message: str) -> bool:
+        return NORMALIZED_CACHE_ENABLED and not context and len(message) <= NORMALIZED_CACHE_MAX_CHARS
+
+    def lookup(self, system_prompt: str, context: List[Dict[str, Any]], message: str) -> Optional[Dict[str, Any]]:
+        """캐시된 응답을 찾습니다. 반환값: {"response", "prompt_tokens", "completion_tokens", "tier"} 또는 None"""
+        found, entry = self.exact.get(self._exact_key(system_prompt, context, message))
+        if found:
+            self.exact_hits += 1
+            return dict(entry, tier="exact")
+        if self._normalized_eligible(context, message):
+            _, bucket = self.normalized.get((self._scope(system_prompt), normalized_key(message)))
+            for text, entry in bucket or []:
+                if same_question(message, text):
+                    self.normalized_hits += 1
+                    return dict(entry, tier="normalized")
+                self.normalized_rejected += 1
+        self.misses += 1
+        return None
+
+    def store(
+        self,
+        system_prompt: str,
+        context: List[Dict[str, Any]],
+        message: str,
+        response: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        used_tools: List[str]
+    ):
+        """모델 응답을 저장합니다. 시점 의존 도구를 사용한 턴이나 빈 응답은 저장하지 않습니다."""
+        if not response:
+            return
+        if TIME_SENSITIVE_TOOLS.intersection(used_tools):
+            self.skipped += 1
+            return
+        entry = {"response": response, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+        self.exact.set(self._exact_key(system_prompt, context, message), entry)
+        if self._normalized_eligible(context, message):
+            key = (self._scope(system_prompt), normalized_key(message))
+            _, bucket = self.normalized.get(key)
+            bucket = [item for item in bucket or [] if item[0] != message] + [(message, entry)]
+            self.normalized.set(key, bucket[-NORMALIZED_CACHE_BUCKET_SIZE:])
+        self.stores += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.exact_hits + self.normalized_hits + self.misses
+        return {
+            "enabled": RESPONSE_CACHE_ENABLED,
+            "exact_size": self.exact.stats()["size"],
+            "normalized_size": self.normalized.stats()["size"],
+            "exact_hits": self.exact_hits,
+            "normalized_hits": self.normalized_hits,
+            "normalized_rejected": self.normalized_rejected,
+            "misses": self.misses,
+            "stores": self.stores,
+            "skipped_time_sensitive": self.skipped,
+            "hit_rate": (self.exact_hits + self.normalized_hits) / lookups if lookups else 0.0,
+        }
+
+response_cache = ResponseCache()
@@ -0,0 +1,105 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from db.chat_archive import CHAT_ARCHIVE_IDLE_DAYS
+from db.mongo import (
+    archive_idle_conversations, compact_archive_segments, delete_expired_conversations,
+    purge_pending_sessions, get_archive_stats,
+)
+from services.shared_state import shared_state, shared_key
+
+logger = logging.getLogger(__name__)
+
+RETENTION_SWEEP_INTERVAL = float(os.getenv("RETENTION_SWEEP_INTERVAL", "3600")) # 보관 정책 스위퍼 실행 간격 (초, 0 이면 사용 안 함)
+RETENTION_SWEEP_BATCH = int(os.getenv("RETENTION_SWEEP_BATCH", "200")) # 한 번 실행에 작업별로 처리할 최대 대화 수
+CHAT_RETENTION_DAYS = float(os.getenv("CHAT_RETENTION_DAYS", "0")) # 마지막 메시지 후 이 기간(일)이 지난 대화를 아카이브 포함 완전 삭제 (0 이면 영구 보관)
+PURGE_RETRY_AFTER = 600 # 삭제 표시 후 이 시간(초)이 지나도 남은 세션은 후속 정리가 중단된 것으로 보고 다시 정리
+
+# === 보관 정책 스위퍼 ===
+# 워커마다 RETENTION_SWEEP_INTERVAL 마다 깨어나지만, 공유 상태 백엔드에 간격만큼 유지되는 키를 먼저 잡은 워커 하나만 실행합니다.
+# (memory 백엔드면 워커마다 실행되며, 각 단계는 여러 워커가 동시에 실행해도 결과가 같도록 되어 있음)
+# 한 번 실행에서 작업별로 RETENTION_SWEEP_BATCH 개까지만 처리하므로, 쌓인 대상은 여러 번에 나눠 처리됩니다.
+# (한 번에 모두 처리하려면 python -m scripts.run_retention_sweep --until-done)
+# 1. 후속 정리가 중단된 세션 삭제 재시도
+# 2. CHAT_RETENTION_DAYS 가 지난 대화 연쇄 삭제
+# 3. CHAT_ARCHIVE_IDLE_DAYS 가 지난 대화 아카이브
+# 4. 죽은 구간이 생긴 아카이브 세그먼트 정리
+
+class RetentionSweeper:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        # 워커가 동시에 시작해도 같은 시각에 몰리지 않도록 첫 실행을 흩뜨림
+        await asyncio.sleep(random.uniform(0.1, 1.0) * min(self.interval, 60))
+        while True:
+            try:
+                if await shared_state.backend.set(shared_key("retention_sweep"), str(os.getpid()), ttl=self.interval * 0.9, nx=True):
+                    await self.sweep()
+            except Exception as e:
+                logger.error(f"보관 정책 스위퍼 실행 실패: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self) -> Dict[str, Any]:
+        """보관 정책 작업을 한 번씩 실행하고 작업별 처리 결과를 반환합니다."""
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        result: Dict[str, Any] = {
+            "purge_retried": await purge_pending_sessions(now - timedelta(seconds=PURGE_RETRY_AFTER), RETENTION_SWEEP_BATCH),
+        }
+        if CHAT_RETENTION_DAYS:
+            result["expired"] = await delete_expired_conversations(now - timedelta(days=CHAT_RETENTION_DAYS), RETENTION_SWEEP_BATCH)
+        if CHAT_ARCHIVE_IDLE_DAYS:
+            result["archived"] = await archive_idle_conversations(now - timedelta(days=CHAT_ARCHIVE_IDLE_DAYS), RETENTION_SWEEP_BATCH)
+        result["compacted"] = await compact_archive_segments()
+        result["archive"] = await get_archive_stats()
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        result["finished_at"] = datetime.utcnow()
+        self.runs += 1
+        self.last_run = result
+        logger.info(f"보관 정책 스위퍼 실행 완료 ({result['seconds']}s): {result}")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "chat_retention_days": CHAT_RETENTION_DAYS,
+            "chat_archive_idle_days": CHAT_ARCHIVE_IDLE_DAYS,
+            "runs": self.runs,
+            "last_run": self.last_run,
+        }
+
+retention_sweeper = RetentionSweeper(RETENTION_SWEEP_INTERVAL)
+
+def init_retention():
+    """워커 시작 시 보관 정책 스위퍼를 백그라운드로 시작합니다. (RETENTION_SWEEP_INTERVAL=0 이면 시작하지 않음)"""
+    retention_sweeper.start()
+    if retention_sweeper.interval > 0:
+        logger.info(
+            f"보관 정책 스위퍼 시작: {RETENTION_SWEEP_INTERVAL}s 간격, 대화 보관 {CHAT_RETENTION_DAYS or '무제한'}일, "
+            f"아카이브 {CHAT_ARCHIVE_IDLE_DAYS or '사용 안 함'}일"
+        )
+
+async def close_retention():
+    await retention_sweeper.stop()
@@ -0,0 +1,324 @@
+import os
+import re
+import json
+import math
+import random
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from services.tool_service import TOOL_REGISTRY
+from services.context_service import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# === 의도 라우터 설정 ===
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "false").lower() == "true" # 턴마다 필요한 도구만 보냄 (false 면 항상 전체 도구)
+ROUTER_THRESHOLD = float(os.getenv("ROUTER_THRESHOLD", "0.5")) # 분류기 확률이 이 값 이상이면 해당 도구를 보냄
+ROUTER_UNSURE_THRESHOLD = float(os.getenv("ROUTER_UNSURE_THRESHOLD", "0.3")) # 이 값 이상 ~ ROUTER_THRESHOLD 미만이면 판단을 보류하고 전체 도구를 보냄
+ROUTER_SHADOW_RATE = float(os.getenv("ROUTER_SHADOW_RATE", "0.05")) # 라우터 판단만 기록하고 전체 도구를 보내는 턴 비율 (평가용 정답 수집)
+ROUTER_LIGHT_MODEL = os.getenv("ROUTER_LIGHT_MODEL", "") # 도구가 필요 없는 짧은 턴에 쓸 저렴한 모델 (비어 있으면 사용 안 함)
+ROUTER_LIGHT_MAX_TOKENS = int(os.getenv("ROUTER_LIGHT_MAX_TOKENS", "20")) # 저렴한 모델을 쓸 사용자 메시지 최대 토큰 수
+ROUTER_FOLLOWUP_MAX_CHARS = int(os.getenv("ROUTER_FOLLOWUP_MAX_CHARS", "30")) # 이보다 짧은 메시지는 직전 사용자 메시지의 도구를 이어받음
+ROUTER_TRAINING_PATH = os.getenv("ROUTER_TRAINING_PATH", "") # 분류기 추가 학습 예시 JSONL (scripts.evaluate_router --export 로 생성)
+
+# === 라우팅 규칙 ===
+# 1. 도구별 키워드 규칙에 걸리면 그 도구를 보냄
+# 2. 규칙에 걸리지 않으면 도구별 나이브 베이즈 분류기(글자 bigram)의 확률로 판단
+#    - ROUTER_THRESHOLD 이상: 보냄 / ROUTER_UNSURE_THRESHOLD 미만: 보내지 않음 / 그 사이: 판단 보류 -> 전체 도구
+# 3. 짧은 후속 메시지("그럼 내일은?")는 직전 사용자 메시지의 도구를 이어받음 (인사/감사 표현은 제외)
+# 도구를 하나도 보내지 않으면 첫 호출에 도구 스키마가 빠지고, 모델이 도구를 부를 수 없으므로 두 번째 호출도 생기지 않습니다.
+# 잘못 빼면 답변 품질이 떨어지고 잘못 넣으면 토큰만 더 들므로, 애매하면 보내는 쪽으로 판단합니다.
+TOOL_KEYWORDS = {
+    "get_current_weather": re.compile(
+        r"날씨|기온|온도|강수|비\s?(가|와|오|올|내)|눈\s?(이|와|오|올|내)|우산|미세\s?먼지|황사|습도|바람\s?(이|불|세)|태풍|"
+        r"더워|추워|덥|춥|쌀쌀|맑|흐려|흐림|옷차림|겉옷|외투|패딩|코트|장갑|목도리|weather|temperature|forecast|rain|snow",
+        re.IGNORECASE,
+    ),
+    "get_current_date": re.compile(
+        r"오늘|내일|모레|어제|그저께|날짜|며칠|몇\s?일|요일|몇\s?월|이번\s?(주|달)|다음\s?(주|달)|지난\s?(주|달)|주말|"
+        r"올해|작년|내년|디데이|d-day|며칠\s?남|date|today|tomorrow|yesterday|weekday",
+        re.IGNORECASE,
+    ),
+}
+# 직전 메시지의 도구를 이어받지 않는 짧은 맺음말
+CLOSING_PATTERN = re.compile(r"고마워|고맙|감사|알겠|수고|좋아|오케이|ㅇㅋ|ㄱㅅ|thanks|thank you|^ok", re.IGNORECASE)
+# 저렴한 모델에 맡기지 않을 메시지 (개발 지식, 설명/비교 요청, 코드)
+COMPLEX_PATTERN = re.compile(
+    r"```|코드|구현|설명|왜|어떻게|차이|비교|분석|예시|방법|원리|에러|오류|버그|설계|정리|요약|번역|작성|써\s?줘|"
+    r"[A-Za-z_]+\(|[A-Za-z]{4,}",
+)
+
+# 분류기 기본 학습 예시 (텍스트, 필요한 도구). 규칙에 걸리지 않는 돌려 말하기를 주로 담음
+SEED_EXAMPLES: List[Tuple[str, List[str]]] = [
+    ("밖에 나가도 괜찮을까?", ["get_current_weather"]),
+    ("산책하기 좋은 날이야?", ["get_current_weather"]),
+    ("빨래 널어도 될까", ["get_current_weather"]),
+    ("세차해도 괜찮은 날씨야?", ["get_current_weather"]),
+    ("겉옷 챙겨야 해?", ["get_current_weather"]),
+    ("지금 밖에 어때?", ["get_current_weather"]),
+    ("서울 지금 몇 도야?", ["get_current_weather"]),
+    ("자전거 타기 괜찮은 날이야?", ["get_current_weather"]),
+    ("캠핑 가기 괜찮은 하늘이야?", ["get_current_weather"]),
+    ("반팔 입어도 될까?", ["get_current_weather"]),
+    ("지금 몇 시 정도야?", ["get_current_date"]),
+    ("이번 달이 몇 월이지?", ["get_current_date"]),
+    ("크리스마스까지 얼마나 남았어?", ["get_current_date"]),
+    ("월급날까지 며칠 남았지?", ["get_current_date"]),
+    ("지금 몇 년도야?", ["get_current_date"]),
+    ("다음 달 첫째 주 월요일이 언제야?", ["get_current_date"]),
+    ("오늘 날짜랑 날씨 같이 알려줘", ["get_current_weather", "get_current_date"]),
+    ("안녕하세요", []),
+    ("안녕", []),
+    ("고마워", []),
+    ("좋아 알겠어", []),
+    ("응 그렇게 해줘", []),
+    ("저녁 메뉴 추천해줘", []),
+    ("매운 건 빼고", []),
+    ("영어 이메일 첫 문장 자연스럽게 써줘", []),
+    ("조금 더 격식 있게", []),
+    ("파이썬에서 리스트를 정렬하는 방법 알려줘", []),
+    ("MongoDB 인덱스가 뭐야?", []),
+    ("복합 인덱스는 언제 써?", []),
+    ("쓰기 성능에는 어떤 영향이 있어?", []),
+    ("트랜스포머 어텐션 원리 설명해줘", []),
+    ("이 코드에서 버그 찾아줘", []),
+    ("재미있는 이야기 해줘", []),
+    ("회의록 정리해줘", []),
+    ("이 문장 번역해줘", []),
+    ("추천할 만한 책 있어?", []),
+    ("운동 루틴 짜줘", []),
+    ("FastAPI 에서 의존성 주입은 어떻게 해?", []),
+    ("비동기랑 멀티스레드 차이가 뭐야?", []),
+    ("면접 준비 어떻게 해야 할까?", []),
+    ("도커 이미지 크기 줄이는 법", []),
+    ("이 에러 메시지 무슨 뜻이야?", []),
+    ("정규표현식으로 이메일 검증하려면?", []),
+    ("REST API 설계할 때 주의할 점", []),
+    ("테스트 코드 작성 요령 알려줘", []),
+    ("리액트 상태 관리 라이브러리 추천", []),
+    ("SQL 조인 종류 정리해줘", []),
+    ("캐시 무효화 전략에는 뭐가 있어?", []),
+    ("LLM 파인튜닝이랑 RAG 중 뭐가 나아?", []),
+    ("프롬프트 좀 다듬어줘", []),
+    ("발표 자료 목차 잡아줘", []),
+    ("자기소개서 첫 문단 봐줘", []),
+    ("더 자연스럽게 바꿔줘", []),
+    ("한 줄로 요약해줘", []),
+    ("반말로 바꿔줘", []),
+    ("예시 하나만 더", []),
+    ("다른 방법은 없어?", []),
+    ("그건 왜 그런 거야?", []),
+    ("자세히 설명해줘", []),
+    ("간단한 디저트 레시피 알려줘", []),
+    ("혼자 볼 만한 영화 추천", []),
+    ("선물로 뭐가 좋을까?", []),
+    ("집중 잘 되는 음악 장르", []),
+    ("다이어트 식단 짜줘", []),
+    ("고양이가 밥을 안 먹어", []),
+    ("스트레스 풀리는 방법", []),
+    ("잠이 안 와", []),
+    ("재테크 입문 책 추천", []),
+    ("엑셀 함수 vlookup 쓰는 법", []),
+    ("노트북 살 때 뭘 봐야 해?", []),
+    ("ㅋㅋ 재밌네", []),
+    ("오 좋은데?", []),
+    ("맞아", []),
+    ("아니 그게 아니라", []),
+    ("계속 해줘", []),
+    ("잘 모르겠어", []),
+    ("음 다시 생각해볼게", []),
+    ("수고했어", []),
+]
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+def _features(text: str) -> Counter:
+    """단어 안의 글자 bigram 과 단어 unigram 빈도를 반환합니다. (한국어 조사/어미 변화에 덜 민감)"""
+    words = re.findall(r"\w+", _normalize(text))
+    features = Counter(f"w:{word}" for word in words)
+    for word in words:
+        features.update(word[i:i + 2] for i in range(len(word) - 1))
+    return features
+
+class ToolClassifier:
+    """도구별로 독립적인 이진 나이브 베이즈 분류기입니다. (도구가 필요함 / 필요 없음)"""
+
+    def __init__(self, examples: Iterable[Tuple[str, Iterable[str]]]):
+        self.tools: List[str] = []
+        # tool -> (label -> feature -> count), (label -> total count), (label -> example count)
+        self._counts: Dict[str, Dict[bool, Counter]] = {}
+        self._totals: Dict[str, Dict[bool, int]] = {}
+        self._docs: Dict[str, Dict[bool, int]] = {}
+        self._vocabulary: Set[str] = set()
+        self.examples = 0
+        self.fit(examples)
+
+    def fit(self, examples: Iterable[Tuple[str, Iterable[str]]]):
+        examples = [(text, set(tools)) for text, tools in examples]
+        self.tools = sorted({tool for _, tools in examples for tool in tools})
+        self._counts = {tool: {True: Counter(), False: Counter()} for tool in self.tools}
+        self._vocabulary = set()
+        for text, tools in examples:
+            features = _features(text)
+            self._vocabulary.update(features)
+            for tool in self.tools:
+                self._counts[tool][tool in tools].update(features)
+        self._totals = {tool: {label: sum(counts[label].values()) for label in counts} for tool, counts in self._counts.items()}
+        self._docs = {tool: {label: sum(1 for _, tools in examples if (tool in tools) == label) for label in (True, False)} for tool in self.tools}
+        self.examples = len(examples)
+
+    def predict(self, text: str) -> Dict[str, float]:
+        """도구별로 필요할 확률을 반환합니다."""
+        features = _features(text)
+        vocabulary = len(self._vocabulary) + 1
+        probabilities = {}
+        for tool in self.tools:
+            scores = {}
+            for label in (True, False):
+                counts, total = self._counts[tool][label], self._totals[tool][label]
+                score = math.log((self._docs[tool][label] + 1) / (self.examples + 2)) # 사전 확률 (라플라스 평활)
+                for feature, count in features.items():
+                    if feature in self._vocabulary:
+                        score += count * math.log((counts[feature] + 1) / (total + vocabulary))
+                scores[label] = score
+            top = max(scores.values())
+            positive, negative = math.exp(scores[True] - top), math.exp(scores[False] - top)
+            probabilities[tool] = positive / (positive + negative)
+        return probabilities
+
+def load_training_examples(path: str) -> List[Tuple[str, List[str]]]:
+    """{"text": ..., "tools": [...]} 형식 JSONL 을 읽습니다."""
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                examples.append((entry["text"], entry.get("tools") or []))
+    return examples
+
+def _initial_examples() -> List[Tuple[str, List[str]]]:
+    examples = list(SEED_EXAMPLES)
+    if ROUTER_TRAINING_PATH:
+        try:
+            extra = load_training_examples(ROUTER_TRAINING_PATH)
+            examples.extend(extra)
+            logger.info(f"라우터 추가 학습 예시 {len(extra)}개 로드: {ROUTER_TRAINING_PATH}")
+        except Exception as e:
+            logger.warning(f"라우터 추가 학습 예시를 읽지 못해 기본 예시만 사용합니다 ({ROUTER_TRAINING_PATH}): {e}")
+    return examples
+
+classifier = ToolClassifier(_initial_examples())
+
+# 도구별 스키마 토큰 수 (도구를 빼면 호출마다 절감되는 입력 토큰 추정치)
+_schema_tokens: Dict[str, int] = {}
+
+def schema_tokens(tool_name: str) -> int:
+    tokens = _schema_tokens.get(tool_name)
+    if tokens is None:
+        tokens = _schema_tokens[tool_name] = count_tokens(json.dumps(TOOL_REGISTRY[tool_name]["schema"], ensure_ascii=False))
+    return tokens
+
+def previous_user_message(context: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+    for message in reversed(context or []):
+        if message.get("role") == "user":
+            return message.get("content")
+    return None
+
+def predict_tools(message: str, previous: Optional[str] = None) -> Tuple[List[str], bool, str]:
+    """메시지에 필요한 도구를 예측합니다. (도구 이름 목록, 판단 보류 여부, 근거) 반환
+
+    근거: "rule" (키워드 규칙) / "classifier" / "followup" (직전 메시지에서 이어받음) / "none"
+    """
+    available = [name for name in TOOL_REGISTRY]
+    tools: Set[str] = {name for name in available if name in TOOL_KEYWORDS and TOOL_KEYWORDS[name].search(message)}
+    reason = "rule" if tools else "none"
+    unsure = False
+    probabilities = classifier.predict(message)
+    for name in available:
+        if name in tools or name not in probabilities:
+            continue
+        if probabilities[name] >= ROUTER_THRESHOLD:
+            tools.add(name)
+            reason = reason if reason == "rule" else "classifier"
+        elif probabilities[name] >= ROUTER_UNSURE_THRESHOLD:
+            unsure = True
+    if previous and len(message) <= ROUTER_FOLLOWUP_MAX_CHARS and not CLOSING_PATTERN.search(message):
+        inherited, _, _ = predict_tools(previous)
+        if set(inherited) - tools:
+            tools.update(inherited)
+            reason = "followup" if reason == "none" else reason
+    return [name for name in available if name in tools], unsure, reason
+
+def plan_route(message: str, context: Optional[List[Dict[str, Any]]] = None, shadow: bool = False,
+               exclude: Iterable[str] = ()) -> Dict[str, Any]:
+    """라우터 판단을 계산합니다. (ROUTER_ENABLED / 샘플링과 상관없이 결정적, 평가 스크립트에서도 사용)
+
+    반환 dict:
+      - route: "none" (도구 없음) / "tools" (예측한 도구만) / "all" (판단 보류, 전체 도구) / "shadow" (기록만, 전체 도구)
+      - tools: 보낼 도구 이름 목록, predicted: 라우터가 예측한 도구 이름 목록, reason: 판단 근거
+      - model: 사용할 모델 (None 이면 기본 모델), saved_per_call: 도구를 뺀 만큼 호출마다 절감되는 입력 토큰 추정치
+      - saved_tokens: 실제 호출에서 누적된 절감량 (openai_service 가 호출마다 더함)
+    exclude: 프롬프트 정보(prompt_facts_service)로 대신해 어차피 보내지 않는 도구 (판단과 절감량 계산에서 제외)
+    """
+    available = [name for name in TOOL_REGISTRY if name not in exclude]
+    predicted, unsure, reason = predict_tools(message, previous_user_message(context))
+    predicted = [name for name in predicted if name in available]
+    if shadow:
+        route, tools = "shadow", available
+    elif unsure and len(predicted) < len(available):
+        route, tools, reason = "all", available, "unsure"
+    else:
+        route, tools = ("tools" if predicted else "none"), predicted
+    model = None
+    if (ROUTER_LIGHT_MODEL and route == "none" and count_tokens(message) <= ROUTER_LIGHT_MAX_TOKENS
+            and not COMPLEX_PATTERN.search(message)):
+        model = ROUTER_LIGHT_MODEL
+    return {
+        "route": route,
+        "tools": tools,
+        "predicted": predicted,
+        "reason": reason,
+        "model": model,
+        "saved_per_call": sum(schema_tokens(name) for name in available if name not in tools),
+        "saved_tokens": 0,
+    }
+
+class RouterStats:
+    def __init__(self):
+        self.routes: Counter = Counter()
+        self.reasons: Counter = Counter()
+        self.light_model = 0
+
+    def record(self, decision: Dict[str, Any]):
+        self.routes[decision["route"]] += 1
+        self.reasons[decision["reason"]] += 1
+        self.light_model += decision["model"] is not None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": ROUTER_ENABLED,
+            "shadow_rate": ROUTER_SHADOW_RATE,
+            "light_model": ROUTER_LIGHT_MODEL or None,
+            "training_examples": classifier.examples,
+            "routes": dict(self.routes),
+            "reasons": dict(self.reasons),
+            "light_model_turns": self.light_model,
+        }
+
+router_stats = RouterStats()
+
+def route_message(message: str, context: Optional[List[Dict[str, Any]]] = None,
+                  exclude: Iterable[str] = ()) -> Optional[Dict[str, Any]]:
+    """턴에 보낼 도구와 모델을 결정합니다. ROUTER_ENABLED=false 면 None (전체 도구, 기본 모델)
+
+    ROUTER_SHADOW_RATE 비율의 턴은 판단만 기록하고 전체 도구를 보내, 라우터가 뺐을 도구를 모델이 실제로 썼는지
+    token_usages 에 남깁니다. (scripts.evaluate_router 의 정답)
+    """
+    if not ROUTER_ENABLED:
+        return None
+    decision = plan_route(message, context, shadow=random.random() < ROUTER_SHADOW_RATE, exclude=exclude)
+    router_stats.record(decision)
+    logger.debug("라우터 판단: %s (도구 %s, 근거 %s, 모델 %s)", decision["route"], decision["tools"], decision["reason"], decision["model"])
+    return decision
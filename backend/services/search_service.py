@@ -0,0 +1,130 @@
+import os
+import re
+import json
+import math
+import base64
+import logging
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from db.mongo import get_session_titles
+from db.search_index import search_index, words
+from services.tracing_service import traced
+
+logger = logging.getLogger(__name__)
+
+SEARCH_WINDOW = int(os.getenv("SEARCH_WINDOW", "1000")) # 한 번에 순위를 매기는 최근 일치 메시지 수
+SEARCH_SCAN_LIMIT = int(os.getenv("SEARCH_SCAN_LIMIT", "5000")) # 요청 한 번에 읽는 최대 색인 항목 수 (조회 비용 상한)
+SEARCH_MAX_WORDS = int(os.getenv("SEARCH_MAX_WORDS", "8")) # 검색어에서 사용할 최대 단어 수
+SEARCH_HITS_PER_CONVERSATION = int(os.getenv("SEARCH_HITS_PER_CONVERSATION", "3")) # 대화별로 반환할 일치 메시지 수
+SEARCH_SNIPPET_LENGTH = int(os.getenv("SEARCH_SNIPPET_LENGTH", "120")) # 미리보기 길이 (글자)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# === 검색 결과 페이지 구성 ===
+# 최신 메시지부터 검색어 단어를 모두 포함하는 메시지를 SEARCH_WINDOW 개(또는 색인 항목 SEARCH_SCAN_LIMIT 개를 읽을 때까지)
+# 모아 한 구간으로 삼고, 대화별로 묶어 관련도(BM25) 순으로 정렬한 뒤 limit 개씩 나눠 반환합니다.
+# 커서는 (구간 상한 rowid, 구간 내 위치)이며, 구간을 다 보면 그 구간보다 오래된 메시지로 다음 구간을 만듭니다.
+# 요청마다 읽는 양에 상한이 있으므로 전체 기록이 늘어나도 페이지 조회 시간은 거의 일정합니다.
+# (같은 대화가 여러 구간에 걸쳐 있으면 구간마다 한 번씩 나올 수 있음)
+
+def _encode_cursor(upper: int, offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"u": upper, "o": offset}).encode()).decode()
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return int(raw["u"]), int(raw["o"])
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+def _bm25(hits: List[Dict[str, Any]], query_words: List[str], total: int, df: Dict[str, int]):
+    """구간의 일치 메시지마다 BM25 점수를 계산합니다. (문서 수는 색인의 bigram 문서 수로 추정, 평균 길이는 구간 기준)"""
+    average_length = sum(len(hit["text"]) for hit in hits) / len(hits)
+    idf = {word: math.log(1 + (total - df[word] + 0.5) / (df[word] + 0.5)) for word in query_words}
+    for hit in hits:
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(hit["text"]) / average_length)
+        score = 0.0
+        for word in query_words:
+            tf = hit["text"].count(word)
+            score += idf[word] * tf * (BM25_K1 + 1) / (tf + norm)
+        hit["score"] = score
+
+def _rank(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """일치 메시지를 대화별로 묶고 관련도 순으로 정렬합니다.
+
+    대화 점수는 가장 높은 메시지 점수에 일치 메시지 수에 따른 가산점을 더한 값입니다.
+    점수가 같으면 최근 메시지가 있는 대화가 먼저입니다.
+    """
+    # 관련도 순으로 한 번 정렬한 뒤 묶으면 대화별 첫 메시지가 가장 관련도 높은 메시지
+    groups: Dict[str, Dict[str, Any]] = {}
+    for hit in sorted(hits, key=lambda hit: (-hit["score"], -hit["row"])):
+        group = groups.get(hit["conversation_id"])
+        if group is None:
+            group = groups[hit["conversation_id"]] = {
+                "conversation_id": hit["conversation_id"], "score": hit["score"], "hit_count": 0, "latest_row": hit["row"], "hits": [],
+            }
+        group["hit_count"] += 1
+        group["latest_row"] = max(group["latest_row"], hit["row"])
+        if len(group["hits"]) < SEARCH_HITS_PER_CONVERSATION:
+            group["hits"].append(hit)
+    for group in groups.values():
+        group["score"] = round(group["score"] + 0.5 * math.log(group["hit_count"]), 4)
+    return sorted(groups.values(), key=lambda group: (-group["score"], -group["latest_row"]))
+
+def _highlight(content: str, pattern: re.Pattern) -> Dict[str, Any]:
+    """첫 일치 위치 주변을 미리보기로 잘라내고, 미리보기 안의 일치 구간 [시작, 끝) 목록을 함께 반환합니다."""
+    text = unicodedata.normalize("NFKC", content)
+    first = pattern.search(text)
+    start = max(0, (first.start() if first else 0) - SEARCH_SNIPPET_LENGTH // 3)
+    end = min(len(text), start + SEARCH_SNIPPET_LENGTH)
+    start = max(0, min(start, end - SEARCH_SNIPPET_LENGTH))
+    prefix = "…" if start > 0 else ""
+    snippet = prefix + text[start:end] + ("…" if end < len(text) else "")
+    highlights = [
+        [match.start() - start + len(prefix), match.end() - start + len(prefix)]
+        for match in pattern.finditer(text, start, end)
+    ]
+    return {"snippet": snippet, "highlights": highlights}
+
+@traced("search.query")
+async def search_conversations(query: str, limit: int = 20, cursor: Optional[str] = None) -> dict:
+    """전체 대화에서 검색어 단어를 모두 포함하는 메시지를 찾아 대화별로 묶어 한 페이지 반환합니다.
+
+    반환값: {"results": [{"conversation_id", "title", "score", "hit_count", "hits": [...]}], "next_cursor": 다음 페이지 커서}
+    검색어에 단어가 없거나 커서가 잘못되면 ValueError, 검색 색인이 비활성화되어 있으면 ConnectionError.
+    """
+    if search_index.index is None:
+        raise ConnectionError("Search index not available")
+    query_words = list(dict.fromkeys(words(query)))[:SEARCH_MAX_WORDS]
+    if not query_words:
+        raise ValueError("Empty query")
+    upper, offset = _decode_cursor(cursor) if cursor else (None, 0)
+
+    found = await search_index.index.search(query_words, upper, SEARCH_WINDOW, SEARCH_SCAN_LIMIT)
+    hits = found["hits"]
+    if hits:
+        _bm25(hits, query_words, found["total"], found["df"])
+    ranked = _rank(hits)
+    page = ranked[offset:offset + limit]
+
+    next_cursor = None
+    if offset + limit < len(ranked):
+        # 같은 구간의 다음 위치 (첫 페이지이면 이후 페이지가 같은 구간을 보도록 상한을 고정)
+        next_cursor = _encode_cursor(upper if upper is not None else hits[0]["row"] + 1, offset + limit)
+    elif found["scanned_to"] is not None:
+        next_cursor = _encode_cursor(found["scanned_to"], 0) # 다음 구간: 이번 구간보다 오래된 메시지
+
+    titles = await get_session_titles([result["conversation_id"] for result in page]) if page else {}
+    # 하이라이트는 반환할 페이지의 메시지에만 적용
+    pattern = re.compile("|".join(re.escape(word) for word in sorted(query_words, key=len, reverse=True)), re.IGNORECASE)
+    for result in page:
+        result.pop("latest_row")
+        result["title"] = titles.get(result["conversation_id"])
+        result["hits"] = [
+            {"id": hit["id"], "role": hit["role"], "timestamp": hit["timestamp"], **_highlight(hit["content"], pattern)}
+            for hit in result["hits"]
+        ]
+    logger.info(f"검색 완료: 일치 메시지 {len(hits)}개, 대화 {len(ranked)}개 중 {len(page)}개 반환")
+    return {"results": page, "next_cursor": next_cursor}
@@ -1,26 +1,35 @@
 import logging
-from typing import List
+from typing import List, Optional, AsyncIterator
 
 # 의존성 주입
 from db.mongo import get_all_sessions as db_get_all_sessions
-from db.mongo import get_chat_history as db_get_chat_history
+from db.mongo import get_chat_history_page as db_get_chat_history_page
+from db.mongo import iter_chat_history as db_iter_chat_history
 from db.mongo import delete_chat_history_by_id as db_delete_history
 
 logger = logging.getLogger(__name__)
 
-async def get_sessions() -> List[str]:
-    """모든 세션 ID 목록을 반환합니다."""
-    logger.info("세션 목록 조회 서비스 호출됨")
-    # 데이터베이스 함수 직접 호출
-    session_ids = await db_get_all_sessions()
-    return session_ids
+async def get_sessions(limit: int = 50, cursor: Optional[str] = None) -> dict:
+    """최근 메시지 순으로 세션 요약 목록 한 페이지와 다음 페이지 커서를 반환합니다."""
+    logger.info(f"세션 목록 조회 서비스 호출됨 (limit={limit})")
+    # 데이터베이스 함수 직접 호출 (잘못된 커서는 ValueError)
+    return await db_get_all_sessions(limit=limit, cursor=cursor)
 
-async def get_history(conversation_id: str) -> List[dict]:
-    """특정 세션의 채팅 기록을 반환합니다."""
-    logger.info(f"채팅 기록 조회 서비스 호출됨: ConvID={conversation_id}")
-    # 데이터베이스 함수 직접 호출
-    history = await db_get_chat_history(conversation_id)
-    return history
+async def get_history(
+    conversation_id: str,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None
+) -> dict:
+    """특정 세션의 채팅 기록 한 페이지와 앞/뒤 페이지 커서를 반환합니다."""
+    logger.info(f"채팅 기록 조회 서비스 호출됨: ConvID={conversation_id}, limit={limit}")
+    # 데이터베이스 함수 직접 호출 (잘못된 커서는 ValueError)
+    return await db_get_chat_history_page(conversation_id, limit=limit, before=before, after=after)
+
+def stream_history(conversation_id: str, before: Optional[str] = None, after: Optional[str] = None) -> AsyncIterator[dict]:
+    """특정 세션의 채팅 기록을 시간순으로 하나씩 반환하는 비동기 이터레이터를 반환합니다."""
+    logger.info(f"채팅 기록 스트리밍 서비스 호출됨: ConvID={conversation_id}")
+    return db_iter_chat_history(conversation_id, before=before, after=after)
 
 async def delete_session(conversation_id: str) -> int:
     """특정 세션 ID에 해당하는 모든 채팅 기록을 삭제합니다."""
@@ -0,0 +1,284 @@
+import os
+import time
+import uuid
+import random
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# === 워커 간 공유 상태 설정 ===
+# memory: 프로세스 내 dict (기본값, 단일 워커 전용)
+# redis: Redis 서버 (멀티 워커 / 멀티 호스트 운영용, pip install redis)
+# sqlite: 로컬 SQLite 파일 (같은 호스트의 워커끼리 공유, Redis 없이 멀티 워커 동작을 확인할 때 사용)
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "memory").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "/tmp/chatbot_shared_state.db") # sqlite 백엔드 파일 경로
+SHARED_STATE_PREFIX = os.getenv("SHARED_STATE_PREFIX", "chatbot:") # 키 접두사 (여러 배포가 같은 Redis 를 쓸 때 구분)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1")) # 워커 프로세스 수 (gunicorn.conf.py 와 동일한 값)
+
+class SharedStateBackend:
+    """워커 간에 공유되는 키-값 저장소 인터페이스입니다. 값은 문자열이며 ttl 은 초 단위입니다.
+
+    is_shared 가 False 이면 (memory) 프로세스 내 상태만으로 충분하므로 호출하는 쪽은 공유 경로를 건너뜁니다.
+    """
+
+    name = "base"
+    is_shared = True
+
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        """값을 저장합니다. nx=True 이면 키가 없을 때만 저장하고, 저장 여부를 반환합니다."""
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def delete_if_equals(self, key: str, value: str) -> bool:
+        """현재 값이 value 와 같을 때만 삭제합니다. (락 소유자만 해제)"""
+        raise NotImplementedError
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """정수 값을 amount 만큼 더한 결과를 반환합니다. ttl 을 주면 만료 시각을 갱신합니다. (비정상 종료한 워커의 카운트 회수)"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class MemoryStateBackend(SharedStateBackend):
+    """프로세스 내 dict 구현입니다. 워커 1개일 때의 기본값이며, 다른 백엔드와 같은 의미로 동작합니다."""
+
+    name = "memory"
+    is_shared = False
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {} # key -> (만료 시각 또는 None, 값)
+        self._writes = 0
+
+    def _live(self, key: str) -> Optional[tuple]:
+        entry = self._data.get(key)
+        if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def _put(self, key: str, value: str, ttl: Optional[float]):
+        self._data[key] = (time.monotonic() + ttl if ttl else None, value)
+        self._writes += 1
+        if self._writes % 1000 == 0: # 가끔 만료된 항목 정리
+            now = time.monotonic()
+            for stale in [k for k, (expires_at, _) in self._data.items() if expires_at is not None and expires_at < now]:
+                del self._data[stale]
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._live(key)
+        return entry[1] if entry else None
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        if nx and self._live(key) is not None:
+            return False
+        self._put(key, value, ttl)
+        return True
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    async def delete_if_equals(self, key: str, value: str) -> bool:
+        entry = self._live(key)
+        if entry is None or entry[1] != value:
+            return False
+        del self._data[key]
+        return True
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        entry = self._live(key)
+        value = int(entry[1]) + amount if entry else amount
+        self._put(key, str(value), ttl if ttl else None)
+        return value
+
+class RedisStateBackend(SharedStateBackend):
+    """Redis 구현입니다. 원자성이 필요한 연산은 단일 명령 또는 Lua 스크립트로 처리합니다."""
+
+    name = "redis"
+    _DELETE_IF_EQUALS = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end return 0"
+    _INCR_WITH_TTL = (
+        "local value = redis.call('INCRBY', KEYS[1], ARGV[1]) "
+        "if tonumber(ARGV[2]) > 0 then redis.call('PEXPIRE', KEYS[1], ARGV[2]) end return value"
+    )
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("SHARED_STATE_BACKEND=redis 를 사용하려면 redis 패키지가 필요합니다. (pip install redis)") from e
+        self._client = redis_asyncio.from_url(url, decode_responses=True)
+        self._delete_if_equals = self._client.register_script(self._DELETE_IF_EQUALS)
+        self._incr_with_ttl = self._client.register_script(self._INCR_WITH_TTL)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        return bool(await self._client.set(key, value, px=int(ttl * 1000) if ttl else None, nx=nx))
+
+    async def delete(self, key: str):
+        await self._client.delete(key)
+
+    async def delete_if_equals(self, key: str, value: str) -> bool:
+        return bool(await self._delete_if_equals(keys=[key], args=[value]))
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return int(await self._incr_with_ttl(keys=[key], args=[amount, int(ttl * 1000) if ttl else 0]))
+
+    async def close(self):
+        await self._client.aclose()
+
+class SqliteStateBackend(SharedStateBackend):
+    """같은 호스트의 워커끼리 SQLite 파일(WAL)로 상태를 공유하는 구현입니다.
+
+    Redis 없이 멀티 워커 동작(사용자별 한도, 중복 요청 병합, 기록 캐시 무효화)을 로컬에서 확인하기 위한 용도입니다.
+    쓰기는 BEGIN IMMEDIATE 트랜잭션으로 직렬화되며, 블로킹 I/O 는 스레드에서 실행합니다.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock() # 프로세스 내 스레드 간 연결 공유 보호
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS shared_state (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def _run(self, operation, *args) -> Any:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = operation(time.time(), *args) # 프로세스 간 비교가 가능하도록 wall clock 사용
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def _current(self, now: float, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value, expires_at FROM shared_state WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < now):
+            return None
+        return row[0]
+
+    def _write(self, now: float, key: str, value: str, ttl: Optional[float]):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, now + ttl if ttl else None),
+        )
+
+    def _set(self, now: float, key: str, value: str, ttl: Optional[float], nx: bool) -> bool:
+        if nx and self._current(now, key) is not None:
+            return False
+        self._write(now, key, value, ttl)
+        return True
+
+    def _delete_if_equals(self, now: float, key: str, value: str) -> bool:
+        if self._current(now, key) != value:
+            return False
+        self._conn.execute("DELETE FROM shared_state WHERE key = ?", (key,))
+        return True
+
+    def _incr(self, now: float, key: str, amount: int, ttl: Optional[float]) -> int:
+        current = self._current(now, key)
+        value = int(current) + amount if current is not None else amount
+        self._write(now, key, str(value), ttl)
+        return value
+
+    def _purge(self, now: float):
+        self._conn.execute("DELETE FROM shared_state WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._run, self._current, key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        return await asyncio.to_thread(self._run, self._set, key, value, ttl, nx)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._run, lambda now: self._conn.execute("DELETE FROM shared_state WHERE key = ?", (key,)))
+
+    async def delete_if_equals(self, key: str, value: str) -> bool:
+        return await asyncio.to_thread(self._run, self._delete_if_equals, key, value)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return await asyncio.to_thread(self._run, self._incr, key, amount, ttl)
+
+    async def close(self):
+        await asyncio.to_thread(self._run, self._purge)
+        with self._lock:
+            self._conn.close()
+
+class SharedState:
+    backend: SharedStateBackend = MemoryStateBackend()
+
+shared_state = SharedState()
+
+def shared_key(*parts: Any) -> str:
+    return SHARED_STATE_PREFIX + ":".join(str(part) for part in parts)
+
+def is_shared() -> bool:
+    """워커 간 공유 백엔드(redis/sqlite)를 사용 중이면 True 입니다."""
+    return shared_state.backend.is_shared
+
+def get_shared_state_stats() -> Dict[str, Any]:
+    """현재 워커의 pid 와 사용 중인 공유 상태 백엔드를 반환합니다. (런타임 통계는 워커별 값)"""
+    return {"pid": os.getpid(), "backend": shared_state.backend.name, "shared": shared_state.backend.is_shared}
+
+async def acquire_lock(name: str, ttl: float, timeout: float) -> Optional[str]:
+    """timeout 안에 공유 락을 얻으면 해제용 토큰을, 얻지 못하면 None 을 반환합니다.
+
+    락은 ttl 후 자동으로 풀리므로 락을 잡은 워커가 비정상 종료해도 영구히 남지 않습니다.
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    while True:
+        if await shared_state.backend.set(name, token, ttl=ttl, nx=True):
+            return token
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        await asyncio.sleep(min(remaining, delay * random.uniform(0.5, 1.5)))
+        delay = min(delay * 2, 0.2)
+
+async def release_lock(name: str, token: str):
+    await shared_state.backend.delete_if_equals(name, token)
+
+async def init_shared_state():
+    """애플리케이션(워커) 시작 시 SHARED_STATE_BACKEND 에 맞는 공유 상태 백엔드를 생성합니다."""
+    if SHARED_STATE_BACKEND == "redis":
+        backend = RedisStateBackend(REDIS_URL)
+        await backend._client.ping()
+    elif SHARED_STATE_BACKEND == "sqlite":
+        backend = SqliteStateBackend(SHARED_STATE_PATH)
+    elif SHARED_STATE_BACKEND == "memory":
+        backend = MemoryStateBackend()
+        if WEB_CONCURRENCY > 1:
+            logger.warning(
+                "WEB_CONCURRENCY=%d 이지만 공유 상태 백엔드가 memory 입니다. "
+                "사용자별 한도/중복 요청 병합/기록 캐시가 워커마다 따로 동작합니다. (SHARED_STATE_BACKEND=redis 권장)",
+                WEB_CONCURRENCY,
+            )
+    else:
+        raise ValueError(f"알 수 없는 SHARED_STATE_BACKEND: {SHARED_STATE_BACKEND}")
+    shared_state.backend = backend
+    logger.info("공유 상태 백엔드 초기화: %s (pid %d)", backend.name, os.getpid())
+
+async def close_shared_state():
+    """애플리케이션(워커) 종료 시 공유 상태 백엔드 연결을 닫습니다."""
+    await shared_state.backend.close()
+    shared_state.backend = MemoryStateBackend()
+    logger.info("공유 상태 백엔드 종료됨.")
@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# 날씨 서비스 함수 임포트
+from services.weather_service import get_current_weather
+# 날짜 서비스 함수 임포트
+from services.datetime_service import get_current_date
+# 턴 마감 시간
+from services.resilience_service import get_turn_deadline
+# 지연 시간 히스토그램
+from services.metrics_service import bind_tool
+from services.tracing_service import start_span
+
+logger = logging.getLogger(__name__)
+
+# === 도구 실행 제한 설정 ===
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "10")) # 도구 1회 실행 타임아웃 (초)
+TOOL_TURN_TIMEOUT = float(os.getenv("TOOL_TURN_TIMEOUT", "20")) # 한 턴에서 도구 실행에 쓸 수 있는 총 시간 (초)
+MAX_TOOL_ROUNDS = int(os.getenv("MAX_TOOL_ROUNDS", "3")) # 모델이 연쇄적으로 도구를 호출할 수 있는 최대 라운드 수
+
+# 도구 이름 -> {"schema": OpenAI 도구 스키마, "handler": 인자(dict)를 키워드로 받는 async 함수}
+TOOL_REGISTRY: Dict[str, Dict[str, Any]] = {}
+
+# 도구별 누적 실행 통계 (어떤 도구가 턴 지연을 주도하는지 확인용)
+tool_stats: Dict[str, Dict[str, float]] = {}
+
+def register_tool(schema: Dict[str, Any], handler: Callable[..., Awaitable[Any]]):
+    """도구 스키마와 실행 함수를 레지스트리에 등록합니다."""
+    name = schema["function"]["name"]
+    TOOL_REGISTRY[name] = {"schema": schema, "handler": handler, "histograms": bind_tool(name)}
+    logger.debug(f"도구 등록됨: {name}")
+
+def get_tool_schemas() -> List[Dict[str, Any]]:
+    """등록된 모든 도구의 스키마 목록을 반환합니다. (chat completion 의 tools 인자)"""
+    return [tool["schema"] for tool in TOOL_REGISTRY.values()]
+
+def get_tool_stats() -> Dict[str, Dict[str, float]]:
+    """도구별 호출 수, 오류 수, 평균/최대 지연 시간(초)을 반환합니다."""
+    return {
+        name: {
+            "calls": stat["calls"],
+            "errors": stat["errors"],
+            "avg_latency": stat["total_latency"] / stat["calls"] if stat["calls"] else 0.0,
+            "max_latency": stat["max_latency"],
+        }
+        for name, stat in tool_stats.items()
+    }
+
+def _record_latency(name: str, latency: float, failed: bool):
+    tool = TOOL_REGISTRY.get(name)
+    if tool is not None:
+        tool["histograms"][int(failed)].observe(latency)
+    stat = tool_stats.setdefault(name, {"calls": 0, "errors": 0, "total_latency": 0.0, "max_latency": 0.0})
+    stat["calls"] += 1
+    stat["errors"] += int(failed)
+    stat["total_latency"] += latency
+    stat["max_latency"] = max(stat["max_latency"], latency)
+
+async def _run_tool_call(tool_call: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """단일 tool_call 을 실행하고 tool 메시지를 반환합니다. 오류는 결과 dict 의 error 로 전달합니다."""
+    function_name = tool_call["function"]["name"]
+    tool = TOOL_REGISTRY.get(function_name)
+    tool_span = start_span("tool_call", tool=function_name)
+    started = time.perf_counter()
+    failed = True
+    if not tool:
+        logger.error(f"알 수 없는 함수 호출 시도: {function_name}")
+        tool_result = {"error": f"Function '{function_name}' not found."}
+    elif timeout <= 0:
+        logger.warning(f"턴 도구 실행 시간 초과로 '{function_name}' 호출 생략")
+        tool_result = {"error": "Tool time budget exceeded."}
+    else:
+        try:
+            # 함수 인자 파싱 (비어 있을 수 있음)
+            function_args = json.loads(tool_call["function"]["arguments"] or "{}")
+            logger.info("함수 '%s' 호출 (인자: %s)", function_name, function_args)
+            tool_result = await asyncio.wait_for(tool["handler"](**function_args), timeout=timeout)
+            failed = isinstance(tool_result, dict) and "error" in tool_result
+            logger.debug("함수 '%s' 결과: %s", function_name, tool_result)
+        except json.JSONDecodeError:
+            logger.error(f"함수 인자 파싱 오류: {tool_call['function']['arguments']}")
+            tool_result = {"error": "Invalid function arguments."}
+        except asyncio.TimeoutError:
+            logger.error(f"함수 '{function_name}' 실행 시간 초과 ({timeout:.1f}s)")
+            tool_result = {"error": "Function timed out."}
+        except Exception as e:
+            logger.error(f"함수 '{function_name}' 실행 중 오류: {e}", exc_info=True)
+            tool_result = {"error": "Error executing function."}
+
+    latency = time.perf_counter() - started
+    _record_latency(function_name, latency, failed)
+    if tool_span:
+        tool_span.set(failed=failed)
+        tool_span.finish()
+    return {
+        "tool_call_id": tool_call["id"],
+        "role": "tool",
+        "name": function_name,
+        "content": json.dumps(tool_result), # 결과를 JSON 문자열로 전달
+        "latency": latency,
+    }
+
+async def execute_tool_calls(tool_calls: List[Dict[str, Any]], deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+    """tool_calls(dict 형태)를 동시에 실행하고, 요청 순서대로 tool 메시지 목록을 반환합니다.
+
+    deadline(time.monotonic 기준)이 주어지면 각 도구의 타임아웃은 남은 턴 예산을 넘지 않습니다.
+    """
+    timeout = TOOL_TIMEOUT
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+
+    results = await asyncio.gather(*(_run_tool_call(tool_call, timeout) for tool_call in tool_calls))
+
+    latencies = ", ".join(f"{result['name']}={result.pop('latency') * 1000:.0f}ms" for result in results)
+    logger.info("도구 %d개 실행 완료 (%s)", len(results), latencies)
+    return list(results)
+
+def new_tool_deadline() -> float:
+    """한 턴의 도구 실행 마감 시각(time.monotonic 기준)을 반환합니다. 턴 마감 시간보다 늦지 않습니다."""
+    deadline = time.monotonic() + TOOL_TURN_TIMEOUT
+    turn_deadline = get_turn_deadline()
+    return deadline if turn_deadline is None else min(deadline, turn_deadline)
+
+# === 도구 등록 ===
+
+async def _get_current_weather_tool(latitude: float = None, longitude: float = None, **_):
+    return await get_current_weather(lat=latitude, lon=longitude)
+
+async def _get_current_date_tool(**_):
+    return await get_current_date() # 인자 없이 호출
+
+# OpenWeatherMap 날씨 조회 - 위도/경도 사용
+register_tool(
+    {
+        "type": "function",
+        "function": {
+            "name": "get_current_weather",
+            "description": "Get the current weather for a given latitude and longitude",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "latitude": {
+                        "type": "number",
+                        "description": "The latitude of the location",
+                    },
+                    "longitude": {
+                        "type": "number",
+                        "description": "The longitude of the location",
+                    },
+                },
+                "required": ["latitude", "longitude"],
+            },
+        },
+    },
+    _get_current_weather_tool,
+)
+
+register_tool(
+    {
+        "type": "function",
+        "function": {
+            "name": "get_current_date",
+            "description": "Get the current date",
+            "parameters": { # 파라미터 없음
+                "type": "object",
+                "properties": {},
+            },
+        },
+    },
+    _get_current_date_tool,
+)
@@ -0,0 +1,327 @@
+import os
+import json
+import time
+import heapq
+import queue
+import random
+import hashlib
+import logging
+import logging.handlers
+import functools
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+
+from logging_config import request_id_var, NonBlockingQueueHandler, DrainingQueueListener
+
+logger = logging.getLogger(__name__)
+
+# === 트레이싱 설정 ===
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true" # 채팅 요청 단위 span 기록
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none") # none | file | otlp (백그라운드 스레드에서 내보냄)
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl") # file: 트레이스 하나당 JSON 한 줄
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces") # otlp: OTLP/HTTP JSON 수집기 주소
+TRACE_EXPORT_SAMPLE_RATE = float(os.getenv("TRACE_EXPORT_SAMPLE_RATE", "1.0")) # 내보낼 트레이스 비율 (느린 트레이스 목록은 전체 대상)
+TRACE_SLOWEST_N = int(os.getenv("TRACE_SLOWEST_N", "20")) # 관리자 화면에서 보여줄 가장 느린 트레이스 수
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "200")) # 트레이스 하나에 기록할 최대 span 수
+SERVICE_NAME = os.getenv("SERVICE_NAME", "my-chat-bot")
+
+class Span:
+    """트레이스 안의 작업 구간 하나입니다. 시간은 time.perf_counter 기준으로 기록합니다."""
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "attributes", "error")
+
+    def __init__(self, name: str, span_id: int, parent_id: Optional[int], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self, error: Optional[BaseException] = None):
+        if self.end is not None:
+            return
+        self.end = time.perf_counter()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"[:200]
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+class Trace:
+    """요청 하나(request_id)의 span 목록입니다. 루트 span 이 끝나면 기록/내보내기 대상이 됩니다."""
+    __slots__ = ("trace_id", "wall_start", "root", "spans", "dropped_spans", "_ids")
+
+    def __init__(self, trace_id: str, name: str, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.wall_start = time.time()
+        self._ids = itertools.count(1)
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        self.root = self.new_span(name, None, attributes)
+
+    def new_span(self, name: str, parent_id: Optional[int], attributes: Dict[str, Any]) -> Optional[Span]:
+        if len(self.spans) >= TRACE_MAX_SPANS:
+            self.dropped_spans += 1
+            return None
+        span = Span(name, next(self._ids), parent_id, attributes)
+        self.spans.append(span)
+        return span
+
+    def _wall_time(self, perf_time: float) -> float:
+        return self.wall_start + (perf_time - self.root.start)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """관리자 화면/JSONL 파일용 표현입니다. span 시작 시각은 루트 기준 오프셋(ms)입니다."""
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "start": datetime.fromtimestamp(self.wall_start, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "duration_ms": round(self.root.duration * 1000, 2),
+            "attributes": self.root.attributes,
+            "error": self.root.error,
+            "dropped_spans": self.dropped_spans,
+            "spans": [
+                {
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "name": span.name,
+                    "offset_ms": round((span.start - self.root.start) * 1000, 2),
+                    "duration_ms": round(span.duration * 1000, 2),
+                    "unfinished": span.end is None,
+                    "attributes": span.attributes,
+                    "error": span.error,
+                }
+                for span in self.spans[1:]
+            ],
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """OTLP/HTTP JSON (ExportTraceServiceRequest) 형식으로 변환합니다."""
+        trace_id = self.trace_id if len(self.trace_id) == 32 else hashlib.md5(self.trace_id.encode()).hexdigest()
+        spans = []
+        for span in self.spans:
+            attributes = dict(span.attributes)
+            if span is self.root:
+                attributes["request_id"] = self.trace_id
+            otlp_span = {
+                "traceId": trace_id,
+                "spanId": f"{span.span_id:016x}",
+                "name": span.name,
+                "kind": 2 if span is self.root else 1, # SERVER / INTERNAL
+                "startTimeUnixNano": str(int(self._wall_time(span.start) * 1e9)),
+                "endTimeUnixNano": str(int(self._wall_time(span.start + span.duration) * 1e9)),
+                "attributes": [_otlp_attribute(key, value) for key, value in attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            }
+            if span.parent_id is not None:
+                otlp_span["parentSpanId"] = f"{span.parent_id:016x}"
+            spans.append(otlp_span)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": "chatbot"}, "spans": spans}],
+        }]}
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+# === 현재 트레이스 / span (요청 단위로 전파, 생성되는 task 에도 복사됨) ===
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def start_trace(name: str, **attributes) -> Optional[Trace]:
+    """현재 요청의 트레이스를 시작합니다. trace_id 는 request_id 를 사용합니다. 끝날 때 end_trace 를 호출해야 합니다.
+
+    스트리밍 응답처럼 라우트 함수가 반환된 뒤에 끝나는 요청에 사용합니다. 그 외에는 trace_request 를 사용하세요.
+    """
+    if not TRACING_ENABLED:
+        return None
+    trace = Trace(request_id_var.get() or os.urandom(16).hex(), name, attributes)
+    _current_trace.set(trace)
+    _current_span.set(trace.root)
+    return trace
+
+def end_trace(trace: Optional[Trace], error: Optional[BaseException] = None):
+    if trace is None or trace.root.end is not None:
+        return
+    trace.root.finish(error)
+    trace_recorder.record(trace)
+
+@contextmanager
+def trace_request(name: str, **attributes) -> Iterator[Optional[Trace]]:
+    trace = start_trace(name, **attributes)
+    try:
+        yield trace
+    except BaseException as e:
+        end_trace(trace, e)
+        raise
+    finally:
+        end_trace(trace)
+        _current_trace.set(None)
+        _current_span.set(None)
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """현재 트레이스에 하위 span 을 기록합니다. 트레이스가 없으면 아무것도 하지 않습니다.
+
+    블록 안에서 시작한 span/task 는 이 span 을 부모로 갖습니다. async generator 에서 yield 를 감싸는 구간에는
+    사용하지 말고 start_span 을 사용하세요. (yield 전후로 실행 컨텍스트가 달라질 수 있음)
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = trace.new_span(name, parent.span_id if parent else None, attributes)
+    if current is None:
+        yield None
+        return
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.finish(e)
+        raise
+    finally:
+        current.finish()
+        _current_span.reset(token)
+
+def start_span(name: str, **attributes) -> Optional[Span]:
+    """현재 span 으로 설정하지 않는 span 을 시작합니다. 호출한 쪽에서 finish() 를 호출해야 합니다."""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    parent = _current_span.get()
+    return trace.new_span(name, parent.span_id if parent else None, attributes)
+
+def set_span_attributes(**attributes):
+    """현재 span 에 속성(토큰 수, 캐시 히트 등)을 추가합니다."""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+def traced(name: str) -> Callable:
+    """async 함수 실행을 span 으로 기록하는 데코레이터입니다. (트레이스가 없으면 그대로 호출)"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return await func(*args, **kwargs)
+            with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# === 내보내기 (백그라운드 스레드) ===
+
+class TraceJsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg.to_dict(), ensure_ascii=False, default=str)
+
+class OtlpHttpHandler(logging.Handler):
+    """트레이스를 OTLP/HTTP JSON 으로 수집기에 전송합니다. 전송 실패는 세기만 하고 버립니다."""
+
+    def __init__(self, endpoint: str):
+        super().__init__()
+        self.endpoint = endpoint
+        self.failures = 0
+        self._client = httpx.Client(timeout=2.0)
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            response = self._client.post(self.endpoint, json=record.msg.to_otlp())
+            response.raise_for_status()
+        except Exception:
+            self.failures += 1
+
+    def close(self):
+        self._client.close()
+        super().close()
+
+class TraceRecorder:
+    """끝난 트레이스 중 가장 느린 N 개를 보관하고, 설정된 exporter 로 내보냅니다."""
+
+    def __init__(self, slowest_n: int):
+        self.slowest_n = slowest_n
+        self._slowest: List[tuple] = [] # (duration, seq, trace) min-heap
+        self._seq = itertools.count()
+        self.finished = 0
+        self.exported = 0
+        self.queue_handler: Optional[NonBlockingQueueHandler] = None
+        self.listener: Optional[DrainingQueueListener] = None
+        self._export_logger = logging.getLogger("chatbot.traces")
+        self._export_logger.propagate = False # 애플리케이션 로그와 섞이지 않도록
+        self._export_logger.setLevel(logging.INFO)
+
+    def record(self, trace: Trace):
+        self.finished += 1
+        entry = (trace.root.duration, next(self._seq), trace)
+        if len(self._slowest) < self.slowest_n:
+            heapq.heappush(self._slowest, entry)
+        elif entry[0] > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+        if self.queue_handler is not None and random.random() < TRACE_EXPORT_SAMPLE_RATE:
+            self.exported += 1
+            self._export_logger.info(trace) # 직렬화/전송은 리스너 스레드에서 수행
+
+    def slowest(self, limit: int) -> List[Dict[str, Any]]:
+        return [trace.to_dict() for _, _, trace in heapq.nlargest(limit, self._slowest)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": TRACING_ENABLED,
+            "finished": self.finished,
+            "exported": self.exported,
+            "export_dropped": self.queue_handler.dropped if self.queue_handler else 0,
+            "slowest_ms": round(max(self._slowest)[0] * 1000, 2) if self._slowest else 0.0,
+        }
+
+trace_recorder = TraceRecorder(TRACE_SLOWEST_N)
+
+def init_tracing():
+    """TRACE_EXPORTER 설정에 따라 트레이스 내보내기 리스너 스레드를 시작합니다."""
+    if not TRACING_ENABLED or TRACE_EXPORTER == "none" or trace_recorder.listener is not None:
+        return
+    if TRACE_EXPORTER == "file":
+        handler = logging.handlers.RotatingFileHandler(TRACE_FILE, maxBytes=50 * 1024 * 1024, backupCount=3, encoding="utf-8")
+        handler.setFormatter(TraceJsonFormatter())
+        target = TRACE_FILE
+    elif TRACE_EXPORTER == "otlp":
+        handler = OtlpHttpHandler(TRACE_OTLP_ENDPOINT)
+        target = TRACE_OTLP_ENDPOINT
+    else:
+        logger.error(f"알 수 없는 TRACE_EXPORTER: {TRACE_EXPORTER} (none | file | otlp)")
+        return
+    export_queue = queue.Queue(1000)
+    trace_recorder.queue_handler = NonBlockingQueueHandler(export_queue)
+    trace_recorder._export_logger.addHandler(trace_recorder.queue_handler)
+    trace_recorder.listener = DrainingQueueListener(export_queue, handler)
+    trace_recorder.listener.start()
+    logger.info(f"트레이스 내보내기 시작 ({TRACE_EXPORTER}: {target})")
+
+def close_tracing():
+    """남은 트레이스를 모두 내보낸 뒤 리스너 스레드를 종료합니다."""
+    if trace_recorder.listener is None:
+        return
+    trace_recorder._export_logger.removeHandler(trace_recorder.queue_handler)
+    trace_recorder.listener.stop()
+    for handler in trace_recorder.listener.handlers:
+        handler.close()
+    trace_recorder.listener = None
+    trace_recorder.queue_handler = None
+    logger.info("트레이스 내보내기 종료됨.")
@@ -1,21 +1,121 @@
 import httpx
 import os
+import json
+import asyncio
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Set
+
+from services.cache_service import AsyncTTLCache
+from services.shared_state import shared_state, shared_key, is_shared
 
 logger = logging.getLogger(__name__)
 
 API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
-BASE_URL = "https://api.openweathermap.org/data/2.5/weather"
+BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org/data/2.5/weather") # 테스트 시 로컬 스텁 서버로 변경 가능
+
+# === HTTP 클라이언트 / 캐시 설정 ===
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", "5")) # 요청 타임아웃 (초)
+WEATHER_MAX_CONNECTIONS = int(os.getenv("WEATHER_MAX_CONNECTIONS", "20"))
+WEATHER_HTTP2 = os.getenv("WEATHER_HTTP2", "true").lower() == "true"
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600")) # 날씨 캐시 유지 시간 (초)
+WEATHER_CACHE_MAXSIZE = int(os.getenv("WEATHER_CACHE_MAXSIZE", "1024")) # 캐시할 격자 셀 최대 개수
+WEATHER_GRID_DEGREES = float(os.getenv("WEATHER_GRID_DEGREES", "0.05")) # 위도/경도 격자 크기 (약 5km)
+
+class WeatherHTTP:
+    client: httpx.AsyncClient = None
+
+weather_http = WeatherHTTP()
+
+# 격자 셀 (lat, lon) -> 날씨 정보
+weather_cache = AsyncTTLCache("weather", maxsize=WEATHER_CACHE_MAXSIZE, ttl=WEATHER_CACHE_TTL)
+
+async def init_weather_client():
+    """애플리케이션 시작 시 keep-alive 커넥션 풀을 사용하는 공유 HTTP 클라이언트를 생성합니다."""
+    http2 = WEATHER_HTTP2
+    if http2:
+        try:
+            import h2 # noqa: F401 (httpx HTTP/2 지원에 필요)
+        except ImportError:
+            logger.warning("h2 패키지가 설치되지 않아 날씨 API 에 HTTP/1.1 을 사용합니다. (pip install 'httpx[http2]')")
+            http2 = False
+    weather_http.client = httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(WEATHER_TIMEOUT),
+        limits=httpx.Limits(max_connections=WEATHER_MAX_CONNECTIONS, max_keepalive_connections=WEATHER_MAX_CONNECTIONS),
+    )
+    logger.info(f"날씨 HTTP 클라이언트 초기화 성공 (HTTP/2: {http2})")
+
+async def close_weather_client():
+    """애플리케이션 종료 시 날씨 HTTP 클라이언트를 닫습니다."""
+    if weather_http.client:
+        await weather_http.client.aclose()
+        weather_http.client = None
+        logger.info("날씨 HTTP 클라이언트 종료됨.")
+
+def _grid_cell(lat: float, lon: float) -> tuple:
+    """위도/경도를 WEATHER_GRID_DEGREES 격자의 셀 중심 좌표로 반올림합니다."""
+    return (
+        round(round(lat / WEATHER_GRID_DEGREES) * WEATHER_GRID_DEGREES, 4),
+        round(round(lon / WEATHER_GRID_DEGREES) * WEATHER_GRID_DEGREES, 4),
+    )
+
+def get_weather_cache_stats() -> Dict[str, Any]:
+    """날씨 캐시 히트/미스/병합 통계를 반환합니다."""
+    return weather_cache.stats()
 
 async def get_current_weather(lat: float, lon: float) -> Optional[Dict[str, Any]]:
-    """지정된 위도/경도의 현재 날씨 정보를 OpenWeatherMap API로부터 가져옵니다."""
+    """지정된 위도/경도의 현재 날씨 정보를 반환합니다.
+
+    같은 격자 셀의 결과는 WEATHER_CACHE_TTL 동안 캐시되며, 동시에 들어온 같은 셀 요청은 한 번만 조회합니다.
+    멀티 워커 모드에서는 워커 캐시에 없을 때 공유 상태 백엔드를 먼저 확인해 다른 워커가 조회한 결과를 재사용합니다.
+    """
     if not API_KEY:
         logger.error("OpenWeatherMap API 키가 설정되지 않았습니다.")
         return {"error": "날씨 API 키가 설정되지 않아 날씨 정보를 가져올 수 없습니다."}
     if lat is None or lon is None:
         return {"error": "날씨를 조회할 위도와 경도가 필요합니다."}
 
+    cell_lat, cell_lon = _grid_cell(lat, lon)
+    return await weather_cache.get_or_load(
+        (cell_lat, cell_lon),
+        lambda: _load_weather(cell_lat, cell_lon),
+        cache_if=lambda result: "error" not in result, # 오류 응답은 캐시하지 않음
+    )
+
+# 백그라운드 미리 조회 작업 (GC 로 취소되지 않도록 참조 유지)
+_prefetch_tasks: Set[asyncio.Task] = set()
+
+def peek_current_weather(lat: float, lon: float) -> Optional[Dict[str, Any]]:
+    """워커 캐시에 남아 있는(WEATHER_CACHE_TTL 이내) 날씨만 반환합니다. 없으면 조회하지 않고 None."""
+    found, weather = weather_cache.get(_grid_cell(lat, lon))
+    return weather if found else None
+
+def prefetch_current_weather(lat: float, lon: float):
+    """날씨 조회를 백그라운드로 시작합니다. 같은 셀을 이미 조회 중이면 get_current_weather 가 한 번만 조회합니다."""
+    if not API_KEY:
+        return
+    task = asyncio.create_task(get_current_weather(lat, lon))
+    _prefetch_tasks.add(task)
+    task.add_done_callback(_prefetch_tasks.discard)
+
+async def _load_weather(lat: float, lon: float) -> Dict[str, Any]:
+    if not is_shared():
+        return await _fetch_weather(lat, lon)
+    key = shared_key("weather", lat, lon)
+    cached = await shared_state.backend.get(key)
+    if cached is not None:
+        return json.loads(cached)
+    result = await _fetch_weather(lat, lon)
+    if "error" not in result:
+        await shared_state.backend.set(key, json.dumps(result, ensure_ascii=False), ttl=WEATHER_CACHE_TTL)
+    return result
+
+async def _fetch_weather(lat: float, lon: float) -> Dict[str, Any]:
+    """OpenWeatherMap API 로부터 현재 날씨를 조회합니다."""
+    if weather_http.client is None:
+        logger.error("날씨 HTTP 클라이언트가 초기화되지 않았습니다.")
+        return {"error": "날씨 정보를 가져오는 중 오류가 발생했습니다."}
+
     params = {
         "lat": lat,
         "lon": lon,
@@ -24,39 +124,39 @@ async def get_current_weather(lat: float, lon: float) -> Optional[Dict[str, Any]
         "lang": "kr"       # 한국어 설명
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(BASE_URL, params=params)
-            response.raise_for_status() # 오류 발생 시 예외 발생
-            data = response.json()
-
-            # 위치 이름을 응답에서 가져오거나, 위도/경도로 표시
-            location_name = data.get("name")
-            if not location_name or location_name.strip() == "":
-                location_name = f"위도 {lat}, 경도 {lon}"
-
-            # 필요한 정보 추출 및 가공 (예시)
-            weather_info = {
-                "location": location_name,
-                "description": data["weather"][0]["description"],
-                "temperature": data["main"]["temp"],
-                "feels_like": data["main"]["feels_like"],
-                "humidity": data["main"]["humidity"],
-                "wind_speed": data["wind"]["speed"]
-            }
-            logger.info(f"'{location_name}' ({lat}, {lon}) 날씨 정보 조회 성공: {weather_info}")
-            return weather_info
-
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 401:
-                logger.error(f"OpenWeatherMap API 키 인증 실패: {e}")
-                return {"error": "날씨 API 키가 유효하지 않습니다."}
-            elif e.response.status_code == 404:
-                logger.warning(f"({lat}, {lon}) 위치를 찾을 수 없음: {e}")
-                return {"error": f"해당 위도/경도({lat}, {lon})의 날씨 정보를 찾을 수 없습니다."}
-            else:
-                logger.error(f"OpenWeatherMap API 요청 실패 ({e.response.status_code}): {e}")
-                return {"error": "날씨 정보를 가져오는 중 오류가 발생했습니다."}
-        except Exception as e:
-            logger.error(f"날씨 정보 조회 중 예상치 못한 오류: {e}", exc_info=True)
-            return {"error": "날씨 정보를 처리하는 중 오류가 발생했습니다."}
\ No newline at end of file
+    try:
+        response = await weather_http.client.get(BASE_URL, params=params)
+        response.raise_for_status() # 오류 발생 시 예외 발생
+        data = response.json()
+
+        # 위치 이름을 응답에서 가져오거나, 위도/경도로 표시
+        location_name = data.get("name")
+        if not location_name or location_name.strip() == "":
+            location_name = f"위도 {lat}, 경도 {lon}"
+
+        # 필요한 정보 추출 및 가공 (예시)
+        weather_info = {
+            "location": location_name,
+            "description": data["weather"][0]["description"],
+            "temperature": data["main"]["temp"],
+            "feels_like": data["main"]["feels_like"],
+            "humidity": data["main"]["humidity"],
+            "wind_speed": data["wind"]["speed"]
+        }
+        logger.info("'%s' (%s, %s) 날씨 정보 조회 성공", location_name, lat, lon)
+        logger.debug("날씨 정보: %s", weather_info)
+        return weather_info
+
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 401:
+            logger.error(f"OpenWeatherMap API 키 인증 실패: {e}")
+            return {"error": "날씨 API 키가 유효하지 않습니다."}
+        elif e.response.status_code == 404:
+            logger.warning(f"({lat}, {lon}) 위치를 찾을 수 없음: {e}")
+            return {"error": f"해당 위도/경도({lat}, {lon})의 날씨 정보를 찾을 수 없습니다."}
+        else:
+            logger.error(f"OpenWeatherMap API 요청 실패 ({e.response.status_code}): {e}")
+            return {"error": "날씨 정보를 가져오는 중 오류가 발생했습니다."}
+    except Exception as e:
+        logger.error(f"날씨 정보 조회 중 예상치 못한 오류: {e}", exc_info=True)
+        return {"error": "날씨 정보를 처리하는 중 오류가 발생했습니다."}
\ No newline at end of file
@@ -0,0 +1,5 @@
+"""테스트 공통 설정 (backend 디렉토리에서 python -m pytest -q)"""
+import os
+
+# services.openai_service 는 import 시점에 키가 없으면 실패하므로, 실제 호출이 없는 테스트용 더미 키를 넣어 둠
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
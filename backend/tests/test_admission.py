@@ -0,0 +1,40 @@
+"""사용자별 수용 한도 식별자 회귀 테스트 (backend 디렉토리에서 python -m pytest -q)"""
+import asyncio
+
+import pytest
+
+from services import admission_service
+from services.admission_service import AdmissionRejected, TurnScheduler, trusted_user_id
+
+@pytest.fixture
+def proxy(monkeypatch):
+    monkeypatch.setattr(admission_service, "_trusted_proxies", admission_service._parse_networks("10.0.0.0/8"))
+    monkeypatch.setattr(admission_service, "CHAT_USER_ID_HEADER", "X-User-Id")
+
+def test_no_trusted_proxy_means_no_user_limit():
+    # 기본 설정: 프록시 뒤의 사용자들이 한 IP 로 묶이지 않도록 식별자를 만들지 않음
+    assert trusted_user_id("172.18.0.5", {"X-User-Id": "alice"}) is None
+
+def test_headers_from_untrusted_clients_are_ignored(proxy):
+    assert trusted_user_id("203.0.113.7", {"X-User-Id": "alice", "X-Forwarded-For": "198.51.100.1"}) == "203.0.113.7"
+
+def test_trusted_proxy_identity(proxy):
+    assert trusted_user_id("10.0.0.2", {"X-User-Id": "alice"}) == "user:alice"
+    # 식별 헤더가 없으면 X-Forwarded-For 에서 신뢰 프록시를 뺀 가장 오른쪽 IP (앞쪽은 클라이언트가 위조 가능)
+    assert trusted_user_id("10.0.0.2", {"X-Forwarded-For": "1.2.3.4, 198.51.100.1, 10.0.0.9"}) == "198.51.100.1"
+    assert trusted_user_id("10.0.0.2", {}) is None
+
+def test_turns_without_user_id_skip_user_limit():
+    scheduler = TurnScheduler(max_concurrent=8, max_per_user=1, max_queue=8, queue_timeout=1)
+
+    async def run():
+        async with scheduler.admit("a"), scheduler.admit("b"):
+            pass
+        async with scheduler.admit("c", "user:alice"):
+            with pytest.raises(AdmissionRejected):
+                async with scheduler.admit("d", "user:alice"):
+                    pass
+
+    asyncio.run(run())
+    assert scheduler.rejected["user_limit"] == 1
+    assert scheduler._user_turns == {}
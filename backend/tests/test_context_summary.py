@@ -0,0 +1,80 @@
+"""대화 요약 워터마크 회귀 테스트 (backend 디렉토리에서 python -m pytest -q)"""
+import asyncio
+from datetime import datetime, timedelta
+
+from services import chat_service
+from services.chat_service import HISTORY_LIMIT
+
+START = datetime(2026, 10, 17, 12, 0)
+
+def _messages(first: int, last: int):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"메시지 {i}", "timestamp": START + timedelta(seconds=i), "token_count": 3}
+        for i in range(first, last)
+    ]
+
+def _session(message_count, summary=None, summary_until=None, summary_count=0):
+    return {"summary": summary, "summary_until": summary_until, "summary_count": summary_count, "message_count": message_count}
+
+def _fake_db(monkeypatch, conversation):
+    calls = {"summarized": [], "saved": []}
+
+    async def get_messages_between(conversation_id, after, before, limit):
+        return [m for m in conversation if (after is None or m["timestamp"] > after) and m["timestamp"] < before][:limit]
+
+    async def summarize_conversation(previous, messages):
+        calls["summarized"].append([m["content"] for m in messages])
+        return f"요약 {len(calls['summarized'])}", 10, 5
+
+    async def save_session_summary(conversation_id, summary, summary_until, summary_count):
+        calls["saved"].append((summary, summary_until, summary_count))
+
+    async def save_token_usage(*args):
+        pass
+
+    monkeypatch.setattr(chat_service, "get_messages_between", get_messages_between)
+    monkeypatch.setattr(chat_service, "summarize_conversation", summarize_conversation)
+    monkeypatch.setattr(chat_service, "save_session_summary", save_session_summary)
+    monkeypatch.setattr(chat_service, "_save_token_usage", save_token_usage)
+    return calls
+
+def test_short_conversation_has_nothing_outside_window():
+    history = _messages(0, HISTORY_LIMIT - 2)
+    assert chat_service._outside_window(history, _session(len(history))) == 0
+
+def test_messages_leaving_window_are_counted():
+    conversation = _messages(0, HISTORY_LIMIT + 10)
+    history = conversation[-HISTORY_LIMIT:]
+    assert chat_service._outside_window(history, _session(len(conversation))) == 10
+    # 앞의 10개가 요약된 뒤 2개가 더 쌓이면 창 밖 미요약 메시지는 2개
+    conversation = _messages(0, HISTORY_LIMIT + 12)
+    session = _session(len(conversation), "요약", conversation[9]["timestamp"], 10)
+    assert chat_service._outside_window(conversation[-HISTORY_LIMIT:], session) == 2
+
+def test_refresh_summarizes_messages_outside_window_and_advances_watermark(monkeypatch):
+    conversation = _messages(0, HISTORY_LIMIT + 10)
+    history = conversation[-HISTORY_LIMIT:]
+    calls = _fake_db(monkeypatch, conversation)
+    asyncio.run(chat_service._refresh_summary("conv", _session(len(conversation)), history, [], 10))
+    assert calls["summarized"] == [[f"메시지 {i}" for i in range(10)]]
+    assert calls["saved"] == [("요약 1", conversation[9]["timestamp"], 10)]
+
+def test_refresh_catches_up_in_batches(monkeypatch):
+    conversation = _messages(0, HISTORY_LIMIT + 10)
+    history = conversation[-HISTORY_LIMIT:]
+    unsummarized = history[:2] # 예산 밖으로 밀려난 메시지는 따라잡는 동안 보류
+    calls = _fake_db(monkeypatch, conversation)
+    monkeypatch.setattr(chat_service, "CONTEXT_SUMMARY_MAX_MESSAGES", 4)
+    asyncio.run(chat_service._refresh_summary("conv", _session(len(conversation)), history, unsummarized, 10))
+    assert calls["summarized"] == [[f"메시지 {i}" for i in range(4)]]
+    assert calls["saved"] == [("요약 1", conversation[3]["timestamp"], 4)]
+
+def test_stale_count_is_corrected_without_model_call(monkeypatch):
+    # summary_count 가 없던 세션: 창 밖 메시지가 이미 모두 요약되어 있으면 개수만 바로잡음
+    conversation = _messages(0, HISTORY_LIMIT + 10)
+    history = conversation[-HISTORY_LIMIT:]
+    session = _session(len(conversation), "요약", conversation[9]["timestamp"], 0)
+    calls = _fake_db(monkeypatch, conversation)
+    asyncio.run(chat_service._refresh_summary("conv", session, history, [], chat_service._outside_window(history, session)))
+    assert calls["summarized"] == []
+    assert calls["saved"] == [(None, None, 10)]
@@ -0,0 +1,65 @@
+"""스트리밍 호출의 동시 호출 슬롯 회귀 테스트 (backend 디렉토리에서 python -m pytest -q)"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services import openai_service
+
+class _Stream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for chunk in self.chunks:
+            yield chunk
+
+def _setup(monkeypatch, responses):
+    async def create(**kwargs):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    slots_during_backoff = []
+
+    async def call_with_retry(call, max_timeout):
+        # 첫 시도 실패 후 재시도 (백오프 대기 중 남은 슬롯 수를 기록)
+        try:
+            return await call(max_timeout)
+        except ConnectionError:
+            slots_during_backoff.append(openai_service.openai_client.semaphore._value)
+            return await call(max_timeout)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(openai_service.openai_client, "client", client)
+    monkeypatch.setattr(openai_service.openai_client, "semaphore", asyncio.Semaphore(1))
+    monkeypatch.setattr(openai_service, "call_with_retry", call_with_retry)
+    return slots_during_backoff
+
+async def _consume():
+    return [chunk async for chunk in openai_service._stream_completion(messages=[])]
+
+def test_backoff_does_not_hold_slot_and_stream_releases_it(monkeypatch):
+    chunk = SimpleNamespace(usage=None)
+    slots_during_backoff = _setup(monkeypatch, [ConnectionError("reset"), _Stream([chunk])])
+
+    async def run():
+        assert await _consume() == [chunk]
+        return openai_service.openai_client.semaphore._value
+
+    assert asyncio.run(run()) == 1
+    assert slots_during_backoff == [1]
+
+def test_failed_stream_releases_slot(monkeypatch):
+    _setup(monkeypatch, [ConnectionError("reset"), ConnectionError("reset")])
+
+    async def run():
+        with pytest.raises(ConnectionError):
+            await _consume()
+        return openai_service.openai_client.semaphore._value
+
+    assert asyncio.run(run()) == 1
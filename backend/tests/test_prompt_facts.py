@@ -0,0 +1,32 @@
+"""프롬프트 정보 주입 회귀 테스트 (backend 디렉토리에서 python -m pytest -q)"""
+import datetime
+
+from services import prompt_facts_service
+from services.datetime_service import KST
+from services.prompt_facts_service import build_prompt_facts, DATE_TOOL
+
+def _at(monkeypatch, *args):
+    monkeypatch.setattr(prompt_facts_service, "PROMPT_FACTS_ENABLED", True) # 기본은 꺼짐
+    monkeypatch.setattr(prompt_facts_service, "now_kst", lambda: datetime.datetime(*args, tzinfo=KST))
+
+def test_cache_key_changes_with_kst_date(monkeypatch):
+    _at(monkeypatch, 2026, 10, 17, 23, 59)
+    today = build_prompt_facts("점심 메뉴 추천해줘")
+    _at(monkeypatch, 2026, 10, 18, 0, 1)
+    tomorrow = build_prompt_facts("점심 메뉴 추천해줘")
+    assert today["cache_key"] != tomorrow["cache_key"]
+    assert today["covered_tools"] == [DATE_TOOL]
+
+def test_time_question_is_answered_by_facts(monkeypatch):
+    _at(monkeypatch, 2026, 10, 17, 9, 30)
+    facts = build_prompt_facts("지금 몇 시야?")
+    assert DATE_TOOL in facts["answered_tools"]
+    assert "09:30" in facts["content"]
+
+def test_unrelated_question_is_not_answered_by_facts(monkeypatch):
+    _at(monkeypatch, 2026, 10, 17, 9, 30)
+    assert build_prompt_facts("git rebase 랑 merge 차이 알려줘")["answered_tools"] == []
+
+def test_disabled_sends_no_facts(monkeypatch):
+    monkeypatch.setattr(prompt_facts_service, "PROMPT_FACTS_ENABLED", False)
+    assert build_prompt_facts("지금 몇 시야?") is None
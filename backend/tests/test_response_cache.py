@@ -0,0 +1,64 @@
+"""응답 캐시 정규화 일치 단계 회귀 테스트 (backend 디렉토리에서 python -m pytest -q)"""
+import pytest
+
+from services.response_cache_service import ResponseCache, normalized_key, same_question
+
+SYSTEM_PROMPT = "테스트 시스템 프롬프트"
+
+# 숫자, 영문 식별자, 고유명사, 어순 하나만 다른 질문: 정규화 일치 캐시가 서로의 답을 돌려주면 안 됨
+NEAR_MISSES = [
+    ("How do I convert 5000 kilometers to miles? Show the formula step by step.",
+     "How do I convert 6000 kilometers to miles? Show the formula step by step."),
+    ("자바스크립트에서 배열의 중복을 제거하는 가장 간단한 방법을 예시 코드와 함께 알려줘",
+     "타입스크립트에서 배열의 중복을 제거하는 가장 간단한 방법을 예시 코드와 함께 알려줘"),
+    ("1부터 100까지 합을 구하는 공식", "1부터 1000까지 합을 구하는 공식"),
+    ("파이썬 3.11 새 기능 정리해줘", "파이썬 3.12 새 기능 정리해줘"),
+    ("React useEffect 예시 보여줘", "React useMemo 예시 보여줘"),
+    ("원을 달러로 바꾸는 공식", "달러를 원으로 바꾸는 공식"),
+    ("서울에서 부산까지 거리", "서울에서 대구까지 거리"),
+]
+
+# 띄어쓰기, 대소문자, 문장부호, 조사/요청 어미만 다른 질문: 같은 질문으로 인정
+PARAPHRASES = [
+    ("파이썬이 뭐야?", "파이썬 이 뭐야"),
+    ("git rebase 랑 merge 차이 알려줘", "git rebase랑 merge 차이 알려줘!"),
+    ("How do I reverse a list in Python?", "how do i reverse a list in python"),
+    ("도커 이미지 용량 줄이는 방법", "도커 이미지 용량 줄이는 방법은?"),
+    ("재귀 함수 설명해줘", "재귀함수 설명해 줘"),
+]
+
+@pytest.mark.parametrize("stored, asked", NEAR_MISSES)
+def test_near_miss_is_not_same_question(stored, asked):
+    assert not same_question(stored, asked)
+
+@pytest.mark.parametrize("stored, asked", NEAR_MISSES)
+def test_near_miss_is_not_served(stored, asked):
+    cache = ResponseCache()
+    cache.store(SYSTEM_PROMPT, [], stored, "stored answer", 10, 10, [])
+    assert cache.lookup(SYSTEM_PROMPT, [], asked) is None
+
+@pytest.mark.parametrize("stored, asked", PARAPHRASES)
+def test_paraphrase_is_same_question(stored, asked):
+    assert same_question(stored, asked)
+
+@pytest.mark.parametrize("stored, asked", PARAPHRASES)
+def test_paraphrase_has_same_key(stored, asked):
+    assert normalized_key(stored) == normalized_key(asked)
+
+def test_paraphrase_is_served_from_normalized_tier():
+    cache = ResponseCache()
+    cache.store(SYSTEM_PROMPT, [], "도커 이미지 용량 줄이는 방법", "answer", 10, 10, [])
+    hit = cache.lookup(SYSTEM_PROMPT, [], "도커 이미지 용량 줄이는 방법은?")
+    assert hit is not None and hit["tier"] == "normalized"
+
+def test_same_key_different_question_is_not_served():
+    cache = ResponseCache()
+    cache.store(SYSTEM_PROMPT, [], "세금 계산", "answer", 10, 10, [])
+    assert normalized_key("세금 계산") == normalized_key("금 계산")
+    assert cache.lookup(SYSTEM_PROMPT, [], "금 계산") is None
+    assert cache.stats()["normalized_rejected"] == 1
+
+def test_time_sensitive_turn_is_not_stored():
+    cache = ResponseCache()
+    cache.store(SYSTEM_PROMPT, [], "오늘 며칠이야", "answer", 10, 10, ["get_current_date"])
+    assert cache.lookup(SYSTEM_PROMPT, [], "오늘 며칠이야") is None
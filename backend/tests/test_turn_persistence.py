@@ -0,0 +1,60 @@
+"""턴 저장 순서 회귀 테스트 (backend 디렉토리에서 python -m pytest -q)"""
+import asyncio
+
+import pytest
+
+from services import chat_service
+
+def _record_writes(monkeypatch):
+    saved, usages = [], []
+
+    async def fake_save_chat_message(conversation_id, role, content, timestamp=None, token_count=None):
+        saved.append(role)
+
+    async def fake_save_token_usage(conversation_id, prompt_tokens, completion_tokens, *args):
+        usages.append((prompt_tokens, completion_tokens))
+
+    monkeypatch.setattr(chat_service, "save_chat_message", fake_save_chat_message)
+    monkeypatch.setattr(chat_service, "_save_token_usage", fake_save_token_usage)
+    return saved, usages
+
+async def _failed_user_write():
+    raise ConnectionError("user write failed")
+
+async def _ok_user_write():
+    return None
+
+def test_failed_user_write_fails_turn_without_saving_reply(monkeypatch):
+    saved, usages = _record_writes(monkeypatch)
+
+    async def turn():
+        user_write = asyncio.create_task(_failed_user_write())
+        await chat_service._finish_turn("conv", user_write, "reply", 10, 5)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(turn())
+    assert saved == [] # 질문 없이 답만 남지 않음
+    assert usages == [(10, 5)] # 모델 비용은 기록
+
+def test_successful_user_write_saves_reply_and_usage(monkeypatch):
+    saved, usages = _record_writes(monkeypatch)
+
+    async def turn():
+        user_write = asyncio.create_task(_ok_user_write())
+        await chat_service._finish_turn("conv", user_write, "reply", 10, 5)
+
+    asyncio.run(turn())
+    assert saved == ["assistant"]
+    assert usages == [(10, 5)]
+
+def test_settle_keeps_original_error():
+    async def turn():
+        user_write = asyncio.create_task(_failed_user_write())
+        try:
+            raise TimeoutError("model timed out")
+        except BaseException:
+            await chat_service._settle(user_write)
+            raise
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(turn())
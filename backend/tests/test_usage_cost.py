@@ -0,0 +1,40 @@
+"""모델별 비용 계산 회귀 테스트 (backend 디렉토리에서 python -m pytest -q)"""
+import asyncio
+
+import pytest
+
+from db import mongo
+from services import chat_service
+from services.chat_service import MODEL_NAME, calculate_cost
+
+def _capture_usage(monkeypatch):
+    saved = []
+
+    async def save_token_usage(doc):
+        saved.append(doc)
+
+    monkeypatch.setattr(chat_service, "save_token_usage", save_token_usage)
+    return saved
+
+def test_cost_uses_model_prices():
+    assert calculate_cost(1_000_000, 1_000_000) == pytest.approx(0.5) # gpt-4.1-nano
+    assert calculate_cost(1_000_000, 1_000_000, "gpt-4o-mini") == pytest.approx(0.75)
+    # 표에 없는 모델은 기본 모델 가격
+    assert calculate_cost(1_000_000, 0, "unknown-model") == calculate_cost(1_000_000, 0)
+
+def test_light_model_turn_is_priced_and_saving_recorded(monkeypatch):
+    saved = _capture_usage(monkeypatch)
+    route = {"route": "none", "tools": [], "predicted": [], "model": "gpt-4o-mini", "saved_tokens": 1000}
+    asyncio.run(chat_service._save_token_usage("conv", 2000, 500, route=route, used_tools=[]))
+    doc = saved[0]
+    assert doc["model_name"] == "gpt-4o-mini"
+    assert doc["cost"] == pytest.approx(calculate_cost(2000, 500, "gpt-4o-mini"))
+    # 빠진 도구 스키마 (사용한 모델 입력 가격) + 기본 모델과의 차액
+    expected = calculate_cost(1000, 0, "gpt-4o-mini") + calculate_cost(2000, 500, MODEL_NAME) - doc["cost"]
+    assert doc["router_saved_cost"] == pytest.approx(expected)
+    assert mongo._usage_increments(doc)["cost"] == doc["cost"]
+
+def test_legacy_usage_doc_falls_back_to_default_prices():
+    increments = mongo._usage_increments({"input_tokens": 1_000_000, "output_tokens": 0})
+    assert increments["cost"] == pytest.approx(calculate_cost(1_000_000, 0))
+    assert increments["router_saved_cost"] == 0
@@ -12,10 +12,21 @@ const apiClient = axios.create({
 // --- 세션 관련 API ---
 
 // 세션 목록 가져오기
+// 서버는 한 페이지(최대 200개)씩 돌려주므로 next_cursor 가 없을 때까지 이어서 받아 전체 목록을 만듦
+const SESSION_PAGE_SIZE = 200;
+
 export const getSessions = async () => {
   try {
-    const response = await apiClient.get("/sessions");
-    return response.data.sessions; // {sessions: [...]} 형태이므로 .sessions 접근
+    const sessionIds: string[] = [];
+    let cursor: string | null = null;
+    do {
+      const response = await apiClient.get("/sessions", {
+        params: { limit: SESSION_PAGE_SIZE, ...(cursor ? { cursor } : {}) },
+      });
+      sessionIds.push(...response.data.sessions); // {sessions: [...], items, next_cursor} 형태
+      cursor = response.data.next_cursor;
+    } while (cursor);
+    return sessionIds;
   } catch (error) {
     console.error("Error fetching sessions:", error);
     throw error; // 에러를 다시 throw하여 호출부에서 처리하도록 함
@@ -23,10 +34,21 @@ export const getSessions = async () => {
 };
 
 // 특정 세션 기록 가져오기
+// 최신 페이지부터 받아 prev_cursor 가 없을 때까지 이전 페이지를 앞에 붙여 전체 기록을 만듦 (각 페이지는 시간순)
+const HISTORY_PAGE_SIZE = 500;
+
 export const getHistory = async (conversationId: string) => {
   try {
-    const response = await apiClient.get(`/history/${conversationId}`);
-    return response.data; // 기록 배열 직접 반환
+    let messages: any[] = [];
+    let before: string | null = null;
+    do {
+      const response = await apiClient.get(`/history/${conversationId}`, {
+        params: { limit: HISTORY_PAGE_SIZE, ...(before ? { before } : {}) },
+      });
+      messages = response.data.messages.concat(messages); // {messages: [...], prev_cursor, next_cursor} 형태
+      before = response.data.prev_cursor;
+    } while (before);
+    return messages;
   } catch (error) {
     console.error(`Error fetching history for ${conversationId}:`, error);
     throw error;
@@ -47,10 +69,32 @@ export const deleteSession = async (sessionId: string) => {
 
 // --- 채팅 관련 API ---
 
+// 메시지 전송마다 새 멱등성 키 생성 (crypto.randomUUID 는 https/localhost 에서만 사용 가능)
+export const newIdempotencyKey = () =>
+  typeof crypto !== "undefined" && "randomUUID" in crypto
+    ? crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).substring(2, 12)}`;
+
 // 새 메시지 보내기
-export const sendMessage = async (conversationId: string, message: string) => {
+// 같은 idempotencyKey 로 재시도하면 서버에서 한 번만 처리하고 같은 응답을 돌려줌 (키가 없으면 같은 메시지를 다시 보내도 새 턴)
+// 응답을 받지 못한 네트워크 오류는 같은 키로 한 번 재시도
+export const sendMessage = async (
+  conversationId: string,
+  message: string,
+  idempotencyKey: string = newIdempotencyKey()
+) => {
+  const payload = {
+    conversation_id: conversationId,
+    message,
+    idempotency_key: idempotencyKey,
+  };
   try {
-    const response = await apiClient.post("/chat", { conversation_id: conversationId, message });
+    const response = await apiClient.post("/chat", payload).catch((error) => {
+      if (axios.isAxiosError(error) && !error.response) {
+        return apiClient.post("/chat", payload);
+      }
+      throw error;
+    });
     return response.data; // {response: "..."} 형태
   } catch (error) {
     console.error("Error sending message:", error);